@@ -0,0 +1,111 @@
+"""
+Benchmark do cache de agendas de pacientes (Clinica.consultar_agenda_paciente).
+
+Gera um banco com dados_sinteticos e roda a mesma sequência de operações
+duas vezes, cada uma numa cópia do banco: sem cache (max_agendas=0) e com o
+cache padrão. A sequência é quase só de leituras de "minhas consultas",
+com pacientes mais e menos populares (pesos 1/posição), e uma fração de
+cancelamentos, que invalidam a agenda do paciente.
+
+Uso:
+    python benchmarks/bench_agenda_paciente.py [--leituras 20000] [--escritas 0.05]
+                                               [--pacientes 2000] [--consultas 50000]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from dados_sinteticos import GeradorDados
+from models.cache_agenda import CacheAgendaPaciente
+from models.clinica import Clinica
+from persistencia import AgendaRepository, STATUS_AGENDADO
+
+
+def preparar(pasta: str, args) -> str:
+    caminho = os.path.join(pasta, "base.db")
+    repo = AgendaRepository(caminho)
+    try:
+        # 'hoje' cedo no período: a maior parte das consultas fica Agendada (cancelável).
+        GeradorDados(42, pacientes=args.pacientes, medicos=args.medicos, consultas=args.consultas,
+                     data_inicio=date(2024, 1, 1), hoje=date(2024, 1, 15)).popular(repo)
+    finally:
+        repo.fechar()
+    return caminho
+
+
+def sequencia(caminho: str, args):
+    """[(tipo, id)]: ('ler', id_paciente) ou ('cancelar', id_agendamento)."""
+    repo = AgendaRepository(caminho)
+    try:
+        conn = repo._get_conexao()
+        pacientes = [i for i, in conn.execute("SELECT id FROM pacientes;")]
+        agendadas = [i for i, in conn.execute("SELECT id FROM agendamentos WHERE status = ?;", (STATUS_AGENDADO,))]
+    finally:
+        repo.fechar()
+    aleatorio = random.Random(7)
+    aleatorio.shuffle(pacientes)
+    pesos = [1 / (posicao + 1) for posicao in range(len(pacientes))]
+    leituras = aleatorio.choices(pacientes, pesos, k=args.leituras)
+    canceladas = iter(aleatorio.sample(agendadas, min(len(agendadas), int(args.leituras * args.escritas) + 1)))
+    operacoes = []
+    for id_paciente in leituras:
+        id_agendamento = next(canceladas, None) if aleatorio.random() < args.escritas else None
+        if id_agendamento is not None:
+            operacoes.append(("cancelar", id_agendamento))
+        operacoes.append(("ler", id_paciente))
+    return operacoes
+
+
+def rodar(caminho: str, operacoes, cache: CacheAgendaPaciente):
+    repo = AgendaRepository(caminho)
+    clinica = Clinica(repo)
+    clinica.agendas = cache
+    try:
+        tempo_leitura = 0.0
+        for tipo, ident in operacoes:
+            if tipo == "cancelar":
+                clinica.cancelar_consulta(ident)
+                continue
+            inicio = time.perf_counter()
+            clinica.consultar_agenda_paciente(ident)
+            tempo_leitura += time.perf_counter() - inicio
+    finally:
+        repo.fechar()
+    return tempo_leitura, cache.estatisticas()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--leituras", type=int, default=20_000)
+    parser.add_argument("--escritas", type=float, default=0.05, help="cancelamentos por leitura")
+    parser.add_argument("--pacientes", type=int, default=2000)
+    parser.add_argument("--medicos", type=int, default=50)
+    parser.add_argument("--consultas", type=int, default=50_000)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix="bench_agenda_")
+    try:
+        base = preparar(pasta, args)
+        operacoes = sequencia(base, args)
+        n = sum(1 for tipo, _ in operacoes if tipo == "ler")
+        print(f"{n} leituras e {len(operacoes) - n} cancelamentos; {args.pacientes} pacientes, "
+              f"~{args.consultas // args.pacientes} consultas cada")
+        for nome, cache in (("sem cache", CacheAgendaPaciente(max_agendas=0)), ("com cache", CacheAgendaPaciente())):
+            copia = os.path.join(pasta, f"{nome.replace(' ', '_')}.db")
+            shutil.copy(base, copia)
+            tempo, estatisticas = rodar(copia, operacoes, cache)
+            print(f"{nome:10} {tempo:7.3f}s  {tempo / n * 1e6:8.1f} us/leitura  "
+                  f"taxa de acerto {estatisticas['taxa_acerto'] or 0:.1%}  {estatisticas}")
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
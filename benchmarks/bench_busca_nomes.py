@@ -0,0 +1,62 @@
+"""
+Benchmark da busca de pacientes por nome (índice FTS5).
+
+Cria N pacientes com nomes brasileiros sintéticos (com e sem acento) e mede
+a latência de buscas típicas da recepção: prefixo curto, nome + sobrenome,
+termo sem acento e a segunda página de resultados.
+
+Uso:
+    python benchmarks/bench_busca_nomes.py [--pacientes 1000000] [--repeticoes 200]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from persistencia import AgendaRepository
+
+NOMES = ("João", "José", "Maria", "Ana", "Antônio", "Francisco", "Luís", "Márcia", "Sebastião", "Conceição",
+         "Joaquim", "Helena", "Inês", "Raimundo", "Lúcia", "Vitória", "Caio", "Letícia", "Otávio", "Bárbara")
+SOBRENOMES = ("Silva", "Santos", "Oliveira", "Souza", "Conceição", "Araújo", "Gonçalves", "Simões",
+              "Magalhães", "Assunção", "Brandão", "Falcão", "Lôbo", "Peçanha", "Müller", "Ribeiro")
+BUSCAS = ("jo", "maria sil", "conceicao", "SEBASTIAO falc", "an", "leticia peçanha mag")
+
+
+def rodar(n_pacientes: int, repeticoes: int):
+    random.seed(42)
+    with tempfile.TemporaryDirectory() as pasta:
+        repo = AgendaRepository(os.path.join(pasta, "busca.db"))
+        conn = repo._get_conexao()
+        inicio = time.perf_counter()
+        with conn:
+            conn.executemany(
+                "INSERT INTO pacientes (nome, cpf, telefone, plano_saude) VALUES (?, ?, ?, ?);",
+                ((f"{random.choice(NOMES)} {random.choice(SOBRENOMES)} {random.choice(SOBRENOMES)}",
+                  f"{i:011d}", "11999990000", "Unimed") for i in range(n_pacientes)))
+        print(f"{n_pacientes} pacientes inseridos (com índice) em {time.perf_counter() - inicio:.1f}s")
+
+        for texto in BUSCAS:
+            tempos = []
+            for _ in range(repeticoes):
+                t = time.perf_counter()
+                pagina = repo.buscar_pacientes_por_nome(texto, limite=20)
+                repo.buscar_pacientes_por_nome(texto, limite=20, apos_id=pagina[-1].id if pagina else 0)
+                tempos.append((time.perf_counter() - t) / 2)
+            tempos.sort()
+            print(f"{texto!r:24} {len(pagina):3} resultados/página  "
+                  f"mediana {statistics.median(tempos) * 1000:.2f} ms  "
+                  f"p99 {tempos[int(len(tempos) * 0.99) - 1] * 1000:.2f} ms")
+        repo.fechar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pacientes", type=int, default=1_000_000)
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args()
+    rodar(args.pacientes, args.repeticoes)
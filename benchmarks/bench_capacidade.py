@@ -0,0 +1,127 @@
+"""
+Benchmark da conferência de capacidade (consultas simultâneas).
+
+Um médico com capacidade > 1 e ~200 consultas num mesmo dia. Para vários
+horários pedidos mede:
+
+- varredura: models.capacidade.cabe sobre TODAS as consultas do dia;
+- repositório: AgendaRepository._excede_capacidade (SQL das consultas que
+  tocam o horário + varredura), o que salvar_agendamento faz na transação;
+- clínica: Clinica._verificar_conflito_horario, separando os horários na
+  grade de 5 minutos (bitset de lotados em cache) dos fora dela (varredura);
+- par a par: o jeito antigo, cada consulta do dia contra todas as outras, O(k²).
+
+Uso:
+    python benchmarks/bench_capacidade.py [--consultas 200] [--capacidade 8] [--pedidos 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from models.capacidade import cabe
+from models.clinica import Clinica
+from models.medico import Medico
+from models.paciente import Paciente
+from persistencia import AgendaRepository
+
+DIA = date(2030, 1, 7)
+EXPEDIENTE = {d: ["06:00-22:00"] for d in ("segunda", "terca", "quarta", "quinta", "sexta", "sabado", "domingo")}
+
+
+def popular(clinica: Clinica, n_consultas: int, capacidade: int):
+    """Marca até n_consultas (20 a 60 min, grade de 5 min) respeitando a capacidade."""
+    id_medico = clinica.cadastrar_medico(Medico("Médico", "1" * 11, "0", "CRM1", "Grupo", EXPEDIENTE))
+    id_paciente = clinica.cadastrar_paciente(Paciente("Paciente", "2" * 11, "0", "SUS"))
+    clinica.definir_capacidade_medico(id_medico, capacidade)
+    aleatorio = random.Random(42)
+    abertura = datetime.combine(DIA, datetime.min.time()) + timedelta(hours=6)
+    marcadas = tentativas = 0
+    while marcadas < n_consultas and tentativas < n_consultas * 50:
+        tentativas += 1
+        duracao = aleatorio.choice((20, 30, 40, 60))
+        inicio = abertura + timedelta(minutes=5 * aleatorio.randrange((16 * 60 - duracao) // 5 + 1))
+        try:
+            clinica.marcar_consulta(id_paciente, id_medico, inicio, duracao)
+        except ValueError:
+            continue
+        marcadas += 1
+    return id_medico
+
+
+def pico_par_a_par(intervalos, inicio: datetime, fim: datetime) -> int:
+    """O jeito antigo: cada consulta do dia (e o pedido) contra todas as outras."""
+    consultas = [(c, c + timedelta(minutes=d)) for c, d in intervalos] + [(inicio, fim)]
+    pico = 0
+    for a_ini, a_fim in consultas:
+        simultaneas = 0
+        for b_ini, b_fim in consultas:
+            # b está em andamento no início de a (todo pico começa no início de alguma consulta)
+            if b_ini <= a_ini < b_fim and b_ini < fim and b_fim > inicio:
+                simultaneas += 1
+        pico = max(pico, simultaneas)
+    return pico - 1  # Sem contar o próprio pedido
+
+
+def medir(nome: str, funcao, pedidos, referencia=None):
+    resultados = []
+    inicio = time.perf_counter()
+    for pedido in pedidos:
+        resultados.append(funcao(*pedido))
+    total = time.perf_counter() - inicio
+    print(f"{nome:12} {total / len(pedidos) * 1e6:9.1f} us/conferência  "
+          f"({sum(resultados)} de {len(pedidos)} lotados)")
+    if referencia is not None and resultados != referencia:
+        raise SystemExit(f"{nome}: resultados diferentes da varredura")
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--capacidade", type=int, default=8)
+    parser.add_argument("--pedidos", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        repo = AgendaRepository(os.path.join(pasta, "bench.db"))
+        try:
+            clinica = Clinica(repo)
+            id_medico = popular(clinica, args.consultas, args.capacidade)
+            intervalos = repo.buscar_intervalos_ocupados_medico(id_medico, DIA, DIA)
+            print(f"{len(intervalos)} consultas no dia, capacidade {args.capacidade}")
+
+            aleatorio = random.Random(7)
+            abertura = datetime.combine(DIA, datetime.min.time()) + timedelta(hours=6)
+            pedidos = []
+            for _ in range(args.pedidos):
+                duracao = aleatorio.choice((15, 30, 45, 60))
+                # Metade fora da grade de 5 minutos: a clínica não usa o bitset.
+                passo = 5 if aleatorio.random() < 0.5 else 1
+                pedidos.append((abertura + timedelta(minutes=passo * aleatorio.randrange((16 * 60 - duracao) // passo)),
+                                duracao))
+
+            capacidade = args.capacidade
+            conn = repo._get_conexao()
+            referencia = medir("varredura", lambda ini, d: not cabe(
+                intervalos, ini, ini + timedelta(minutes=d), capacidade), pedidos)
+            medir("repositório", lambda ini, d: AgendaRepository._excede_capacidade(
+                conn, id_medico, ini, ini + timedelta(minutes=d), capacidade), pedidos, referencia)
+            alinhados = [i for i, (ini, d) in enumerate(pedidos) if ini.minute % 5 == 0]
+            fora = [i for i, (ini, d) in enumerate(pedidos) if ini.minute % 5]
+            for nome, indices in (("clínica/5min", alinhados), ("clínica/fora", fora)):
+                medir(nome, lambda ini, d: clinica._verificar_conflito_horario(id_medico, ini, d),
+                      [pedidos[i] for i in indices], [referencia[i] for i in indices])
+            medir("par a par", lambda ini, d: pico_par_a_par(
+                intervalos, ini, ini + timedelta(minutes=d)) >= capacidade, pedidos, referencia)
+        finally:
+            repo.fechar()
+
+
+if __name__ == "__main__":
+    main()
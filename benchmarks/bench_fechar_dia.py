@@ -0,0 +1,80 @@
+"""
+Benchmark do fechamento do dia (Clinica.fechar_dia).
+
+Cria N consultas Agendadas num mesmo dia, espalhadas entre vários médicos, e
+mede o fechamento em um único UPDATE (inclui os eventos gravados pelos
+gatilhos do change feed). Compara com o caminho antigo, objeto a objeto
+(confirmar_realizacao + atualizar_agendamento), numa amostra menor.
+
+Uso:
+    python benchmarks/bench_fechar_dia.py [--consultas 100000] [--medicos 200] [--amostra 2000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from models.clinica import Clinica
+from persistencia import AgendaRepository, STATUS_AGENDADO
+
+DIA = date(2030, 1, 7)
+
+
+def popular(repo: AgendaRepository, n_consultas: int, n_medicos: int):
+    random.seed(42)
+    conn = repo._get_conexao()
+    por_medico = -(-n_consultas // n_medicos)
+    with conn:
+        conn.executemany("INSERT INTO pacientes (nome, cpf, telefone, plano_saude) VALUES (?, ?, '0', 'SUS');",
+                         ((f"Paciente {i}", f"{i:011d}") for i in range(1000)))
+        conn.executemany("INSERT INTO medicos (nome, cpf, telefone, crm, especialidade, regras_disponibilidade) "
+                         "VALUES (?, ?, '0', ?, 'Clínica Geral', '{}');",
+                         ((f"Médico {i}", f"m{i:010d}", f"CRM{i}") for i in range(n_medicos)))
+        inicio_dia = datetime.combine(DIA, datetime.min.time())
+        conn.executemany(
+            "INSERT INTO agendamentos (id_paciente, id_medico, data_hora_inicio, duracao_minutos, status) "
+            "VALUES (?, ?, ?, 5, ?);",
+            ((random.randint(1, 1000), 1 + i // por_medico,
+              (inicio_dia + timedelta(minutes=5 * (i % por_medico) % (24 * 60))).isoformat(), STATUS_AGENDADO)
+             for i in range(n_consultas)))
+
+
+def rodar(n_consultas: int, n_medicos: int, amostra: int):
+    with tempfile.TemporaryDirectory() as pasta:
+        repo = AgendaRepository(os.path.join(pasta, "fechamento.db"))
+        popular(repo, n_consultas, n_medicos)
+        clinica = Clinica(repo)
+
+        ids = [linha[0] for linha in repo._get_conexao().execute(
+            "SELECT id FROM agendamentos ORDER BY random() LIMIT ?;", (amostra,))]
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):  # confirmar_realizacao imprime uma linha por consulta
+            for id_agendamento in ids:
+                ag = repo.buscar_agendamento(id_agendamento)
+                ag.confirmar_realizacao()
+                repo.atualizar_agendamento(ag)
+        por_consulta = (time.perf_counter() - inicio) / len(ids)
+        print(f"objeto a objeto: {por_consulta * 1000:.3f} ms/consulta "
+              f"(~{por_consulta * n_consultas:.1f}s para {n_consultas})")
+
+        inicio = time.perf_counter()
+        por_medico = clinica.fechar_dia(DIA, agora=datetime.combine(DIA + timedelta(days=1), datetime.min.time()))
+        print(f"fechar_dia: {sum(por_medico.values())} consultas de {len(por_medico)} médicos "
+              f"em {time.perf_counter() - inicio:.3f}s")
+        repo.fechar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--consultas", type=int, default=100_000)
+    parser.add_argument("--medicos", type=int, default=200)
+    parser.add_argument("--amostra", type=int, default=2000)
+    args = parser.parse_args()
+    rodar(args.consultas, args.medicos, args.amostra)
@@ -0,0 +1,73 @@
+"""
+Benchmark do otimizador da lista de espera.
+
+Cria N pedidos ("qualquer horário na semana") distribuídos entre 4
+especialidades com 20 médicos cada, roda o OtimizadorListaEspera e confere
+que nenhuma consulta gravada se sobrepõe a outra do mesmo médico.
+
+Uso:
+    python benchmarks/bench_lista_espera.py [--pedidos 10000] [--workers N] [--sem-processos]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from persistencia import AgendaRepository
+from models.clinica import Clinica
+from models.medico import Medico
+from lista_espera import OtimizadorListaEspera
+
+ESPECIALIDADES = ("Cardiologia", "Dermatologia", "Ortopedia", "Pediatria")
+REGRAS = {dia: ["08:00-12:00", "13:00-18:00"] for dia in ("segunda", "terca", "quarta", "quinta", "sexta")}
+
+
+def rodar(n_pedidos: int, workers: int, usar_processos: bool):
+    random.seed(42)
+    with tempfile.TemporaryDirectory() as pasta:
+        repo = AgendaRepository(os.path.join(pasta, "espera.db"))
+        clinica = Clinica(repo)
+        conn = repo._get_conexao()
+        with conn:
+            conn.executemany(
+                "INSERT INTO pacientes (nome, cpf, telefone, plano_saude) VALUES (?, ?, ?, ?);",
+                [(f"Paciente {i}", f"{i:011d}", "11999990000", "Unimed") for i in range(n_pedidos)])
+        for i in range(20 * len(ESPECIALIDADES)):
+            clinica.cadastrar_medico(Medico(f"Medico {i}", f"9{i:010d}", "11999990000", f"CRM-{i}",
+                                            ESPECIALIDADES[i % len(ESPECIALIDADES)], REGRAS))
+        segunda = date(2030, 1, 7)
+        for i in range(n_pedidos):
+            clinica.adicionar_lista_espera(i + 1, ESPECIALIDADES[i % len(ESPECIALIDADES)], segunda,
+                                           segunda + timedelta(days=4), random.choice((15, 30, 45)))
+
+        inicio = time.perf_counter()
+        resumo = OtimizadorListaEspera(clinica, max_workers=workers, usar_processos=usar_processos).executar(
+            agora=datetime(2030, 1, 6, 12, 0))
+        total = time.perf_counter() - inicio
+
+        linhas = conn.execute(
+            "SELECT id_medico, data_hora_inicio, duracao_minutos FROM agendamentos "
+            "ORDER BY id_medico, data_hora_inicio;").fetchall()
+        sobreposicoes = sum(
+            1 for a, b in zip(linhas, linhas[1:])
+            if a[0] == b[0] and datetime.fromisoformat(a[1]) + timedelta(minutes=a[2]) > datetime.fromisoformat(b[1]))
+        repo.fechar()
+
+    print(f"pedidos: {resumo['pedidos']}  agendados: {resumo['agendados']}  conflitos: {resumo['conflitos']}")
+    print(f"leitura {resumo['tempo_leitura']:.2f}s  cálculo {resumo['tempo_calculo']:.2f}s  "
+          f"gravação {resumo['tempo_gravacao']:.2f}s  total {total:.2f}s")
+    print(f"sobreposições encontradas: {sobreposicoes}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pedidos", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--sem-processos", action="store_true")
+    args = parser.parse_args()
+    rodar(args.pedidos, args.workers, not args.sem_processos)
@@ -0,0 +1,72 @@
+"""
+Benchmark das listagens de cadastro (telas "Listar pacientes/médicos").
+
+Compara, no mesmo banco gerado por dados_sinteticos:
+- objetos: buscar_todos_* (todas as colunas, Paciente/Medico montados e as
+  regras em JSON lidas), como o menu fazia;
+- resumo: listar_*_resumo, páginas de tuplas lidas só do índice de cobertura;
+- 1ª página: o que uma tela paginada realmente pede (limite 100).
+
+Uso:
+    python benchmarks/bench_listagens.py [--pacientes 200000] [--medicos 2000] [--repeticoes 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from dados_sinteticos import GeradorDados
+from persistencia import AgendaRepository
+
+
+def paginar(listar):
+    """Percorre todas as páginas; retorna o total de linhas."""
+    total, apos_id = 0, 0
+    while True:
+        pagina = listar(apos_id=apos_id)
+        if not pagina:
+            return total
+        total += len(pagina)
+        apos_id = pagina[-1][0]
+
+
+def medir(nome: str, funcao, repeticoes: int):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    n = resultado if isinstance(resultado, int) else len(resultado)
+    print(f"  {nome:12} {melhor * 1000:9.2f} ms  ({n} linhas)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pacientes", type=int, default=200_000)
+    parser.add_argument("--medicos", type=int, default=2000)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        repo = AgendaRepository(os.path.join(pasta, "bench.db"))
+        try:
+            GeradorDados(42, pacientes=args.pacientes, medicos=args.medicos, consultas=1000,
+                         data_inicio=date(2024, 1, 1)).popular(repo)
+            print("pacientes")
+            medir("objetos", repo.buscar_todos_pacientes, args.repeticoes)
+            medir("resumo", lambda: paginar(repo.listar_pacientes_resumo), args.repeticoes)
+            medir("1ª página", lambda: repo.listar_pacientes_resumo(100), args.repeticoes)
+            print("médicos")
+            medir("objetos", repo.buscar_todos_medicos, args.repeticoes)
+            medir("resumo", lambda: paginar(repo.listar_medicos_resumo), args.repeticoes)
+            medir("1ª página", lambda: repo.listar_medicos_resumo(100), args.repeticoes)
+        finally:
+            repo.fechar()
+
+
+if __name__ == "__main__":
+    main()
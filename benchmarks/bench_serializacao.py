@@ -0,0 +1,80 @@
+"""
+Benchmark da serialização de agendas: objetos x linhas.
+
+Cria um paciente com N consultas (espalhadas entre 50 médicos) e compara:
+
+  objetos: buscar_agendamentos_por_paciente (Agendamento + Paciente + Medico
+           por linha) -> dict -> json.dumps, como op_listar faz hoje;
+  linhas:  iterar_agenda_paciente (JOIN, lotes) -> SERIALIZADOR_AGENDA, como
+           o modo serviço responde.
+
+Mede também só a etapa de serialização (com os dados já em memória) e
+confere que os dois caminhos produzem o mesmo JSON.
+
+Uso:
+    python benchmarks/bench_serializacao.py [--consultas 100000]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from main import _agendamento_para_dict
+from persistencia import AgendaRepository, STATUS_AGENDADO, STATUS_CANCELADO
+from serializacao import SERIALIZADOR_AGENDA
+
+N_MEDICOS = 50
+
+
+def popular(repo: AgendaRepository, n_consultas: int):
+    conn = repo._get_conexao()
+    inicio = datetime(2024, 1, 1, 8)
+    with conn:
+        conn.execute("INSERT INTO pacientes (nome, cpf, telefone, plano_saude) "
+                     "VALUES ('Conceição Araújo', '12345678901', '0', 'SUS');")
+        conn.executemany("INSERT INTO medicos (nome, cpf, telefone, crm, especialidade, regras_disponibilidade) "
+                         "VALUES (?, ?, '0', ?, 'Clínica Geral', '{}');",
+                         ((f"Médico {i}", f"m{i:010d}", f"CRM-SP {i}") for i in range(N_MEDICOS)))
+        conn.executemany(
+            "INSERT INTO agendamentos (id_paciente, id_medico, data_hora_inicio, duracao_minutos, status) "
+            "VALUES (1, ?, ?, 30, ?);",
+            ((1 + i % N_MEDICOS, (inicio + timedelta(minutes=30 * i)).isoformat(),
+              STATUS_CANCELADO if i % 10 == 0 else STATUS_AGENDADO) for i in range(n_consultas)))
+
+
+def medir(nome: str, funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    print(f"{nome:38} {time.perf_counter() - inicio:8.3f}s")
+    return resultado
+
+
+def rodar(n_consultas: int):
+    with tempfile.TemporaryDirectory() as pasta:
+        repo = AgendaRepository(os.path.join(pasta, "serializacao.db"))
+        popular(repo, n_consultas)
+        print(f"{n_consultas} consultas do paciente (com canceladas)")
+
+        objetos = medir("objetos: busca", lambda: repo.buscar_agendamentos_por_paciente(1, True))
+        texto_objetos = medir("objetos: dict + json.dumps", lambda: json.dumps(
+            [_agendamento_para_dict(a) for a in objetos], separators=(",", ":"), ensure_ascii=False))
+
+        lotes = medir("linhas: busca", lambda: list(repo.iterar_agenda_paciente(1, True)))
+        bytes_linhas = medir("linhas: serializador", lambda: b"".join(SERIALIZADOR_AGENDA.partes_array(lotes)))
+
+        medir("linhas: busca + serialização em fluxo", lambda: sum(
+            len(parte) for parte in SERIALIZADOR_AGENDA.partes_array(repo.iterar_agenda_paciente(1, True))))
+        print("mesmo JSON:", json.loads(bytes_linhas) == json.loads(texto_objetos))
+        repo.fechar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--consultas", type=int, default=100_000)
+    args = parser.parse_args()
+    rodar(args.consultas)
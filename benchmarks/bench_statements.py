@@ -0,0 +1,75 @@
+"""
+Microbenchmark do registro de statements do AgendaRepository.
+
+Compara o custo por chamada de buscar_paciente e salvar_agendamento:
+  - modo antigo: uma conexão nova por operação (sem reaproveitar statements);
+  - modo novo: conexão de longa duração + cache de statements do sqlite3.
+
+Uso:
+    python benchmarks/bench_statements.py [--n 2000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from persistencia import AgendaRepository
+from models.agendamento import Agendamento
+from models.medico import Medico
+from models.paciente import Paciente
+
+
+def _popular(repo: AgendaRepository):
+    paciente = Paciente(nome="Ana", cpf="000.000.000-01", telefone="11999990000", plano_saude="Unimed")
+    repo.salvar_paciente(paciente)
+    medico = Medico(nome="Bruno", cpf="000.000.000-02", telefone="11999990001", crm="CRM-1",
+                    especialidade="Cardiologia", regras_disponibilidade={"segunda": ["08:00-12:00"]})
+    repo.salvar_medico(medico)
+    return paciente, medico
+
+
+def _medir(funcao, n: int) -> float:
+    """Executa a função n vezes e retorna o tempo médio em microssegundos."""
+    inicio = time.perf_counter()
+    for i in range(n):
+        funcao(i)
+    return (time.perf_counter() - inicio) / n * 1e6
+
+
+def rodar(n: int):
+    with tempfile.TemporaryDirectory() as pasta:
+        resultados = {}
+        for modo, reutilizar in (("conexao_por_chamada", False), ("conexao_reaproveitada", True)):
+            repo = AgendaRepository(os.path.join(pasta, f"{modo}.db"), reutilizar_conexao=reutilizar)
+            paciente, medico = _popular(repo)
+            base = datetime(2030, 1, 7, 8, 0)
+
+            busca = _medir(lambda i: repo.buscar_paciente(paciente.id), n)
+
+            def salvar(i):
+                ag = Agendamento(paciente, medico, base + timedelta(minutes=30 * i), 30)
+                ag.status = "agendado"
+                repo.salvar_agendamento(ag)
+
+            escrita = _medir(salvar, n)
+            resultados[modo] = (busca, escrita)
+            repo.fechar()
+
+    print(f"{'modo':<24}{'buscar_paciente (us)':>24}{'salvar_agendamento (us)':>26}")
+    for modo, (busca, escrita) in resultados.items():
+        print(f"{modo:<24}{busca:>24.1f}{escrita:>26.1f}")
+
+    antigo, novo = resultados["conexao_por_chamada"], resultados["conexao_reaproveitada"]
+    print(f"\nEconomia por chamada: buscar_paciente {antigo[0] - novo[0]:.1f} us "
+          f"({antigo[0] / novo[0]:.1f}x), salvar_agendamento {antigo[1] - novo[1]:.1f} us "
+          f"({antigo[1] / novo[1]:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=2000, help="chamadas por medição")
+    rodar(parser.parse_args().n)
@@ -0,0 +1,168 @@
+"""
+Gerador de carga para o modo serviço (python main.py servir).
+
+Simula várias recepções ao mesmo tempo: cada cliente é uma thread com UMA
+conexão HTTP keep-alive, que alterna entre consultas (agenda do médico no
+dia, consultas do paciente) e marcações de consulta. No fim mostra req/s e
+latências (p50/p90/p99/máx) por tipo de requisição.
+
+Sem --url, sobe o servidor num processo separado com um banco temporário e
+cadastra os médicos e pacientes pelo próprio HTTP.
+
+Uso:
+    python benchmarks/carga_servidor.py [--clientes 8] [--segundos 10] [--leituras 0.8]
+                                        [--workers 8] [--url http://127.0.0.1:8080]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from urllib.parse import urlencode, urlsplit
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DIAS = ("segunda", "terca", "quarta", "quinta", "sexta", "sabado", "domingo")
+
+
+class Cliente:
+    """Uma recepção: uma conexão keep-alive, reaberta se o servidor a fechar."""
+
+    def __init__(self, host: str, porta: int):
+        self.host, self.porta = host, porta
+        self.conexao = http.client.HTTPConnection(host, porta, timeout=30)
+
+    def pedir(self, metodo: str, caminho: str, dados: dict = None):
+        corpo = json.dumps(dados).encode("utf-8") if dados is not None else None
+        cabecalhos = {"Content-Type": "application/json"} if corpo else {}
+        for tentativa in range(2):
+            try:
+                self.conexao.request(metodo, caminho, body=corpo, headers=cabecalhos)
+                resposta = self.conexao.getresponse()
+                return resposta.status, json.loads(resposta.read())
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self.conexao.close()
+                self.conexao = http.client.HTTPConnection(self.host, self.porta, timeout=30)
+                if tentativa:
+                    raise
+
+
+def subir_servidor(workers: int, caminho_db: str = None):
+    """Sobe 'main.py servir' numa porta livre (sem caminho_db, num banco temporário novo)."""
+    if caminho_db is None:
+        caminho_db = os.path.join(tempfile.mkdtemp(prefix="carga_"), "carga.db")
+    processo = subprocess.Popen(
+        [sys.executable, "-u", os.path.join(RAIZ, "main.py"), "--db", caminho_db,
+         "servir", "--porta", "0", "--workers", str(workers)],
+        stdout=subprocess.PIPE, text=True)
+    linha = processo.stdout.readline()  # "Clínica em http://127.0.0.1:PORTA (...)"
+    url = linha.split()[2]
+    return processo, url
+
+
+def cadastrar(cliente: Cliente, n_medicos: int, n_pacientes: int):
+    regras = {dia: ["08:00-18:00"] for dia in DIAS}
+    for i in range(n_medicos):
+        cliente.pedir("POST", "/cadastrar", {"tipo": "medico", "nome": f"Médico {i}", "cpf": f"m{i:010d}",
+                                             "telefone": "0", "crm": f"CRM{i}", "especialidade": "Clínica Geral",
+                                             "regras_disponibilidade": regras})
+    for i in range(n_pacientes):
+        cliente.pedir("POST", "/cadastrar", {"tipo": "paciente", "nome": f"Paciente {i}", "cpf": f"{i:011d}",
+                                             "telefone": "0", "plano_saude": "SUS"})
+
+
+def rodar_cliente(cliente: Cliente, args, fim: float, latencias: dict, codigos: dict, trava: threading.Lock):
+    aleatorio = random.Random()
+    hoje = date.today()
+    locais_lat, locais_cod = defaultdict(list), defaultdict(int)
+    while time.perf_counter() < fim:
+        dia = hoje + timedelta(days=aleatorio.randrange(1, 31))
+        sorteio = aleatorio.random()
+        if sorteio < args.leituras / 2:
+            tipo = "agenda-medico"
+            caminho = "/agenda-medico?" + urlencode({"crm_medico": f"CRM{aleatorio.randrange(args.medicos)}",
+                                                     "data": dia.isoformat()})
+            metodo, dados = "GET", None
+        elif sorteio < args.leituras:
+            tipo = "consultas-paciente"
+            caminho = "/listar?" + urlencode({"alvo": "consultas", "cpf_paciente": f"{aleatorio.randrange(args.pacientes):011d}"})
+            metodo, dados = "GET", None
+        else:
+            tipo = "marcar"
+            minuto = 8 * 60 + 30 * aleatorio.randrange(20)
+            metodo, caminho = "POST", "/marcar"
+            dados = {"cpf_paciente": f"{aleatorio.randrange(args.pacientes):011d}",
+                     "crm_medico": f"CRM{aleatorio.randrange(args.medicos)}",
+                     "inicio": f"{dia.isoformat()} {minuto // 60:02d}:{minuto % 60:02d}", "duracao_minutos": 30}
+        inicio = time.perf_counter()
+        codigo, _ = cliente.pedir(metodo, caminho, dados)
+        locais_lat[tipo].append(time.perf_counter() - inicio)
+        locais_cod[(tipo, codigo)] += 1
+    with trava:
+        for tipo, lista in locais_lat.items():
+            latencias[tipo].extend(lista)
+        for chave, n in locais_cod.items():
+            codigos[chave] += n
+
+
+def percentil(ordenados, p: float) -> float:
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="servidor já em execução (sem isto, um é criado)")
+    parser.add_argument("--clientes", type=int, default=8)
+    parser.add_argument("--segundos", type=float, default=10.0)
+    parser.add_argument("--leituras", type=float, default=0.8, help="fração de requisições de consulta")
+    parser.add_argument("--workers", type=int, default=8, help="workers do servidor criado")
+    parser.add_argument("--medicos", type=int, default=50)
+    parser.add_argument("--pacientes", type=int, default=2000)
+    args = parser.parse_args()
+
+    processo = None
+    url = args.url
+    if url is None:
+        processo, url = subir_servidor(args.workers)
+    endereco = urlsplit(url)
+    try:
+        if processo is not None:
+            inicio = time.perf_counter()
+            cadastrar(Cliente(endereco.hostname, endereco.port), args.medicos, args.pacientes)
+            print(f"{args.medicos} médicos e {args.pacientes} pacientes cadastrados "
+                  f"em {time.perf_counter() - inicio:.1f}s")
+
+        latencias, codigos, trava = defaultdict(list), defaultdict(int), threading.Lock()
+        clientes = [Cliente(endereco.hostname, endereco.port) for _ in range(args.clientes)]
+        fim = time.perf_counter() + args.segundos
+        threads = [threading.Thread(target=rodar_cliente, args=(c, args, fim, latencias, codigos, trava))
+                   for c in clientes]
+        inicio = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        decorrido = time.perf_counter() - inicio
+
+        total = sum(len(v) for v in latencias.values())
+        print(f"{total} requisições em {decorrido:.1f}s com {args.clientes} clientes: {total / decorrido:.0f} req/s")
+        print(f"{'tipo':20} {'n':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'máx ms':>8}  códigos")
+        for tipo, lista in sorted(latencias.items()):
+            lista.sort()
+            resumo = ", ".join(f"{c}: {n}" for (t, c), n in sorted(codigos.items()) if t == tipo)
+            print(f"{tipo:20} {len(lista):7} {percentil(lista, 0.5) * 1000:8.2f} {percentil(lista, 0.9) * 1000:8.2f} "
+                  f"{percentil(lista, 0.99) * 1000:8.2f} {lista[-1] * 1000:8.2f}  {resumo}")
+    finally:
+        if processo is not None:
+            processo.terminate()
+            processo.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+"""
+Teste de CARGA: várias recepções usando a mesma clínica ao mesmo tempo.
+
+Cada cliente (uma "recepção") sorteia operações segundo um perfil de carga:
+busca de pacientes por nome, agenda do médico no dia, consultas de um
+paciente, marcação e cancelamento. Os clientes rodam como threads de um
+processo (--processos 0, padrão) ou divididos entre processos (cada um com a
+sua AgendaRepository sobre o mesmo arquivo) e chamam a Clinica diretamente
+(as funções de main.OPERACOES) ou, com --http, o modo serviço.
+
+Mede, por operação: vazão, latências (p50/p90/p99/máx e histograma),
+recusas de negócio (horário ocupado...), "database is locked" (ou 503 no
+modo serviço) e outros erros. No fim procura DUPLA MARCAÇÃO: consultas
+ativas criadas no teste que se sobrepõem a outra do mesmo médico.
+O resultado vai para <relatorio>.json e <relatorio>.html.
+
+Sem --db, o banco é gerado com dados_sinteticos (consultas a partir de duas
+semanas atrás); as marcações caem nos 30 dias seguintes, dentro do
+expediente de cada médico.
+
+Uso:
+    python benchmarks/teste_carga.py [--clientes 20] [--processos 0] [--segundos 15] [--http]
+        [--perfil buscar=20,agenda=35,consultas=10,marcar=25,cancelar=10]
+        [--db banco.db] [--url http://127.0.0.1:8080] [--relatorio relatorio_carga]
+"""
+import argparse
+import html
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from carga_servidor import Cliente, percentil, subir_servidor
+from dados_sinteticos import ESPECIALIDADES, NOMES, GeradorDados
+from models.mapa_disponibilidade import DIAS_SEMANA
+from persistencia import STATUS_AGENDADO, AgendaRepository
+
+PERFIL_PADRAO = "buscar=20,agenda=35,consultas=10,marcar=25,cancelar=10"
+# Limites (ms) das faixas do histograma de latência; a última faixa é "acima de 5000".
+FAIXAS_MS = (0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+RESULTADOS = ("ok", "recusada", "travada", "erro")
+
+
+def ler_perfil(texto: str) -> dict:
+    """'buscar=20,marcar=5' -> {'buscar': 20.0, 'marcar': 5.0}."""
+    perfil = {}
+    for parte in texto.split(","):
+        nome, _, peso = parte.partition("=")
+        if nome.strip() not in ("buscar", "agenda", "consultas", "marcar", "cancelar"):
+            raise ValueError(f"Operação desconhecida no perfil: {nome!r}.")
+        perfil[nome.strip()] = float(peso)
+    if not any(perfil.values()):
+        raise ValueError("O perfil precisa de pelo menos um peso positivo.")
+    return perfil
+
+
+# --- Preparação ---
+
+def preparar_banco(args) -> str:
+    caminho = os.path.join(tempfile.mkdtemp(prefix="teste_carga_"), "carga.db")
+    inicio = time.perf_counter()
+    hoje = date.today()
+    gerador = GeradorDados(args.semente, pacientes=args.pacientes, medicos=args.medicos,
+                           consultas=args.consultas, data_inicio=hoje - timedelta(days=14), hoje=hoje)
+    repo = AgendaRepository(caminho)
+    try:
+        contagem = gerador.popular(repo)
+    finally:
+        repo.fechar()
+    print(f"Banco gerado em {caminho} ({contagem}) em {time.perf_counter() - inicio:.1f}s")
+    return caminho
+
+
+def _minutos(hhmm: str) -> int:
+    horas, minutos = hhmm.split(":")
+    return int(horas) * 60 + int(minutos)
+
+
+def ler_catalogo(caminho_db: str) -> dict:
+    """O que os clientes sorteiam: CPFs, médicos com expediente/duração e consultas futuras."""
+    conn = sqlite3.connect(caminho_db)
+    try:
+        cpfs = [cpf for cpf, in conn.execute("SELECT cpf FROM pacientes WHERE deleted_at IS NULL;")]
+        medicos = []
+        for crm, especialidade, regras in conn.execute(
+                "SELECT crm, especialidade, regras_disponibilidade FROM medicos WHERE deleted_at IS NULL;"):
+            faixas = {}
+            for dia, intervalos in json.loads(regras or "{}").items():
+                faixas[DIAS_SEMANA.index(dia)] = [tuple(_minutos(h) for h in i.split("-")) for i in intervalos]
+            medicos.append((crm, faixas, ESPECIALIDADES.get(especialidade, (30,))[0]))
+        futuras = [i for i, in conn.execute(
+            "SELECT id FROM agendamentos WHERE status = ? AND data_hora_inicio >= ? LIMIT 20000;",
+            (STATUS_AGENDADO, date.today().isoformat()))]
+        id_maximo = conn.execute("SELECT COALESCE(MAX(id), 0) FROM agendamentos;").fetchone()[0]
+    finally:
+        conn.close()
+    if not cpfs or not medicos:
+        raise ValueError(f"{caminho_db} não tem pacientes e médicos.")
+    return {"cpfs": cpfs, "medicos": medicos, "futuras": futuras, "id_maximo": id_maximo,
+            "hoje": date.today().isoformat()}
+
+
+# --- Execução ---
+
+class _Local:
+    """Chama as operações do CLI direto na Clinica (a mesma de todas as threads do processo)."""
+
+    def __init__(self, caminho_db: str):
+        from main import OPERACOES
+        from models.clinica import Clinica
+
+        self.operacoes = OPERACOES
+        self.repo = AgendaRepository(caminho_db)
+        self.clinica = Clinica(self.repo)
+
+    def cliente(self):
+        return self
+
+    def executar(self, op: str, dados: dict):
+        from persistencia import ConflitoVersao
+
+        try:
+            return "ok", self.operacoes[op](self.clinica, dados)
+        except (ValueError, KeyError, ConflitoVersao) as e:
+            return "recusada", str(e)
+        except sqlite3.OperationalError as e:
+            return ("travada" if "locked" in str(e) or "busy" in str(e) else "erro"), str(e)
+        except Exception as e:  # Qualquer outra falha entra no relatório, não derruba o teste
+            return "erro", f"{type(e).__name__}: {e}"
+
+    def fechar(self):
+        self.repo.fechar()
+
+
+class _Remoto:
+    """As mesmas operações pelo modo serviço; cada recepção com a sua conexão keep-alive."""
+
+    def __init__(self, url: str):
+        from servidor import OPERACOES_LEITURA
+
+        self.leitura = OPERACOES_LEITURA
+        self.endereco = urlsplit(url)
+
+    def cliente(self):
+        return _ClienteRemoto(Cliente(self.endereco.hostname, self.endereco.port), self.leitura)
+
+    def fechar(self):
+        pass
+
+
+class _ClienteRemoto:
+    def __init__(self, cliente: Cliente, leitura):
+        self.http, self.leitura = cliente, leitura
+
+    def executar(self, op: str, dados: dict):
+        try:
+            if op in self.leitura:
+                codigo, corpo = self.http.pedir("GET", f"/{op}?{urlencode(dados)}")
+            else:
+                codigo, corpo = self.http.pedir("POST", f"/{op}", dados)
+        except OSError as e:
+            return "erro", f"{type(e).__name__}: {e}"
+        if codigo == 200:
+            return "ok", corpo
+        classe = {400: "recusada", 409: "recusada", 503: "travada"}.get(codigo, "erro")
+        return classe, corpo.get("erro", str(codigo))
+
+
+class Recepcao:
+    """Um cliente: sorteia a próxima operação do perfil e monta os dados dela."""
+
+    def __init__(self, semente: int, perfil: dict, catalogo: dict, executor):
+        self.aleatorio = random.Random(semente)
+        self.ops, self.pesos = list(perfil), list(perfil.values())
+        self.catalogo = catalogo
+        self.executor = executor
+        self.hoje = date.fromisoformat(catalogo["hoje"])
+        self.marcadas = []  # IDs marcados por esta recepção (os primeiros a serem cancelados)
+
+    def _dia(self) -> date:
+        return self.hoje + timedelta(days=self.aleatorio.randrange(1, 31))
+
+    def _dados(self, op: str):
+        sorteio = self.aleatorio
+        if op == "buscar":
+            return "buscar", {"alvo": "pacientes", "texto": sorteio.choice(NOMES)[:3], "limite": 20}
+        if op == "agenda":
+            return "agenda-medico", {"crm_medico": sorteio.choice(self.catalogo["medicos"])[0],
+                                     "data": self._dia().isoformat()}
+        if op == "consultas":
+            return "listar", {"alvo": "consultas", "cpf_paciente": sorteio.choice(self.catalogo["cpfs"]),
+                              "de": self.hoje.isoformat()}
+        if op == "cancelar":
+            if self.marcadas:
+                id_agendamento = self.marcadas.pop(sorteio.randrange(len(self.marcadas)))
+            elif self.catalogo["futuras"]:
+                id_agendamento = sorteio.choice(self.catalogo["futuras"])
+            else:
+                return None
+            return "cancelar", {"id_agendamento": id_agendamento}
+        # marcar: um horário dentro do expediente do médico (o conflito fica por conta da Clinica).
+        for _ in range(20):
+            crm, faixas, duracao = sorteio.choice(self.catalogo["medicos"])
+            dia = self._dia()
+            if faixas.get(dia.weekday()):
+                inicio_min, fim_min = sorteio.choice(faixas[dia.weekday()])
+                vagas = (fim_min - inicio_min) // duracao
+                if vagas:
+                    minuto = inicio_min + duracao * sorteio.randrange(vagas)
+                    return "marcar", {"cpf_paciente": sorteio.choice(self.catalogo["cpfs"]), "crm_medico": crm,
+                                      "inicio": f"{dia.isoformat()} {minuto // 60:02d}:{minuto % 60:02d}",
+                                      "duracao_minutos": duracao}
+        return None
+
+    def rodar(self, ate: float, medidas: dict):
+        while time.time() < ate:
+            op = self.aleatorio.choices(self.ops, self.pesos)[0]
+            pedido = self._dados(op)
+            if pedido is None:
+                continue
+            inicio = time.perf_counter()
+            resultado, resposta = self.executor.executar(*pedido)
+            segundos = time.perf_counter() - inicio
+            medida = medidas[op]
+            medida["latencias"].append(segundos)
+            medida[resultado] += 1
+            if resultado != "ok" and len(medida["exemplos"]) < 5 and resposta not in medida["exemplos"]:
+                medida["exemplos"].append(resposta)
+            if op == "marcar" and resultado == "ok":
+                self.marcadas.append(resposta["id_agendamento"])
+
+
+def _medida_vazia() -> dict:
+    return {"latencias": [], "exemplos": [], **{r: 0 for r in RESULTADOS}}
+
+
+def rodar_recepcoes(config: dict, catalogo: dict, sementes: list) -> dict:
+    """
+    Roda uma recepção por semente, cada uma numa thread, de config['comeco'] até
+    config['comeco'] + config['segundos'] (horário de parede: vale entre processos).
+    Retorna {op: medida}, com as medidas de todas as threads somadas.
+    """
+    executor = _Remoto(config["url"]) if config["url"] else _Local(config["db"])
+    medidas_por_thread = [defaultdict(_medida_vazia) for _ in sementes]
+    recepcoes = [Recepcao(s, config["perfil"], catalogo, executor.cliente()) for s in sementes]
+    ate = config["comeco"] + config["segundos"]
+    threads = [threading.Thread(target=r.rodar, args=(ate, m)) for r, m in zip(recepcoes, medidas_por_thread)]
+    time.sleep(max(0.0, config["comeco"] - time.time()))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    executor.fechar()
+    total = defaultdict(_medida_vazia)
+    for medidas in medidas_por_thread:
+        for op, medida in medidas.items():
+            juntar_medida(total[op], medida)
+    return dict(total)
+
+
+def juntar_medida(destino: dict, origem: dict):
+    destino["latencias"].extend(origem["latencias"])
+    for resultado in RESULTADOS:
+        destino[resultado] += origem[resultado]
+    for exemplo in origem["exemplos"]:
+        if len(destino["exemplos"]) < 5 and exemplo not in destino["exemplos"]:
+            destino["exemplos"].append(exemplo)
+
+
+# --- Verificação e relatório ---
+
+def duplas_marcacoes(caminho_db: str, id_maximo: int, limite: int = 20):
+    """Consultas ativas criadas no teste (id > id_maximo) sobrepostas a outra do mesmo médico."""
+    fim = "strftime('%Y-%m-%dT%H:%M:%S', {0}.data_hora_inicio, '+' || {0}.duracao_minutos || ' minutes')"
+    sql = ("SELECT b.id, a.id, b.id_medico, b.data_hora_inicio, a.data_hora_inicio FROM agendamentos b "
+           "JOIN agendamentos a ON a.id_medico = b.id_medico AND a.id <> b.id AND a.status <> 2 "
+           "AND a.data_hora_inicio >= substr(b.data_hora_inicio, 1, 10) "
+           f"AND a.data_hora_inicio < {fim.format('b')} AND {fim.format('a')} > b.data_hora_inicio "
+           "WHERE b.id > ? AND b.status <> 2 ORDER BY b.id;")
+    conn = sqlite3.connect(caminho_db)
+    try:
+        linhas = conn.execute(sql, (id_maximo,)).fetchall()
+    finally:
+        conn.close()
+    exemplos = [{"id": b, "sobreposta_a": a, "id_medico": m, "inicio": ib, "inicio_outra": ia}
+                for b, a, m, ib, ia in linhas[:limite]]
+    return len({linha[0] for linha in linhas}), exemplos
+
+
+def resumir(medidas: dict, decorrido: float) -> dict:
+    por_operacao = {}
+    for op, medida in sorted(medidas.items()):
+        lista = sorted(medida["latencias"])
+        if not lista:
+            continue
+        histograma, i = [], 0
+        for limite in FAIXAS_MS + (None,):
+            n = 0
+            while i < len(lista) and (limite is None or lista[i] * 1000 <= limite):
+                n, i = n + 1, i + 1
+            histograma.append([limite, n])
+        por_operacao[op] = {
+            "n": len(lista), "por_segundo": round(len(lista) / decorrido, 1),
+            **{r: medida[r] for r in RESULTADOS},
+            "media_ms": round(sum(lista) / len(lista) * 1000, 3),
+            **{f"p{p}_ms": round(percentil(lista, p / 100) * 1000, 3) for p in (50, 90, 99)},
+            "max_ms": round(lista[-1] * 1000, 3),
+            "histograma_ms": histograma,
+            "exemplos": medida["exemplos"],
+        }
+    total = sum(o["n"] for o in por_operacao.values())
+    return {"total": total, "por_segundo": round(total / decorrido, 1),
+            "travadas": sum(o["travada"] for o in por_operacao.values()),
+            "erros": sum(o["erro"] for o in por_operacao.values()),
+            "por_operacao": por_operacao}
+
+
+def gerar_html(relatorio: dict) -> str:
+    e = html.escape
+    linhas = []
+    for op, o in relatorio["por_operacao"].items():
+        linhas.append(f"<tr><td>{e(op)}</td><td>{o['n']}</td><td>{o['por_segundo']}</td><td>{o['ok']}</td>"
+                      f"<td>{o['recusada']}</td><td class='{'ruim' if o['travada'] else ''}'>{o['travada']}</td>"
+                      f"<td class='{'ruim' if o['erro'] else ''}'>{o['erro']}</td><td>{o['media_ms']}</td>"
+                      f"<td>{o['p50_ms']}</td><td>{o['p90_ms']}</td><td>{o['p99_ms']}</td><td>{o['max_ms']}</td></tr>")
+    histogramas = []
+    for op, o in relatorio["por_operacao"].items():
+        maior = max(n for _, n in o["histograma_ms"]) or 1
+        barras = "".join(
+            f"<tr><td>{'≤ ' + str(limite) if limite is not None else '> ' + str(FAIXAS_MS[-1])} ms</td>"
+            f"<td><div class='barra' style='width:{300 * n / maior:.0f}px'></div></td><td>{n}</td></tr>"
+            for limite, n in o["histograma_ms"] if n or limite is not None)
+        exemplos = "".join(f"<li>{e(str(x))}</li>" for x in o["exemplos"])
+        histogramas.append(f"<section><h3>{e(op)}</h3><table class='hist'>{barras}</table>"
+                           + (f"<p>Respostas sem sucesso (exemplos):</p><ul>{exemplos}</ul>" if exemplos else "")
+                           + "</section>")
+    duplas = relatorio["duplas_marcacoes"]
+    exemplos_duplas = "".join(f"<li>{e(json.dumps(x, ensure_ascii=False))}</li>" for x in relatorio["exemplos_duplas"])
+    return f"""<!DOCTYPE html>
+<html lang="pt-BR"><head><meta charset="utf-8"><title>Teste de carga da clínica</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }} table {{ border-collapse: collapse; }}
+td, th {{ border: 1px solid #ccc; padding: 3px 8px; text-align: right; }} td:first-child {{ text-align: left; }}
+.hist td {{ border: none; }} .barra {{ background: #4a7ab5; height: 12px; }} .ruim {{ background: #f6c6c6; }}
+section {{ display: inline-block; vertical-align: top; margin: 0 2em 1em 0; }}
+</style></head><body>
+<h1>Teste de carga da clínica</h1>
+<p>{e(relatorio['modo'])}: {relatorio['config']['clientes']} clientes em {relatorio['config']['processos'] or 1}
+processo(s), {relatorio['decorrido_s']} s, perfil {e(json.dumps(relatorio['config']['perfil']))}.</p>
+<p><b>{relatorio['total']}</b> operações, <b>{relatorio['por_segundo']}</b> op/s.
+Travadas ("database is locked"/503): <b>{relatorio['travadas']}</b>. Erros: <b>{relatorio['erros']}</b>.
+Duplas marcações: <b class="{'ruim' if duplas else ''}">{duplas}</b>.</p>
+<ul>{exemplos_duplas}</ul>
+<table><tr><th>operação</th><th>n</th><th>op/s</th><th>ok</th><th>recusadas</th><th>travadas</th><th>erros</th>
+<th>média ms</th><th>p50 ms</th><th>p90 ms</th><th>p99 ms</th><th>máx ms</th></tr>
+{''.join(linhas)}</table>
+<h2>Histogramas de latência</h2>
+{''.join(histogramas)}
+</body></html>
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clientes", type=int, default=20, help="recepções simultâneas")
+    parser.add_argument("--processos", type=int, default=0,
+                        help="divide os clientes entre N processos (0 = todos como threads deste)")
+    parser.add_argument("--segundos", type=float, default=15.0)
+    parser.add_argument("--perfil", default=PERFIL_PADRAO, help="pesos das operações (padrão: %(default)s)")
+    parser.add_argument("--http", action="store_true", help="passa pelo modo serviço (sobe 'main.py servir')")
+    parser.add_argument("--url", help="servidor já em execução sobre --db (implica --http)")
+    parser.add_argument("--workers", type=int, help="workers do servidor criado (padrão: --clientes)")
+    parser.add_argument("--db", help="banco já populado (sem isto, um é gerado)")
+    parser.add_argument("--pacientes", type=int, default=5000)
+    parser.add_argument("--medicos", type=int, default=50)
+    parser.add_argument("--consultas", type=int, default=10_000)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--relatorio", default="relatorio_carga", help="prefixo dos arquivos .json e .html")
+    args = parser.parse_args()
+    if args.url and not args.db:
+        parser.error("--url precisa do --db do servidor (catálogo e verificação de dupla marcação).")
+
+    perfil = ler_perfil(args.perfil)
+    caminho_db = args.db or preparar_banco(args)
+    catalogo = ler_catalogo(caminho_db)
+    processo, url = None, args.url
+    if args.http and not url:
+        processo, url = subir_servidor(args.workers or args.clientes, caminho_db)
+    modo = ("modo serviço (HTTP)" if url else "Clinica direta") + (" em processos" if args.processos else " em threads")
+    try:
+        config = {"db": caminho_db, "url": url, "perfil": perfil, "segundos": args.segundos,
+                  "comeco": time.time() + 0.5 + 0.2 * args.processos}
+        sementes = [args.semente * 1000 + i for i in range(args.clientes)]
+        print(f"{modo}: {args.clientes} clientes por {args.segundos:.0f}s...")
+        if args.processos:
+            with ProcessPoolExecutor(max_workers=args.processos) as pool:
+                futuros = [pool.submit(rodar_recepcoes, config, catalogo, sementes[i::args.processos])
+                           for i in range(args.processos)]
+                parciais = [f.result() for f in futuros]
+        else:
+            parciais = [rodar_recepcoes(config, catalogo, sementes)]
+        decorrido = time.time() - config["comeco"]
+    finally:
+        if processo is not None:
+            processo.terminate()
+            processo.wait()
+
+    medidas = defaultdict(_medida_vazia)
+    for parcial in parciais:
+        for op, medida in parcial.items():
+            juntar_medida(medidas[op], medida)
+    relatorio = {"modo": modo, "data": datetime.now().isoformat(timespec="seconds"), "db": caminho_db,
+                 "config": {"clientes": args.clientes, "processos": args.processos, "segundos": args.segundos,
+                            "perfil": perfil, "http": bool(url), "semente": args.semente},
+                 "decorrido_s": round(decorrido, 2), **resumir(medidas, decorrido)}
+    relatorio["duplas_marcacoes"], relatorio["exemplos_duplas"] = duplas_marcacoes(caminho_db, catalogo["id_maximo"])
+
+    with open(f"{args.relatorio}.json", "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    with open(f"{args.relatorio}.html", "w", encoding="utf-8") as f:
+        f.write(gerar_html(relatorio))
+
+    print(f"{relatorio['total']} operações em {decorrido:.1f}s: {relatorio['por_segundo']} op/s; "
+          f"travadas: {relatorio['travadas']}, erros: {relatorio['erros']}, "
+          f"duplas marcações: {relatorio['duplas_marcacoes']}")
+    print(f"{'operação':10} {'n':>7} {'ok':>7} {'recus.':>7} {'trav.':>6} {'p50 ms':>8} {'p90 ms':>8} "
+          f"{'p99 ms':>8} {'máx ms':>8}")
+    for op, o in relatorio["por_operacao"].items():
+        print(f"{op:10} {o['n']:7} {o['ok']:7} {o['recusada']:7} {o['travada']:6} {o['p50_ms']:8.2f} "
+              f"{o['p90_ms']:8.2f} {o['p99_ms']:8.2f} {o['max_ms']:8.2f}")
+    print(f"Relatório em {args.relatorio}.json e {args.relatorio}.html")
+    return 1 if relatorio["duplas_marcacoes"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Verificação do orçamento de inicialização do main.py.
+
+Roda o CLI em processos novos com "python -X importtime", soma o tempo de
+todas as importações (incluindo as do próprio interpretador) e compara o
+menor valor das repetições com o orçamento: a carga da máquina só acrescenta
+tempo, então o mínimo é a medida mais estável do custo real das importações.
+Também mostra a mediana do tempo total de cada processo.
+
+Sai com código 1 se algum comando estourar o orçamento, para poder ser
+usado em scripts/CI; tests/test_inicializacao.py faz a mesma verificação.
+
+Uso:
+    python benchmarks/verificar_inicializacao.py [--orcamento-ms 50] [--repeticoes 7]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+MAIN = os.path.join(RAIZ, "main.py")
+
+
+def _tempo_importacoes_ms(stderr: str) -> float:
+    """Soma o tempo cumulativo das importações de primeiro nível do -X importtime."""
+    total_us = 0
+    for linha in stderr.splitlines():
+        if not linha.startswith("import time:"):
+            continue
+        partes = linha.split("|")
+        if len(partes) != 3 or not partes[1].strip().isdigit():
+            continue  # Cabeçalho
+        nome = partes[2]
+        if nome.startswith(" ") and not nome.startswith("  "):
+            total_us += int(partes[1])
+    return total_us / 1000
+
+
+def medir(argumentos, repeticoes: int):
+    """Retorna (mínimo das importações ms, mediana do processo ms) do comando."""
+    env = dict(os.environ)
+    # O orçamento considera o bytecode em cache (__pycache__), como em produção.
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    comando = [sys.executable, "-X", "importtime", MAIN, *argumentos]
+    subprocess.run(comando, env=env, capture_output=True)  # Aquecimento / gera .pyc
+    importacoes, processos = [], []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = subprocess.run(comando, env=env, capture_output=True, text=True)
+        processos.append((time.perf_counter() - inicio) * 1000)
+        importacoes.append(_tempo_importacoes_ms(resultado.stderr))
+    return min(importacoes), statistics.median(processos)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orcamento-ms", type=float, default=50.0)
+    parser.add_argument("--repeticoes", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        db = os.path.join(pasta, "inicializacao.db")
+        comandos = {
+            "--help": ["--help"],
+            "listar medicos": ["--db", db, "listar", "medicos"],
+            "agenda-medico": ["--db", db, "agenda-medico", "--crm", "X", "--data", "2030-01-07"],
+        }
+        estourou = False
+        print(f"{'comando':<18}{'importações (ms)':>18}{'processo (ms)':>16}  orçamento {args.orcamento_ms:.0f} ms")
+        for nome, argumentos in comandos.items():
+            importacoes, processo = medir(argumentos, args.repeticoes)
+            ok = importacoes <= args.orcamento_ms
+            estourou |= not ok
+            print(f"{nome:<18}{importacoes:>18.1f}{processo:>16.1f}  {'OK' if ok else 'ESTOUROU'}")
+    return 1 if estourou else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
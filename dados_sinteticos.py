@@ -0,0 +1,259 @@
+"""
+Gerador de DADOS SINTÉTICOS para testes de escala e benchmarks.
+
+Monta pacientes, médicos, bloqueios e consultas com os models de verdade
+(Paciente, Medico, Bloqueio, Agendamento) e grava tudo com
+AgendaRepository.carregar_em_massa (uma transação, executemany em lotes).
+
+- Reprodutível: tudo sai de um random.Random(semente) e de datas fixas
+  (nada de datetime.now()). Mesma semente e parâmetros = mesmo banco.
+- CPFs com dígitos verificadores válidos e CRMs no formato "CRM/UF 123456",
+  todos únicos.
+- Médicos com um dos MODELOS_EXPEDIENTE (manhã, tarde, integral, noite,
+  plantão de fim de semana...), especialidade e duração típica de consulta.
+- Consultas só dentro do expediente, fora dos feriados da clínica e das
+  férias de cada médico, sem sobreposição no mesmo médico e com no máximo uma
+  consulta por paciente por dia. Antes de 'hoje' ficam Realizadas ou
+  Canceladas; a partir de 'hoje', Agendadas ou Canceladas.
+
+    python main.py --db escala.db gerar-dados --consultas 1000000 --semente 42
+"""
+import random
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterator, List
+
+from models.agendamento import Agendamento
+from models.bloqueio import Bloqueio
+from models.mapa_disponibilidade import DIAS_SEMANA
+from models.medico import Medico
+from models.paciente import Paciente
+from persistencia import AgendaRepository
+
+NOMES = ("Ana", "João", "Maria", "José", "Antônio", "Francisca", "Carlos", "Paulo", "Adriana", "Lucas",
+         "Juliana", "Márcia", "Fernanda", "Pedro", "Patrícia", "Aline", "Sandra", "Luís", "Camila", "Gabriel",
+         "Letícia", "Rafael", "Conceição", "Sebastião", "Raimundo", "Beatriz", "Mateus", "Vitória", "Caio",
+         "Helena", "Otávio", "Cecília", "Thiago", "Lúcia", "Bruno", "Isabela", "Rodrigo", "Fátima", "Igor",
+         "Débora")
+SOBRENOMES = ("Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima",
+              "Gomes", "Costa", "Ribeiro", "Martins", "Carvalho", "Araújo", "Melo", "Barbosa", "Cardoso",
+              "Rocha", "Dias", "Nascimento", "Andrade", "Moreira", "Nunes", "Marques", "Machado", "Mendes",
+              "Freitas", "Cavalcanti", "Monteiro", "Teixeira", "Correia", "Vieira", "Pinto", "Simões",
+              "Conceição", "Brandão", "Assunção", "Magalhães", "Gonçalves")
+PLANOS = ("SUS", "SUS", "Unimed", "Amil", "Bradesco Saúde", "SulAmérica", "Hapvida", "NotreDame", "Particular")
+UFS = ("SP", "SP", "SP", "RJ", "MG", "RS", "PR", "BA", "PE", "SC", "GO", "DF")
+DDDS = ("11", "11", "21", "31", "41", "51", "61", "71", "81")
+
+# Especialidade -> durações de consulta (minutos) usadas pelo médico.
+ESPECIALIDADES = {
+    "Clínica Geral": (20, 30),
+    "Pediatria": (20, 30),
+    "Cardiologia": (30, 45),
+    "Dermatologia": (15, 20, 30),
+    "Ginecologia": (30, 40),
+    "Ortopedia": (20, 30),
+    "Psiquiatria": (50, 60),
+    "Oftalmologia": (15, 20),
+    "Neurologia": (40, 45, 60),
+    "Endocrinologia": (30,),
+}
+
+_UTEIS = DIAS_SEMANA[:5]
+
+# (peso, regras_disponibilidade)
+MODELOS_EXPEDIENTE = (
+    (5, {dia: ["08:00-12:00"] for dia in _UTEIS}),
+    (4, {dia: ["13:00-18:00"] for dia in _UTEIS}),
+    (6, {dia: ["08:00-12:00", "13:00-17:00"] for dia in _UTEIS}),
+    (3, {dia: ["08:00-12:00", "14:00-18:00"] for dia in ("segunda", "quarta", "sexta")}),
+    (2, {"terca": ["07:30-12:30"], "quinta": ["07:30-12:30"], "sabado": ["08:00-12:00"]}),
+    (1, {dia: ["18:00-22:00"] for dia in ("segunda", "terca", "quarta", "quinta")}),
+    (1, {"sabado": ["08:00-20:00"], "domingo": ["08:00-20:00"]}),
+    (2, {**{dia: ["09:00-13:00"] for dia in _UTEIS}, "sabado": ["09:00-12:00"]}),
+)
+
+# Feriados nacionais de data fixa (mês, dia): bloqueios da clínica inteira.
+FERIADOS = ((1, 1), (4, 21), (5, 1), (9, 7), (10, 12), (11, 2), (11, 15), (12, 25))
+
+
+def digitos_cpf(base: str) -> str:
+    """Os dois dígitos verificadores de um CPF, dados os 9 primeiros dígitos."""
+    digitos = [int(c) for c in base]
+    for _ in range(2):
+        soma = sum(d * peso for d, peso in zip(digitos, range(len(digitos) + 1, 1, -1)))
+        digitos.append(soma * 10 % 11 % 10)
+    return "".join(str(d) for d in digitos[9:])
+
+
+def cpf_valido(cpf: str) -> bool:
+    """True se cpf tem 11 dígitos, não é uma repetição (111...) e os verificadores batem."""
+    return len(cpf) == 11 and cpf.isdigit() and len(set(cpf)) > 1 and digitos_cpf(cpf[:9]) == cpf[9:]
+
+
+def _minutos(hhmm: str) -> int:
+    horas, minutos = hhmm.split(":")
+    return int(horas) * 60 + int(minutos)
+
+
+class GeradorDados:
+    """
+    Gera um conjunto de dados fixo a partir da semente. A ordem das chamadas
+    a self.aleatorio é sempre a mesma, então o resultado é reprodutível.
+
+    consultas: total de consultas; o período é o necessário para chegar nele,
+    a partir de data_inicio (com 200 médicos e ocupação 0.75, ~2 anos por 1M).
+    hoje: separa o "passado" (Realizado/Cancelado) do "futuro" (Agendado);
+    padrão: data_inicio + 1 ano.
+    """
+
+    def __init__(self, semente: int = 42, pacientes: int = 50_000, medicos: int = 200,
+                 consultas: int = 1_000_000, data_inicio: date = date(2024, 1, 1), hoje: date = None,
+                 ocupacao: float = 0.75, taxa_cancelamento: float = 0.08):
+        if pacientes <= 0 or medicos <= 0:
+            raise ValueError("São necessários pacientes e médicos.")
+        self.aleatorio = random.Random(semente)
+        self.n_pacientes = pacientes
+        self.n_medicos = medicos
+        self.n_consultas = consultas
+        self.data_inicio = data_inicio
+        self.hoje = hoje or data_inicio + timedelta(days=365)
+        self.ocupacao = ocupacao
+        self.taxa_cancelamento = taxa_cancelamento
+        self.bloqueios: List[Bloqueio] = []
+
+    # --- Cadastros ---
+
+    def _nome(self) -> str:
+        escolha = self.aleatorio.choice
+        return f"{escolha(NOMES)} {escolha(SOBRENOMES)} {escolha(SOBRENOMES)}"
+
+    def _telefone(self) -> str:
+        numero = self.aleatorio.randrange(10 ** 8)
+        return f"({self.aleatorio.choice(DDDS)}) 9{numero // 10000:04d}-{numero % 10000:04d}"
+
+    def _cpfs(self) -> List[str]:
+        # sample() de um range não materializa a faixa: bases distintas, CPFs distintos.
+        bases = self.aleatorio.sample(range(1_000_000, 999_999_999), self.n_pacientes + self.n_medicos)
+        return [f"{base:09d}" + digitos_cpf(f"{base:09d}") for base in bases]
+
+    def gerar_cadastros(self):
+        """Retorna (pacientes, medicos), ainda sem ID."""
+        cpfs = self._cpfs()
+        pacientes = [Paciente(self._nome(), cpf, self._telefone(), self.aleatorio.choice(PLANOS))
+                     for cpf in cpfs[:self.n_pacientes]]
+        numeros_crm = self.aleatorio.sample(range(10_000, 999_999), self.n_medicos)
+        pesos = [peso for peso, _ in MODELOS_EXPEDIENTE]
+        especialidades = list(ESPECIALIDADES)
+        medicos = []
+        for cpf, numero in zip(cpfs[self.n_pacientes:], numeros_crm):
+            regras = self.aleatorio.choices(MODELOS_EXPEDIENTE, weights=pesos)[0][1]
+            medicos.append(Medico(self._nome(), cpf, self._telefone(),
+                                  f"CRM/{self.aleatorio.choice(UFS)} {numero:06d}",
+                                  self.aleatorio.choice(especialidades), regras))
+        return pacientes, medicos
+
+    # --- Bloqueios ---
+
+    def _bloqueios_do_ano(self, ano: int, medicos: List[Medico]) -> List[Bloqueio]:
+        """Feriados do ano (clínica) e 14 dias de férias para cada médico."""
+        bloqueios = []
+        for mes, dia in FERIADOS:
+            inicio = datetime(ano, mes, dia)
+            bloqueios.append(Bloqueio(inicio, inicio + timedelta(days=1), None, "Feriado"))
+        for indice, _ in enumerate(medicos):
+            inicio = datetime(ano, 1, 1) + timedelta(days=self.aleatorio.randrange(351))
+            # Índice (não ID): os IDs só existem depois da gravação; veja gerar_agendamentos.
+            bloqueios.append(Bloqueio(inicio, inicio + timedelta(days=14), indice, "Férias"))
+        return bloqueios
+
+    # --- Consultas ---
+
+    def gerar_agendamentos(self, pacientes: List[Paciente], medicos: List[Medico]) -> Iterator[Agendamento]:
+        """
+        Gera as consultas dia a dia, médico a médico, até n_consultas. Os
+        bloqueios de cada ano são criados ao entrar no ano e acumulados em
+        self.bloqueios (com o índice do médico em id_medico até a gravação).
+        """
+        aleatorio = self.aleatorio
+        faixas = {}  # id(regras) -> {weekday: [(inicio_min, fim_min)]}
+        for m in medicos:
+            if id(m.regras_disponibilidade) not in faixas:
+                faixas[id(m.regras_disponibilidade)] = {
+                    DIAS_SEMANA.index(dia): [tuple(_minutos(h) for h in faixa.split("-")) for faixa in lista]
+                    for dia, lista in m.regras_disponibilidade.items()}
+        duracoes = [ESPECIALIDADES[m.especialidade] for m in medicos]
+        feriados, ferias = set(), {}
+        gerados, dia, ano = 0, self.data_inicio, None
+        ultimo_paciente = len(pacientes) - 1
+        while gerados < self.n_consultas:
+            if dia.year != ano:
+                ano = dia.year
+                novos = self._bloqueios_do_ano(ano, medicos)
+                self.bloqueios.extend(novos)
+                for b in novos:
+                    if b.da_clinica:
+                        feriados.add(b.inicio.date())
+                    else:
+                        for d, _, _ in b.por_dia(b.inicio.date(), b.fim.date()):
+                            ferias.setdefault(d, set()).add(b.id_medico)
+            if dia not in feriados:
+                meia_noite = datetime.combine(dia, time.min)
+                passado = dia < self.hoje
+                em_ferias = ferias.get(dia, ())
+                atendidos_no_dia = set()
+                semana = dia.weekday()
+                for indice, medico in enumerate(medicos):
+                    if indice in em_ferias:
+                        continue
+                    opcoes = duracoes[indice]
+                    for inicio, fim in faixas[id(medico.regras_disponibilidade)].get(semana, ()):
+                        minuto = inicio
+                        while True:
+                            duracao = opcoes[0] if len(opcoes) == 1 else aleatorio.choice(opcoes)
+                            if minuto + duracao > fim:
+                                break
+                            if aleatorio.random() < self.ocupacao:
+                                if len(atendidos_no_dia) > ultimo_paciente:
+                                    break  # Todos os pacientes já têm consulta neste dia
+                                paciente = aleatorio.randint(0, ultimo_paciente)
+                                while paciente in atendidos_no_dia:  # no máximo uma consulta por dia
+                                    paciente = paciente + 1 if paciente < ultimo_paciente else 0
+                                atendidos_no_dia.add(paciente)
+                                ag = Agendamento(pacientes[paciente], medico,
+                                                 meia_noite + timedelta(minutes=minuto), duracao)
+                                if aleatorio.random() < self.taxa_cancelamento:
+                                    ag.status = Agendamento.CANCELADO
+                                else:
+                                    ag.status = Agendamento.REALIZADO if passado else Agendamento.AGENDADO
+                                yield ag
+                                gerados += 1
+                                if gerados == self.n_consultas:
+                                    return
+                                minuto += duracao
+                            else:
+                                minuto += 5 * aleatorio.randint(1, 3)  # horário vago
+            dia += timedelta(days=1)
+
+    # --- Gravação ---
+
+    def popular(self, repo: AgendaRepository) -> Dict[str, int]:
+        """Gera tudo e grava no repositório (de preferência um banco vazio). Retorna as contagens."""
+        pacientes, medicos = self.gerar_cadastros()
+
+        def bloqueios():
+            # Percorrido pelo repositório depois das consultas: os anos (e os
+            # bloqueios) dependem de quantas consultas couberam no período.
+            for b in self.bloqueios:
+                if not b.da_clinica:
+                    b.id_medico = medicos[b.id_medico].id
+                yield b
+
+        return repo.carregar_em_massa(pacientes, medicos, self.gerar_agendamentos(pacientes, medicos), bloqueios())
+
+
+def gerar(caminho_db: str, semente: int = 42, **parametros) -> Dict[str, int]:
+    """Atalho: cria/abre o banco em caminho_db e grava um conjunto gerado com a semente."""
+    repo = AgendaRepository(caminho_db)
+    try:
+        return GeradorDados(semente, **parametros).popular(repo)
+    finally:
+        repo.fechar()
@@ -0,0 +1,282 @@
+"""
+Exportação de agendas para relatórios.
+
+Todas as funções leem os agendamentos por UM cursor com JOIN
+(AgendaRepository.iterar_agendamentos_completos) e escrevem em fluxo,
+então a memória usada não cresce com o tamanho da base.
+
+Formatos:
+  - CSV e JSONL: texto, uma linha por agendamento.
+  - Colunar (.agcol): binário, uma coluna por bloco contíguo (arrays do
+    módulo 'array'), pensado para ser aberto com mmap pelos scripts de
+    análise sem precisar "parsear" texto. Veja carregar_colunar().
+"""
+import array
+import csv
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from datetime import datetime
+
+from persistencia import AgendaRepository, COLUNAS_AGENDAMENTO_COMPLETO
+
+TAMANHO_LOTE = 1000
+
+# --- Formato colunar ---
+# [MAGICO (8 bytes)] [tamanho do cabeçalho (uint32 LE)] [cabeçalho JSON]
+# [colunas, cada bloco alinhado em 8 bytes]
+# O cabeçalho descreve cada coluna com "offset" e "bytes" a partir do início
+# do arquivo. Colunas de texto têm dois blocos: "offsets" (int64, n+1 itens)
+# e "dados" (UTF-8 concatenado). "status" é codificado por dicionário (int8).
+MAGICO = b"AGCOL1\0\0"
+_ALINHAMENTO = 8
+_EPOCA = datetime(1970, 1, 1)
+
+# Tipo de cada coluna no formato colunar: código do 'array' ou "texto"/"dicionario".
+TIPOS_COLUNAR = {
+    "id_agendamento": "q",
+    "data_hora_inicio": "q",  # Segundos desde 1970-01-01 (horário local, sem fuso)
+    "duracao_minutos": "i",
+    "status": "dicionario",
+    "id_paciente": "q",
+    "nome_paciente": "texto",
+    "cpf_paciente": "texto",
+    "plano_saude": "texto",
+    "id_medico": "q",
+    "nome_medico": "texto",
+    "crm_medico": "texto",
+    "especialidade": "texto",
+}
+
+
+def exportar_csv(repo: AgendaRepository, saida) -> int:
+    """Escreve os agendamentos em CSV (com cabeçalho). Retorna o nº de linhas."""
+    escritor = csv.writer(saida)
+    escritor.writerow(COLUNAS_AGENDAMENTO_COMPLETO)
+    total = 0
+    lote = []
+    for linha in repo.iterar_agendamentos_completos(TAMANHO_LOTE):
+        lote.append(linha)
+        if len(lote) >= TAMANHO_LOTE:
+            escritor.writerows(lote)
+            total += len(lote)
+            lote.clear()
+    escritor.writerows(lote)
+    return total + len(lote)
+
+
+def exportar_jsonl(repo: AgendaRepository, saida) -> int:
+    """Escreve os agendamentos em JSONL (um objeto por linha). Retorna o nº de linhas."""
+    codificar = json.JSONEncoder(ensure_ascii=False).encode
+    total = 0
+    for linha in repo.iterar_agendamentos_completos(TAMANHO_LOTE):
+        saida.write(codificar(dict(zip(COLUNAS_AGENDAMENTO_COMPLETO, linha))))
+        saida.write("\n")
+        total += 1
+    return total
+
+
+class _ColunaEmDisco:
+    """
+    Acumula uma coluna em um arquivo temporário, em lotes, para que a
+    exportação colunar também use memória constante.
+    """
+
+    def __init__(self, pasta: str, nome: str, tipo: str):
+        self.nome = nome
+        self.tipo = tipo
+        codigo = "b" if tipo == "dicionario" else ("q" if tipo == "texto" else tipo)
+        self._valores = array.array(codigo)
+        self._arq_valores = open(os.path.join(pasta, nome + ".valores"), "w+b")
+        self.dicionario = {}
+        if tipo == "texto":
+            self._tamanho_dados = 0
+            self._valores.append(0)  # offsets começa em 0 (n+1 itens no total)
+            self._dados = bytearray()
+            self._arq_dados = open(os.path.join(pasta, nome + ".dados"), "w+b")
+
+    def adicionar(self, valor):
+        if self.tipo == "texto":
+            codificado = (valor or "").encode("utf-8")
+            self._dados += codificado
+            self._tamanho_dados += len(codificado)
+            self._valores.append(self._tamanho_dados)
+        elif self.tipo == "dicionario":
+            self._valores.append(self.dicionario.setdefault(valor, len(self.dicionario)))
+        else:
+            self._valores.append(valor)
+
+    def descarregar(self):
+        self._valores.tofile(self._arq_valores)
+        del self._valores[:]
+        if self.tipo == "texto":
+            self._arq_dados.write(self._dados)
+            self._dados.clear()
+
+    def blocos(self):
+        """Retorna [(nome_do_bloco, arquivo)] já posicionados no início."""
+        self.descarregar()
+        if self.tipo == "texto":
+            blocos = [("offsets", self._arq_valores), ("dados", self._arq_dados)]
+        else:
+            blocos = [("valores", self._arq_valores)]
+        for _, arquivo in blocos:
+            arquivo.seek(0)
+        return blocos
+
+    def fechar(self):
+        self._arq_valores.close()
+        if self.tipo == "texto":
+            self._arq_dados.close()
+
+
+def exportar_colunar(repo: AgendaRepository, caminho: str) -> int:
+    """
+    Escreve os agendamentos no formato colunar binário em 'caminho'.
+    Retorna o nº de linhas.
+    """
+    with tempfile.TemporaryDirectory() as pasta:
+        colunas = [_ColunaEmDisco(pasta, nome, TIPOS_COLUNAR[nome]) for nome in COLUNAS_AGENDAMENTO_COMPLETO]
+        indice_data = COLUNAS_AGENDAMENTO_COMPLETO.index("data_hora_inicio")
+        total = 0
+        try:
+            for linha in repo.iterar_agendamentos_completos(TAMANHO_LOTE):
+                for i, coluna in enumerate(colunas):
+                    valor = linha[i]
+                    if i == indice_data:
+                        valor = int((datetime.fromisoformat(valor) - _EPOCA).total_seconds())
+                    coluna.adicionar(valor)
+                total += 1
+                if total % TAMANHO_LOTE == 0:
+                    for coluna in colunas:
+                        coluna.descarregar()
+
+            # Calcula a posição de cada bloco antes de escrever o cabeçalho.
+            descricao, blocos = [], []
+            for coluna in colunas:
+                item = {"nome": coluna.nome, "tipo": coluna.tipo}
+                if coluna.tipo == "dicionario":
+                    item["dicionario"] = list(coluna.dicionario)
+                for nome_bloco, arquivo in coluna.blocos():
+                    item[nome_bloco] = {"bytes": os.fstat(arquivo.fileno()).st_size}
+                    blocos.append((item[nome_bloco], arquivo))
+                descricao.append(item)
+
+            cabecalho = {"linhas": total, "ordem_bytes": sys.byteorder, "colunas": descricao}
+            # O tamanho do cabeçalho depende dos offsets e vice-versa; como os
+            # offsets só crescem, basta recalcular até estabilizar.
+            tamanho_cabecalho = 0
+            while True:
+                posicao = _alinhar(len(MAGICO) + 4 + tamanho_cabecalho)
+                for info, _ in blocos:
+                    info["offset"] = posicao
+                    posicao = _alinhar(posicao + info["bytes"])
+                bruto = json.dumps(cabecalho).encode("utf-8")
+                if len(bruto) == tamanho_cabecalho:
+                    break
+                tamanho_cabecalho = len(bruto)
+
+            with open(caminho, "wb") as destino:
+                destino.write(MAGICO)
+                destino.write(struct.pack("<I", len(bruto)))
+                destino.write(bruto)
+                for info, arquivo in blocos:
+                    destino.write(b"\0" * (info["offset"] - destino.tell()))
+                    shutil.copyfileobj(arquivo, destino)
+        finally:
+            for coluna in colunas:
+                coluna.fechar()
+    return total
+
+
+def _alinhar(posicao: int) -> int:
+    return (posicao + _ALINHAMENTO - 1) // _ALINHAMENTO * _ALINHAMENTO
+
+
+class ColunaTexto:
+    """Acesso preguiçoso a uma coluna de texto mapeada em memória."""
+
+    def __init__(self, offsets: memoryview, dados: memoryview):
+        self._offsets = offsets
+        self._dados = dados
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        return bytes(self._dados[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+
+
+class TabelaColunar:
+    """
+    Arquivo colunar aberto com mmap. As colunas numéricas são memoryviews
+    direto sobre o arquivo (zero cópia); o texto é decodificado sob demanda.
+    Ao fechar, as colunas entregues são liberadas e deixam de valer.
+    """
+
+    def __init__(self, caminho: str):
+        with open(caminho, "rb") as arquivo:
+            self._mmap = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGICO)] != MAGICO:
+            self._mmap.close()
+            raise ValueError(f"{caminho} não é um arquivo colunar de agendas.")
+        tamanho, = struct.unpack_from("<I", self._mmap, len(MAGICO))
+        inicio = len(MAGICO) + 4
+        self.cabecalho = json.loads(self._mmap[inicio:inicio + tamanho])
+        if self.cabecalho["ordem_bytes"] != sys.byteorder:
+            self._mmap.close()
+            raise ValueError("Arquivo colunar gerado em máquina com outra ordem de bytes.")
+        self.linhas = self.cabecalho["linhas"]
+        self._visao = memoryview(self._mmap)
+        self._colunas = {c["nome"]: c for c in self.cabecalho["colunas"]}
+        # Visões entregues por coluna(): enquanto alguma existir, o mmap não fecha.
+        self._entregues = []
+
+    def _bloco(self, info: dict, codigo: str = "B") -> memoryview:
+        fatia = self._visao[info["offset"]:info["offset"] + info["bytes"]]
+        visao = fatia.cast(codigo) if codigo != "B" else fatia
+        self._entregues.append(visao)
+        return visao
+
+    @property
+    def nomes(self):
+        return list(self._colunas)
+
+    def coluna(self, nome: str):
+        """
+        Retorna a coluna: memoryview numérica (tipos 'q'/'i'), memoryview de
+        códigos int8 (status; veja dicionario()) ou ColunaTexto.
+        """
+        info = self._colunas[nome]
+        if info["tipo"] == "texto":
+            return ColunaTexto(self._bloco(info["offsets"], "q"), self._bloco(info["dados"]))
+        codigo = "b" if info["tipo"] == "dicionario" else info["tipo"]
+        return self._bloco(info["valores"], codigo)
+
+    def dicionario(self, nome: str) -> list:
+        """Valores da coluna codificada por dicionário (o código é o índice)."""
+        return self._colunas[nome]["dicionario"]
+
+    def fechar(self):
+        for visao in self._entregues:
+            visao.release()
+        self._entregues.clear()
+        self._visao.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+def carregar_colunar(caminho: str) -> TabelaColunar:
+    """Abre um arquivo gerado por exportar_colunar()."""
+    return TabelaColunar(caminho)
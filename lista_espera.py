@@ -0,0 +1,274 @@
+"""
+Otimizador da LISTA DE ESPERA.
+
+Os pedidos ("qualquer horário com qualquer médico da especialidade entre
+data_inicio e data_fim") são resolvidos em lote:
+
+  1. Lê do repositório os pedidos pendentes, os médicos, as consultas já
+     marcadas no período (tuplas leves, sem montar objetos Agendamento) e os
+     bloqueios de agenda (férias, feriados), que contam como ocupados.
+  2. Separa o trabalho por especialidade e resolve cada especialidade em um
+     processo do ProcessPoolExecutor (resolver_grupo). Dentro da
+     especialidade os dias são resolvidos em ordem: um pedido que aceita a
+     semana inteira só "sobra" para o dia seguinte se não couber no anterior.
+     Por isso a unidade de paralelismo é a especialidade, e não o dia.
+     Especialidades com pacientes em comum (o mesmo paciente esperando em
+     duas) formam UM grupo, resolvido numa única tarefa: em processos
+     separados, o paciente poderia receber dois horários sobrepostos.
+  3. O algoritmo é guloso: pedidos em ordem de chegada, cada um fica com o
+     horário livre mais cedo (em qualquer médico da especialidade), alinhado
+     à granularidade, sem sobrepor outra consulta do mesmo paciente.
+  4. As propostas são gravadas pela Clinica (marcar_consultas_em_lote) em
+     lotes, cada lote numa transação que confere conflitos de novo.
+"""
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+from models.clinica import Clinica
+from models.mapa_disponibilidade import DIAS_SEMANA, _minutos
+
+
+def regras_em_minutos(regras: dict) -> dict:
+    """
+    Converte regras_disponibilidade ({'segunda': ['08:00-12:00', ...]}) para
+    {weekday: [(inicio_min, fim_min), ...]}, que é fácil de enviar a outro processo.
+    """
+    convertidas = {}
+    for dia, intervalos in (regras or {}).items():
+        if dia not in DIAS_SEMANA:
+            continue
+        faixas = []
+        for intervalo in intervalos:
+            inicio, fim = intervalo.split("-")
+            faixas.append((_minutos(inicio), _minutos(fim)))
+        convertidas[DIAS_SEMANA.index(dia)] = sorted(faixas)
+    return convertidas
+
+
+def _subtrair(faixas, ocupados):
+    """Faixas de trabalho menos os intervalos ocupados (ambos em minutos)."""
+    livres = []
+    ocupados = sorted(ocupados)
+    for inicio, fim in faixas:
+        cursor = inicio
+        for o_ini, o_fim in ocupados:
+            if o_fim <= cursor or o_ini >= fim:
+                continue
+            if o_ini > cursor:
+                livres.append([cursor, o_ini])
+            cursor = max(cursor, o_fim)
+        if cursor < fim:
+            livres.append([cursor, fim])
+    return livres
+
+
+def _alinhar(minuto: int, granularidade: int) -> int:
+    return -(-minuto // granularidade) * granularidade
+
+
+def _primeiro_encaixe(livres, duracao, granularidade, ocupados_paciente, minimo):
+    """Retorna (indice_faixa, inicio) do primeiro horário que cabe, ou None."""
+    for k, (inicio, fim) in enumerate(livres):
+        candidato = _alinhar(max(inicio, minimo), granularidade)
+        while candidato + duracao <= fim:
+            choque = next((p_fim for p_ini, p_fim in ocupados_paciente
+                           if p_ini < candidato + duracao and p_fim > candidato), None)
+            if choque is None:
+                return k, candidato
+            candidato = _alinhar(choque, granularidade)
+    return None
+
+
+def resolver_grupo(tarefa: dict) -> list:
+    """
+    Resolve os pedidos de UM grupo de especialidades (as ligadas por pacientes
+    em comum). Função pura (só recebe e devolve tipos simples) para poder
+    rodar em outro processo.
+
+    tarefa:
+      medicos: {id_medico: {weekday: [(inicio_min, fim_min)]}}
+      medicos_por_especialidade: {especialidade: [id_medico, ...]}
+      ocupados: {(id_medico, dia_ordinal): [(inicio_min, fim_min)]} (consultas e bloqueios do médico)
+      bloqueios_clinica: {dia_ordinal: [(inicio_min, fim_min)]} (valem para todos os médicos)
+      ocupados_pacientes: {(id_paciente, dia_ordinal): [(inicio_min, fim_min)]}
+      pedidos: [(id_pedido, id_paciente, dia_inicio_ordinal, dia_fim_ordinal, duracao, especialidade)],
+               em ordem de chegada
+      hoje: dia ordinal de hoje; minuto_atual: minutos passados hoje
+      granularidade: minutos
+
+    Retorna [(id_pedido, id_paciente, id_medico, dia_ordinal, inicio_min, duracao)].
+    """
+    medicos = tarefa["medicos"]
+    medicos_por_especialidade = tarefa["medicos_por_especialidade"]
+    ocupados = tarefa["ocupados"]
+    bloqueios_clinica = tarefa["bloqueios_clinica"]
+    granularidade = tarefa["granularidade"]
+    hoje, minuto_atual = tarefa["hoje"], tarefa["minuto_atual"]
+    pacientes = defaultdict(list)
+    for chave, intervalos in tarefa["ocupados_pacientes"].items():
+        pacientes[chave].extend(intervalos)
+
+    livres_cache = {}
+
+    def livres(id_medico, dia):
+        chave = (id_medico, dia)
+        faixas = livres_cache.get(chave)
+        if faixas is None:
+            semana = date.fromordinal(dia).weekday()
+            faixas = livres_cache[chave] = _subtrair(medicos[id_medico].get(semana, ()),
+                                                     ocupados.get(chave, []) + bloqueios_clinica.get(dia, []))
+        return faixas
+
+    propostas = []
+    for id_pedido, id_paciente, dia_inicio, dia_fim, duracao, especialidade in tarefa["pedidos"]:
+        for dia in range(max(dia_inicio, hoje), dia_fim + 1):
+            minimo = minuto_atual if dia == hoje else 0
+            ocupados_paciente = pacientes[(id_paciente, dia)]
+            melhor = None
+            for id_medico in medicos_por_especialidade[especialidade]:
+                faixas = livres(id_medico, dia)
+                encaixe = _primeiro_encaixe(faixas, duracao, granularidade, ocupados_paciente, minimo)
+                if encaixe and (melhor is None or encaixe[1] < melhor[2]):
+                    melhor = (id_medico, encaixe[0], encaixe[1])
+            if melhor is None:
+                continue
+            id_medico, k, inicio = melhor
+            faixas = livres(id_medico, dia)
+            f_ini, f_fim = faixas[k]
+            # Divide a faixa livre em (antes do horário) e (depois do horário).
+            novas = [f for f in ([f_ini, inicio], [inicio + duracao, f_fim]) if f[1] - f[0] > 0]
+            faixas[k:k + 1] = novas
+            ocupados_paciente.append((inicio, inicio + duracao))
+            propostas.append((id_pedido, id_paciente, id_medico, dia, inicio, duracao))
+            break
+    return propostas
+
+
+class OtimizadorListaEspera:
+    """
+    Resolve a lista de espera e grava as consultas pela Clinica.
+    Use executar() periodicamente (ex: um job a cada poucos minutos).
+    """
+
+    def __init__(self, clinica: Clinica, max_workers: int = None, tamanho_lote: int = 500,
+                 granularidade_min: int = 5, usar_processos: bool = True):
+        self.clinica = clinica
+        self.max_workers = max_workers
+        self.tamanho_lote = tamanho_lote
+        self.granularidade_min = granularidade_min
+        self.usar_processos = usar_processos
+
+    def _montar_tarefas(self, pedidos, medicos, agora: datetime) -> list:
+        repo = self.clinica.repo
+        hoje = agora.date()
+        inicio_periodo = max(hoje, min(p.data_inicio for p in pedidos))
+        fim_periodo = max(p.data_fim for p in pedidos)
+
+        ocupados_medico = defaultdict(list)
+        ocupados_paciente = defaultdict(list)
+        bloqueios_clinica = defaultdict(list)
+        if inicio_periodo <= fim_periodo:
+            for id_medico, id_paciente, inicio, duracao in repo.buscar_intervalos_ocupados(inicio_periodo,
+                                                                                           fim_periodo):
+                intervalo = (inicio.hour * 60 + inicio.minute, inicio.hour * 60 + inicio.minute + duracao)
+                ocupados_medico[(id_medico, inicio.toordinal())].append(intervalo)
+                ocupados_paciente[(id_paciente, inicio.toordinal())].append(intervalo)
+            for bloqueio in repo.buscar_bloqueios(None, inicio_periodo, fim_periodo):
+                for dia, inicio_min, fim_min in bloqueio.por_dia(inicio_periodo, fim_periodo):
+                    if bloqueio.da_clinica:
+                        bloqueios_clinica[dia.toordinal()].append((inicio_min, fim_min))
+                    else:
+                        ocupados_medico[(bloqueio.id_medico, dia.toordinal())].append((inicio_min, fim_min))
+
+        por_especialidade = defaultdict(list)
+        for m in medicos:
+            if m.especialidade:
+                por_especialidade[m.especialidade.strip().casefold()].append(m)
+
+        # Especialidades ligadas por um paciente em comum ficam no mesmo grupo
+        # (union-find: grupo[esp] aponta para outra especialidade do grupo).
+        grupo = {esp: esp for esp in por_especialidade}
+
+        def raiz(esp):
+            while grupo[esp] != esp:
+                grupo[esp] = esp = grupo[grupo[esp]]
+            return esp
+
+        primeira_especialidade = {}
+        for p in pedidos:
+            esp = p.especialidade.strip().casefold()
+            if esp in grupo:
+                anterior = primeira_especialidade.setdefault(p.id_paciente, esp)
+                grupo[raiz(esp)] = raiz(anterior)
+
+        pedidos_por_grupo = defaultdict(list)
+        for p in pedidos:  # Mantém a ordem de chegada dentro de cada grupo
+            esp = p.especialidade.strip().casefold()
+            if esp in grupo:
+                pedidos_por_grupo[raiz(esp)].append((p, esp))
+
+        tarefas = []
+        for lista in pedidos_por_grupo.values():
+            especialidades = {esp for _, esp in lista}
+            medicos_grupo = [m for esp in especialidades for m in por_especialidade[esp]]
+            ids = {m.id for m in medicos_grupo}
+            ids_pacientes = {p.id_paciente for p, _ in lista}
+            tarefas.append({
+                "medicos": {m.id: regras_em_minutos(m.regras_disponibilidade) for m in medicos_grupo},
+                "medicos_por_especialidade": {esp: [m.id for m in por_especialidade[esp]] for esp in especialidades},
+                "ocupados": {k: v for k, v in ocupados_medico.items() if k[0] in ids},
+                "ocupados_pacientes": {k: v for k, v in ocupados_paciente.items() if k[0] in ids_pacientes},
+                "bloqueios_clinica": dict(bloqueios_clinica),
+                "pedidos": [(p.id, p.id_paciente, p.data_inicio.toordinal(), p.data_fim.toordinal(),
+                             p.duracao_minutos, esp) for p, esp in lista],
+                "hoje": hoje.toordinal(),
+                "minuto_atual": agora.hour * 60 + agora.minute + 1,
+                "granularidade": self.granularidade_min,
+            })
+        return tarefas
+
+    def _resolver(self, tarefas) -> list:
+        if self.usar_processos and len(tarefas) > 1 and self.max_workers != 1:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                return [p for propostas in pool.map(resolver_grupo, tarefas) for p in propostas]
+        return [p for tarefa in tarefas for p in resolver_grupo(tarefa)]
+
+    def executar(self, agora: datetime = None) -> dict:
+        """
+        Resolve todos os pedidos pendentes. Retorna um resumo com contagens
+        (pedidos, propostas, agendados, conflitos) e tempos em segundos.
+        """
+        agora = agora or datetime.now()
+        repo = self.clinica.repo
+        inicio = time.perf_counter()
+        pedidos = repo.buscar_pedidos_espera_pendentes()
+        resumo = {"pedidos": len(pedidos), "propostas": 0, "agendados": 0, "conflitos": 0,
+                  "tempo_leitura": 0.0, "tempo_calculo": 0.0, "tempo_gravacao": 0.0}
+        if not pedidos:
+            return resumo
+
+        medicos = repo.buscar_todos_medicos()
+        tarefas = self._montar_tarefas(pedidos, medicos, agora)
+        resumo["tempo_leitura"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        propostas = self._resolver(tarefas)
+        resumo["tempo_calculo"] = time.perf_counter() - inicio
+        resumo["propostas"] = len(propostas)
+
+        inicio = time.perf_counter()
+        medicos_por_id = {m.id: m for m in medicos}
+        convertidas = [
+            (id_pedido, id_paciente, id_medico,
+             datetime.combine(date.fromordinal(dia), datetime.min.time()) + timedelta(minutes=minuto), duracao)
+            for id_pedido, id_paciente, id_medico, dia, minuto, duracao in propostas
+        ]
+        for i in range(0, len(convertidas), self.tamanho_lote):
+            ids = self.clinica.marcar_consultas_em_lote(convertidas[i:i + self.tamanho_lote], medicos_por_id)
+            agendados = sum(1 for id_agendamento in ids if id_agendamento is not None)
+            resumo["agendados"] += agendados
+            resumo["conflitos"] += len(ids) - agendados
+        resumo["tempo_gravacao"] = time.perf_counter() - inicio
+        return resumo
@@ -1,14 +1,28 @@
-import json
-from datetime import datetime
+from __future__ import annotations
+
 import sys
 import os
+import time
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from persistencia import AgendaRepository
-from models.medico import Medico
-from models.paciente import Paciente
-from models.clinica import Clinica
+# --- IMPORTAÇÕES TARDIAS ---
+# No uso por script (um processo por operação) o tempo de inicialização pesa
+# mais que a própria operação. Por isso persistencia, models, json, datetime
+# e argparse só são importados dentro das funções que precisam deles.
+# Com "from __future__ import annotations" as anotações (Clinica, Paciente...)
+# não são avaliadas; os nomes delas só são importados para os verificadores
+# de tipo (mypy, pyflakes). TYPE_CHECKING é definido aqui, e não importado de
+# typing, porque o import do typing sozinho custa mais de 10 ms.
+# Veja tests/test_inicializacao.py para o orçamento de tempo.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import argparse
+    from datetime import datetime
+
+    from models.clinica import Clinica
+    from models.medico import Medico
+    from models.paciente import Paciente
 
 # Define o caminho do banco de dados
 db_path = os.path.join(os.path.dirname(__file__), "clinica.db")
@@ -19,6 +33,8 @@ def obter_regras_interativas() -> dict:
     Cria um menu interativo para definir os horários de trabalho
     e retorna um dicionário de regras.
     """
+    import json
+
     regras = {}
     dias_semana = ["segunda", "terca", "quarta", "quinta", "sexta", "sabado", "domingo"]
     print("\n--- Definir Regras de Disponibilidade ---")
@@ -46,6 +62,8 @@ def obter_regras_interativas() -> dict:
 
 def cadastrar_medico(clinica: Clinica):
     """Cadastra um novo médico no sistema."""
+    from models.medico import Medico
+
     print("\n=== Cadastro de Médico ===")
     nome = input("Nome do médico: ").strip()
     cpf = input("CPF do médico: ").strip()
@@ -75,6 +93,8 @@ def cadastrar_medico(clinica: Clinica):
 
 def cadastrar_paciente(clinica: Clinica):
     """Cadastra um novo paciente no sistema."""
+    from models.paciente import Paciente
+
     print("\n=== Cadastro de Paciente ===")
     nome = input("Nome do paciente: ").strip()
     cpf = input("CPF do paciente: ").strip()
@@ -96,6 +116,9 @@ def cadastrar_paciente(clinica: Clinica):
 
 def marcar_consulta(clinica: Clinica):
     """Marca uma consulta no sistema."""
+    import json
+    from datetime import datetime
+
     print("\n=== Marcar Consulta ===")
     try:
         # --- MUDANÇA: Pedir CPF em vez de ID ---
@@ -156,7 +179,8 @@ def listar_consultas(clinica: Clinica):
             return
 
         # --- MUDANÇA: Usar o ID encontrado ---
-        consultas = clinica.consultar_agenda_paciente(paciente.id)
+        # Histórico completo, inclusive as canceladas (a coluna Status mostra).
+        consultas = clinica.consultar_agenda_paciente(paciente.id, incluir_cancelados=True)
 
         if not consultas:
             print(f"Nenhuma consulta encontrada para o paciente {paciente.nome}.")
@@ -179,16 +203,17 @@ def listar_pacientes(clinica: Clinica):
     """Lista todos os pacientes cadastrados."""
     print("\n=== Lista de Pacientes Cadastrados ===")
     try:
-        pacientes = clinica.listar_todos_pacientes()
-        if not pacientes:
+        # Páginas de tuplas lidas do índice de cobertura (sem montar Pacientes).
+        pagina = clinica.listar_pacientes_resumo()
+        if not pagina:
             print("Nenhum paciente cadastrado.")
             return
 
         print("-" * 40)
-        for p in pacientes:
-            print(
-                f"ID: {p.id} | Nome: {p.nome} | CPF: {p.cpf} | Plano: {p.plano_saude}"
-            )
+        while pagina:
+            for pid, nome, cpf, plano in pagina:
+                print(f"ID: {pid} | Nome: {nome} | CPF: {cpf} | Plano: {plano}")
+            pagina = clinica.listar_pacientes_resumo(apos_id=pagina[-1][0])
         print("-" * 40)
 
     except Exception as e:
@@ -199,16 +224,16 @@ def listar_medicos(clinica: Clinica):
     """Lista todos os médicos cadastrados."""
     print("\n=== Lista de Médicos Cadastrados ===")
     try:
-        medicos = clinica.listar_todos_medicos()
-        if not medicos:
+        pagina = clinica.listar_medicos_resumo()
+        if not pagina:
             print("Nenhum médico cadastrado.")
             return
 
         print("-" * 40)
-        for m in medicos:
-            print(
-                f"ID: {m.id} | Nome: Dr(a). {m.nome} | CRM: {m.crm} | Espec: {m.especialidade}"
-            )
+        while pagina:
+            for mid, nome, crm, especialidade in pagina:
+                print(f"ID: {mid} | Nome: Dr(a). {nome} | CRM: {crm} | Espec: {especialidade}")
+            pagina = clinica.listar_medicos_resumo(apos_id=pagina[-1][0])
         print("-" * 40)
 
     except Exception as e:
@@ -273,12 +298,15 @@ def atualizar_paciente(clinica: Clinica):
         print(f"Erro inesperado: {e}")
 
 
-def main():
+def main(caminho_db: str = db_path):
     """Função principal que executa o menu do sistema."""
+    from persistencia import AgendaRepository
+    from models.clinica import Clinica
+
     print("Sistema de Agendamento de Clínica")
     print("=" * 40)
 
-    repo = AgendaRepository(db_path)
+    repo = AgendaRepository(caminho_db)
     clinica = Clinica(repo)
 
     while True:
@@ -320,5 +348,772 @@ def main():
             print("Opção inválida! Tente novamente.")
 
 
+# =====================================================================
+# --- MODO NÃO INTERATIVO (CLI / BATCH) ---
+# Cada operação recebe um dicionário (vindo de JSON/JSONL) e devolve um
+# dicionário com o resultado. Assim o mesmo código atende os subcomandos
+# (cadastrar, marcar, ...) e o modo --batch, que processa um fluxo de
+# operações num único processo e numa única conexão.
+# =====================================================================
+
+
+def _ler_registros(caminho: str):
+    """
+    Lê registros JSON de um arquivo (ou de stdin, se caminho == "-").
+    Aceita um array JSON, um objeto JSON (pode ocupar várias linhas) ou JSONL
+    (um objeto por linha). No JSONL os registros são produzidos sob demanda,
+    sem carregar o arquivo todo, e cada linha é lida sozinha: uma linha
+    inválida vira um ValueError no lugar do registro, e o lote segue.
+    """
+    import json
+
+    def registro(texto: str, origem: str):
+        try:
+            valor = json.loads(texto)
+        except json.JSONDecodeError as e:
+            return ValueError(f"JSON inválido na {origem}: {e.msg}: {texto.strip()[:80]!r}")
+        return valor if isinstance(valor, dict) else ValueError(f"O registro na {origem} não é um objeto JSON.")
+
+    arquivo = sys.stdin if caminho == "-" else open(caminho, encoding="utf-8")
+    try:
+        linhas = enumerate(arquivo, start=1)
+        for numero, linha in linhas:
+            if not linha.strip():
+                continue
+            if linha.lstrip().startswith("["):
+                # Array JSON: precisa ser lido inteiro.
+                for i, item in enumerate(json.loads(linha + arquivo.read()), start=1):
+                    yield item if isinstance(item, dict) else ValueError(f"O item {i} do array não é um objeto JSON.")
+                return
+            primeiro = registro(linha, f"linha {numero}")
+            if isinstance(primeiro, ValueError):
+                # Um objeto JSON ocupando várias linhas? Senão, JSONL com a 1ª linha inválida.
+                resto = linha + arquivo.read()
+                try:
+                    objeto = json.loads(resto)
+                except json.JSONDecodeError:
+                    linhas = enumerate(resto.splitlines(), start=numero)
+                else:
+                    yield objeto if isinstance(objeto, dict) else ValueError("A entrada não é um objeto JSON.")
+                    return
+            else:
+                yield primeiro
+            break
+        for numero, linha in linhas:
+            if linha.strip():
+                yield registro(linha, f"linha {numero}")
+    finally:
+        if arquivo is not sys.stdin:
+            arquivo.close()
+
+
+def _emitir(saida, registro: dict):
+    """Escreve um registro como uma linha JSON (formato JSONL)."""
+    import json
+
+    saida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+
+def _paciente_para_dict(p: Paciente) -> dict:
+    return {"id": p.id, "nome": p.nome, "cpf": p.cpf, "telefone": p.telefone, "plano_saude": p.plano_saude}
+
+
+def _medico_para_dict(m: Medico) -> dict:
+    return {"id": m.id, "nome": m.nome, "cpf": m.cpf, "telefone": m.telefone, "crm": m.crm,
+            "especialidade": m.especialidade, "regras_disponibilidade": m.regras_disponibilidade}
+
+
+def _bloqueio_para_dict(b) -> dict:
+    return {"id_bloqueio": b.id, "id_medico": b.id_medico, "inicio": b.inicio.isoformat(),
+            "fim": b.fim.isoformat(), "motivo": b.motivo}
+
+
+def _agendamento_para_dict(a) -> dict:
+    return {"id_agendamento": a.id, "cpf_paciente": a.paciente.cpf, "crm_medico": a.medico.crm,
+            "inicio": a.data_hora_inicio.isoformat(), "duracao_minutos": a.duracao_minutos,
+            "status": a.status}
+
+
+def _resolver_paciente(clinica: Clinica, dados: dict) -> int:
+    """Aceita id_paciente ou cpf_paciente e retorna o ID do paciente."""
+    if dados.get("id_paciente") is not None:
+        return int(dados["id_paciente"])
+    paciente = clinica.repo.buscar_paciente_por_cpf(str(dados.get("cpf_paciente", "")))
+    if not paciente:
+        raise ValueError(f"Paciente com CPF {dados.get('cpf_paciente')} não encontrado.")
+    return paciente.id
+
+
+def _resolver_medico(clinica: Clinica, dados: dict) -> int:
+    """Aceita id_medico ou crm_medico e retorna o ID do médico."""
+    if dados.get("id_medico") is not None:
+        return int(dados["id_medico"])
+    medico = clinica.repo.buscar_medico_por_crm(str(dados.get("crm_medico", "")))
+    if not medico:
+        raise ValueError(f"Médico com CRM {dados.get('crm_medico')} não encontrado.")
+    return medico.id
+
+
+def _ler_data_hora(valor: str) -> datetime:
+    """Aceita 'YYYY-MM-DD HH:MM' (mesmo formato do menu) ou ISO 8601."""
+    from datetime import datetime
+
+    # fromisoformat já aceita o formato do menu; o strptime (que importa
+    # _strptime e calendar, ~3 ms) fica só para horas sem zero ("8:00").
+    try:
+        return datetime.fromisoformat(valor)
+    except ValueError:
+        return datetime.strptime(valor, "%Y-%m-%d %H:%M")
+
+
+def op_cadastrar(clinica: Clinica, dados: dict) -> dict:
+    """Cadastra um paciente ou médico. dados['tipo'] = 'paciente' | 'medico'."""
+    from models.medico import Medico
+    from models.paciente import Paciente
+
+    tipo = dados.get("tipo")
+    if tipo == "paciente":
+        paciente = Paciente(nome=dados["nome"], cpf=dados["cpf"], telefone=dados["telefone"],
+                            plano_saude=dados["plano_saude"])
+        return {"tipo": tipo, "id": clinica.cadastrar_paciente(paciente)}
+    if tipo == "medico":
+        medico = Medico(nome=dados["nome"], cpf=dados["cpf"], telefone=dados["telefone"], crm=dados["crm"],
+                        especialidade=dados["especialidade"],
+                        regras_disponibilidade=dados.get("regras_disponibilidade") or {})
+        return {"tipo": tipo, "id": clinica.cadastrar_medico(medico)}
+    raise ValueError(f"Tipo de cadastro inválido: {tipo!r} (use 'paciente' ou 'medico').")
+
+
+def op_marcar(clinica: Clinica, dados: dict) -> dict:
+    """Marca uma consulta a partir de CPF/CRM (ou IDs), início e duração."""
+    agendamento = clinica.marcar_consulta(
+        id_paciente=_resolver_paciente(clinica, dados),
+        id_medico=_resolver_medico(clinica, dados),
+        inicio=_ler_data_hora(dados["inicio"]),
+        duracao_min=int(dados["duracao_minutos"]),
+    )
+    return {"id_agendamento": agendamento.id, "data_hora_inicio": agendamento.data_hora_inicio.isoformat(),
+            "duracao_minutos": agendamento.duracao_minutos, "status": agendamento.status}
+
+
+def op_cancelar(clinica: Clinica, dados: dict) -> dict:
+    """Cancela uma consulta pelo ID do agendamento (com 'versao', só se ela não mudou desde a leitura)."""
+    id_agendamento = int(dados["id_agendamento"])
+    versao = dados.get("versao")
+    clinica.cancelar_consulta(id_agendamento, int(versao) if versao is not None else None)
+    return {"id_agendamento": id_agendamento, "status": "Cancelado"}
+
+
+def op_excluir(clinica: Clinica, dados: dict) -> dict:
+    """Exclui (logicamente) um paciente (cpf_paciente/id_paciente) ou um médico (crm_medico/id_medico)."""
+    if dados.get("cpf_paciente") is not None or dados.get("id_paciente") is not None:
+        id_paciente = _resolver_paciente(clinica, dados)
+        clinica.excluir_paciente(id_paciente)
+        return {"tipo": "paciente", "id": id_paciente}
+    id_medico = _resolver_medico(clinica, dados)
+    clinica.excluir_medico(id_medico)
+    return {"tipo": "medico", "id": id_medico}
+
+
+def _meses_atras(meses: int) -> datetime:
+    """Meia-noite do mesmo dia, 'meses' meses atrás (dia ajustado ao fim do mês)."""
+    import calendar
+    from datetime import datetime
+
+    hoje = datetime.now()
+    ano, mes = divmod(hoje.year * 12 + hoje.month - 1 - meses, 12)
+    dia = min(hoje.day, calendar.monthrange(ano, mes + 1)[1])
+    return datetime(ano, mes + 1, dia)
+
+
+def op_listar(clinica: Clinica, dados: dict) -> dict:
+    """
+    Lista pacientes, médicos ou as consultas de um paciente (dados['alvo']).
+    Com 'resumo', pacientes/médicos vêm só com as colunas da listagem, em
+    páginas de 'limite' (repita com 'apos_id' = 'proximo_apos_id'; None = fim).
+    """
+    alvo = dados.get("alvo", "pacientes")
+    if dados.get("resumo") and alvo in ("pacientes", "medicos"):
+        from persistencia import COLUNAS_RESUMO_MEDICO, COLUNAS_RESUMO_PACIENTE
+
+        limite, apos_id = int(dados.get("limite", 100)), int(dados.get("apos_id") or 0)
+        if alvo == "pacientes":
+            colunas, pagina = COLUNAS_RESUMO_PACIENTE, clinica.listar_pacientes_resumo(limite, apos_id)
+        else:
+            colunas, pagina = COLUNAS_RESUMO_MEDICO, clinica.listar_medicos_resumo(limite, apos_id)
+        return {alvo: [dict(zip(colunas, linha)) for linha in pagina],
+                "proximo_apos_id": pagina[-1][0] if pagina else None}
+    if alvo == "pacientes":
+        return {"pacientes": [_paciente_para_dict(p) for p in clinica.listar_todos_pacientes()]}
+    if alvo == "medicos":
+        return {"medicos": [_medico_para_dict(m) for m in clinica.listar_todos_medicos()]}
+    if alvo == "consultas":
+        from datetime import date
+
+        consultas = clinica.consultar_agenda_paciente(
+            _resolver_paciente(clinica, dados), bool(dados.get("incluir_cancelados")),
+            date.fromisoformat(dados["de"]) if dados.get("de") else None,
+            date.fromisoformat(dados["ate"]) if dados.get("ate") else None)
+        return {"consultas": [_agendamento_para_dict(a) for a in consultas]}
+    raise ValueError(f"Alvo de listagem inválido: {alvo!r}.")
+
+
+def op_buscar(clinica: Clinica, dados: dict) -> dict:
+    """
+    Busca pacientes ou médicos por nome (e médicos por especialidade).
+    Para a próxima página, repita com 'apos_id' = 'proximo_apos_id' (None = fim).
+    """
+    alvo = dados.get("alvo", "pacientes")
+    limite = int(dados.get("limite", 20))
+    apos_id = int(dados.get("apos_id") or 0)
+    if alvo == "pacientes":
+        itens = [_paciente_para_dict(p) for p in clinica.buscar_pacientes(dados.get("texto", ""), limite, apos_id)]
+    elif alvo == "medicos":
+        itens = [_medico_para_dict(m) for m in clinica.buscar_medicos(dados.get("texto"), dados.get("especialidade"),
+                                                                       limite, apos_id)]
+    else:
+        raise ValueError(f"Alvo de busca inválido: {alvo!r}.")
+    return {alvo: itens, "proximo_apos_id": itens[-1]["id"] if itens else None}
+
+
+def op_agenda_medico(clinica: Clinica, dados: dict) -> dict:
+    """Lista a agenda de um médico (por CRM ou ID) em uma data."""
+    from datetime import date
+
+    data = date.fromisoformat(dados["data"])
+    consultas = clinica.consultar_agenda_medico(_resolver_medico(clinica, dados), data,
+                                                bool(dados.get("incluir_cancelados")))
+    return {"data": data.isoformat(), "consultas": [_agendamento_para_dict(a) for a in consultas]}
+
+
+def op_disponiveis(clinica: Clinica, dados: dict) -> dict:
+    """Médicos livres para uma consulta (inicio, duracao_minutos, especialidade opcional)."""
+    medicos = clinica.medicos_disponiveis(_ler_data_hora(dados["inicio"]), int(dados.get("duracao_minutos", 30)),
+                                          dados.get("especialidade"))
+    return {"medicos": [_medico_para_dict(m) for m in medicos]}
+
+
+def _medico_opcional(clinica: Clinica, dados: dict):
+    """ID do médico (por id_medico ou crm_medico), ou None quando nenhum dos dois veio."""
+    if dados.get("id_medico") is None and not dados.get("crm_medico"):
+        return None
+    return _resolver_medico(clinica, dados)
+
+
+def op_bloquear(clinica: Clinica, dados: dict) -> dict:
+    """
+    Bloqueia a agenda (férias, feriado...) entre inicio e fim: de um médico
+    (crm_medico/id_medico) ou, sem médico, da clínica inteira.
+    """
+    bloqueio = clinica.bloquear_agenda(_ler_data_hora(dados["inicio"]), _ler_data_hora(dados["fim"]),
+                                       _medico_opcional(clinica, dados), dados.get("motivo") or "")
+    return _bloqueio_para_dict(bloqueio)
+
+
+def op_desbloquear(clinica: Clinica, dados: dict) -> dict:
+    """Remove um bloqueio pelo ID."""
+    return _bloqueio_para_dict(clinica.desbloquear_agenda(int(dados["id_bloqueio"])))
+
+
+def op_bloqueios(clinica: Clinica, dados: dict) -> dict:
+    """Lista os bloqueios (de um médico, com os da clínica, ou todos), opcionalmente entre 'de' e 'ate'."""
+    from datetime import date
+
+    bloqueios = clinica.listar_bloqueios(
+        _medico_opcional(clinica, dados),
+        date.fromisoformat(dados["de"]) if dados.get("de") else None,
+        date.fromisoformat(dados["ate"]) if dados.get("ate") else None)
+    return {"bloqueios": [_bloqueio_para_dict(b) for b in bloqueios]}
+
+
+def op_capacidade(clinica: Clinica, dados: dict) -> dict:
+    """
+    Capacidade (consultas simultâneas). Com médico: define a dele se vier
+    'capacidade' (null volta à regra da especialidade) e retorna a que vale.
+    Com especialidade: define a regra (null remove). Sem nenhum: lista as regras.
+    """
+    id_medico = _medico_opcional(clinica, dados)
+    if id_medico is not None:
+        if "capacidade" in dados:
+            capacidade = dados["capacidade"]
+            clinica.definir_capacidade_medico(id_medico, int(capacidade) if capacidade is not None else None)
+        return {"id_medico": id_medico, "capacidade": clinica.capacidade_medico(id_medico)}
+    if dados.get("especialidade"):
+        capacidade = dados.get("capacidade")
+        clinica.definir_capacidade_especialidade(dados["especialidade"],
+                                                 int(capacidade) if capacidade is not None else None)
+        return {"especialidade": dados["especialidade"], "capacidade": capacidade}
+    return {"especialidades": [{"especialidade": e, "capacidade": c}
+                               for e, c in clinica.listar_capacidades_especialidades().items()]}
+
+
+def op_importar(clinica: Clinica, dados: dict) -> dict:
+    """
+    Importa um registro no formato gerado pelo 'export':
+    tipo = 'paciente' | 'medico' | 'agendamento'.
+    """
+    if dados.get("tipo") == "agendamento":
+        resultado = op_marcar(clinica, dados)
+        if str(dados.get("status", "")).casefold() == "cancelado":
+            resultado = op_cancelar(clinica, resultado)
+        return resultado
+    return op_cadastrar(clinica, dados)
+
+
+def op_espera(clinica: Clinica, dados: dict) -> dict:
+    """Coloca um paciente na lista de espera de uma especialidade."""
+    from datetime import date
+
+    pedido = clinica.adicionar_lista_espera(
+        id_paciente=_resolver_paciente(clinica, dados),
+        especialidade=dados["especialidade"],
+        data_inicio=date.fromisoformat(dados["data_inicio"]),
+        data_fim=date.fromisoformat(dados["data_fim"]),
+        duracao_min=int(dados["duracao_minutos"]),
+    )
+    return {"id_pedido": pedido.id, "status": pedido.status}
+
+
+def listagem_agenda_medico(clinica: Clinica, dados: dict):
+    """
+    Caminho rápido de op_agenda_medico para o modo serviço: retorna
+    (campos fixos, nome da lista, lotes de linhas) para serializacao.py.
+    """
+    from datetime import date
+
+    data = date.fromisoformat(dados["data"])
+    lotes = clinica.repo.iterar_agenda_medico(_resolver_medico(clinica, dados), data,
+                                              bool(dados.get("incluir_cancelados")))
+    return {"data": data.isoformat()}, "consultas", lotes
+
+
+def listagem_consultas(clinica: Clinica, dados: dict):
+    """
+    Caminho rápido de op_listar (alvo 'consultas'); None para os outros alvos.
+    As linhas vêm do cache de agendas da Clinica (as estatísticas de /saude).
+    """
+    from datetime import date
+
+    if dados.get("alvo", "pacientes") != "consultas":
+        return None
+    linhas = clinica.linhas_agenda_paciente(
+        _resolver_paciente(clinica, dados), bool(dados.get("incluir_cancelados")),
+        date.fromisoformat(dados["de"]) if dados.get("de") else None,
+        date.fromisoformat(dados["ate"]) if dados.get("ate") else None)
+    return {}, "consultas", (linhas,)
+
+
+# Operações cujas listas o servidor serializa direto das linhas do banco.
+LISTAGENS = {
+    "agenda-medico": listagem_agenda_medico,
+    "listar": listagem_consultas,
+}
+
+
+OPERACOES = {
+    "cadastrar": op_cadastrar,
+    "marcar": op_marcar,
+    "cancelar": op_cancelar,
+    "excluir": op_excluir,
+    "listar": op_listar,
+    "buscar": op_buscar,
+    "agenda-medico": op_agenda_medico,
+    "disponiveis": op_disponiveis,
+    "bloquear": op_bloquear,
+    "desbloquear": op_desbloquear,
+    "bloqueios": op_bloqueios,
+    "capacidade": op_capacidade,
+    "import": op_importar,
+    "espera": op_espera,
+}
+
+
+def exportar(clinica: Clinica, saida):
+    """Exporta pacientes, médicos e agendamentos em JSONL (compatível com 'import')."""
+    total = 0
+    pacientes = clinica.listar_todos_pacientes()
+    for p in pacientes:
+        _emitir(saida, {"tipo": "paciente", **_paciente_para_dict(p)})
+        total += 1
+    for m in clinica.listar_todos_medicos():
+        _emitir(saida, {"tipo": "medico", **_medico_para_dict(m)})
+        total += 1
+    # Agendamentos: um único cursor com JOIN, lido em lotes (sem N+1 por paciente).
+    for (id_agendamento, inicio, duracao, status, _, _, cpf_paciente, _,
+         _, _, crm_medico, _) in clinica.repo.iterar_agendamentos_completos():
+        _emitir(saida, {"tipo": "agendamento", "id_agendamento": id_agendamento, "cpf_paciente": cpf_paciente,
+                        "crm_medico": crm_medico, "inicio": inicio, "duracao_minutos": duracao,
+                        "status": status})
+        total += 1
+    return total
+
+
+def emitir_eventos(clinica: Clinica, saida, apos_seq: int = 0, consumidor: str = None,
+                   tamanho_lote: int = 1000) -> int:
+    """
+    Escreve em JSONL os eventos de agendamento posteriores a apos_seq.
+    Com 'consumidor', começa do último seq confirmado por ele e confirma
+    cada lote depois de escrevê-lo (entrega "pelo menos uma vez").
+    """
+    repo = clinica.repo
+    if consumidor:
+        apos_seq = max(apos_seq, repo.posicao_consumidor(consumidor))
+    total = 0
+    for lote in repo.iterar_eventos(apos_seq, tamanho_lote):
+        for evento in lote:
+            _emitir(saida, evento)
+        saida.flush()
+        if consumidor:
+            repo.confirmar_eventos(consumidor, lote[-1]["seq"])
+        total += len(lote)
+    return total
+
+
+def gerar_relatorio(clinica: Clinica, formato: str, caminho_saida: str, saida) -> int:
+    """Exporta os agendamentos completos (com paciente e médico) para relatórios."""
+    import exportacao
+
+    if formato == "colunar":
+        if caminho_saida == "-":
+            raise ValueError("O formato colunar precisa de um arquivo em --saida.")
+        return exportacao.exportar_colunar(clinica.repo, caminho_saida)
+    if formato == "csv":
+        return exportacao.exportar_csv(clinica.repo, saida)
+    return exportacao.exportar_jsonl(clinica.repo, saida)
+
+
+def executar_operacoes(clinica: Clinica, operacoes, saida, relatorio=sys.stderr) -> int:
+    """
+    Executa uma sequência de (nome_operacao, dados), escrevendo um resultado
+    JSONL por operação. Erros de negócio não interrompem o lote.
+    Retorna o número de operações com erro.
+    """
+    import sqlite3
+
+    total = erros = 0
+    inicio = time.perf_counter()
+    operacoes = iter(operacoes)
+    # Os models imprimem mensagens (ex: Agendamento.cancelar); elas vão para o
+    # relatório para não misturar texto livre com o JSONL da saída. A troca é
+    # feita à mão (sem contextlib.redirect_stdout) para não pesar na inicialização.
+    stdout_original, sys.stdout = sys.stdout, relatorio
+    try:
+        while True:
+            nome = None
+            try:
+                # A leitura da entrada também fica no try: um erro nela (arquivo
+                # inexistente, array inválido) vira um resultado de erro.
+                item = next(operacoes, None)
+                if item is None:
+                    break
+                nome, dados = item
+                if isinstance(dados, ValueError):
+                    raise dados  # Registro da entrada que não é JSON válido
+                funcao = OPERACOES.get(nome)
+                if funcao is None:
+                    raise ValueError(f"Operação desconhecida: {nome!r}.")
+                resultado = {"op": nome, "ok": True, **funcao(clinica, dados)}
+            except (ValueError, KeyError, TypeError, OSError, sqlite3.Error) as e:
+                erros += 1
+                resultado = {"op": nome, "ok": False, "erro": str(e)}
+            total += 1
+            _emitir(saida, resultado)
+    finally:
+        sys.stdout = stdout_original
+    decorrido = time.perf_counter() - inicio
+    taxa = total / decorrido if decorrido > 0 else 0.0
+    print(f"{total} operações em {decorrido:.3f}s ({taxa:.1f} ops/s), {erros} com erro.", file=relatorio)
+    return erros
+
+
+def _operacoes_do_comando(args):
+    """Converte os argumentos de um subcomando em (nome_operacao, dados)."""
+    if args.comando == "listar" and (args.alvo != "consultas" or args.cpf):
+        yield "listar", {"alvo": args.alvo, "cpf_paciente": args.cpf, "incluir_cancelados": args.com_cancelados,
+                         "de": args.de, "ate": args.ate, "resumo": args.resumo, "limite": args.limite,
+                         "apos_id": args.apos_id}
+        return
+    if args.comando == "buscar":
+        yield "buscar", {"alvo": args.alvo, "texto": " ".join(args.texto), "especialidade": args.especialidade,
+                         "limite": args.limite, "apos_id": args.apos_id}
+        return
+    if args.comando == "agenda-medico" and args.crm and args.data:
+        yield "agenda-medico", {"crm_medico": args.crm, "data": args.data,
+                                "incluir_cancelados": args.com_cancelados}
+        return
+    if args.comando == "disponiveis" and args.inicio:
+        yield "disponiveis", {"inicio": args.inicio, "duracao_minutos": args.duracao,
+                              "especialidade": args.especialidade}
+        return
+    if args.comando == "bloquear" and args.inicio and args.fim:
+        yield "bloquear", {"crm_medico": args.crm, "inicio": args.inicio, "fim": args.fim, "motivo": args.motivo}
+        return
+    if args.comando == "desbloquear" and args.id is not None:
+        yield "desbloquear", {"id_bloqueio": args.id}
+        return
+    if args.comando == "bloqueios":
+        yield "bloqueios", {"crm_medico": args.crm, "de": args.de, "ate": args.ate}
+        return
+    if args.comando == "capacidade":
+        dados = {"crm_medico": args.crm, "especialidade": args.especialidade}
+        if args.padrao or args.valor is not None:
+            dados["capacidade"] = None if args.padrao else args.valor
+        yield "capacidade", dados
+        return
+    if args.comando == "excluir" and (args.cpf or args.crm):
+        yield "excluir", {"cpf_paciente": args.cpf} if args.cpf else {"crm_medico": args.crm}
+        return
+    if args.comando == "cancelar" and args.id is not None:
+        yield "cancelar", {"id_agendamento": args.id, "versao": args.versao}
+        return
+    for dados in _ler_registros(args.arquivo):
+        if isinstance(dados, ValueError):
+            yield args.comando, dados
+            continue
+        if args.comando == "cadastrar" and args.tipo:
+            dados.setdefault("tipo", args.tipo)
+        if args.comando == "listar":
+            dados.setdefault("alvo", args.alvo)
+        yield args.comando, dados
+
+
+def _operacoes_do_batch(caminho: str):
+    """No modo --batch cada registro traz o nome da operação em 'op'."""
+    for dados in _ler_registros(caminho):
+        yield (None, dados) if isinstance(dados, ValueError) else (dados.pop("op", None), dados)
+
+
+def criar_parser() -> argparse.ArgumentParser:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Sistema de Agendamento de Clínica. Sem argumentos, abre o menu interativo.")
+    parser.add_argument("--db", default=db_path, help="caminho do banco SQLite (padrão: clinica.db)")
+    parser.add_argument("--batch", metavar="ARQUIVO", nargs="?", const="-",
+                        help="processa um fluxo JSONL de operações ({'op': 'marcar', ...}); '-' = stdin")
+    parser.add_argument("--saida", default="-", help="arquivo de saída JSONL ('-' = stdout)")
+    parser.add_argument("--somente-leitura", action="store_true",
+                        help="abre --db como snapshot congelado (ver 'snapshot'); só consultas")
+    sub = parser.add_subparsers(dest="comando")
+
+    def com_entrada(nome, ajuda):
+        p = sub.add_parser(nome, help=ajuda)
+        p.add_argument("arquivo", nargs="?", default="-", help="arquivo JSON/JSONL ('-' = stdin)")
+        return p
+
+    com_entrada("cadastrar", "cadastra pacientes/médicos").add_argument(
+        "--tipo", choices=["paciente", "medico"], help="tipo padrão dos registros")
+    com_entrada("marcar", "marca consultas (cpf_paciente, crm_medico, inicio, duracao_minutos)")
+    p = com_entrada("cancelar", "cancela consultas (id_agendamento, versao opcional)")
+    p.add_argument("--id", type=int)
+    p.add_argument("--versao", type=int, help="falha se a consulta mudou desde esta versão")
+    p = com_entrada("excluir", "exclui pacientes (cpf_paciente) ou médicos (crm_medico); cancela as consultas futuras")
+    p.add_argument("--cpf", help="CPF do paciente")
+    p.add_argument("--crm", help="CRM do médico")
+    p = com_entrada("listar", "lista pacientes, médicos ou consultas de um paciente")
+    p.add_argument("alvo", choices=["pacientes", "medicos", "consultas"])
+    p.add_argument("--cpf", help="CPF do paciente (alvo 'consultas')")
+    p.add_argument("--com-cancelados", action="store_true", help="inclui as consultas canceladas")
+    p.add_argument("--de", help="YYYY-MM-DD: só consultas a partir desta data")
+    p.add_argument("--ate", help="YYYY-MM-DD: só consultas até esta data")
+    p.add_argument("--resumo", action="store_true",
+                   help="pacientes/médicos só com ID, nome, CPF/CRM e plano/especialidade, paginados")
+    p.add_argument("--limite", type=int, default=100, help="itens por página (com --resumo)")
+    p.add_argument("--apos-id", type=int, default=0, help="continua depois deste ID (com --resumo)")
+    p = sub.add_parser("buscar", help="busca pacientes/médicos por nome (sem diferenciar acentos)")
+    p.add_argument("alvo", choices=["pacientes", "medicos"])
+    p.add_argument("texto", nargs="*", help="começo das palavras do nome")
+    p.add_argument("--especialidade", help="filtra médicos pela especialidade")
+    p.add_argument("--limite", type=int, default=20)
+    p.add_argument("--apos-id", type=int, default=0, help="continua a partir deste ID (paginação)")
+    p = com_entrada("agenda-medico", "agenda de um médico em uma data")
+    p.add_argument("--crm")
+    p.add_argument("--data", help="YYYY-MM-DD")
+    p.add_argument("--com-cancelados", action="store_true", help="inclui as consultas canceladas")
+    p = com_entrada("disponiveis", "médicos livres num horário (pelo expediente e pelas consultas)")
+    p.add_argument("--inicio", help="YYYY-MM-DD HH:MM")
+    p.add_argument("--duracao", type=int, default=30, help="minutos (padrão: 30)")
+    p.add_argument("--especialidade")
+    p = com_entrada("bloquear", "bloqueia a agenda de um médico (ou, sem --crm, da clínica): férias, feriados")
+    p.add_argument("--crm")
+    p.add_argument("--inicio", help="YYYY-MM-DD HH:MM")
+    p.add_argument("--fim", help="YYYY-MM-DD HH:MM")
+    p.add_argument("--motivo", default="")
+    com_entrada("desbloquear", "remove bloqueios (id_bloqueio)").add_argument("--id", type=int)
+    p = sub.add_parser("bloqueios", help="lista os bloqueios de um médico (com os da clínica) ou todos")
+    p.add_argument("--crm")
+    p.add_argument("--de", help="YYYY-MM-DD: só bloqueios a partir desta data")
+    p.add_argument("--ate", help="YYYY-MM-DD: só bloqueios até esta data")
+    p = sub.add_parser("capacidade", help="consultas simultâneas de um médico (--crm) ou de uma "
+                                          "especialidade; sem opções, lista as regras")
+    p.add_argument("--crm")
+    p.add_argument("--especialidade")
+    p.add_argument("--valor", type=int, help="nova capacidade (sem --valor: só mostra a do médico)")
+    p.add_argument("--padrao", action="store_true", help="remove a capacidade própria / a regra")
+    com_entrada("import", "importa registros gerados pelo 'export'")
+    com_entrada("espera", "entra na lista de espera (cpf_paciente, especialidade, data_inicio, data_fim, "
+                          "duracao_minutos)")
+    sub.add_parser("resolver-espera", help="marca consultas para a lista de espera").add_argument(
+        "--workers", type=int, help="processos usados no cálculo (padrão: nº de CPUs)")
+    sub.add_parser("export", help="exporta todos os dados em JSONL")
+    p = sub.add_parser("eventos", help="emite em JSONL as mudanças de agendamentos (change feed)")
+    p.add_argument("--apos", type=int, default=0, help="só eventos com seq maior que este")
+    p.add_argument("--consumidor", help="continua de onde este consumidor parou e confirma o que foi emitido")
+    p.add_argument("--lote", type=int, default=1000, help="eventos por consulta ao banco")
+    sub.add_parser("relatorio", help="exporta os agendamentos com paciente e médico").add_argument(
+        "--formato", choices=["csv", "jsonl", "colunar"], default="csv")
+    p = sub.add_parser("arquivar", help="move consultas encerradas antigas para o banco de arquivo")
+    p.add_argument("--meses", type=int, default=12, help="arquiva consultas com mais de N meses (padrão: 12)")
+    p.add_argument("--lote", type=int, default=1000, help="consultas movidas por transação")
+    p = sub.add_parser("purgar", help="apaga de vez os cadastros excluídos e as consultas deles")
+    p.add_argument("--dias", type=int, default=0, help="só os excluídos há mais de N dias")
+    p.add_argument("--sem-arquivo", action="store_true", help="apaga as consultas em vez de arquivá-las")
+    p.add_argument("--lote", type=int, default=500, help="linhas por transação")
+    p = sub.add_parser("manutencao", help="confere a integridade, acha consultas órfãs, atualiza as estatísticas "
+                                          "e devolve o espaço livre do arquivo")
+    p.add_argument("--paginas", type=int, help="no máximo N páginas livres devolvidas (padrão: todas)")
+    p.add_argument("--converter", action="store_true",
+                   help="banco antigo: liga o auto_vacuum incremental com um VACUUM completo (trava o banco)")
+    p.add_argument("--repeticoes", type=int, default=20, help="execuções de cada consulta medida antes/depois")
+    p = sub.add_parser("fechar-dia", help="marca como realizadas as consultas do dia que já terminaram")
+    p.add_argument("--data", help="YYYY-MM-DD (padrão: hoje)")
+    p.add_argument("--ate", help="YYYY-MM-DD: fecha todos os dias de --data até esta data (reprocessamento)")
+    p = sub.add_parser("servir", help="atende as operações por HTTP/JSON (várias recepções ao mesmo tempo)")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--porta", type=int, default=8080)
+    p.add_argument("--workers", type=int, default=8, help="threads de atendimento (cada uma com sua conexão)")
+    p.add_argument("--fila", type=int, help="conexões que esperam um worker livre; as demais recebem 503 "
+                                            "(padrão: igual a --workers)")
+    p.add_argument("--verboso", action="store_true", help="registra cada requisição no stderr")
+    p = sub.add_parser("gerar-dados", help="popula o banco com dados sintéticos reprodutíveis (testes de escala)")
+    p.add_argument("--pacientes", type=int, default=50_000)
+    p.add_argument("--medicos", type=int, default=200)
+    p.add_argument("--consultas", type=int, default=1_000_000)
+    p.add_argument("--inicio", default="2024-01-01", help="YYYY-MM-DD: primeiro dia de consultas")
+    p.add_argument("--semente", type=int, default=42, help="mesma semente e parâmetros = mesmo banco")
+    p = sub.add_parser("snapshot", help="grava uma cópia do banco para relatórios")
+    p.add_argument("destino")
+    p.add_argument("--compactar", action="store_true", help="usa VACUUM INTO (arquivo menor, mais lento)")
+    return parser
+
+
+def main_cli(argv=None) -> int:
+    """Ponto de entrada não interativo. Retorna o código de saída do processo."""
+    args = criar_parser().parse_args(argv)
+    if args.comando is None and not args.batch:
+        main(args.db)  # Só opções globais (ex: --db): o menu interativo nesse banco
+        return 0
+
+    from persistencia import AgendaRepository
+    from models.clinica import Clinica
+
+    try:
+        repo = AgendaRepository(args.db, somente_leitura=args.somente_leitura)
+    except FileNotFoundError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+    clinica = Clinica(repo)
+    if args.comando == "servir":
+        from servidor import servir
+
+        try:
+            servir(clinica, OPERACOES, args.host, args.porta, args.workers, args.verboso, LISTAGENS,
+                   args.fila)
+        finally:
+            repo.fechar()
+        return 0
+    if args.comando == "relatorio" and args.formato == "colunar":
+        saida = None  # O exportador colunar escreve direto no arquivo
+    elif args.saida == "-":
+        saida = sys.stdout
+    else:
+        saida = open(args.saida, "w", encoding="utf-8", newline="")
+    try:
+        if args.batch:
+            return 1 if executar_operacoes(clinica, _operacoes_do_batch(args.batch), saida) else 0
+        if args.comando == "snapshot":
+            inicio = time.perf_counter()
+            try:
+                repo.criar_snapshot(args.destino, compactar=args.compactar)
+            except FileExistsError as e:
+                print(f"Erro: {e}", file=sys.stderr)
+                return 1
+            print(f"Snapshot gravado em {args.destino} ({time.perf_counter() - inicio:.3f}s).", file=sys.stderr)
+            return 0
+        if args.comando == "gerar-dados":
+            from datetime import date
+            from dados_sinteticos import GeradorDados
+
+            inicio = time.perf_counter()
+            gerador = GeradorDados(args.semente, pacientes=args.pacientes, medicos=args.medicos,
+                                   consultas=args.consultas, data_inicio=date.fromisoformat(args.inicio))
+            _emitir(saida, gerador.popular(repo))
+            print(f"Dados gerados em {time.perf_counter() - inicio:.3f}s.", file=sys.stderr)
+            return 0
+        if args.comando == "resolver-espera":
+            from lista_espera import OtimizadorListaEspera
+
+            resumo = OtimizadorListaEspera(clinica, max_workers=args.workers).executar()
+            _emitir(saida, resumo)
+            return 0
+        if args.comando == "export":
+            inicio = time.perf_counter()
+            total = exportar(clinica, saida)
+            print(f"{total} registros exportados em {time.perf_counter() - inicio:.3f}s.", file=sys.stderr)
+            return 0
+        if args.comando == "arquivar":
+            inicio = time.perf_counter()
+            corte = _meses_atras(args.meses)
+            total = repo.arquivar_agendamentos(corte, args.lote)
+            print(f"{total} consultas anteriores a {corte:%Y-%m-%d} arquivadas em {repo.caminho_arquivo} "
+                  f"({time.perf_counter() - inicio:.3f}s).", file=sys.stderr)
+            return 0
+        if args.comando == "purgar":
+            from datetime import datetime, timedelta
+
+            resumo = repo.purgar_excluidos(datetime.now() - timedelta(days=args.dias),
+                                           arquivar=not args.sem_arquivo, tamanho_lote=args.lote)
+            _emitir(saida, resumo)
+            return 0
+        if args.comando == "manutencao":
+            import manutencao
+
+            inicio = time.perf_counter()
+            relatorio = manutencao.executar(repo, args.paginas, args.converter, args.repeticoes)
+            _emitir(saida, relatorio)
+            print(f"Manutenção em {time.perf_counter() - inicio:.3f}s.", file=sys.stderr)
+            return 1 if manutencao.com_problemas(relatorio) else 0
+        if args.comando == "fechar-dia":
+            from datetime import date
+
+            inicio = time.perf_counter()
+            data = date.fromisoformat(args.data) if args.data else date.today()
+            por_medico = clinica.fechar_dia(data, date.fromisoformat(args.ate) if args.ate else None)
+            _emitir(saida, {"consultas": sum(por_medico.values()),
+                            "por_medico": {str(m): n for m, n in sorted(por_medico.items())}})
+            print(f"Dia fechado em {time.perf_counter() - inicio:.3f}s.", file=sys.stderr)
+            return 0
+        if args.comando == "eventos":
+            total = emitir_eventos(clinica, saida, args.apos, args.consumidor, args.lote)
+            print(f"{total} eventos emitidos.", file=sys.stderr)
+            return 0
+        if args.comando == "relatorio":
+            inicio = time.perf_counter()
+            try:
+                total = gerar_relatorio(clinica, args.formato, args.saida, saida)
+            except ValueError as e:
+                print(f"Erro: {e}", file=sys.stderr)
+                return 1
+            print(f"{total} agendamentos exportados em {time.perf_counter() - inicio:.3f}s.", file=sys.stderr)
+            return 0
+        return 1 if executar_operacoes(clinica, _operacoes_do_comando(args), saida) else 0
+    finally:
+        if saida is not None and saida is not sys.stdout:
+            saida.close()
+        repo.fechar()
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(main_cli())
     main()
\ No newline at end of file
@@ -0,0 +1,96 @@
+"""
+MANUTENÇÃO do banco (subcomando 'manutencao').
+
+Com o tempo, exclusões, arquivamentos e purgas deixam páginas livres no
+arquivo, e as estatísticas do planejador envelhecem. A manutenção roda, em
+ordem:
+
+  1. PRAGMA integrity_check e foreign_key_check;
+  2. a busca de consultas ÓRFÃS (paciente/médico inexistente ou excluído);
+  3. ANALYZE, para o planejador escolher bem os índices;
+  4. PRAGMA incremental_vacuum, que devolve as páginas livres ao sistema
+     (bancos antigos só com converter=True, que faz um VACUUM completo);
+  5. PRAGMA optimize.
+
+Antes e depois são medidas as páginas do arquivo e o tempo de algumas
+consultas típicas da recepção (mediana de várias repetições), para o
+relatório mostrar o efeito.
+"""
+import statistics
+import time
+from datetime import timedelta
+
+from persistencia import AgendaRepository
+
+# Repetições de cada consulta típica; o relatório usa a mediana.
+REPETICOES = 20
+
+
+def consultas_tipicas(repo: AgendaRepository) -> dict:
+    """{nome: função sem argumentos} com as consultas medidas antes e depois."""
+    amostra = repo.buscar_consulta_recente()
+    consultas = {
+        "listar_pacientes": lambda: repo.listar_pacientes_resumo(100),
+        "listar_medicos": lambda: repo.listar_medicos_resumo(100),
+    }
+    if amostra is not None:
+        id_medico, inicio, id_paciente = amostra
+        dia = inicio.date()
+        consultas.update({
+            "agenda_medico": lambda: repo.buscar_agendamentos_por_medico_e_data(id_medico, dia.isoformat()),
+            "agenda_paciente": lambda: repo.buscar_agendamentos_por_paciente(id_paciente),
+            "intervalos_semana": lambda: repo.buscar_intervalos_ocupados_medico(
+                id_medico, dia, dia + timedelta(days=6)),
+            "medicos_disponiveis": lambda: repo.buscar_medicos_disponiveis(inicio, 30),
+        })
+    return consultas
+
+
+def medir_consultas(consultas: dict, repeticoes: int = REPETICOES) -> dict:
+    """Mediana, em milissegundos, de 'repeticoes' execuções de cada consulta."""
+    tempos = {}
+    for nome, consulta in consultas.items():
+        consulta()  # Aquecimento: prepara o statement (de novo, depois do ANALYZE)
+        amostras = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            consulta()
+            amostras.append(time.perf_counter() - inicio)
+        tempos[nome] = round(statistics.median(amostras) * 1000, 3)
+    return tempos
+
+
+def executar(repo: AgendaRepository, paginas: int = None, converter: bool = False,
+             repeticoes: int = REPETICOES) -> dict:
+    """
+    Roda a manutenção completa e retorna o relatório: integridade, órfãs,
+    páginas e tempos antes/depois e a duração de cada etapa (segundos).
+    paginas/converter vão para AgendaRepository.compactar.
+    """
+    consultas = consultas_tipicas(repo)
+    relatorio = {"antes": {"paginas": repo.estatisticas_paginas(),
+                           "consultas_ms": medir_consultas(consultas, repeticoes)}}
+    etapas = {}
+
+    def etapa(nome, funcao, *args):
+        inicio = time.perf_counter()
+        resultado = funcao(*args)
+        etapas[nome] = round(time.perf_counter() - inicio, 3)
+        return resultado
+
+    relatorio.update(etapa("integridade", repo.verificar_integridade))
+    relatorio["orfaos"] = etapa("orfaos", repo.buscar_agendamentos_orfaos)
+    etapa("analyze", repo.analisar)
+    relatorio["paginas_liberadas"] = etapa("vacuum", repo.compactar, paginas, converter)
+    etapa("optimize", repo.otimizar)
+
+    relatorio["depois"] = {"paginas": repo.estatisticas_paginas(),
+                           "consultas_ms": medir_consultas(consultas, repeticoes)}
+    relatorio["etapas_s"] = etapas
+    return relatorio
+
+
+def com_problemas(relatorio: dict) -> bool:
+    """True se a manutenção achou corrupção, furos de chave estrangeira ou órfãs sem cadastro."""
+    inexistentes = sum(n for motivo, n in relatorio["orfaos"]["por_motivo"].items() if "inexistente" in motivo)
+    return bool(relatorio["integridade"] or relatorio["chaves_estrangeiras"] or inexistentes)
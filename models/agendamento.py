@@ -11,6 +11,20 @@ class Agendamento:
     Ela também protege seus dados internos (ENCAPSULAMENTO).
     """
 
+    # Status possíveis (no banco viram códigos inteiros; veja persistencia.py).
+    AGENDADO = "Agendado"
+    CANCELADO = "Cancelado"
+    REALIZADO = "Realizado"
+
+    @staticmethod
+    def normalizar_status(value):
+        """Grafia canônica de um status conhecido ("agendado" -> "Agendado")."""
+        if isinstance(value, str):
+            for status in (Agendamento.AGENDADO, Agendamento.CANCELADO, Agendamento.REALIZADO):
+                if value.strip().casefold() == status.casefold():
+                    return status
+        return value
+
     def __init__(self, paciente: Paciente, medico: Medico, data_hora_inicio: datetime, duracao_minutos: int):
         
         # --- COMPOSIÇÃO ---
@@ -29,6 +43,8 @@ class Agendamento:
         # PELA CAMADA DE LÓGICA (CLINICA) OU DE PERSISTÊNCIA (AO LER DO BANCO).
         # POR ISSO, O STATUS COMEÇA COMO 'None'.
         self._status = None 
+        # Versão da linha no banco (controle de concorrência otimista).
+        self._versao = None
 
     # --- Propriedades (Getters) ---
     
@@ -64,6 +80,10 @@ class Agendamento:
     def id(self):
         return self._id
 
+    @property
+    def versao(self):
+        return self._versao
+
     # --- Setters (Usados pela Lógica e Persistência) ---
 
     @id.setter
@@ -71,6 +91,11 @@ class Agendamento:
         """Usado pela persistência para setar o ID do banco."""
         self._id = value
 
+    @versao.setter
+    def versao(self, value: int):
+        """Usado pela persistência: versão lida do banco (ou a nova, após gravar)."""
+        self._versao = value
+
     @status.setter
     def status(self, value: str):
         """
@@ -83,14 +108,14 @@ class Agendamento:
         (ao ler do banco) POSSAM DEFINIR O STATUS.
         """
         """Usado pela Clinica ou Repositório para definir o status."""
-        self._status = value
+        self._status = Agendamento.normalizar_status(value)
     
     def cancelar(self):
         """
         Este método ENCAPSULA a lógica de cancelamento.
         """
         print(f"Agendamento em {self._data_hora_inicio} cancelado.")
-        self._status = "Cancelado"
+        self._status = Agendamento.CANCELADO
 
     def confirmar_realizacao(self):
         """
@@ -98,4 +123,4 @@ class Agendamento:
         Encapsula a mudança de status.
         """
         print(f"Agendamento em {self._data_hora_inicio} realizado.")
-        self._status = "Realizado"
\ No newline at end of file
+        self._status = Agendamento.REALIZADO
\ No newline at end of file
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta
+
+
+class Bloqueio:
+    """
+    CLASSE DE ENCAPSULAMENTO
+
+    Representa uma EXCEÇÃO à disponibilidade: férias, congresso, feriado...
+    Durante [inicio, fim) o médico não atende, mesmo dentro do expediente.
+    Sem id_medico o bloqueio vale para a clínica inteira (feriado).
+    """
+
+    def __init__(self, inicio: datetime, fim: datetime, id_medico: int | None = None, motivo: str = ""):
+        if fim <= inicio:
+            raise ValueError("O fim do bloqueio deve ser posterior ao início.")
+
+        # --- ENCAPSULAMENTO ---
+        self._id = None  # Para ser setado pela persistência
+        self._id_medico = id_medico
+        self._inicio = inicio
+        self._fim = fim
+        self._motivo = motivo or ""
+
+    # --- Propriedades (Getters) ---
+
+    @property
+    def id(self):
+        return self._id
+
+    @id.setter
+    def id(self, value: int):
+        """Usado pela persistência para setar o ID do banco."""
+        self._id = value
+
+    @property
+    def id_medico(self):
+        return self._id_medico
+
+    @id_medico.setter
+    def id_medico(self, value: int):
+        """Usado pela persistência com shards (ID local <-> global)."""
+        self._id_medico = value
+
+    @property
+    def inicio(self):
+        return self._inicio
+
+    @property
+    def fim(self):
+        return self._fim
+
+    @property
+    def motivo(self):
+        return self._motivo
+
+    @property
+    def da_clinica(self) -> bool:
+        return self._id_medico is None
+
+    def por_dia(self, data_inicio: date, data_fim: date) -> list[tuple[date, int, int]]:
+        """
+        O bloqueio recortado em dias entre data_inicio e data_fim (inclusive):
+        (dia, inicio_min, fim_min), com os minutos contados da meia-noite.
+        """
+        faixas = []
+        dia = max(self._inicio.date(), data_inicio)
+        ultimo = min((self._fim - timedelta(microseconds=1)).date(), data_fim)
+        while dia <= ultimo:
+            meia_noite = datetime.combine(dia, time.min)
+            inicio = max(self._inicio, meia_noite) - meia_noite
+            fim = min(self._fim, meia_noite + timedelta(days=1)) - meia_noite
+            # Arredonda para fora: um bloqueio até 10:00:30 ocupa o minuto 10:00.
+            faixas.append((dia, inicio // timedelta(minutes=1), -(-fim // timedelta(minutes=1))))
+            dia += timedelta(days=1)
+        return faixas
+
+    def __str__(self):
+        alvo = "Clínica inteira" if self.da_clinica else f"Médico {self._id_medico}"
+        return (f"Bloqueio {self._id}: {alvo}, {self._inicio:%Y-%m-%d %H:%M} até {self._fim:%Y-%m-%d %H:%M}"
+                + (f" ({self._motivo})" if self._motivo else ""))
@@ -0,0 +1,127 @@
+"""
+Cache das agendas de pacientes ("minhas consultas"), na memória do processo.
+
+Cada paciente tem um contador de VERSÃO, incrementado (invalidar) pela
+Clinica em toda escrita que toca a agenda dele: marcar, cancelar, confirmar,
+excluir o paciente, mudar o cadastro. Uma agenda guardada só é servida
+enquanto a versão com que foi lida for a versão atual, então o acerto é um
+acesso a dict, sem SQL e sem montar objetos.
+
+A versão é lida ANTES da consulta ao banco (versao()) e conferida ao guardar:
+se uma escrita terminar no meio da consulta, o resultado (talvez antigo) é
+descartado em vez de ficar no cache.
+
+Escritas em massa que não dizem os pacientes (fechar o dia, excluir um
+médico) invalidam tudo: incrementam a GERAÇÃO, que faz parte da versão de
+todos os pacientes. O mesmo acontece quando há versões de pacientes demais
+guardadas (max_versoes): tirar só algumas as faria voltar a zero, e uma
+leitura iniciada antes da escrita passaria na conferência.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Agenda:
+    """Uma agenda guardada e a versão (geração, versão do paciente) com que foi lida."""
+
+    __slots__ = ("versao", "consultas", "criado_em")
+
+    def __init__(self, versao: tuple[int, int], consultas: tuple):
+        self.versao = versao
+        self.consultas = consultas
+        self.criado_em = time.monotonic()
+
+
+class CacheAgendaPaciente:
+    """
+    Agendas por (id_paciente, incluir_cancelados, data_inicio, data_fim), de
+    Agendamentos ou, com "linhas" no fim da chave, de linhas do banco
+    (Clinica.linhas_agenda_paciente).
+
+    Limites de memória: no máximo max_agendas agendas e max_consultas
+    consultas somadas; passando disso saem as usadas há mais tempo (LRU).
+    Agendas maiores que max_consultas nem entram. Passando de max_versoes
+    pacientes com versão, o cache recomeça numa geração nova.
+
+    As consultas devolvidas são os MESMOS objetos para todos os leitores:
+    não altere os Agendamentos de uma agenda em cache.
+
+    Como no MapaDisponibilidade, gravações de OUTRO processo no mesmo banco
+    não passam pela Clinica; por isso cada agenda expira após ttl_segundos.
+    """
+
+    def __init__(self, max_agendas: int = 10_000, max_consultas: int = 200_000,
+                 ttl_segundos: float | None = 60.0, max_versoes: int = 100_000):
+        self.max_agendas = max_agendas
+        self.max_consultas = max_consultas
+        self.max_versoes = max_versoes
+        self.ttl_segundos = ttl_segundos
+        self._agendas: "OrderedDict[tuple, _Agenda]" = OrderedDict()
+        self._versoes: dict[int, int] = {}
+        self._geracao = 0
+        self._total_consultas = 0
+        self._trava = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+        self.descartes = 0  # Agendas tiradas para respeitar os limites
+
+    def versao(self, id_paciente: int) -> tuple[int, int]:
+        """Versão atual da agenda do paciente; leia antes de consultar o banco."""
+        return self._geracao, self._versoes.get(id_paciente, 0)
+
+    def obter(self, chave: tuple) -> list | None:
+        """As consultas guardadas para a chave, ou None se não houver agenda válida."""
+        with self._trava:
+            item = self._agendas.get(chave)
+            if item is not None:
+                if item.versao == self.versao(chave[0]) and (
+                        self.ttl_segundos is None or time.monotonic() - item.criado_em < self.ttl_segundos):
+                    self._agendas.move_to_end(chave)
+                    self.acertos += 1
+                    return list(item.consultas)
+                self._remover(chave)
+            self.faltas += 1
+            return None
+
+    def guardar(self, chave: tuple, versao: tuple[int, int], consultas: list) -> None:
+        """Guarda a agenda lida com 'versao', se ela ainda for a atual."""
+        if len(consultas) > self.max_consultas:
+            return
+        with self._trava:
+            if versao != self.versao(chave[0]):
+                return  # Houve escrita durante a leitura
+            if chave in self._agendas:
+                self._remover(chave)
+            self._agendas[chave] = _Agenda(versao, tuple(consultas))
+            self._total_consultas += len(consultas)
+            while len(self._agendas) > self.max_agendas or self._total_consultas > self.max_consultas:
+                self._remover(next(iter(self._agendas)))
+                self.descartes += 1
+
+    def _remover(self, chave: tuple) -> None:
+        self._total_consultas -= len(self._agendas.pop(chave).consultas)
+
+    def invalidar(self, id_paciente: int | None = None) -> None:
+        """Incrementa a versão de um paciente (ou, sem ID, a geração: todos)."""
+        with self._trava:
+            if id_paciente is not None:
+                self._versoes[id_paciente] = self._versoes.get(id_paciente, 0) + 1
+                if len(self._versoes) <= self.max_versoes:
+                    return
+                self.descartes += len(self._agendas)
+            # A geração nova já difere de toda versão lida antes: as versões
+            # por paciente podem recomeçar do zero.
+            self._geracao += 1
+            self._versoes.clear()
+            self._agendas.clear()
+            self._total_consultas = 0
+
+    def estatisticas(self) -> dict:
+        """Acertos, faltas, taxa de acerto, descartes e ocupação atual."""
+        leituras = self.acertos + self.faltas
+        return {"acertos": self.acertos, "faltas": self.faltas,
+                "taxa_acerto": round(self.acertos / leituras, 4) if leituras else None,
+                "descartes": self.descartes, "agendas": len(self._agendas), "consultas": self._total_consultas}
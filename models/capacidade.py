@@ -0,0 +1,46 @@
+"""
+CAPACIDADE de atendimento: quantas consultas um médico pode ter ao mesmo
+tempo (sessões em grupo, duas salas de exame...). O padrão é 1, ou seja,
+qualquer sobreposição é conflito.
+
+A regra vale por médico (medicos.capacidade) e, se o médico não tiver a
+sua, pela especialidade (capacidade_especialidades). Veja
+AgendaRepository.capacidade_medico.
+
+A conferência não compara as consultas duas a duas: é uma VARREDURA dos
+eventos (início: +1, fim: -1) das consultas que tocam o horário pedido, em
+ordem, guardando o maior número simultâneo. O(k log k) para k consultas.
+"""
+from __future__ import annotations
+
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+
+CAPACIDADE_PADRAO = 1
+
+
+def pico_simultaneo(intervalos: Iterable[tuple[datetime, int]], inicio: datetime, fim: datetime) -> int:
+    """
+    Maior número de consultas simultâneas dentro de [inicio, fim).
+    intervalos: (início, duração em minutos), como em buscar_intervalos_ocupados_medico.
+    """
+    eventos = []
+    for comeco, duracao in intervalos:
+        termino = comeco + timedelta(minutes=duracao)
+        if comeco < fim and termino > inicio:
+            eventos.append((max(comeco, inicio), 1))
+            eventos.append((min(termino, fim), -1))
+    # No mesmo instante o fim (-1) vem antes do início (+1): consultas
+    # encostadas (uma termina às 9:00, a outra começa às 9:00) não se somam.
+    eventos.sort()
+    pico = atual = 0
+    for _, passo in eventos:
+        atual += passo
+        if atual > pico:
+            pico = atual
+    return pico
+
+
+def cabe(intervalos: Iterable[tuple[datetime, int]], inicio: datetime, fim: datetime, capacidade: int) -> bool:
+    """True se mais uma consulta em [inicio, fim) não passa da capacidade."""
+    return pico_simultaneo(intervalos, inicio, fim) < capacidade
@@ -1,8 +1,14 @@
+from __future__ import annotations
+
 from datetime import datetime, timedelta, date
-from typing import List
 from models.agendamento import Agendamento
+from models.bloqueio import Bloqueio
+from models.cache_agenda import CacheAgendaPaciente
+from models.capacidade import cabe
+from models.mapa_disponibilidade import MapaDisponibilidade
 from models.medico import Medico
 from models.paciente import Paciente
+from models.pedido_espera import PedidoEspera
 from persistencia import AgendaRepository 
 
 
@@ -14,6 +20,10 @@ class Clinica:
         Inicializa a clínica com um repositório de dados.
         """
         self.repo = repo
+        # Cache de disponibilidade em bitsets (expediente e consultas por médico/dia).
+        self.mapa = MapaDisponibilidade(repo)
+        # Cache das agendas de pacientes, invalidado por versão a cada escrita.
+        self.agendas = CacheAgendaPaciente()
 
     # --- NOVO ---
     def cadastrar_paciente(self, paciente: Paciente) -> int:
@@ -65,8 +75,11 @@ class Clinica:
         if not self._verificar_disponibilidade_medico(medico, inicio, duracao_min):
             raise ValueError("Médico não está disponível neste horário.")
 
-        # Verifica conflitos de horário
+        # Verifica conflitos de horário (além da capacidade do médico)
         if self._verificar_conflito_horario(id_medico, inicio, duracao_min):
+            capacidade = self.mapa.capacidade(id_medico)
+            if capacidade > 1:
+                raise ValueError(f"O horário já tem {capacidade} consultas simultâneas (capacidade do médico).")
             raise ValueError("Já existe uma consulta agendada neste horário.")
 
         # Cria e salva o agendamento
@@ -76,16 +89,85 @@ class Clinica:
             data_hora_inicio=inicio,
             duracao_minutos=duracao_min
         )
-        agendamento.status = "agendado" # O status é setado aqui
+        agendamento.status = Agendamento.AGENDADO # O status é setado aqui
 
 
-        agendamento_id = self.repo.salvar_agendamento(agendamento)
+        # O conflito é conferido de novo na gravação: outra recepção (ou outra
+        # thread do modo serviço) pode ter ocupado o horário nesse meio-tempo.
+        agendamento_id = self.repo.salvar_agendamento(agendamento, conferir_conflito=True)
         agendamento.id = agendamento_id
+        self.mapa.registrar_agendamento(id_medico, inicio, duracao_min)
+        self.agendas.invalidar(id_paciente)
 
         return agendamento
 
+    # --- NOVO: LISTA DE ESPERA ---
+    def adicionar_lista_espera(self, id_paciente: int, especialidade: str, data_inicio: date, data_fim: date,
+                               duracao_min: int) -> PedidoEspera:
+        """
+        Coloca o paciente na lista de espera para "qualquer horário com qualquer
+        médico da especialidade" entre data_inicio e data_fim.
+        """
+        if not self.repo.buscar_paciente(id_paciente):
+            raise ValueError(f"Paciente com ID {id_paciente} não encontrado.")
+        if not especialidade or not especialidade.strip():
+            raise ValueError("A especialidade é obrigatória.")
+
+        pedido = PedidoEspera(id_paciente, especialidade.strip(), data_inicio, data_fim, duracao_min)
+        self.repo.salvar_pedido_espera(pedido)
+        return pedido
+
+    def marcar_consultas_em_lote(self, propostas, medicos: dict = None) -> list[int | None]:
+        """
+        Marca várias consultas de uma vez (usado pela lista de espera).
+
+        propostas: sequência de (id_pedido_espera, id_paciente, id_medico, inicio, duracao_min).
+        medicos: dict opcional id -> Medico, para não buscar o mesmo médico várias vezes.
+
+        A regra de horário de trabalho é conferida aqui; o conflito com outras
+        consultas é conferido pelo repositório dentro da mesma transação da
+        gravação. Retorna, para cada proposta, o ID do agendamento ou None.
+        """
+        medicos = dict(medicos or {})
+        resultado = [None] * len(propostas)
+        validas, posicoes = [], []
+        for i, (id_pedido, id_paciente, id_medico, inicio, duracao_min) in enumerate(propostas):
+            medico = medicos.get(id_medico)
+            if medico is None:
+                medico = medicos[id_medico] = self.repo.buscar_medico(id_medico)
+            if medico is None or not self._verificar_disponibilidade_medico(medico, inicio, duracao_min):
+                continue
+            validas.append((id_pedido, id_paciente, id_medico, inicio, duracao_min, Agendamento.AGENDADO))
+            posicoes.append(i)
+
+        for i, id_agendamento in zip(posicoes, self.repo.salvar_agendamentos_em_lote(validas)):
+            resultado[i] = id_agendamento
+            if id_agendamento is not None:
+                _, id_paciente, id_medico, inicio, duracao_min = propostas[i]
+                self.mapa.registrar_agendamento(id_medico, inicio, duracao_min)
+                self.agendas.invalidar(id_paciente)
+        return resultado
+
     def _verificar_disponibilidade_medico(self, medico: Medico, inicio: datetime, duracao_min: int) -> bool:
-        """Verifica se o médico está disponível no horário solicitado."""
+        """Verifica se o médico está disponível no horário solicitado (expediente e bloqueios)."""
+        return self._dentro_do_expediente(medico, inicio, duracao_min) \
+            and not self._verificar_bloqueio(medico.id, inicio, duracao_min)
+
+    def _verificar_bloqueio(self, id_medico: int, inicio: datetime, duracao_min: int) -> bool:
+        """Verifica se há bloqueio (do médico ou da clínica) no horário."""
+        # Caminho rápido: máscara do pedido AND slots bloqueados (bitset em cache).
+        bloqueado = self.mapa.bloqueado(id_medico, inicio, duracao_min)
+        if bloqueado is not None:
+            return bloqueado
+        return self.repo.existe_bloqueio(id_medico, inicio, inicio + timedelta(minutes=duracao_min))
+
+    def _dentro_do_expediente(self, medico: Medico, inicio: datetime, duracao_min: int) -> bool:
+        """Verifica se o horário cai dentro das regras semanais do médico."""
+        # Caminho rápido: máscara do pedido AND expediente (bitset em cache).
+        dentro = self.mapa.dentro_do_expediente(medico, inicio, duracao_min)
+        if dentro is not None:
+            return dentro
+
         dias_semana = {
             0: "segunda",
             1: "terca",
@@ -111,53 +193,225 @@ class Clinica:
         return False
 
     def _verificar_conflito_horario(self, id_medico: int, inicio: datetime, duracao_min: int) -> bool:
-        """Verifica se há conflito de horário com outras consultas do médico."""
-        fim = inicio + timedelta(minutes=duracao_min)
-        
-        agendamentos = self.repo.buscar_agendamentos_por_medico_e_data(id_medico, inicio.date().isoformat())
+        """
+        Verifica se mais uma consulta no horário passa da capacidade do médico
+        (com a capacidade padrão, 1: se há qualquer sobreposição).
+        """
+        # Caminho rápido: máscara do pedido AND slots lotados (bitset em cache).
+        conflito = self.mapa.tem_conflito(id_medico, inicio, duracao_min)
+        if conflito is not None:
+            return conflito
 
-        for ag in agendamentos:
-            if ag.status == 'Cancelado':
-                continue
-            
-            ag_fim = ag.data_hora_inicio + timedelta(minutes=ag.duracao_minutos)
-            if (inicio < ag_fim and fim > ag.data_hora_inicio):
-                return True
+        # Varredura das consultas ativas do dia (o repositório já filtra as canceladas).
+        intervalos = self.repo.buscar_intervalos_ocupados_medico(id_medico, inicio.date(), inicio.date())
+        return not cabe(intervalos, inicio, inicio + timedelta(minutes=duracao_min), self.mapa.capacidade(id_medico))
 
-        return False
+    def buscar_horarios_livres(self, id_medico: int, data_inicio: date, data_fim: date,
+                               duracao_min: int) -> list[datetime]:
+        """
+        Retorna todos os inícios possíveis (grade de 5 minutos) para uma consulta
+        de duracao_min com o médico entre data_inicio e data_fim.
+        """
+        medico = self.repo.buscar_medico(id_medico)
+        if not medico:
+            raise ValueError(f"Médico com ID {id_medico} não encontrado.")
+        return self.mapa.horarios_livres(medico, data_inicio, data_fim, duracao_min)
+
+    # --- NOVO: BLOQUEIOS (férias, feriados, ausências) ---
+    def bloquear_agenda(self, inicio: datetime, fim: datetime, id_medico: int = None, motivo: str = "") -> Bloqueio:
+        """
+        Bloqueia a agenda de um médico (ou, sem id_medico, da clínica inteira)
+        entre inicio e fim. Nenhuma consulta nova pode ser marcada no período;
+        as já marcadas continuam valendo (cancele-as se for o caso).
+        """
+        if id_medico is not None and not self.repo.buscar_medico(id_medico):
+            raise ValueError(f"Médico com ID {id_medico} não encontrado.")
+        bloqueio = Bloqueio(inicio, fim, id_medico, motivo)
+        self.repo.salvar_bloqueio(bloqueio)
+        self.mapa.invalidar(id_medico)
+        return bloqueio
 
-    def consultar_agenda_paciente(self, id_paciente: int) -> List[Agendamento]:
+    def desbloquear_agenda(self, id_bloqueio: int) -> Bloqueio:
+        """Remove um bloqueio, liberando o período de novo."""
+        bloqueio = self.repo.remover_bloqueio(id_bloqueio)
+        if bloqueio is None:
+            raise ValueError(f"Bloqueio com ID {id_bloqueio} não encontrado.")
+        self.mapa.invalidar(bloqueio.id_medico)
+        return bloqueio
+
+    def listar_bloqueios(self, id_medico: int = None, data_inicio: date = None,
+                         data_fim: date = None) -> list[Bloqueio]:
+        """Bloqueios do médico (incluindo os da clínica) ou de todos, opcionalmente só no período."""
+        return self.repo.buscar_bloqueios(id_medico, data_inicio, data_fim)
+
+    # --- NOVO: CAPACIDADE (consultas simultâneas) ---
+    def capacidade_medico(self, id_medico: int) -> int:
+        """Consultas simultâneas que valem para o médico (dele, da especialidade ou o padrão)."""
+        return self.mapa.capacidade(id_medico)
+
+    def definir_capacidade_medico(self, id_medico: int, capacidade: int | None) -> int:
         """
-        Retorna todas as consultas de um paciente.
+        Define quantas consultas o médico atende ao mesmo tempo (None: volta a
+        valer a regra da especialidade). Retorna a capacidade que passa a valer.
+        Baixar a capacidade não cancela consultas já marcadas.
         """
-        return self.repo.buscar_agendamentos_por_paciente(id_paciente)
+        if capacidade is not None and capacidade < 1:
+            raise ValueError("A capacidade deve ser de pelo menos 1 consulta.")
+        self.repo.definir_capacidade_medico(id_medico, capacidade)
+        self.mapa.invalidar(id_medico)
+        return self.mapa.capacidade(id_medico)
+
+    def definir_capacidade_especialidade(self, especialidade: str, capacidade: int | None) -> None:
+        """Capacidade dos médicos da especialidade que não têm uma própria (None: remove a regra)."""
+        if capacidade is not None and capacidade < 1:
+            raise ValueError("A capacidade deve ser de pelo menos 1 consulta.")
+        if not especialidade or not especialidade.strip():
+            raise ValueError("A especialidade é obrigatória.")
+        self.repo.definir_capacidade_especialidade(especialidade.strip(), capacidade)
+        self.mapa.invalidar()
 
-    def consultar_agenda_medico(self, id_medico: int, data: date) -> List[Agendamento]:
+    def listar_capacidades_especialidades(self) -> dict[str, int]:
+        """Regras de capacidade por especialidade."""
+        return self.repo.buscar_capacidades_especialidades()
+
+    def consultar_agenda_paciente(self, id_paciente: int, incluir_cancelados: bool = False,
+                                  data_inicio: date = None, data_fim: date = None) -> list[Agendamento]:
         """
-        Retorna todas as consultas de um médico em uma data específica.
+        Retorna as consultas de um paciente (com incluir_cancelados, também as canceladas),
+        opcionalmente só entre data_inicio e data_fim. O histórico arquivado entra
+        automaticamente quando o período pedido alcança o arquivo.
+
+        Repetições sem escrita no meio saem do cache (self.agendas), sem SQL.
         """
-        return self.repo.buscar_agendamentos_por_medico_e_data(id_medico, data.isoformat())
+        chave = (id_paciente, incluir_cancelados, data_inicio, data_fim)
+        consultas = self.agendas.obter(chave)
+        if consultas is None:
+            versao = self.agendas.versao(id_paciente)
+            consultas = self.repo.buscar_agendamentos_por_paciente(id_paciente, incluir_cancelados,
+                                                                   data_inicio, data_fim)
+            self.agendas.guardar(chave, versao, consultas)
+        return consultas
 
-    def cancelar_consulta(self, id_agendamento: int) -> None:
+    def linhas_agenda_paciente(self, id_paciente: int, incluir_cancelados: bool = False,
+                               data_inicio: date = None, data_fim: date = None) -> list[tuple]:
         """
-        Cancela uma consulta.
+        A agenda de consultar_agenda_paciente como linhas (ordem de
+        COLUNAS_AGENDA), para o caminho rápido do modo serviço. Passa pelo
+        mesmo cache (self.agendas), numa chave própria.
         """
-        agendamento = self.repo.buscar_agendamento(id_agendamento)
-        if not agendamento:
-            raise ValueError(f"Agendamento com ID {id_agendamento} não encontrado.")
+        chave = (id_paciente, incluir_cancelados, data_inicio, data_fim, "linhas")
+        linhas = self.agendas.obter(chave)
+        if linhas is None:
+            versao = self.agendas.versao(id_paciente)
+            lotes = self.repo.iterar_agenda_paciente(id_paciente, incluir_cancelados, data_inicio, data_fim)
+            linhas = [linha for lote in lotes for linha in lote]
+            self.agendas.guardar(chave, versao, linhas)
+        return linhas
 
-        agendamento.cancelar()
-        
-        self.repo.atualizar_agendamento(agendamento)
+    def consultar_agenda_medico(self, id_medico: int, data: date, incluir_cancelados: bool = False) -> list[Agendamento]:
+        """
+        Retorna as consultas de um médico em uma data específica (com incluir_cancelados, também as canceladas).
+        """
+        return self.repo.buscar_agendamentos_por_medico_e_data(id_medico, data.isoformat(), incluir_cancelados)
+
+    def cancelar_consulta(self, id_agendamento: int, versao: int = None) -> None:
+        """
+        Cancela uma consulta com um único UPDATE (sem carregar paciente/médico).
+        Com 'versao' (a lida junto com o agendamento), o cancelamento falha com
+        ConflitoVersao se a consulta tiver sido alterada nesse meio-tempo.
+        Cancelar uma consulta já cancelada não faz nada.
+        """
+        resultado = self.repo.mudar_status_agendamento(id_agendamento, Agendamento.CANCELADO, versao)
+        if resultado is not None:
+            id_medico, inicio, duracao_min, _, id_paciente = resultado
+            self.mapa.registrar_cancelamento(id_medico, inicio, duracao_min)
+            self.agendas.invalidar(id_paciente)
+
+    def confirmar_realizacao(self, id_agendamento: int, versao: int = None) -> None:
+        """Marca uma consulta como Realizada (mesmas regras de cancelar_consulta)."""
+        resultado = self.repo.mudar_status_agendamento(id_agendamento, Agendamento.REALIZADO, versao)
+        if resultado is None:
+            return
+        # Uma consulta cancelada que volta a valer ocupa o horário de novo.
+        self.mapa.invalidar(resultado[0])
+        self.agendas.invalidar(resultado[4])
+
+    def fechar_dia(self, data: date, data_fim: date = None, agora: datetime = None) -> dict[int, int]:
+        """
+        Fechamento do dia: marca como Realizadas todas as consultas Agendadas de
+        'data' (ou de data até data_fim, para reprocessar dias atrasados) que já
+        terminaram até 'agora'. É um único UPDATE numa transação, sem montar
+        objetos. Retorna {id_medico: consultas fechadas}.
+        """
+        por_medico = self.repo.fechar_periodo(data, data_fim or data, agora or datetime.now())
+        if por_medico:
+            self.agendas.invalidar()  # O UPDATE não diz quais pacientes
+        return por_medico
+
+    def confirmar_realizacoes(self, data_inicio: date, data_fim: date = None, id_medico: int = None) -> int:
+        """
+        Marca como Realizadas, num único UPDATE, todas as consultas Agendadas
+        entre data_inicio e data_fim (padrão: só data_inicio), de todos os
+        médicos ou de um só. Retorna quantas consultas mudaram.
+        """
+        total = self.repo.mudar_status_no_periodo(Agendamento.REALIZADO, Agendamento.AGENDADO,
+                                                  data_inicio, data_fim or data_inicio, id_medico)
+        if total:
+            self.agendas.invalidar()
+        return total
             
-    def listar_todos_pacientes(self) -> List[Paciente]:
+    def listar_todos_pacientes(self) -> list[Paciente]:
         """Retorna uma lista de todos os pacientes cadastrados."""
         return self.repo.buscar_todos_pacientes()
         
-    def listar_todos_medicos(self) -> List[Medico]:
+    def listar_todos_medicos(self) -> list[Medico]:
         """Retorna uma lista de todos os médicos cadastrados."""
         return self.repo.buscar_todos_medicos()
 
+    def listar_pacientes_resumo(self, limite: int = 1000, apos_id: int = 0) -> list[tuple]:
+        """Página de (id, nome, cpf, plano_saude), sem montar Pacientes (paginada por ID)."""
+        return self.repo.listar_pacientes_resumo(limite, apos_id)
+
+    def listar_medicos_resumo(self, limite: int = 1000, apos_id: int = 0) -> list[tuple]:
+        """Página de (id, nome, crm, especialidade), sem montar Medicos (paginada por ID)."""
+        return self.repo.listar_medicos_resumo(limite, apos_id)
+
+    def buscar_pacientes(self, texto: str, limite: int = 20, apos_id: int = 0) -> list[Paciente]:
+        """Busca pacientes pelo começo das palavras do nome (paginado por ID)."""
+        return self.repo.buscar_pacientes_por_nome(texto, limite, apos_id)
+
+    def buscar_medicos(self, texto: str = None, especialidade: str = None,
+                       limite: int = 20, apos_id: int = 0) -> list[Medico]:
+        """Busca médicos por nome e/ou especialidade (paginado por ID)."""
+        return self.repo.buscar_medicos(texto, especialidade, limite, apos_id)
+
+    def medicos_disponiveis(self, inicio: datetime, duracao_min: int, especialidade: str = None) -> list[Medico]:
+        """
+        Médicos que trabalham no horário pedido e estão sem consulta nem
+        bloqueio nele (opcionalmente só da especialidade). Uma consulta
+        indexada no banco.
+        """
+        return self.repo.buscar_medicos_disponiveis(inicio, duracao_min, especialidade)
+
+    def excluir_paciente(self, id_paciente: int) -> None:
+        """
+        Exclui (logicamente) um paciente. As consultas futuras dele são
+        canceladas e o cadastro some das buscas; o histórico fica até o expurgo.
+        """
+        if not self.repo.buscar_paciente(id_paciente):
+            raise ValueError(f"Paciente com ID {id_paciente} não encontrado.")
+        self.repo.deletar_paciente(id_paciente)
+        self.mapa.invalidar()  # As consultas canceladas podem ser de qualquer médico
+        self.agendas.invalidar(id_paciente)
+
+    def excluir_medico(self, id_medico: int) -> None:
+        """Exclui (logicamente) um médico, cancelando as consultas futuras dele."""
+        if not self.repo.buscar_medico(id_medico):
+            raise ValueError(f"Médico com ID {id_medico} não encontrado.")
+        self.repo.deletar_medico(id_medico)
+        self.mapa.invalidar(id_medico)
+        self.agendas.invalidar()  # Consultas futuras canceladas, de vários pacientes
+
     # --- NOVO ---
     def atualizar_dados_paciente(self, id_paciente: int, novo_telefone: str, novo_plano: str) -> Paciente:
         """
@@ -173,6 +427,7 @@ A-        Atualiza os dados de um paciente, validando regras.
             raise ValueError("Telefone e Plano de Saúde não podem ser vazios.")
             
         self.repo.atualizar_paciente(id_paciente, novo_telefone, novo_plano)
+        self.agendas.invalidar(id_paciente)  # As consultas em cache levam o cadastro junto
         
         # Retorna o objeto paciente ATUALIZADO, lendo do banco
         # Isso garante que estamos retornando os dados corretos
@@ -0,0 +1,360 @@
+from __future__ import annotations
+
+import threading
+from datetime import date, datetime, timedelta
+
+# Cada dia é dividido em 288 "slots" de 5 minutos. Um conjunto de slots é
+# guardado como um int do Python usado como bitset: o bit i representa o
+# intervalo [i*5, (i+1)*5) minutos a partir da meia-noite.
+SLOT_MIN = 5
+SLOTS_DIA = 24 * 60 // SLOT_MIN  # 288
+DIA_COMPLETO = (1 << SLOTS_DIA) - 1
+
+DIAS_SEMANA = ("segunda", "terca", "quarta", "quinta", "sexta", "sabado", "domingo")
+
+
+def alinhado(inicio: datetime, duracao_min: int) -> bool:
+    """True se início e duração caem exatamente na grade de 5 minutos."""
+    return inicio.second == 0 and inicio.microsecond == 0 and inicio.minute % SLOT_MIN == 0 \
+        and duracao_min % SLOT_MIN == 0
+
+
+def mascara(inicio_min: int, fim_min: int) -> int:
+    """
+    Bits dos slots que tocam o intervalo [inicio_min, fim_min).
+    Para intervalos fora da grade o resultado é "por excesso" (arredonda para fora).
+    """
+    primeiro = max(0, inicio_min // SLOT_MIN)
+    ultimo = min(SLOTS_DIA, -(-fim_min // SLOT_MIN))
+    if ultimo <= primeiro:
+        return 0
+    return ((1 << (ultimo - primeiro)) - 1) << primeiro
+
+
+def mascara_contida(inicio_min: int, fim_min: int) -> int:
+    """
+    Bits dos slots INTEIROS dentro de [inicio_min, fim_min): arredonda para
+    dentro. Para o expediente, em que um slot só está livre se couber todo.
+    """
+    return mascara(-(-inicio_min // SLOT_MIN) * SLOT_MIN, fim_min // SLOT_MIN * SLOT_MIN)
+
+
+def _minutos(hhmm: str) -> int:
+    horas, minutos = hhmm.strip().split(":")
+    return int(horas) * 60 + int(minutos)
+
+
+def inicios_com_janela(livres: int, n_slots: int) -> int:
+    """
+    Bits dos slots onde COMEÇAM n_slots livres consecutivos.
+    (livres & livres>>1 & ... & livres>>(n-1)), calculado por dobramento em O(log n).
+    """
+    resultado, janela = livres, 1
+    while janela < n_slots:
+        passo = min(janela, n_slots - janela)
+        resultado &= resultado >> passo
+        janela += passo
+    return resultado
+
+
+def contar(contagem: list[int], inicio_min: int, fim_min: int, passo: int, capacidade: int) -> int:
+    """
+    Soma 'passo' (+1 ao marcar, -1 ao cancelar) às consultas de cada slot de
+    [inicio_min, fim_min) e retorna os bits dos slots desse trecho que ficaram lotados.
+    """
+    lotados = 0
+    for slot in range(max(0, inicio_min // SLOT_MIN), min(SLOTS_DIA, -(-fim_min // SLOT_MIN))):
+        contagem[slot] += passo
+        if contagem[slot] >= capacidade:
+            lotados |= 1 << slot
+    return lotados
+
+
+def posicoes_dos_bits(bits: int) -> list[int]:
+    """Índices dos bits ligados, em ordem crescente (varredura de bits)."""
+    posicoes = []
+    while bits:
+        menor = bits & -bits
+        posicoes.append(menor.bit_length() - 1)
+        bits ^= menor
+    return posicoes
+
+
+class _Dia:
+    """Estado em cache de um médico em um dia."""
+    __slots__ = ("ocupados", "exato", "bloqueados", "bloqueio_exato", "capacidade", "contagem")
+
+    def __init__(self, ocupados: int, exato: bool, bloqueados: int = 0, bloqueio_exato: bool = True,
+                 capacidade: int = 1, contagem: list[int] | None = None):
+        # Slots sem vaga: com capacidade 1, os que têm consulta; acima disso,
+        # os que já têm 'capacidade' consultas (contagem guarda quantas por slot).
+        self.ocupados = ocupados
+        self.exato = exato  # False se houver consulta fora da grade (ou sobreposta, com capacidade 1)
+        # Bloqueios (férias, feriados) ficam numa máscara à parte: cancelar uma
+        # consulta nunca libera um slot bloqueado.
+        self.bloqueados = bloqueados
+        self.bloqueio_exato = bloqueio_exato  # False se algum bloqueio não cai na grade
+        self.capacidade = capacidade
+        self.contagem = contagem
+
+
+class MapaDisponibilidade:
+    """
+    Cache de disponibilidade em bitsets, por médico e por dia.
+
+    - expediente(medico, weekday): slots inteiros dentro do horário de
+      trabalho (vem de medico.regras_disponibilidade).
+    - ocupados(id_medico, dia): slots com consulta não cancelada. É montado
+      com UMA consulta leve ao repositório e depois atualizado de forma
+      incremental por registrar_agendamento / registrar_cancelamento.
+    - bloqueados(id_medico, dia): slots com bloqueio do médico ou da clínica
+      (repo.buscar_bloqueios), montados junto com os ocupados.
+    - capacidade(id_medico): consultas simultâneas permitidas. Acima de 1, o
+      dia guarda também quantas consultas há em cada slot, e "ocupado" passa
+      a ser "lotado": o teste continua sendo um AND de máscaras.
+
+    "Este horário está livre?" vira uma operação de AND entre máscaras, e a
+    busca de horários livres vira uma varredura de bits.
+
+    Gravações de outro processo (ou de outra conexão) no mesmo banco não
+    passam por registrar_*: antes de cada consulta ao cache a versão dos
+    dados (repo.versao_dados, um PRAGMA data_version) é conferida, e se
+    mudou desde a última conferência desta thread o cache é descartado.
+    """
+
+    def __init__(self, repo):
+        self.repo = repo
+        self._dias: dict[tuple[int, date], _Dia] = {}
+        self._expedientes: dict[tuple[int, int], tuple[int, bool]] = {}
+        self._capacidades: dict[int, int] = {}
+        self._trava = threading.Lock()
+        # Última versão dos dados vista por cada thread (cada uma tem sua conexão).
+        self._local = threading.local()
+
+    def _conferir_versao(self) -> None:
+        """Descarta o cache se outra conexão gravou no banco desde a última conferência desta thread."""
+        versao = self.repo.versao_dados()
+        if versao is None or versao != getattr(self._local, "versao", None):
+            # Primeira conferência da thread (conexão nova) também descarta:
+            # não dá para saber o que foi gravado antes dela.
+            self.invalidar()
+            self._local.versao = versao
+
+    def capacidade(self, id_medico: int) -> int:
+        """Consultas simultâneas permitidas ao médico (em cache; veja invalidar)."""
+        capacidade = self._capacidades.get(id_medico)
+        if capacidade is None:
+            capacidade = self._capacidades[id_medico] = self.repo.capacidade_medico(id_medico)
+        return capacidade
+
+    # --- Horário de trabalho ---
+
+    def expediente(self, medico, weekday: int) -> tuple[int, bool]:
+        """
+        Retorna (bits, exato) do expediente do médico no dia da semana.
+        exato=False quando alguma regra não cai na grade de 5 minutos.
+        """
+        chave = (medico.id, weekday)
+        item = self._expedientes.get(chave)
+        if item is None:
+            bits, exato = 0, True
+            for intervalo in (medico.regras_disponibilidade or {}).get(DIAS_SEMANA[weekday], ()):
+                inicio, fim = (_minutos(h) for h in intervalo.split("-"))
+                if inicio % SLOT_MIN or fim % SLOT_MIN:
+                    exato = False
+                bits |= mascara_contida(inicio, fim)
+            item = self._expedientes[chave] = (bits, exato)
+        return item
+
+    def dentro_do_expediente(self, medico, inicio: datetime, duracao_min: int) -> bool | None:
+        """True/False pelo bitset, ou None se o bitset não puder decidir com exatidão."""
+        if not alinhado(inicio, duracao_min):
+            return None
+        bits, exato = self.expediente(medico, inicio.weekday())
+        if not exato:
+            return None
+        minuto = inicio.hour * 60 + inicio.minute
+        pedido = mascara(minuto, minuto + duracao_min)
+        if minuto + duracao_min > 24 * 60:
+            return False  # Atravessa a meia-noite
+        return pedido & ~bits == 0
+
+    # --- Consultas marcadas ---
+
+    def _montar_dias(self, id_medico: int, data_inicio: date, data_fim: date) -> None:
+        """Monta (numa única consulta) os dias ainda não carregados no intervalo."""
+        capacidade = self.capacidade(id_medico)
+        ocupados = {}
+        exatos = {}
+        contagens = {}
+        for inicio, duracao in self.repo.buscar_intervalos_ocupados_medico(id_medico, data_inicio, data_fim):
+            dia = inicio.date()
+            minuto = inicio.hour * 60 + inicio.minute
+            atual = ocupados.get(dia, 0)
+            if capacidade > 1:
+                exatos[dia] = exatos.get(dia, True) and alinhado(inicio, duracao)
+                contagem = contagens.setdefault(dia, [0] * SLOTS_DIA)
+                ocupados[dia] = atual | contar(contagem, minuto, minuto + duracao, 1, capacidade)
+                continue
+            bits = mascara(minuto, minuto + duracao)
+            exatos[dia] = exatos.get(dia, True) and alinhado(inicio, duracao) and not (atual & bits)
+            ocupados[dia] = atual | bits
+        bloqueados = {}
+        bloqueios_exatos = {}
+        for bloqueio in self.repo.buscar_bloqueios(id_medico, data_inicio, data_fim):
+            for dia, inicio_min, fim_min in bloqueio.por_dia(data_inicio, data_fim):
+                bloqueados[dia] = bloqueados.get(dia, 0) | mascara(inicio_min, fim_min)
+                if inicio_min % SLOT_MIN or fim_min % SLOT_MIN or bloqueio.inicio.second or bloqueio.fim.second:
+                    bloqueios_exatos[dia] = False
+        with self._trava:
+            dia = data_inicio
+            while dia <= data_fim:
+                self._dias[(id_medico, dia)] = _Dia(ocupados.get(dia, 0), exatos.get(dia, True),
+                                                    bloqueados.get(dia, 0), bloqueios_exatos.get(dia, True),
+                                                    capacidade, contagens.get(dia))
+                dia += timedelta(days=1)
+
+    def _dia(self, id_medico: int, dia: date, conferir: bool = True) -> _Dia:
+        if conferir:
+            self._conferir_versao()
+        item = self._dias.get((id_medico, dia))
+        if item is None:
+            self._montar_dias(id_medico, dia, dia)
+            item = self._dias[(id_medico, dia)]
+        return item
+
+    def tem_conflito(self, id_medico: int, inicio: datetime, duracao_min: int) -> bool | None:
+        """True/False pelo bitset, ou None se o bitset não puder decidir com exatidão."""
+        if not alinhado(inicio, duracao_min):
+            return None
+        item = self._dia(id_medico, inicio.date())
+        if not item.exato:
+            return None
+        minuto = inicio.hour * 60 + inicio.minute
+        return item.ocupados & mascara(minuto, minuto + duracao_min) != 0
+
+    def bloqueado(self, id_medico: int, inicio: datetime, duracao_min: int) -> bool | None:
+        """True se algum bloqueio toca o horário; None se o bitset não puder decidir com exatidão."""
+        if not alinhado(inicio, duracao_min):
+            return None
+        minuto = inicio.hour * 60 + inicio.minute
+        if minuto + duracao_min > 24 * 60:
+            return None  # Atravessa a meia-noite: dois dias
+        item = self._dia(id_medico, inicio.date())
+        if not item.bloqueio_exato:
+            return None
+        return item.bloqueados & mascara(minuto, minuto + duracao_min) != 0
+
+    def registrar_agendamento(self, id_medico: int, inicio: datetime, duracao_min: int) -> None:
+        """Atualiza o cache depois que uma consulta é gravada."""
+        with self._trava:
+            item = self._dias.get((id_medico, inicio.date()))
+            if item is None:
+                return  # Dia ainda não carregado: será montado do banco quando preciso
+            minuto = inicio.hour * 60 + inicio.minute
+            if item.capacidade > 1:
+                if not alinhado(inicio, duracao_min):
+                    item.exato = False
+                if item.contagem is None:
+                    item.contagem = [0] * SLOTS_DIA
+                item.ocupados |= contar(item.contagem, minuto, minuto + duracao_min, 1, item.capacidade)
+                return
+            bits = mascara(minuto, minuto + duracao_min)
+            if item.ocupados & bits or not alinhado(inicio, duracao_min):
+                item.exato = False
+            item.ocupados |= bits
+
+    def registrar_cancelamento(self, id_medico: int, inicio: datetime, duracao_min: int) -> None:
+        """Atualiza o cache depois que uma consulta é cancelada."""
+        with self._trava:
+            chave = (id_medico, inicio.date())
+            item = self._dias.get(chave)
+            if item is None:
+                return
+            minuto = inicio.hour * 60 + inicio.minute
+            if item.exato and item.contagem is not None:
+                # Capacidade > 1: desconta a consulta e recalcula os slots lotados do trecho.
+                lotados = contar(item.contagem, minuto, minuto + duracao_min, -1, item.capacidade)
+                item.ocupados = item.ocupados & ~mascara(minuto, minuto + duracao_min) | lotados
+            elif item.exato and item.capacidade == 1:
+                # No modo exato nenhum slot é compartilhado entre consultas,
+                # então basta desligar os bits desta consulta.
+                item.ocupados &= ~mascara(minuto, minuto + duracao_min)
+            else:
+                del self._dias[chave]
+
+    def invalidar(self, id_medico: int | None = None) -> None:
+        """Descarta o cache (de um médico ou de todos)."""
+        with self._trava:
+            if id_medico is None:
+                self._dias.clear()
+                self._expedientes.clear()
+                self._capacidades.clear()
+            else:
+                self._capacidades.pop(id_medico, None)
+                for chave in [c for c in self._dias if c[0] == id_medico]:
+                    del self._dias[chave]
+                for chave in [c for c in self._expedientes if c[0] == id_medico]:
+                    del self._expedientes[chave]
+
+    # --- Busca de horários livres ---
+
+    def livres(self, medico, dia: date, conferir: bool = True) -> int:
+        """Bits livres do dia: expediente menos slots ocupados e bloqueados."""
+        item = self._dia(medico.id, dia, conferir)
+        return self.expediente(medico, dia.weekday())[0] & ~(item.ocupados | item.bloqueados) & DIA_COMPLETO
+
+    def horarios_livres(self, medico, data_inicio: date, data_fim: date, duracao_min: int,
+                        usar_numpy: bool | None = None) -> list[datetime]:
+        """
+        Todos os inícios possíveis (na grade de 5 min) para uma consulta de
+        duracao_min entre data_inicio e data_fim, em ordem.
+
+        Os dias são carregados com uma única consulta ao banco. Com NumPy
+        instalado (ou usar_numpy=True), a varredura de períodos longos é
+        vetorizada sobre a matriz dias x 288; sem NumPy usa operações de bits.
+        """
+        n_slots = -(-duracao_min // SLOT_MIN)
+        self._conferir_versao()  # Uma vez para o período todo
+        dias = _dias_entre(data_inicio, data_fim)
+        faltando = [d for d in dias if (medico.id, d) not in self._dias]
+        if faltando:
+            self._montar_dias(medico.id, faltando[0], faltando[-1])
+        mapas = [self.livres(medico, d, conferir=False) for d in dias]
+
+        np = _numpy() if usar_numpy is not False else None
+        if np is not None and (usar_numpy or len(dias) >= 28):
+            return _horarios_numpy(np, dias, mapas, n_slots)
+
+        horarios = []
+        for dia, livres in zip(dias, mapas):
+            base = datetime.combine(dia, datetime.min.time())
+            for slot in posicoes_dos_bits(inicios_com_janela(livres, n_slots)):
+                horarios.append(base + timedelta(minutes=slot * SLOT_MIN))
+        return horarios
+
+
+def _dias_entre(data_inicio: date, data_fim: date) -> list[date]:
+    return [data_inicio + timedelta(days=i) for i in range((data_fim - data_inicio).days + 1)]
+
+
+def _numpy():
+    """Importa o NumPy só quando necessário (ele é opcional)."""
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+def _horarios_numpy(np, dias, mapas, n_slots) -> list[datetime]:
+    """Versão vetorizada: janelas de n_slots livres via soma acumulada."""
+    bruto = b"".join(m.to_bytes(SLOTS_DIA // 8, "little") for m in mapas)
+    matriz = np.unpackbits(np.frombuffer(bruto, dtype=np.uint8), bitorder="little").reshape(len(dias), SLOTS_DIA)
+    acumulado = np.zeros((len(dias), SLOTS_DIA + 1), dtype=np.int32)
+    np.cumsum(matriz, axis=1, out=acumulado[:, 1:])
+    # janela[d, s] = quantidade de slots livres em [s, s + n_slots)
+    janela = acumulado[:, n_slots:] - acumulado[:, :SLOTS_DIA + 1 - n_slots]
+    linhas, slots = np.nonzero(janela == n_slots)
+    return [datetime.combine(dias[d], datetime.min.time()) + timedelta(minutes=int(s) * SLOT_MIN)
+            for d, s in zip(linhas.tolist(), slots.tolist())]
@@ -0,0 +1,95 @@
+from datetime import date, datetime
+
+
+class PedidoEspera:
+    """
+    CLASSE DE ENCAPSULAMENTO
+
+    Representa um pedido na LISTA DE ESPERA: o paciente aceita "qualquer
+    horário, com qualquer médico da especialidade, entre data_inicio e data_fim".
+    O pedido é atendido quando o otimizador da lista de espera encontra
+    um horário e cria o Agendamento correspondente.
+    """
+
+    PENDENTE = "pendente"
+    ATENDIDO = "atendido"
+    CANCELADO = "cancelado"
+
+    def __init__(self, id_paciente: int, especialidade: str, data_inicio: date, data_fim: date, duracao_minutos: int):
+        if data_fim < data_inicio:
+            raise ValueError("A data final do pedido não pode ser anterior à inicial.")
+        if duracao_minutos <= 0:
+            raise ValueError("A duração do pedido deve ser positiva.")
+
+        # --- ENCAPSULAMENTO ---
+        self._id = None  # Para ser setado pela persistência
+        self._id_paciente = id_paciente
+        self._especialidade = especialidade
+        self._data_inicio = data_inicio
+        self._data_fim = data_fim
+        self._duracao_minutos = duracao_minutos
+        self._status = PedidoEspera.PENDENTE
+        self._criado_em = datetime.now()
+        self._id_agendamento = None
+
+    # --- Propriedades (Getters) ---
+
+    @property
+    def id(self):
+        return self._id
+
+    @id.setter
+    def id(self, value: int):
+        """Usado pela persistência para setar o ID do banco."""
+        self._id = value
+
+    @property
+    def id_paciente(self):
+        return self._id_paciente
+
+    @property
+    def especialidade(self):
+        return self._especialidade
+
+    @property
+    def data_inicio(self):
+        return self._data_inicio
+
+    @property
+    def data_fim(self):
+        return self._data_fim
+
+    @property
+    def duracao_minutos(self):
+        return self._duracao_minutos
+
+    @property
+    def criado_em(self):
+        return self._criado_em
+
+    @criado_em.setter
+    def criado_em(self, value: datetime):
+        """Usado pela persistência ao ler do banco."""
+        self._criado_em = value
+
+    @property
+    def status(self):
+        return self._status
+
+    @status.setter
+    def status(self, value: str):
+        """Usado pela persistência ao ler do banco."""
+        self._status = value
+
+    @property
+    def id_agendamento(self):
+        return self._id_agendamento
+
+    @id_agendamento.setter
+    def id_agendamento(self, value: int):
+        self._id_agendamento = value
+
+    def atender(self, id_agendamento: int):
+        """Marca o pedido como atendido pelo agendamento informado."""
+        self._id_agendamento = id_agendamento
+        self._status = PedidoEspera.ATENDIDO
@@ -1,75 +1,1179 @@
-import json
+from __future__ import annotations
+
+import itertools
 import os.path
 import sqlite3
+import threading
+from collections.abc import Iterable, Sequence
 from sqlite3 import Error
-from typing import List, Tuple, Optional
 from datetime import datetime, date, timedelta
 from models.paciente import Paciente
 from models.medico import Medico
 from models.agendamento import Agendamento
+from models.bloqueio import Bloqueio
+from models.pedido_espera import PedidoEspera
+
+# --- IMPORTAÇÕES TARDIAS ---
+# Como em main.py: o CLI abre um processo por operação, então json, pathlib,
+# re/unicodedata e as funções de capacidade e de mapa_disponibilidade são
+# importados dentro das funções que os usam. As anotações usam os genéricos
+# nativos (list[...], X | None) em vez do typing, cujo import sozinho custa
+# mais de 10 ms.
 
 DB_FILE = "sistema_agenda_clinica.db"
 
+# Tamanho do cache de statements do sqlite3 por conexão (o padrão é 128).
+# Como a conexão agora é reaproveitada, cada SQL abaixo é compilado uma
+# única vez e reutilizado nas chamadas seguintes.
+CACHED_STATEMENTS = 512
+
+# Número de série de cada conexão por thread aberta (veja versao_dados).
+_SERIAIS_CONEXAO = itertools.count(1)
+
+# mmap_size usado nos snapshots somente leitura: o arquivo é mapeado em memória
+# e as páginas são lidas direto do cache do sistema operacional (sem cópia).
+MMAP_SNAPSHOT = 1024 * 1024 * 1024  # 1 GiB
+
+# cache_size durante carregar_em_massa (negativo = KiB). Com o padrão (~2 MiB)
+# os índices de agendamentos não cabem na memória e cada lote relê páginas.
+CACHE_CARGA_EM_MASSA = -256 * 1024  # 256 MiB
+
+# --- STATUS DOS AGENDAMENTOS ---
+# No banco o status é um inteiro pequeno (tabela status_agendamento); nos
+# objetos Agendamento continua sendo o nome ("Agendado", "Cancelado", ...).
+# Os códigos entram no texto do SQL como literais (e não como "?") porque o
+# índice parcial de consultas ativas só é usado quando a consulta repete a
+# mesma condição "status <> 2" do índice.
+STATUS_AGENDADO = 1
+STATUS_CANCELADO = 2
+STATUS_REALIZADO = 3
+STATUS_NOMES = {
+    STATUS_AGENDADO: Agendamento.AGENDADO,
+    STATUS_CANCELADO: Agendamento.CANCELADO,
+    STATUS_REALIZADO: Agendamento.REALIZADO,
+}
+STATUS_CODIGOS = {nome: codigo for codigo, nome in STATUS_NOMES.items()}
+
+
+def codigo_status(nome: str) -> int:
+    """Código do status no banco. Aceita o nome em qualquer caixa ("agendado")."""
+    codigo = STATUS_CODIGOS.get(Agendamento.normalizar_status(nome))
+    if codigo is None:
+        raise ValueError(f"Status de agendamento inválido: {nome!r}.")
+    return codigo
+
+
+_ATIVO = f"status <> {STATUS_CANCELADO}"
+
+
+def _nome_status_sql(coluna: str) -> str:
+    """CASE com o nome do status (mais barato que consultar status_agendamento a cada linha)."""
+    return "CASE " + coluna + "".join(f" WHEN {codigo} THEN '{nome}'" for codigo, nome in STATUS_NOMES.items()) \
+        + " END"
+
+
+class ConflitoVersao(ValueError):
+    """O agendamento mudou no banco desde que foi lido (versão diferente da esperada)."""
+
+
+# --- HORÁRIOS DE TRABALHO NORMALIZADOS ---
+# Cada conjunto distinto de faixas semanais é gravado UMA vez como um modelo
+# (modelos_disponibilidade + faixas_disponibilidade) e os médicos com o mesmo
+# expediente apontam para o mesmo modelo. O JSON regras_disponibilidade
+# continua em medicos: é dele que o objeto Medico é montado.
+
+def faixas_disponibilidade(regras: dict | None) -> list[tuple[int, int, int]]:
+    """
+    Converte regras_disponibilidade ({'segunda': ['08:00-12:00', ...]}) em
+    (dia_semana, inicio_min, fim_min), com dia_semana igual a datetime.weekday().
+    Ordenadas e sem repetição; dias e intervalos que não se entendem ficam de fora.
+    """
+    from models.mapa_disponibilidade import DIAS_SEMANA
+
+    faixas = set()
+    for dia, intervalos in (regras or {}).items():
+        if dia not in DIAS_SEMANA:
+            continue
+        for intervalo in intervalos or ():
+            try:
+                inicio, fim = (int(h) * 60 + int(m) for h, m in (parte.strip().split(":")
+                                                                 for parte in intervalo.split("-")))
+            except (ValueError, AttributeError):
+                continue
+            if inicio < fim:
+                faixas.add((DIAS_SEMANA.index(dia), inicio, fim))
+    return sorted(faixas)
+
+
+def _id_modelo_disponibilidade(conn: sqlite3.Connection, regras: dict | None) -> int:
+    """ID do modelo com estas faixas, criando-o (com as faixas) se ainda não existir."""
+    faixas = faixas_disponibilidade(regras)
+    assinatura = ";".join(f"{dia}:{inicio}-{fim}" for dia, inicio, fim in faixas)
+    cursor = conn.execute(SQL["criar_modelo_disponibilidade"], (assinatura,))
+    if cursor.rowcount:
+        conn.executemany(SQL["salvar_faixa_disponibilidade"], ((cursor.lastrowid,) + faixa for faixa in faixas))
+        return cursor.lastrowid
+    return conn.execute(SQL["buscar_modelo_disponibilidade"], (assinatura,)).fetchone()[0]
+
+
+def _migrar_regras_para_modelos(conn: sqlite3.Connection) -> None:
+    """Migração 10: liga cada médico ao modelo do seu JSON regras_disponibilidade."""
+    import json
+
+    for id_medico, regras_json in conn.execute("SELECT id, regras_disponibilidade FROM medicos;").fetchall():
+        id_modelo = _id_modelo_disponibilidade(conn, json.loads(regras_json) if regras_json else {})
+        conn.execute("UPDATE medicos SET id_modelo_disponibilidade = ? WHERE id = ?;", (id_modelo, id_medico))
+
+
+def _unicidade_so_dos_ativos(conn: sqlite3.Connection) -> None:
+    """
+    Migração 14: tira o UNIQUE da coluna cpf de pacientes e medicos (que valia
+    também para os excluídos logicamente) recriando as tabelas. A unicidade
+    passa para índices parciais, só dos cadastros ativos (veja a migração).
+
+    O SQLite não remove restrições de coluna, então cada tabela é copiada
+    para uma nova com o mesmo CREATE TABLE sem o UNIQUE. DROP TABLE leva os
+    índices e gatilhos da tabela, que são recriados a partir do sqlite_master;
+    as views que citam a tabela saem antes e voltam no fim.
+    """
+    views = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'view';").fetchall()
+    for nome, _ in views:
+        conn.execute(f"DROP VIEW {nome};")
+    for tabela in ("pacientes", "medicos"):
+        ddl = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?;", (tabela,)).fetchone()[0]
+        dependentes = [sql for sql, in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name = ? AND sql IS NOT NULL;",
+            (tabela,))]
+        novo = ddl.replace("cpf TEXT UNIQUE NOT NULL", "cpf TEXT NOT NULL", 1)
+        novo = novo.replace(f"CREATE TABLE {tabela}", f"CREATE TABLE {tabela}_novo", 1)
+        colunas = ", ".join(linha[1] for linha in conn.execute(f"PRAGMA table_info({tabela});"))
+        conn.execute(novo)
+        conn.execute(f"INSERT INTO {tabela}_novo ({colunas}) SELECT {colunas} FROM {tabela};")
+        # Preserva o contador do AUTOINCREMENT, como na migração 5.
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = ?;", (f"{tabela}_novo",))
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) SELECT ?, seq FROM sqlite_sequence WHERE name = ?;",
+                     (f"{tabela}_novo", tabela))
+        conn.execute(f"DROP TABLE {tabela};")
+        conn.execute(f"ALTER TABLE {tabela}_novo RENAME TO {tabela};")
+        for sql in dependentes:
+            conn.execute(sql)
+    for _, sql in views:
+        conn.execute(sql)
+
+
+_EPOCA = datetime(1970, 1, 1)
+_MINUTO = timedelta(minutes=1)
+# "Todos os médicos" na dimensão medico do bloqueios_rtree (maior inteiro de 32 bits).
+_MEDICO_MAX = 2 ** 31 - 1
+
+
+def minuto_epoca(momento: datetime, para_cima: bool = False) -> int:
+    """Minutos desde 1970 (a escala do bloqueios_rtree), arredondando para baixo ou para cima."""
+    if para_cima:
+        return -((_EPOCA - momento) // _MINUTO)
+    return (momento - _EPOCA) // _MINUTO
+
+
+def _minuto_epoca_sql(coluna: str, para_cima: bool = False) -> str:
+    """A mesma conta de minuto_epoca, em SQL, para uma coluna ISO 8601 (sem fuso)."""
+    segundos = f"CAST(strftime('%s', {coluna}) AS INTEGER)"
+    return f"(({segundos} + 59) / 60)" if para_cima else f"({segundos} / 60)"
+
+
+# --- MIGRAÇÕES DE ESQUEMA ---
+# Cada item é uma lista de comandos DDL (ou de funções que recebem a conexão,
+# para as migrações de dados que precisam de Python). A migração N (contando de 1) leva o
+# banco para "PRAGMA user_version = N". Ao abrir o repositório só rodam as
+# migrações que ainda não foram aplicadas; com o banco em dia, nenhum DDL roda.
+# Para mudar o esquema, ACRESCENTE uma migração no fim (nunca edite as antigas).
+MIGRACOES = (
+    # 1: tabelas originais
+    (
+    """
+    CREATE TABLE IF NOT EXISTS pacientes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL,
+        cpf TEXT UNIQUE NOT NULL,
+        telefone TEXT NOT NULL,
+        plano_saude TEXT NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS medicos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL,
+        cpf TEXT UNIQUE NOT NULL,
+        telefone TEXT NOT NULL,
+        crm TEXT,
+        especialidade TEXT,
+        regras_disponibilidade TEXT
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS agendamentos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_paciente INTEGER NOT NULL,
+        id_medico INTEGER NOT NULL,
+        data_hora_inicio TEXT NOT NULL,
+        duracao_minutos INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        FOREIGN KEY (id_paciente) REFERENCES pacientes (id),
+        FOREIGN KEY (id_medico) REFERENCES medicos (id)
+    );
+    """,
+    ),
+    # 2: lista de espera + índice para as buscas de agenda/conflito por médico
+    (
+    """
+    CREATE TABLE IF NOT EXISTS lista_espera (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_paciente INTEGER NOT NULL,
+        especialidade TEXT NOT NULL,
+        data_inicio TEXT NOT NULL,
+        data_fim TEXT NOT NULL,
+        duracao_minutos INTEGER NOT NULL,
+        criado_em TEXT NOT NULL,
+        status TEXT NOT NULL,
+        id_agendamento INTEGER,
+        FOREIGN KEY (id_paciente) REFERENCES pacientes (id),
+        FOREIGN KEY (id_agendamento) REFERENCES agendamentos (id)
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_lista_espera_status ON lista_espera (status, especialidade);",
+    "CREATE INDEX IF NOT EXISTS idx_agendamentos_medico_inicio ON agendamentos (id_medico, data_hora_inicio);",
+    ),
+    # 3: busca por nome (FTS5). Tabelas "external content": o texto fica só em
+    # pacientes/medicos e os gatilhos mantêm o índice em dia. O tokenizador
+    # remove acentos ("João" == "joao") e prefix='2 3' acelera prefixos curtos.
+    (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS pacientes_busca USING fts5(
+        nome, content='pacientes', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS pacientes_busca_ai AFTER INSERT ON pacientes BEGIN
+        INSERT INTO pacientes_busca (rowid, nome) VALUES (new.id, new.nome);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS pacientes_busca_ad AFTER DELETE ON pacientes BEGIN
+        INSERT INTO pacientes_busca (pacientes_busca, rowid, nome) VALUES ('delete', old.id, old.nome);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS pacientes_busca_au AFTER UPDATE OF nome ON pacientes BEGIN
+        INSERT INTO pacientes_busca (pacientes_busca, rowid, nome) VALUES ('delete', old.id, old.nome);
+        INSERT INTO pacientes_busca (rowid, nome) VALUES (new.id, new.nome);
+    END;
+    """,
+    "INSERT INTO pacientes_busca (pacientes_busca) VALUES ('rebuild');",
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS medicos_busca USING fts5(
+        nome, especialidade, content='medicos', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS medicos_busca_ai AFTER INSERT ON medicos BEGIN
+        INSERT INTO medicos_busca (rowid, nome, especialidade) VALUES (new.id, new.nome, new.especialidade);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS medicos_busca_ad AFTER DELETE ON medicos BEGIN
+        INSERT INTO medicos_busca (medicos_busca, rowid, nome, especialidade)
+        VALUES ('delete', old.id, old.nome, old.especialidade);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS medicos_busca_au AFTER UPDATE OF nome, especialidade ON medicos BEGIN
+        INSERT INTO medicos_busca (medicos_busca, rowid, nome, especialidade)
+        VALUES ('delete', old.id, old.nome, old.especialidade);
+        INSERT INTO medicos_busca (rowid, nome, especialidade) VALUES (new.id, new.nome, new.especialidade);
+    END;
+    """,
+    "INSERT INTO medicos_busca (medicos_busca) VALUES ('rebuild');",
+    ),
+    # 4: diário de eventos dos agendamentos ("outbox"). Os gatilhos gravam o
+    # evento no MESMO statement (e portanto na mesma transação) da mudança,
+    # inclusive nas gravações em lote. seq só cresce e, como o SQLite tem um
+    # único escritor por vez, a ordem de seq é a ordem de commit.
+    (
+    """
+    CREATE TABLE IF NOT EXISTS eventos_agenda (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        tipo TEXT NOT NULL,
+        id_agendamento INTEGER NOT NULL,
+        dados TEXT NOT NULL,
+        criado_em TEXT NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS consumidores_eventos (
+        nome TEXT PRIMARY KEY,
+        ultimo_seq INTEGER NOT NULL
+    );
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS eventos_agenda_ai AFTER INSERT ON agendamentos BEGIN
+        INSERT INTO eventos_agenda (tipo, id_agendamento, dados, criado_em) VALUES (
+            'criado', new.id,
+            json_object('id_paciente', new.id_paciente, 'id_medico', new.id_medico,
+                        'data_hora_inicio', new.data_hora_inicio, 'duracao_minutos', new.duracao_minutos,
+                        'status', new.status),
+            strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'));
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS eventos_agenda_au AFTER UPDATE ON agendamentos BEGIN
+        INSERT INTO eventos_agenda (tipo, id_agendamento, dados, criado_em) VALUES (
+            'atualizado', new.id,
+            json_object('id_paciente', new.id_paciente, 'id_medico', new.id_medico,
+                        'data_hora_inicio', new.data_hora_inicio, 'duracao_minutos', new.duracao_minutos,
+                        'status', new.status, 'status_anterior', old.status),
+            strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'));
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS eventos_agenda_ad AFTER DELETE ON agendamentos BEGIN
+        INSERT INTO eventos_agenda (tipo, id_agendamento, dados, criado_em) VALUES (
+            'removido', old.id,
+            json_object('id_paciente', old.id_paciente, 'id_medico', old.id_medico,
+                        'data_hora_inicio', old.data_hora_inicio, 'duracao_minutos', old.duracao_minutos,
+                        'status', old.status),
+            strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'));
+    END;
+    """,
+    ),
+    # 5: status como inteiro (tabela status_agendamento) e índices parciais só
+    # com as consultas ativas. O SQLite não muda o tipo de uma coluna, então a
+    # tabela agendamentos é recriada (as chaves estrangeiras ficam desligadas
+    # durante as migrações; veja _criar_tabelas). DROP TABLE leva junto os
+    # índices e os gatilhos do diário de eventos, que são recriados aqui.
+    (
+    """
+    CREATE TABLE IF NOT EXISTS status_agendamento (
+        codigo INTEGER PRIMARY KEY,
+        nome TEXT UNIQUE NOT NULL
+    );
+    """,
+    "INSERT OR IGNORE INTO status_agendamento (codigo, nome) VALUES "
+    + ", ".join(f"({codigo}, '{nome}')" for codigo, nome in STATUS_NOMES.items()) + ";",
+    """
+    CREATE TABLE agendamentos_novo (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_paciente INTEGER NOT NULL,
+        id_medico INTEGER NOT NULL,
+        data_hora_inicio TEXT NOT NULL,
+        duracao_minutos INTEGER NOT NULL,
+        status INTEGER NOT NULL,
+        FOREIGN KEY (id_paciente) REFERENCES pacientes (id),
+        FOREIGN KEY (id_medico) REFERENCES medicos (id),
+        FOREIGN KEY (status) REFERENCES status_agendamento (codigo)
+    );
+    """,
+    # Os textos antigos eram "agendado" (marcar_consulta) e "Cancelado".
+    f"""
+    INSERT INTO agendamentos_novo (id, id_paciente, id_medico, data_hora_inicio, duracao_minutos, status)
+    SELECT id, id_paciente, id_medico, data_hora_inicio, duracao_minutos,
+           CASE lower(status) WHEN 'cancelado' THEN {STATUS_CANCELADO}
+                              WHEN 'realizado' THEN {STATUS_REALIZADO}
+                              ELSE {STATUS_AGENDADO} END
+    FROM agendamentos;
+    """,
+    # Preserva o contador do AUTOINCREMENT (IDs apagados não podem voltar:
+    # o diário de eventos se refere a eles).
+    "DELETE FROM sqlite_sequence WHERE name = 'agendamentos_novo';",
+    "INSERT INTO sqlite_sequence (name, seq) SELECT 'agendamentos_novo', seq FROM sqlite_sequence "
+    "WHERE name = 'agendamentos';",
+    "DROP TABLE agendamentos;",
+    "ALTER TABLE agendamentos_novo RENAME TO agendamentos;",
+    "CREATE INDEX IF NOT EXISTS idx_agendamentos_medico_inicio ON agendamentos (id_medico, data_hora_inicio);",
+    "CREATE INDEX IF NOT EXISTS idx_agendamentos_paciente_inicio ON agendamentos (id_paciente, data_hora_inicio);",
+    # Índice parcial: só consultas ativas, com a duração (cobre as buscas de conflito).
+    f"CREATE INDEX IF NOT EXISTS idx_agendamentos_ativos_medico ON agendamentos "
+    f"(id_medico, data_hora_inicio, duracao_minutos) WHERE {_ATIVO};",
+    """
+    CREATE TRIGGER IF NOT EXISTS eventos_agenda_ai AFTER INSERT ON agendamentos BEGIN
+        INSERT INTO eventos_agenda (tipo, id_agendamento, dados, criado_em) VALUES (
+            'criado', new.id,
+            json_object('id_paciente', new.id_paciente, 'id_medico', new.id_medico,
+                        'data_hora_inicio', new.data_hora_inicio, 'duracao_minutos', new.duracao_minutos,
+                        'status', (SELECT nome FROM status_agendamento WHERE codigo = new.status)),
+            strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'));
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS eventos_agenda_au AFTER UPDATE ON agendamentos BEGIN
+        INSERT INTO eventos_agenda (tipo, id_agendamento, dados, criado_em) VALUES (
+            'atualizado', new.id,
+            json_object('id_paciente', new.id_paciente, 'id_medico', new.id_medico,
+                        'data_hora_inicio', new.data_hora_inicio, 'duracao_minutos', new.duracao_minutos,
+                        'status', (SELECT nome FROM status_agendamento WHERE codigo = new.status),
+                        'status_anterior', (SELECT nome FROM status_agendamento WHERE codigo = old.status)),
+            strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'));
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS eventos_agenda_ad AFTER DELETE ON agendamentos BEGIN
+        INSERT INTO eventos_agenda (tipo, id_agendamento, dados, criado_em) VALUES (
+            'removido', old.id,
+            json_object('id_paciente', old.id_paciente, 'id_medico', old.id_medico,
+                        'data_hora_inicio', old.data_hora_inicio, 'duracao_minutos', old.duracao_minutos,
+                        'status', (SELECT nome FROM status_agendamento WHERE codigo = old.status)),
+            strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'));
+    END;
+    """,
+    ),
+    # 6: arquivamento de consultas antigas (veja arquivar_agendamentos). Enquanto
+    # arquivamento_ativo tiver uma linha (só dentro da transação do job), o
+    # DELETE gera o evento 'arquivado' em vez de 'removido'.
+    (
+    "CREATE TABLE IF NOT EXISTS arquivamento_ativo (ativo INTEGER NOT NULL);",
+    "CREATE INDEX IF NOT EXISTS idx_lista_espera_agendamento ON lista_espera (id_agendamento);",
+    "DROP TRIGGER IF EXISTS eventos_agenda_ad;",
+    """
+    CREATE TRIGGER IF NOT EXISTS eventos_agenda_ad AFTER DELETE ON agendamentos BEGIN
+        INSERT INTO eventos_agenda (tipo, id_agendamento, dados, criado_em) VALUES (
+            CASE WHEN EXISTS (SELECT 1 FROM arquivamento_ativo) THEN 'arquivado' ELSE 'removido' END, old.id,
+            json_object('id_paciente', old.id_paciente, 'id_medico', old.id_medico,
+                        'data_hora_inicio', old.data_hora_inicio, 'duracao_minutos', old.duracao_minutos,
+                        'status', (SELECT nome FROM status_agendamento WHERE codigo = old.status)),
+            strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'));
+    END;
+    """,
+    ),
+    # 7: exclusão lógica de pacientes e médicos (deleted_at) e índices das
+    # chaves estrangeiras que ainda faltavam. Os índices parciais só guardam
+    # os excluídos, que são os que o expurgo (purgar_excluidos) procura.
+    (
+    "ALTER TABLE pacientes ADD COLUMN deleted_at TEXT;",
+    "ALTER TABLE medicos ADD COLUMN deleted_at TEXT;",
+    "CREATE INDEX IF NOT EXISTS idx_pacientes_excluidos ON pacientes (deleted_at) WHERE deleted_at IS NOT NULL;",
+    "CREATE INDEX IF NOT EXISTS idx_medicos_excluidos ON medicos (deleted_at) WHERE deleted_at IS NOT NULL;",
+    "CREATE INDEX IF NOT EXISTS idx_lista_espera_paciente ON lista_espera (id_paciente);",
+    ),
+    # 8: versão de cada agendamento, para atualizações com concorrência otimista.
+    (
+    "ALTER TABLE agendamentos ADD COLUMN versao INTEGER NOT NULL DEFAULT 1;",
+    # Para as transições em massa por período (todos os médicos).
+    "CREATE INDEX IF NOT EXISTS idx_agendamentos_inicio ON agendamentos (data_hora_inicio);",
+    ),
+    # 9: o gatilho de UPDATE roda uma vez por linha nas transições em massa
+    # (fechar_periodo); os nomes de status passam a vir de um CASE.
+    (
+    "DROP TRIGGER IF EXISTS eventos_agenda_au;",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS eventos_agenda_au AFTER UPDATE ON agendamentos BEGIN
+        INSERT INTO eventos_agenda (tipo, id_agendamento, dados, criado_em) VALUES (
+            'atualizado', new.id,
+            json_object('id_paciente', new.id_paciente, 'id_medico', new.id_medico,
+                        'data_hora_inicio', new.data_hora_inicio, 'duracao_minutos', new.duracao_minutos,
+                        'status', {_nome_status_sql("new.status")},
+                        'status_anterior', {_nome_status_sql("old.status")}),
+            strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'));
+    END;
+    """,
+    ),
+    # 10: horários de trabalho normalizados em modelos compartilhados (veja
+    # faixas_disponibilidade), para perguntas como "quem atende sábado de manhã"
+    # serem uma consulta indexada em vez de ler o JSON de todos os médicos.
+    (
+    """
+    CREATE TABLE IF NOT EXISTS modelos_disponibilidade (
+        id INTEGER PRIMARY KEY,
+        assinatura TEXT UNIQUE NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS faixas_disponibilidade (
+        id_modelo INTEGER NOT NULL REFERENCES modelos_disponibilidade (id),
+        dia_semana INTEGER NOT NULL,
+        inicio_min INTEGER NOT NULL,
+        fim_min INTEGER NOT NULL,
+        PRIMARY KEY (id_modelo, dia_semana, inicio_min)
+    ) WITHOUT ROWID;
+    """,
+    # Cobre a busca por horário: dia, início <= T, fim >= T + duração -> modelo.
+    "CREATE INDEX IF NOT EXISTS idx_faixas_dia_inicio ON faixas_disponibilidade "
+    "(dia_semana, inicio_min, fim_min, id_modelo);",
+    "ALTER TABLE medicos ADD COLUMN id_modelo_disponibilidade INTEGER REFERENCES modelos_disponibilidade (id);",
+    "CREATE INDEX IF NOT EXISTS idx_medicos_modelo ON medicos (id_modelo_disponibilidade);",
+    _migrar_regras_para_modelos,
+    # A mesma informação por médico, no formato (id_medico, dia, início, fim).
+    """
+    CREATE VIEW IF NOT EXISTS disponibilidade AS
+    SELECT m.id AS id_medico, f.dia_semana, f.inicio_min, f.fim_min
+    FROM medicos m JOIN faixas_disponibilidade f ON f.id_modelo = m.id_modelo_disponibilidade;
+    """,
+    ),
+    # 11: exceções à disponibilidade (férias, feriados, bloqueios de agenda).
+    # id_medico NULL = clínica inteira. bloqueios_rtree é um índice R*Tree
+    # (como pacientes_busca é um índice FTS5), mantido pelos gatilhos: a
+    # dimensão "medico" vale [id, id] para um médico e [0, MAX] para a
+    # clínica, então "algum bloqueio do médico X entre A e B?" é UMA busca
+    # no R*Tree, O(log n), sem importar quantos bloqueios existam. O tempo
+    # fica em minutos desde 1970 (inteiro de 32 bits), arredondado para fora.
+    (
+    """
+    CREATE TABLE IF NOT EXISTS bloqueios (
+        id INTEGER PRIMARY KEY,
+        id_medico INTEGER REFERENCES medicos (id) ON DELETE CASCADE,
+        inicio TEXT NOT NULL,
+        fim TEXT NOT NULL,
+        motivo TEXT NOT NULL DEFAULT '',
+        CHECK (fim > inicio)
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_bloqueios_medico_inicio ON bloqueios (id_medico, inicio);",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS bloqueios_rtree USING rtree_i32 (id, medico_min, medico_max, "
+    "inicio_min, fim_min);",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS bloqueios_ai AFTER INSERT ON bloqueios BEGIN
+        INSERT INTO bloqueios_rtree (id, medico_min, medico_max, inicio_min, fim_min)
+        VALUES (new.id, coalesce(new.id_medico, 0), coalesce(new.id_medico, {_MEDICO_MAX}),
+                {_minuto_epoca_sql("new.inicio")}, {_minuto_epoca_sql("new.fim", para_cima=True)});
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS bloqueios_ad AFTER DELETE ON bloqueios BEGIN
+        DELETE FROM bloqueios_rtree WHERE id = old.id;
+    END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS bloqueios_au AFTER UPDATE ON bloqueios BEGIN
+        UPDATE bloqueios_rtree SET medico_min = coalesce(new.id_medico, 0),
+            medico_max = coalesce(new.id_medico, {_MEDICO_MAX}),
+            inicio_min = {_minuto_epoca_sql("new.inicio")},
+            fim_min = {_minuto_epoca_sql("new.fim", para_cima=True)}
+        WHERE id = old.id;
+    END;
+    """,
+    ),
+    # 12: capacidade (consultas simultâneas) por médico e por especialidade.
+    # medicos.capacidade NULL = vale a regra da especialidade, ou 1.
+    (
+    "ALTER TABLE medicos ADD COLUMN capacidade INTEGER CHECK (capacidade IS NULL OR capacidade >= 1);",
+    """
+    CREATE TABLE IF NOT EXISTS capacidade_especialidades (
+        especialidade TEXT PRIMARY KEY COLLATE NOCASE,
+        capacidade INTEGER NOT NULL CHECK (capacidade >= 1)
+    ) WITHOUT ROWID;
+    """,
+    ),
+    # 13: índices de cobertura das listagens (telas de cadastro): só as colunas
+    # exibidas, em ordem de ID, e só os registros não excluídos. A listagem lê
+    # apenas o índice, sem passar pelas linhas inteiras (telefone, regras em JSON).
+    # deleted_at (sempre NULL aqui) entra no fim só para que o "deleted_at IS
+    # NULL" da consulta não obrigue o SQLite a ler a tabela.
+    (
+    "CREATE INDEX IF NOT EXISTS idx_pacientes_listagem ON pacientes (id, nome, cpf, plano_saude, deleted_at) "
+    "WHERE deleted_at IS NULL;",
+    "CREATE INDEX IF NOT EXISTS idx_medicos_listagem ON medicos (id, nome, crm, especialidade, deleted_at) "
+    "WHERE deleted_at IS NULL;",
+    ),
+    # 14: CPF/CRM únicos só entre os cadastros ATIVOS. Com o UNIQUE na coluna,
+    # recadastrar o CPF de um paciente excluído quebrava com IntegrityError, e o
+    # CRM não tinha restrição nenhuma (dois médicos ativos com o mesmo CRM).
+    (
+    _unicidade_so_dos_ativos,
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_pacientes_cpf ON pacientes (cpf) WHERE deleted_at IS NULL;",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_medicos_cpf ON medicos (cpf) WHERE deleted_at IS NULL;",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_medicos_crm ON medicos (crm) WHERE deleted_at IS NULL;",
+    ),
+)
+
+# --- ARQUIVO (consultas antigas) ---
+# Banco separado, anexado às conexões como "arquivo". Guarda as consultas
+# encerradas (Realizado/Cancelado) mais antigas que o corte do job de
+# arquivamento, para que a tabela "quente" agendamentos fique pequena.
+# "horizonte" é o maior corte já usado: consultas a partir dele estão todas
+# na tabela quente, então só buscas que começam antes precisam do arquivo.
+ESQUEMA_ARQUIVO = (
+    """
+    CREATE TABLE IF NOT EXISTS arquivo.agendamentos (
+        id INTEGER PRIMARY KEY,
+        id_paciente INTEGER NOT NULL,
+        id_medico INTEGER NOT NULL,
+        data_hora_inicio TEXT NOT NULL,
+        duracao_minutos INTEGER NOT NULL,
+        status INTEGER NOT NULL,
+        arquivado_em TEXT NOT NULL
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS arquivo.idx_arquivo_paciente_inicio ON agendamentos (id_paciente, data_hora_inicio);",
+    "CREATE TABLE IF NOT EXISTS arquivo.controle (chave TEXT PRIMARY KEY, valor TEXT NOT NULL);",
+)
+
+ESQUEMA_VERSAO = len(MIGRACOES)
+
+# "Existe bloqueio do médico (ou da clínica) que se sobrepõe a [ini, fim)?"
+# O R*Tree filtra pela faixa em minutos; a comparação ISO acerta os segundos.
+_BLOQUEIO_NO_INTERVALO = (
+    "SELECT 1 FROM bloqueios_rtree r JOIN bloqueios b ON b.id = r.id "
+    "WHERE r.medico_min <= {medico} AND r.medico_max >= {medico} "
+    "AND r.inicio_min < {fim_min} AND r.fim_min > {ini_min} AND b.inicio < {fim} AND b.fim > {ini}"
+)
+
+# Consultas ÓRFÃS: o paciente ou o médico não existe (furo de chave
+# estrangeira) ou foi excluído; buscar_agendamento devolve None para elas.
+_AGENDAMENTOS_ORFAOS = (
+    "SELECT a.id, CASE WHEN p.id IS NULL THEN 'paciente inexistente' "
+    "WHEN m.id IS NULL THEN 'médico inexistente' "
+    "WHEN p.deleted_at IS NOT NULL THEN 'paciente excluído' ELSE 'médico excluído' END AS motivo "
+    "FROM agendamentos a LEFT JOIN pacientes p ON p.id = a.id_paciente "
+    "LEFT JOIN medicos m ON m.id = a.id_medico "
+    "WHERE p.id IS NULL OR m.id IS NULL OR p.deleted_at IS NOT NULL OR m.deleted_at IS NOT NULL"
+)
+
+_COLUNAS_PACIENTE = "id, nome, cpf, telefone, plano_saude"
+_COLUNAS_MEDICO = "id, nome, cpf, telefone, crm, especialidade, regras_disponibilidade"
+
+# --- REGISTRO CENTRAL DE SQL ---
+# Todo SQL usado pelo AgendaRepository fica aqui, com texto canônico.
+# O cache de statements do sqlite3 é indexado pelo TEXTO do SQL, então
+# usar sempre a mesma string garante que o statement preparado seja reaproveitado.
+
+SQL = {
+    # Pacientes
+    "salvar_paciente":
+        "INSERT INTO pacientes (nome, cpf, telefone, plano_saude) VALUES (?, ?, ?, ?);",
+    "buscar_paciente":
+        f"SELECT {_COLUNAS_PACIENTE} FROM pacientes WHERE id = ? AND deleted_at IS NULL;",
+    "buscar_todos_pacientes":
+        f"SELECT {_COLUNAS_PACIENTE} FROM pacientes WHERE deleted_at IS NULL ORDER BY id;",
+    # Listagem resumida (colunas de COLUNAS_RESUMO_PACIENTE), paginada por keyset.
+    # INDEXED BY: sozinho o planejador prefere percorrer a tabela pelo rowid.
+    "listar_pacientes_resumo":
+        "SELECT id, nome, cpf, plano_saude FROM pacientes INDEXED BY idx_pacientes_listagem "
+        "WHERE id > ? AND deleted_at IS NULL ORDER BY id LIMIT ?;",
+    "buscar_paciente_por_cpf":
+        f"SELECT {_COLUNAS_PACIENTE} FROM pacientes WHERE cpf = ? AND deleted_at IS NULL;",
+    "buscar_cpfs_pacientes":
+        "SELECT id, cpf FROM pacientes WHERE id IN (SELECT value FROM json_each(?));",
+    "atualizar_paciente":
+        "UPDATE pacientes SET telefone = ?, plano_saude = ? WHERE id = ?;",
+    # Exclusão lógica: marca deleted_at; o DELETE de verdade é feito pelo expurgo.
+    "deletar_paciente":
+        "UPDATE pacientes SET deleted_at = ? WHERE id = ? AND deleted_at IS NULL;",
+
+    # Médicos
+    "salvar_medico":
+        "INSERT INTO medicos (nome, cpf, telefone, especialidade, crm, regras_disponibilidade, "
+        "id_modelo_disponibilidade) VALUES (?, ?, ?, ?, ?, ?, ?);",
+    # Modelos de horário (veja faixas_disponibilidade)
+    "criar_modelo_disponibilidade":
+        "INSERT OR IGNORE INTO modelos_disponibilidade (assinatura) VALUES (?);",
+    "buscar_modelo_disponibilidade":
+        "SELECT id FROM modelos_disponibilidade WHERE assinatura = ?;",
+    "salvar_faixa_disponibilidade":
+        "INSERT INTO faixas_disponibilidade (id_modelo, dia_semana, inicio_min, fim_min) VALUES (?, ?, ?, ?);",
+    # Médicos cujo expediente cobre [início, fim) no dia da semana e, com ?5,
+    # sem consulta ativa que se sobreponha; nunca com bloqueio no intervalo.
+    # Parâmetros: dia_semana, início_min, fim_min, especialidade (ou NULL),
+    # sem_consulta, dia ISO, fim ISO, início ISO, início e fim em minuto_epoca.
+    "buscar_medicos_disponiveis":
+        "SELECT DISTINCT m.id, m.nome, m.cpf, m.telefone, m.crm, m.especialidade, m.regras_disponibilidade "
+        "FROM faixas_disponibilidade f JOIN medicos m ON m.id_modelo_disponibilidade = f.id_modelo "
+        "LEFT JOIN capacidade_especialidades ce ON ce.especialidade = m.especialidade "
+        "WHERE f.dia_semana = ?1 AND f.inicio_min <= ?2 AND f.fim_min >= ?3 AND m.deleted_at IS NULL "
+        "AND (?4 IS NULL OR m.especialidade = ?4 COLLATE NOCASE) "
+        # Com capacidade > 1 conta as consultas que tocam o horário (por excesso:
+        # pode deixar de fora um médico com vaga, nunca inclui um lotado).
+        "AND (NOT ?5 OR (SELECT COUNT(*) FROM agendamentos a WHERE a.id_medico = m.id "
+        f"AND a.data_hora_inicio >= ?6 AND a.data_hora_inicio < ?7 AND {_ATIVO} "
+        "AND strftime('%Y-%m-%dT%H:%M:%S', a.data_hora_inicio, '+' || a.duracao_minutos || ' minutes') > ?8"
+        ") < coalesce(m.capacidade, ce.capacidade, 1)) "
+        "AND NOT EXISTS ("
+        + _BLOQUEIO_NO_INTERVALO.format(medico="m.id", ini_min="?9", fim_min="?10", ini="?8", fim="?7") + ") "
+        "ORDER BY m.id;",
+    "buscar_medico":
+        f"SELECT {_COLUNAS_MEDICO} FROM medicos WHERE id = ? AND deleted_at IS NULL;",
+    "listar_medicos_resumo":
+        "SELECT id, nome, crm, especialidade FROM medicos INDEXED BY idx_medicos_listagem "
+        "WHERE id > ? AND deleted_at IS NULL ORDER BY id LIMIT ?;",
+    "buscar_medico_por_crm":
+        f"SELECT {_COLUNAS_MEDICO} FROM medicos WHERE crm = ? AND deleted_at IS NULL;",
+    "buscar_medico_por_cpf":
+        f"SELECT {_COLUNAS_MEDICO} FROM medicos WHERE cpf = ? AND deleted_at IS NULL;",
+    "buscar_todos_medicos":
+        f"SELECT {_COLUNAS_MEDICO} FROM medicos WHERE deleted_at IS NULL ORDER BY id;",
+    # Busca paginada por "keyset": ordem de id e "rowid > último id visto", o
+    # que evita OFFSET e mantém o custo da página constante.
+    "buscar_pacientes_por_nome":
+        "SELECT p.id, p.nome, p.cpf, p.telefone, p.plano_saude "
+        "FROM pacientes_busca JOIN pacientes p ON p.id = pacientes_busca.rowid "
+        "WHERE pacientes_busca MATCH ? AND pacientes_busca.rowid > ? AND p.deleted_at IS NULL "
+        "ORDER BY pacientes_busca.rowid LIMIT ?;",
+    "buscar_medicos_por_texto":
+        "SELECT m.id, m.nome, m.cpf, m.telefone, m.crm, m.especialidade, m.regras_disponibilidade "
+        "FROM medicos_busca JOIN medicos m ON m.id = medicos_busca.rowid "
+        "WHERE medicos_busca MATCH ? AND medicos_busca.rowid > ? AND m.deleted_at IS NULL "
+        "ORDER BY medicos_busca.rowid LIMIT ?;",
+    "deletar_medico":
+        "UPDATE medicos SET deleted_at = ? WHERE id = ? AND deleted_at IS NULL;",
+
+    # Agendamentos
+    "salvar_agendamento":
+        "INSERT INTO agendamentos (id_paciente, id_medico, data_hora_inicio, duracao_minutos, status) "
+        "VALUES (?, ?, ?, ?, ?);",
+    "buscar_agendamento":
+        "SELECT id, id_paciente, id_medico, data_hora_inicio, duracao_minutos, status, versao "
+        "FROM agendamentos WHERE id = ?;",
+    # As agendas trazem só as consultas ativas; as variantes "_com_cancelados"
+    # incluem o histórico. Parâmetros do médico: id_medico, dia, dia seguinte
+    # (faixa em data_hora_inicio, que usa os índices).
+    "buscar_agendamentos_por_paciente":
+        "SELECT id, id_medico, data_hora_inicio, duracao_minutos, status "
+        "FROM agendamentos WHERE id_paciente = ? AND data_hora_inicio >= ? AND data_hora_inicio < ? "
+        f"AND {_ATIVO} ORDER BY data_hora_inicio;",
+    "buscar_agendamentos_por_paciente_com_cancelados":
+        "SELECT id, id_medico, data_hora_inicio, duracao_minutos, status "
+        "FROM agendamentos WHERE id_paciente = ? AND data_hora_inicio >= ? AND data_hora_inicio < ? "
+        "ORDER BY data_hora_inicio;",
+    # Agenda do paciente nas duas camadas (só quando o período pedido começa
+    # antes do horizonte do arquivo). Parâmetros: (id_paciente, de, até) x 2.
+    "buscar_agendamentos_por_paciente_com_arquivo":
+        "SELECT id, id_medico, data_hora_inicio, duracao_minutos, status FROM agendamentos "
+        f"WHERE id_paciente = ? AND data_hora_inicio >= ? AND data_hora_inicio < ? AND {_ATIVO} "
+        "UNION ALL "
+        "SELECT id, id_medico, data_hora_inicio, duracao_minutos, status FROM arquivo.agendamentos "
+        f"WHERE id_paciente = ? AND data_hora_inicio >= ? AND data_hora_inicio < ? AND {_ATIVO} "
+        "ORDER BY data_hora_inicio;",
+    "buscar_agendamentos_por_paciente_com_arquivo_e_cancelados":
+        "SELECT id, id_medico, data_hora_inicio, duracao_minutos, status FROM agendamentos "
+        "WHERE id_paciente = ? AND data_hora_inicio >= ? AND data_hora_inicio < ? "
+        "UNION ALL "
+        "SELECT id, id_medico, data_hora_inicio, duracao_minutos, status FROM arquivo.agendamentos "
+        "WHERE id_paciente = ? AND data_hora_inicio >= ? AND data_hora_inicio < ? "
+        "ORDER BY data_hora_inicio;",
+    "buscar_agendamentos_por_medico_e_data":
+        "SELECT id, id_paciente, data_hora_inicio, duracao_minutos, status "
+        f"FROM agendamentos WHERE id_medico = ? AND data_hora_inicio >= ? AND data_hora_inicio < ? AND {_ATIVO} "
+        "ORDER BY data_hora_inicio;",
+    "buscar_agendamentos_por_medico_e_data_com_cancelados":
+        "SELECT id, id_paciente, data_hora_inicio, duracao_minutos, status "
+        "FROM agendamentos WHERE id_medico = ? AND data_hora_inicio >= ? AND data_hora_inicio < ? "
+        "ORDER BY data_hora_inicio;",
+    # Agendas como linhas prontas para serializacao.py (ordem de COLUNAS_AGENDA),
+    # com CPF/CRM por JOIN em vez de montar Paciente/Medico a cada linha (e,
+    # como lá, sem as consultas de cadastros excluídos). O primeiro parâmetro
+    # é incluir_cancelados (0/1).
+    "linhas_agenda_paciente":
+        "SELECT a.id, p.cpf, m.crm, a.data_hora_inicio, a.duracao_minutos, a.status FROM agendamentos a "
+        "JOIN pacientes p ON p.id = a.id_paciente JOIN medicos m ON m.id = a.id_medico "
+        f"WHERE (? OR {_ATIVO}) AND p.deleted_at IS NULL AND m.deleted_at IS NULL AND a.id_paciente = ? AND a.data_hora_inicio >= ? AND a.data_hora_inicio < ? "
+        "ORDER BY a.data_hora_inicio;",
+    "linhas_agenda_paciente_com_arquivo":
+        "SELECT a.id, p.cpf, m.crm, a.data_hora_inicio, a.duracao_minutos, a.status FROM ("
+        "SELECT id, id_paciente, id_medico, data_hora_inicio, duracao_minutos, status FROM agendamentos "
+        "WHERE id_paciente = ?2 AND data_hora_inicio >= ?3 AND data_hora_inicio < ?4 "
+        "UNION ALL "
+        "SELECT id, id_paciente, id_medico, data_hora_inicio, duracao_minutos, status FROM arquivo.agendamentos "
+        "WHERE id_paciente = ?2 AND data_hora_inicio >= ?3 AND data_hora_inicio < ?4) a "
+        "JOIN pacientes p ON p.id = a.id_paciente JOIN medicos m ON m.id = a.id_medico "
+        f"WHERE (?1 OR {_ATIVO}) AND p.deleted_at IS NULL AND m.deleted_at IS NULL ORDER BY a.data_hora_inicio;",
+    "linhas_agenda_medico":
+        "SELECT a.id, p.cpf, m.crm, a.data_hora_inicio, a.duracao_minutos, a.status FROM agendamentos a "
+        "JOIN pacientes p ON p.id = a.id_paciente JOIN medicos m ON m.id = a.id_medico "
+        f"WHERE (? OR {_ATIVO}) AND p.deleted_at IS NULL AND m.deleted_at IS NULL AND a.id_medico = ? AND a.data_hora_inicio >= ? AND a.data_hora_inicio < ? "
+        "ORDER BY a.data_hora_inicio;",
+    "atualizar_agendamento":
+        "UPDATE agendamentos SET status = ?, versao = versao + 1 WHERE id = ?;",
+    "atualizar_agendamento_versionado":
+        "UPDATE agendamentos SET status = ?, versao = versao + 1 WHERE id = ? AND versao = ?;",
+    # Transição de status sem montar Paciente/Medico: um único UPDATE que só
+    # afeta a linha se o status mudar de fato (e, se informada, se a versão
+    # bater), e devolve o que a Clinica precisa. Parâmetros: novo, id, novo,
+    # versão (ou NULL), versão.
+    "mudar_status_agendamento":
+        "UPDATE agendamentos SET status = ?, versao = versao + 1 "
+        "WHERE id = ? AND status <> ? AND (? IS NULL OR versao = ?) "
+        "RETURNING id_medico, data_hora_inicio, duracao_minutos, versao, id_paciente;",
+    "buscar_status_agendamento":
+        "SELECT status, versao FROM agendamentos WHERE id = ?;",
+    # Transições em massa num só statement. Parâmetros: novo, de, até, status atual [, id_medico].
+    "mudar_status_no_periodo":
+        "UPDATE agendamentos SET status = ?, versao = versao + 1 "
+        "WHERE data_hora_inicio >= ? AND data_hora_inicio < ? AND status = ?;",
+    "mudar_status_no_periodo_medico":
+        "UPDATE agendamentos SET status = ?, versao = versao + 1 "
+        "WHERE data_hora_inicio >= ? AND data_hora_inicio < ? AND status = ? AND id_medico = ?;",
+    # Fechamento do dia: só consultas que já terminaram até o instante de corte.
+    "fechar_periodo":
+        "UPDATE agendamentos SET status = ?, versao = versao + 1 "
+        "WHERE data_hora_inicio >= ? AND data_hora_inicio < ? AND status = ? "
+        "AND strftime('%Y-%m-%dT%H:%M:%S', data_hora_inicio, '+' || duracao_minutos || ' minutes') <= ? "
+        "RETURNING id_medico;",
+    "fechar_periodo_medico":
+        "UPDATE agendamentos SET status = ?, versao = versao + 1 "
+        "WHERE data_hora_inicio >= ? AND data_hora_inicio < ? AND status = ? AND id_medico = ? "
+        "AND strftime('%Y-%m-%dT%H:%M:%S', data_hora_inicio, '+' || duracao_minutos || ' minutes') <= ? "
+        "RETURNING id_medico;",
+    "deletar_agendamento":
+        "DELETE FROM agendamentos WHERE id = ?;",
+
+    # Lista de espera
+    "salvar_pedido_espera":
+        "INSERT INTO lista_espera (id_paciente, especialidade, data_inicio, data_fim, duracao_minutos, "
+        "criado_em, status) VALUES (?, ?, ?, ?, ?, ?, ?);",
+    "buscar_pedidos_espera_pendentes":
+        "SELECT id, id_paciente, especialidade, data_inicio, data_fim, duracao_minutos, criado_em "
+        "FROM lista_espera WHERE status = 'pendente' ORDER BY id;",
+    "atender_pedido_espera":
+        "UPDATE lista_espera SET status = 'atendido', id_agendamento = ? WHERE id = ? AND status = 'pendente';",
+    "buscar_intervalos_ocupados":
+        "SELECT id_medico, id_paciente, data_hora_inicio, duracao_minutos FROM agendamentos "
+        f"WHERE data_hora_inicio >= ? AND data_hora_inicio < ? AND {_ATIVO};",
+    "buscar_intervalos_ocupados_medico":
+        "SELECT data_hora_inicio, duracao_minutos FROM agendamentos "
+        f"WHERE id_medico = ? AND data_hora_inicio >= ? AND data_hora_inicio < ? AND {_ATIVO};",
+    # Sobreposição: existente.inicio < novo.fim AND existente.fim > novo.inicio.
+    # Nenhuma consulta passa de um dia, então o início existente fica entre o
+    # começo do dia e novo.fim (faixa que usa o índice idx_agendamentos_medico_inicio).
+    # Parâmetros: id_medico, dia (YYYY-MM-DD), novo.fim, novo.inicio.
+    "existe_conflito_medico":
+        "SELECT 1 FROM agendamentos "
+        f"WHERE id_medico = ? AND data_hora_inicio >= ? AND data_hora_inicio < ? AND {_ATIVO} "
+        "AND strftime('%Y-%m-%dT%H:%M:%S', data_hora_inicio, '+' || duracao_minutos || ' minutes') > ? "
+        "LIMIT 1;",
+    # As mesmas consultas, para a varredura de capacidade (médicos com capacidade > 1).
+    "intervalos_sobrepostos_medico":
+        "SELECT data_hora_inicio, duracao_minutos FROM agendamentos "
+        f"WHERE id_medico = ? AND data_hora_inicio >= ? AND data_hora_inicio < ? AND {_ATIVO} "
+        "AND strftime('%Y-%m-%dT%H:%M:%S', data_hora_inicio, '+' || duracao_minutos || ' minutes') > ?;",
+
+    # Capacidade: a do médico; sem ela, a da especialidade; sem as duas, 1.
+    "capacidade_medico":
+        "SELECT coalesce(m.capacidade, ce.capacidade) FROM medicos m "
+        "LEFT JOIN capacidade_especialidades ce ON ce.especialidade = m.especialidade WHERE m.id = ?;",
+    "definir_capacidade_medico":
+        "UPDATE medicos SET capacidade = ? WHERE id = ? AND deleted_at IS NULL;",
+    "definir_capacidade_especialidade":
+        "INSERT INTO capacidade_especialidades (especialidade, capacidade) VALUES (?, ?) "
+        "ON CONFLICT (especialidade) DO UPDATE SET capacidade = excluded.capacidade;",
+    "remover_capacidade_especialidade":
+        "DELETE FROM capacidade_especialidades WHERE especialidade = ?;",
+    "buscar_capacidades_especialidades":
+        "SELECT especialidade, capacidade FROM capacidade_especialidades ORDER BY especialidade;",
+
+    # Bloqueios (exceções à disponibilidade). As buscas vão pelo bloqueios_rtree
+    # e conferem os horários exatos (ISO) só nos poucos candidatos que ele devolve.
+    "salvar_bloqueio":
+        "INSERT INTO bloqueios (id_medico, inicio, fim, motivo) VALUES (?, ?, ?, ?);",
+    "remover_bloqueio":
+        "DELETE FROM bloqueios WHERE id = ? RETURNING id_medico, inicio, fim, motivo;",
+    # Com shards, um bloqueio da clínica tem uma cópia (com outro ID) em cada shard.
+    "remover_copias_bloqueio_clinica":
+        "DELETE FROM bloqueios WHERE id_medico IS NULL AND inicio = ? AND fim = ? AND motivo = ?;",
+    # Parâmetros: id_medico, início (min), fim (min), início ISO, fim ISO.
+    "existe_bloqueio":
+        _BLOQUEIO_NO_INTERVALO.format(medico="?1", ini_min="?2", fim_min="?3", ini="?4", fim="?5") + " LIMIT 1;",
+    # Bloqueios que valem para algum médico de [?1, ?2] (um médico: [id, id], o
+    # que inclui os da clínica; todos: [0, MAX]) e tocam os minutos [?3, ?4).
+    "buscar_bloqueios":
+        "SELECT b.id, b.id_medico, b.inicio, b.fim, b.motivo "
+        "FROM bloqueios_rtree r JOIN bloqueios b ON b.id = r.id "
+        "WHERE r.medico_min <= ?2 AND r.medico_max >= ?1 AND r.inicio_min < ?4 AND r.fim_min > ?3 "
+        "ORDER BY b.inicio, b.id;",
+
+    # Diário de eventos
+    "buscar_eventos":
+        "SELECT seq, tipo, id_agendamento, dados, criado_em FROM eventos_agenda "
+        "WHERE seq > ? ORDER BY seq LIMIT ?;",
+    "buscar_posicao_consumidor":
+        "SELECT ultimo_seq FROM consumidores_eventos WHERE nome = ?;",
+    "confirmar_eventos":
+        "INSERT INTO consumidores_eventos (nome, ultimo_seq) VALUES (?, ?) "
+        "ON CONFLICT (nome) DO UPDATE SET ultimo_seq = max(ultimo_seq, excluded.ultimo_seq);",
+    "podar_eventos":
+        "DELETE FROM eventos_agenda WHERE seq <= ? "
+        "AND seq <= (SELECT coalesce(min(ultimo_seq), ?) FROM consumidores_eventos);",
+
+    # Arquivamento. As listas de IDs vão como um array JSON (json_each), para
+    # o texto do SQL não mudar com o tamanho do lote.
+    "selecionar_para_arquivo":
+        "SELECT id FROM agendamentos a "
+        f"WHERE id > ? AND data_hora_inicio < ? AND status IN ({STATUS_CANCELADO}, {STATUS_REALIZADO}) "
+        "AND NOT EXISTS (SELECT 1 FROM lista_espera l WHERE l.id_agendamento = a.id) "
+        "ORDER BY id LIMIT ?;",
+    "copiar_para_arquivo":
+        "INSERT OR REPLACE INTO arquivo.agendamentos "
+        "(id, id_paciente, id_medico, data_hora_inicio, duracao_minutos, status, arquivado_em) "
+        "SELECT id, id_paciente, id_medico, data_hora_inicio, duracao_minutos, status, ? "
+        "FROM agendamentos WHERE id IN (SELECT value FROM json_each(?));",
+    "remover_agendamentos_por_ids":
+        "DELETE FROM agendamentos WHERE id IN (SELECT value FROM json_each(?));",
+    "iniciar_arquivamento":
+        "INSERT INTO arquivamento_ativo (ativo) VALUES (1);",
+    "encerrar_arquivamento":
+        "DELETE FROM arquivamento_ativo;",
+    "buscar_horizonte_arquivo":
+        "SELECT valor FROM arquivo.controle WHERE chave = 'horizonte';",
+    "avancar_horizonte_arquivo":
+        "INSERT INTO arquivo.controle (chave, valor) VALUES ('horizonte', ?) "
+        "ON CONFLICT (chave) DO UPDATE SET valor = max(valor, excluded.valor);",
+
+    # Exclusão lógica e expurgo. Ao excluir alguém, as consultas futuras dele
+    # são canceladas e os pedidos pendentes da lista de espera também.
+    "cancelar_futuras_paciente":
+        f"UPDATE agendamentos SET status = {STATUS_CANCELADO}, versao = versao + 1 "
+        f"WHERE id_paciente = ? AND data_hora_inicio >= ? AND {_ATIVO};",
+    "cancelar_futuras_medico":
+        f"UPDATE agendamentos SET status = {STATUS_CANCELADO}, versao = versao + 1 "
+        f"WHERE id_medico = ? AND data_hora_inicio >= ? AND {_ATIVO};",
+    "cancelar_pedidos_espera_paciente":
+        "UPDATE lista_espera SET status = 'cancelado' WHERE id_paciente = ? AND status = 'pendente';",
+    "selecionar_agendamentos_para_purga":
+        "SELECT id FROM agendamentos "
+        "WHERE id_paciente IN (SELECT id FROM pacientes WHERE deleted_at IS NOT NULL AND deleted_at <= ?) "
+        "OR id_medico IN (SELECT id FROM medicos WHERE deleted_at IS NOT NULL AND deleted_at <= ?) "
+        "LIMIT ?;",
+    "desvincular_pedidos_espera":
+        "UPDATE lista_espera SET id_agendamento = NULL "
+        "WHERE id_agendamento IN (SELECT value FROM json_each(?));",
+    "purgar_pedidos_espera":
+        "DELETE FROM lista_espera WHERE id IN ("
+        "SELECT l.id FROM lista_espera l JOIN pacientes p ON p.id = l.id_paciente "
+        "WHERE p.deleted_at IS NOT NULL AND p.deleted_at <= ? LIMIT ?);",
+    "purgar_pacientes":
+        "DELETE FROM pacientes WHERE id IN ("
+        "SELECT id FROM pacientes WHERE deleted_at IS NOT NULL AND deleted_at <= ? LIMIT ?);",
+    "purgar_medicos":
+        "DELETE FROM medicos WHERE id IN ("
+        "SELECT id FROM medicos WHERE deleted_at IS NOT NULL AND deleted_at <= ? LIMIT ?);",
+
+    # Relatórios
+    "iterar_agendamentos_completos":
+        "SELECT a.id, a.data_hora_inicio, a.duracao_minutos, s.nome, "
+        "p.id, p.nome, p.cpf, p.plano_saude, m.id, m.nome, m.crm, m.especialidade "
+        "FROM agendamentos a "
+        "JOIN pacientes p ON p.id = a.id_paciente "
+        "JOIN medicos m ON m.id = a.id_medico "
+        "JOIN status_agendamento s ON s.codigo = a.status "
+        "ORDER BY a.id;",
+
+    # Manutenção
+    "contar_agendamentos_orfaos":
+        f"SELECT motivo, COUNT(*) FROM ({_AGENDAMENTOS_ORFAOS}) GROUP BY motivo ORDER BY motivo;",
+    "amostra_agendamentos_orfaos":
+        f"SELECT id, motivo FROM ({_AGENDAMENTOS_ORFAOS}) ORDER BY id LIMIT ?;",
+    # Consulta recente com cadastros ativos: base das medições da manutenção.
+    "buscar_consulta_recente":
+        "SELECT a.id_medico, a.data_hora_inicio, a.id_paciente FROM agendamentos a "
+        "JOIN pacientes p ON p.id = a.id_paciente JOIN medicos m ON m.id = a.id_medico "
+        "WHERE p.deleted_at IS NULL AND m.deleted_at IS NULL ORDER BY a.id DESC LIMIT 1;",
+}
+
+# Tamanho máximo de uma página nas buscas por nome.
+LIMITE_BUSCA = 100
+
+# Tamanho máximo de uma página nas listagens resumidas (listar_*_resumo).
+LIMITE_LISTAGEM = 1000
+
+
+def expressao_busca(texto: str | None = None, especialidade: str | None = None) -> str | None:
+    """
+    Monta a expressão MATCH do FTS5 a partir do texto digitado na recepção.
+
+    Cada palavra de 'texto' vira um prefixo na coluna nome ("jo sil" acha
+    "João da Silva"); 'especialidade' é comparada como frase na coluna
+    especialidade. Os termos vão entre aspas, então caracteres especiais do
+    FTS5 digitados pelo usuário não quebram a consulta. Acentos e maiúsculas
+    são ignorados pelo tokenizador. Retorna None se não sobrar nenhum termo.
+    """
+    import re
+    import unicodedata
+
+    partes = []
+    palavras = re.findall(r"\w+", unicodedata.normalize("NFC", texto or ""))
+    if palavras:
+        partes.append("nome : (" + " AND ".join(f'"{p}"*' for p in palavras) + ")")
+    termos = re.findall(r"\w+", unicodedata.normalize("NFC", especialidade or ""))
+    if termos:
+        partes.append('especialidade : "' + " ".join(termos) + '"')
+    return " AND ".join(partes) or None
+
+
+# Colunas das linhas de iterar_agenda_paciente / iterar_agenda_medico
+# (status vem como código; veja STATUS_NOMES).
+COLUNAS_AGENDA = ("id_agendamento", "cpf_paciente", "crm_medico", "inicio", "duracao_minutos", "status")
+
+# Colunas das tuplas de listar_pacientes_resumo / listar_medicos_resumo.
+COLUNAS_RESUMO_PACIENTE = ("id", "nome", "cpf", "plano_saude")
+COLUNAS_RESUMO_MEDICO = ("id", "nome", "crm", "especialidade")
+
+# Nomes das colunas devolvidas por AgendaRepository.iterar_agendamentos_completos.
+COLUNAS_AGENDAMENTO_COMPLETO = (
+    "id_agendamento", "data_hora_inicio", "duracao_minutos", "status",
+    "id_paciente", "nome_paciente", "cpf_paciente", "plano_saude",
+    "id_medico", "nome_medico", "crm_medico", "especialidade",
+)
+
+
 class AgendaRepository:
     """
     Camada de PERSITÊNCIA
     Responsável por todas as operações de banco de dados.
     Usa SQLite via sqlite3, que é parte da biblioteca padrão do Python.
+
+    Por padrão cada thread mantém UMA conexão aberta (de longa duração), para
+    que o cache de statements do sqlite3 seja aproveitado entre as chamadas.
+    fechar() fecha as conexões de todas as threads.
+    Use reutilizar_conexao=False para voltar ao comportamento antigo
+    (uma conexão nova por operação).
+
+    Com somente_leitura=True o arquivo é aberto como um snapshot congelado
+    (mode=ro, immutable=1, mmap): nenhuma trava é usada e nenhuma escrita é
+    permitida. Veja criar_snapshot() e abrir_snapshot().
     """
 
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, reutilizar_conexao: bool = True, somente_leitura: bool = False,
+                 caminho_arquivo: str | None = None):
         self.db_path = db_path
-        self._criar_tabelas()
+        self.reutilizar_conexao = reutilizar_conexao
+        self.somente_leitura = somente_leitura
+        # Banco das consultas arquivadas: "clinica.db" -> "clinica.arquivo.db".
+        self.caminho_arquivo = caminho_arquivo or os.path.splitext(db_path)[0] + ".arquivo.db"
+        self._local = threading.local()
+        # Conexão aberta de cada thread, para fechar() fechar todas.
+        self._conexoes: dict[threading.Thread, sqlite3.Connection] = {}
+        self._trava_conexoes = threading.Lock()
+        if somente_leitura:
+            if not os.path.exists(db_path):
+                raise FileNotFoundError(f"Snapshot {db_path} não encontrado.")
+        else:
+            self._criar_tabelas()
+
+    def _abrir_conexao(self) -> sqlite3.Connection:
+        """Abre uma nova conexão com o banco de dados SQLite."""
+        if self.somente_leitura:
+            import pathlib
+
+            # immutable=1 diz ao SQLite que o arquivo nunca muda: ele não usa
+            # travas nem verifica journal/WAL. Só é seguro para snapshots.
+            uri = pathlib.Path(self.db_path).resolve().as_uri() + "?mode=ro&immutable=1"
+            conn = sqlite3.connect(uri, uri=True, cached_statements=CACHED_STATEMENTS, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size = {MMAP_SNAPSHOT};")
+            conn.execute("PRAGMA query_only = ON;")
+            return conn
+        # check_same_thread=False só para fechar() poder fechar a conexão de
+        # outra thread; cada conexão continua sendo usada por uma única thread.
+        conn = sqlite3.connect(self.db_path, cached_statements=CACHED_STATEMENTS, check_same_thread=False)
+        conn.execute("PRAGMA foreign_keys = ON;")  # Habilita suporte a chaves estrangeiras
+        return conn
+
+    def _anexar_arquivo(self, conn: sqlite3.Connection, criar: bool = False) -> bool:
+        """
+        Anexa o banco de arquivo à conexão como "arquivo" (se ainda não estiver).
+        Sem criar=True, só anexa se o arquivo já existir. Retorna se está anexado.
+        Num snapshot, o arquivo copiado por criar_snapshot é anexado só para leitura.
+        """
+        if any(nome == "arquivo" for _, nome, _ in conn.execute("PRAGMA database_list;")):
+            return True
+        if not os.path.exists(self.caminho_arquivo) and (not criar or self.somente_leitura):
+            return False
+        if self.somente_leitura:
+            import pathlib
+
+            uri = pathlib.Path(self.caminho_arquivo).resolve().as_uri() + "?mode=ro&immutable=1"
+            conn.execute("ATTACH DATABASE ? AS arquivo;", (uri,))
+            return True
+        conn.execute("ATTACH DATABASE ? AS arquivo;", (self.caminho_arquivo,))
+        for ddl in ESQUEMA_ARQUIVO:
+            conn.execute(ddl)
+        conn.commit()
+        return True
 
     def _get_conexao(self):
-        """Cria e retorna uma conexão com o banco de dados SQLite."""
+        """
+        Retorna a conexão da thread atual com o banco de dados SQLite.
+        A conexão é criada na primeira chamada e reaproveitada depois.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.execute("PRAGMA foreign_keys = ON;")  # Habilita suporte a chaves estrangeiras
+            if not self.reutilizar_conexao:
+                return self._abrir_conexao()
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._abrir_conexao()
+                self._local.conn = conn
+                self._local.serial = next(_SERIAIS_CONEXAO)
+                with self._trava_conexoes:
+                    # As conexões de threads que já terminaram são fechadas aqui.
+                    for thread in [t for t in self._conexoes if not t.is_alive()]:
+                        self._conexoes.pop(thread).close()
+                    self._conexoes[threading.current_thread()] = conn
             return conn
         except Error as e:
             raise
 
+    def fechar(self) -> None:
+        """
+        Fecha as conexões abertas por todas as threads (ex: os workers do modo
+        serviço). Chame quando nenhuma outra thread estiver usando o repositório;
+        um uso depois disso abre uma conexão nova.
+        """
+        with self._trava_conexoes:
+            conexoes = list(self._conexoes.values())
+            self._conexoes.clear()
+            self._local = threading.local()
+        for conn in conexoes:
+            conn.close()
+
+    def versao_dados(self) -> tuple[int, int] | None:
+        """
+        (série da conexão, PRAGMA data_version) da conexão desta thread. O
+        data_version muda quando OUTRA conexão (outro processo, outra thread)
+        grava no banco; as gravações desta mesma conexão não o alteram. Custa
+        um PRAGMA, sem ler páginas: os caches em memória (MapaDisponibilidade)
+        comparam o par para descobrir gravações que não passaram por eles.
+        None sem conexão reaproveitada (reutilizar_conexao=False).
+        """
+        if not self.reutilizar_conexao:
+            return None
+        conn = self._get_conexao()
+        return self._local.serial, conn.execute("PRAGMA data_version;").fetchone()[0]
+
     def _criar_tabelas(self):
-        """Cria as tabelas necessárias no banco de dados, se não existirem."""
-        with self._get_conexao() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS pacientes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT NOT NULL,
-                cpf TEXT UNIQUE NOT NULL,
-                telefone TEXT NOT NULL,
-                plano_saude TEXT NOT NULL
-            );
-            """)
-            cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS medicos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT NOT NULL,
-                cpf TEXT UNIQUE NOT NULL,
-                telefone TEXT NOT NULL,
-                crm TEXT,
-                especialidade TEXT,
-                regras_disponibilidade TEXT
-            );
-            """)
-            cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS agendamentos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                id_paciente INTEGER NOT NULL,
-                id_medico INTEGER NOT NULL,
-                data_hora_inicio TEXT NOT NULL,
-                duracao_minutos INTEGER NOT NULL,
-                status TEXT NOT NULL,
-                FOREIGN KEY (id_paciente) REFERENCES pacientes (id),
-                FOREIGN KEY (id_medico) REFERENCES medicos (id)
-            );
-            """)
-        conn.commit()
+        """
+        Cria/atualiza as tabelas do banco aplicando as MIGRACOES pendentes.
+        Se o "PRAGMA user_version" já estiver na versão atual, nada é executado.
+        """
+        conn = self._get_conexao()
+        versao = conn.execute("PRAGMA user_version;").fetchone()[0]
+        if versao >= ESQUEMA_VERSAO:
+            return
+        if versao == 0 and conn.execute("PRAGMA page_count;").fetchone()[0] == 0:
+            # Banco novo: o espaço de exclusões pode ser devolvido aos poucos
+            # (incremental_vacuum, veja compactar). Só vale antes da 1ª tabela.
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+        # Migrações que recriam tabelas precisam das chaves estrangeiras desligadas
+        # (o PRAGMA não tem efeito dentro de uma transação, por isso vem antes).
+        # A integridade é conferida com foreign_key_check antes do commit.
+        conn.execute("PRAGMA foreign_keys = OFF;")
+        # BEGIN IMMEDIATE: se outro processo estiver migrando ao mesmo tempo,
+        # esperamos por ele e relemos a versão já dentro da transação.
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            versao = conn.execute("PRAGMA user_version;").fetchone()[0]
+            for numero in range(versao + 1, ESQUEMA_VERSAO + 1):
+                for ddl in MIGRACOES[numero - 1]:
+                    if callable(ddl):
+                        ddl(conn)
+                    else:
+                        conn.execute(ddl)
+                # PRAGMA não aceita parâmetros "?"; numero é sempre um int nosso.
+                conn.execute(f"PRAGMA user_version = {numero};")
+            violacao = conn.execute("PRAGMA foreign_key_check;").fetchone()
+            if violacao:
+                raise sqlite3.IntegrityError(f"Migração deixaria chave estrangeira inválida: {violacao}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()  # Uma migração que falha pela metade não deixa nada gravado
+            raise
+        finally:
+            conn.execute("PRAGMA foreign_keys = ON;")
 
     def salvar_paciente(self, paciente: Paciente) -> int:
             """Salva um novo Paciente no banco de dados e retorna seu ID."""
@@ -77,10 +1181,7 @@ class AgendaRepository:
                 cursor = conn.cursor()
                 try:
                     cursor.execute(
-                        """
-                        INSERT INTO pacientes (nome, cpf, telefone, plano_saude)
-                        VALUES (?, ?, ?, ?);
-                        """,
+                        SQL["salvar_paciente"],
                         (paciente.nome, paciente.cpf, paciente.telefone, paciente.plano_saude)
                     )
                     conn.commit()
@@ -89,17 +1190,13 @@ class AgendaRepository:
                 except sqlite3.IntegrityError as e:
                     raise
 
-    def buscar_paciente(self, id_paciente: int) -> Optional[Paciente]:
+    def buscar_paciente(self, id_paciente: int) -> Paciente | None:
             """Busca um Paciente pelo ID. Retorna None se não encontrado."""
             with self._get_conexao() as conn:
                 cursor = conn.cursor()
                 try:
                     cursor.execute(
-                        """
-                        SELECT id, nome, cpf, telefone, plano_saude
-                        FROM pacientes
-                        WHERE id = ?;
-                        """,
+                        SQL["buscar_paciente"],
                         (id_paciente,)
                     )
                     row = cursor.fetchone()
@@ -112,17 +1209,14 @@ class AgendaRepository:
                 except sqlite3.Error as e:
                     raise
 
-    def buscar_todos_pacientes(self) -> List[Paciente]:
+    def buscar_todos_pacientes(self) -> list[Paciente]:
             """Retorna uma lista de todos os Pacientes no banco de dados."""
             pacientes = []
             with self._get_conexao() as conn:
                 cursor = conn.cursor()
                 try:
                     cursor.execute(
-                        """
-                        SELECT id, nome, cpf, telefone, plano_saude
-                        FROM pacientes;
-                        """
+                        SQL["buscar_todos_pacientes"]
                     )
                     rows = cursor.fetchall()
                     for row in rows:
@@ -135,33 +1229,69 @@ class AgendaRepository:
                     print(f"Erro ao buscar pacientes: {e}")
                     raise
 
+    def listar_pacientes_resumo(self, limite: int = LIMITE_LISTAGEM,
+                                apos_id: int = 0) -> list[tuple[int, str, str, str]]:
+        """
+        Página da listagem de pacientes como tuplas (COLUNAS_RESUMO_PACIENTE),
+        lidas só do índice de cobertura, sem montar objetos. Em ordem de ID;
+        para a próxima página, passe apos_id = ID da última tupla recebida.
+        """
+        return self._get_conexao().execute(
+            SQL["listar_pacientes_resumo"], (apos_id or 0, min(limite, LIMITE_LISTAGEM))).fetchall()
+
+    def buscar_pacientes_por_nome(self, texto: str, limite: int = 20, apos_id: int = 0) -> list[Paciente]:
+            """
+            Busca pacientes por prefixo das palavras do nome, sem diferenciar
+            acentos. Retorna até 'limite' pacientes em ordem de ID; para a próxima
+            página, passe apos_id = ID do último paciente recebido.
+            """
+            expressao = expressao_busca(texto)
+            if expressao is None:
+                return []
+            with self._get_conexao() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(
+                        SQL["buscar_pacientes_por_nome"],
+                        (expressao, apos_id or 0, min(limite, LIMITE_BUSCA))
+                    )
+                    pacientes = []
+                    for pid, nome, cpf, telefone, plano in cursor.fetchall():
+                        p = Paciente(nome=nome, cpf=cpf, telefone=telefone, plano_saude=plano)
+                        p.id = pid
+                        pacientes.append(p)
+                    return pacientes
+                except sqlite3.Error as e:
+                    raise
+
     def deletar_paciente(self, id_paciente: int) -> None:
-            """Deleta um Paciente pelo ID."""
+            """
+            Exclui (logicamente) um Paciente pelo ID: marca deleted_at e, na mesma
+            transação, cancela as consultas futuras e os pedidos da lista de espera.
+            O registro some das buscas; o DELETE físico fica para purgar_excluidos().
+            """
+            agora = datetime.now().isoformat(timespec="seconds")
             with self._get_conexao() as conn:
                 cursor = conn.cursor()
                 try:
                     cursor.execute(
-                        """
-                        DELETE FROM pacientes
-                        WHERE id = ?;
-                        """,
-                        (id_paciente,)
+                        SQL["deletar_paciente"],
+                        (agora, id_paciente)
                     )
+                    if cursor.rowcount:
+                        cursor.execute(SQL["cancelar_futuras_paciente"], (id_paciente, agora))
+                        cursor.execute(SQL["cancelar_pedidos_espera_paciente"], (id_paciente,))
                     conn.commit()
                 except sqlite3.Error as e:
                     raise
 
-    def buscar_paciente_por_cpf(self, cpf: str) -> Optional[Paciente]:
+    def buscar_paciente_por_cpf(self, cpf: str) -> Paciente | None:
             """Busca um Paciente pelo CPF. Retorna None se não encontrado."""
             with self._get_conexao() as conn:
                 cursor = conn.cursor()
                 try:
                     cursor.execute(
-                        """
-                        SELECT id, nome, cpf, telefone, plano_saude
-                        FROM pacientes
-                        WHERE cpf = ?;
-                        """,
+                        SQL["buscar_paciente_por_cpf"],
                         (cpf,)
                     )
                     row = cursor.fetchone()
@@ -174,26 +1304,33 @@ class AgendaRepository:
                 except sqlite3.Error as e:
                     raise
 
+    def buscar_cpfs_pacientes(self, ids: Iterable[int]) -> dict[int, str]:
+        """{id: cpf} dos pacientes pedidos, inclusive os excluídos (uma consulta só)."""
+        import json
+
+        return dict(self._get_conexao().execute(SQL["buscar_cpfs_pacientes"], (json.dumps(list(ids)),)))
 
     def salvar_medico(self, medico: Medico) -> int:
             """Salva um novo Médico no banco de dados e retorna seu ID."""
+            import json
+
             with self._get_conexao() as conn:
                 cursor = conn.cursor()
                 try:
                     # Serializar regras_disponibilidade como JSON
                     regras_json = json.dumps(medico.regras_disponibilidade) if medico.regras_disponibilidade else "{}"
+                    # Mesmo expediente de outro médico = mesmo modelo (na mesma transação).
+                    id_modelo = _id_modelo_disponibilidade(conn, medico.regras_disponibilidade)
                     cursor.execute(
-                        """
-                        INSERT INTO medicos (nome, cpf, telefone, especialidade, crm, regras_disponibilidade)
-                        VALUES (?, ?, ?, ?, ?, ?);
-                        """,
+                        SQL["salvar_medico"],
                         (
                             medico.nome,
                             medico.cpf,
                             medico.telefone,
                             medico.especialidade,
                             medico.crm,
-                            regras_json
+                            regras_json,
+                            id_modelo
                         )
                     )
                     conn.commit()
@@ -202,17 +1339,15 @@ class AgendaRepository:
                 except sqlite3.IntegrityError as e:
                     raise
 
-    def buscar_medico(self, id_medico: int) -> Optional[Medico]:
+    def buscar_medico(self, id_medico: int) -> Medico | None:
             """Busca um Médico pelo ID. Retorna None se não encontrado."""
+            import json
+
             with self._get_conexao() as conn:
                 cursor = conn.cursor()
                 try:
                     cursor.execute(
-                        """
-                        SELECT id, nome, cpf, telefone, crm, especialidade, regras_disponibilidade
-                        FROM medicos
-                        WHERE id = ?;
-                        """,
+                        SQL["buscar_medico"],
                         (id_medico,)
                     )
                     row = cursor.fetchone()
@@ -226,17 +1361,15 @@ class AgendaRepository:
                 except sqlite3.Error as e:
                     raise
 
-    def buscar_medico_por_crm(self, crm: str) -> Optional[Medico]:
+    def buscar_medico_por_crm(self, crm: str) -> Medico | None:
             """Busca um Médico pelo CRM. Retorna None se não encontrado."""
+            import json
+
             with self._get_conexao() as conn:
                 cursor = conn.cursor()
                 try:
                     cursor.execute(
-                        """
-                        SELECT id, nome, cpf, telefone, crm, especialidade, regras_disponibilidade
-                        FROM medicos
-                        WHERE crm = ?;
-                        """,
+                        SQL["buscar_medico_por_crm"],
                         (crm,)
                     )
                     row = cursor.fetchone()
@@ -251,17 +1384,15 @@ class AgendaRepository:
                     raise
 
     # --- NOVO ---
-    def buscar_medico_por_cpf(self, cpf: str) -> Optional[Medico]:
+    def buscar_medico_por_cpf(self, cpf: str) -> Medico | None:
             """Busca um Médico pelo CPF. Retorna None se não encontrado."""
+            import json
+
             with self._get_conexao() as conn:
                 cursor = conn.cursor()
                 try:
                     cursor.execute(
-                        """
-                        SELECT id, nome, cpf, telefone, crm, especialidade, regras_disponibilidade
-                        FROM medicos
-                        WHERE cpf = ?;
-                        """,
+                        SQL["buscar_medico_por_cpf"],
                         (cpf,)
                     )
                     row = cursor.fetchone()
@@ -275,17 +1406,16 @@ class AgendaRepository:
                 except sqlite3.Error as e:
                     raise
 
-    def buscar_todos_medicos(self) -> List[Medico]:
+    def buscar_todos_medicos(self) -> list[Medico]:
             """Retorna uma lista de todos os Médicos no banco de dados."""
+            import json
+
             medicos = []
             with self._get_conexao() as conn:
                 cursor = conn.cursor()
                 try:
                     cursor.execute(
-                        """
-                        SELECT id, nome, cpf, telefone, crm, especialidade, regras_disponibilidade
-                        FROM medicos;
-                        """
+                        SQL["buscar_todos_medicos"]
                     )
                     rows = cursor.fetchall()
                     for row in rows:
@@ -298,24 +1428,105 @@ class AgendaRepository:
                 except sqlite3.Error as e:
                     raise
 
+    def listar_medicos_resumo(self, limite: int = LIMITE_LISTAGEM,
+                              apos_id: int = 0) -> list[tuple[int, str, str, str]]:
+        """
+        Página da listagem de médicos como tuplas (COLUNAS_RESUMO_MEDICO), sem
+        montar objetos nem ler as regras em JSON. Paginação igual à de
+        listar_pacientes_resumo.
+        """
+        return self._get_conexao().execute(
+            SQL["listar_medicos_resumo"], (apos_id or 0, min(limite, LIMITE_LISTAGEM))).fetchall()
+
+    def buscar_medicos(self, texto: str | None = None, especialidade: str | None = None,
+                       limite: int = 20, apos_id: int = 0) -> list[Medico]:
+            """
+            Busca médicos por prefixo do nome e/ou pela especialidade (ambos sem
+            diferenciar acentos). Paginação igual à de buscar_pacientes_por_nome.
+            """
+            import json
+
+            expressao = expressao_busca(texto, especialidade)
+            if expressao is None:
+                return []
+            with self._get_conexao() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(
+                        SQL["buscar_medicos_por_texto"],
+                        (expressao, apos_id or 0, min(limite, LIMITE_BUSCA))
+                    )
+                    medicos = []
+                    for mid, nome, cpf, telefone, crm, esp, regras_json in cursor.fetchall():
+                        regras = json.loads(regras_json) if regras_json else {}
+                        m = Medico(nome=nome, cpf=cpf, telefone=telefone, crm=crm, especialidade=esp, regras_disponibilidade=regras)
+                        m.id = mid
+                        medicos.append(m)
+                    return medicos
+                except sqlite3.Error as e:
+                    raise
+
+    def buscar_medicos_disponiveis(self, inicio: datetime, duracao_min: int, especialidade: str | None = None,
+                                   sem_consulta: bool = True) -> list[Medico]:
+            """
+            Médicos cujo horário de trabalho cobre [inicio, inicio + duracao_min)
+            (opcionalmente só da especialidade, sem diferenciar maiúsculas) e,
+            com sem_consulta, que não têm consulta ativa nesse intervalo. Uma
+            única consulta pelos índices de faixas_disponibilidade e de agendamentos.
+            Médicos com bloqueio (próprio ou da clínica) no intervalo nunca entram.
+            Ex: quem atende sábado de manhã = um sábado às 08:00, 240 minutos,
+            sem_consulta=False.
+            """
+            import json
+
+            minuto = inicio.hour * 60 + inicio.minute
+            fim = inicio + timedelta(minutes=duracao_min)
+            with self._get_conexao() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(
+                        SQL["buscar_medicos_disponiveis"],
+                        (inicio.weekday(), minuto, minuto + duracao_min, especialidade, sem_consulta,
+                         inicio.date().isoformat(), fim.isoformat(), inicio.isoformat(),
+                         minuto_epoca(inicio), minuto_epoca(fim, para_cima=True))
+                    )
+                    medicos = []
+                    for mid, nome, cpf, telefone, crm, esp, regras_json in cursor.fetchall():
+                        regras = json.loads(regras_json) if regras_json else {}
+                        m = Medico(nome=nome, cpf=cpf, telefone=telefone, crm=crm, especialidade=esp, regras_disponibilidade=regras)
+                        m.id = mid
+                        medicos.append(m)
+                    return medicos
+                except sqlite3.Error as e:
+                    raise
+
     def deletar_medico(self, id_medico: int) -> None:
-            """Deleta um Médico pelo ID."""
+            """
+            Exclui (logicamente) um Médico pelo ID: marca deleted_at e cancela as
+            consultas futuras dele na mesma transação (veja deletar_paciente).
+            """
+            agora = datetime.now().isoformat(timespec="seconds")
             with self._get_conexao() as conn:
                 cursor = conn.cursor()
                 try:
                     cursor.execute(
-                        """
-                        DELETE FROM medicos
-                        WHERE id = ?;
-                        """,
-                        (id_medico,)
+                        SQL["deletar_medico"],
+                        (agora, id_medico)
                     )
+                    if cursor.rowcount:
+                        cursor.execute(SQL["cancelar_futuras_medico"], (id_medico, agora))
                     conn.commit()
                 except sqlite3.Error as e:
                     raise
 
-    def salvar_agendamento(self, ag: Agendamento) -> int:
-            """Salva um novo Agendamento no banco de dados e retorna seu ID."""
+    def salvar_agendamento(self, ag: Agendamento, conferir_conflito: bool = False) -> int:
+            """
+            Salva um novo Agendamento no banco de dados e retorna seu ID.
+            Com conferir_conflito=True o horário do médico é conferido de novo
+            dentro da transação (BEGIN IMMEDIATE): se outra conexão marcou uma
+            consulta que se sobrepõe além da capacidade do médico (ou bloqueou
+            a agenda), lança ValueError e nada é gravado.
+            """
             with self._get_conexao() as conn:
                 cursor = conn.cursor()
                 try:
@@ -327,17 +1538,23 @@ class AgendaRepository:
                     if not ag.medico.id:
                         raise ValueError("Médico sem ID não pode agendar.")
 
+                    if conferir_conflito:
+                        conn.execute("BEGIN IMMEDIATE;")
+                        inicio = ag.data_hora_inicio
+                        if self._excede_capacidade(conn, ag.medico.id, inicio, ag.data_hora_fim,
+                                                   self._capacidade_medico(conn, ag.medico.id)):
+                            raise ValueError("Já existe uma consulta agendada neste horário.")
+                        if self._existe_bloqueio(conn, ag.medico.id, inicio, ag.data_hora_fim):
+                            raise ValueError("Médico não está disponível neste horário.")
+
                     cursor.execute(
-                        """
-                        INSERT INTO agendamentos (id_paciente, id_medico, data_hora_inicio, duracao_minutos, status)
-                        VALUES (?, ?, ?, ?, ?);
-                        """,
+                        SQL["salvar_agendamento"],
                         (
                             ag.paciente.id,
                             ag.medico.id,
                             ag.data_hora_inicio.isoformat(),
                             ag.duracao_minutos,
-                            ag.status
+                            codigo_status(ag.status)
                         )
                     )
                     conn.commit()
@@ -345,20 +1562,34 @@ class AgendaRepository:
                 except sqlite3.IntegrityError as e:
                     raise
 
-    def buscar_agendamentos_por_paciente(self, id_paciente: int) -> List[Agendamento]:
-            """Retorna uma lista de Agendamentos para um dado Paciente."""
+    def buscar_agendamentos_por_paciente(self, id_paciente: int, incluir_cancelados: bool = False,
+                                         data_inicio: date | None = None,
+                                         data_fim: date | None = None) -> list[Agendamento]:
+            """
+            Retorna os Agendamentos de um Paciente, por data, opcionalmente só
+            entre data_inicio e data_fim (inclusive). Os cancelados ficam de fora
+            (filtrados no SQL), a não ser com incluir_cancelados.
+
+            O banco de arquivo só é consultado (UNION ALL) quando o período
+            começa antes do horizonte do arquivamento; agendas recentes leem
+            apenas a tabela quente.
+            """
             agendamentos = []
+            de = data_inicio.isoformat() if data_inicio else "0000-01-01"
+            ate = (data_fim + timedelta(days=1)).isoformat() if data_fim else "9999-12-31"
             with self._get_conexao() as conn:
                 cursor = conn.cursor()
                 try:
-                    cursor.execute(
-                        """
-                        SELECT id, id_medico, data_hora_inicio, duracao_minutos, status
-                        FROM agendamentos
-                        WHERE id_paciente = ?;
-                        """,
-                        (id_paciente,)
-                    )
+                    horizonte = self.horizonte_arquivo(conn)
+                    if horizonte is not None and de < horizonte:
+                        chave = "buscar_agendamentos_por_paciente_com_arquivo"
+                        chave += "_e_cancelados" if incluir_cancelados else ""
+                        parametros = (id_paciente, de, ate) * 2
+                    else:
+                        chave = "buscar_agendamentos_por_paciente"
+                        chave += "_com_cancelados" if incluir_cancelados else ""
+                        parametros = (id_paciente, de, ate)
+                    cursor.execute(SQL[chave], parametros)
                     rows = cursor.fetchall()
                     for row in rows:
                         aid, id_medico, data_hora_inicio, duracao_minutos, status = row
@@ -372,25 +1603,27 @@ class AgendaRepository:
                                 duracao_minutos=duracao_minutos
                             )
                             ag.id = aid
-                            ag.status = status
+                            ag.status = STATUS_NOMES[status]
                             agendamentos.append(ag)
                     return agendamentos
                 except sqlite3.Error as e:
                     raise
 
-    def buscar_agendamentos_por_medico_e_data(self, id_medico: int, data_iso: str) -> List[Agendamento]:
-            """Retorna uma lista de Agendamentos para um dado Médico em uma data específica."""
+    def buscar_agendamentos_por_medico_e_data(self, id_medico: int, data_iso: str,
+                                              incluir_cancelados: bool = False) -> list[Agendamento]:
+            """
+            Retorna os Agendamentos de um Médico em uma data, por horário. Os
+            cancelados ficam de fora (filtrados no SQL), a não ser com incluir_cancelados.
+            """
             agendamentos = []
+            dia = date.fromisoformat(data_iso[:10])
             with self._get_conexao() as conn:
                 cursor = conn.cursor()
                 try:
                     cursor.execute(
-                        """
-                        SELECT id, id_paciente, data_hora_inicio, duracao_minutos, status
-                        FROM agendamentos
-                        WHERE id_medico = ? AND date(data_hora_inicio) = date(?);
-                        """,
-                        (id_medico, data_iso)
+                        SQL["buscar_agendamentos_por_medico_e_data_com_cancelados" if incluir_cancelados
+                            else "buscar_agendamentos_por_medico_e_data"],
+                        (id_medico, dia.isoformat(), (dia + timedelta(days=1)).isoformat())
                     )
                     rows = cursor.fetchall()
                     for row in rows:
@@ -405,7 +1638,7 @@ class AgendaRepository:
                                 duracao_minutos=duracao_minutos
                             )
                             ag.id = aid
-                            ag.status = status
+                            ag.status = STATUS_NOMES[status]
                             agendamentos.append(ag)
                     return agendamentos
                 except sqlite3.Error as e:
@@ -417,10 +1650,7 @@ class AgendaRepository:
                 cursor = conn.cursor()
                 try:
                     cursor.execute(
-                        """
-                        DELETE FROM agendamentos
-                        WHERE id = ?;
-                        """,
+                        SQL["deletar_agendamento"],
                         (id_agendamento,)
                     )
                     conn.commit()
@@ -428,6 +1658,340 @@ class AgendaRepository:
                     print(f"Erro ao deletar agendamento: {e}")
                     raise
 
+    def iterar_agendamentos_completos(self, tamanho_lote: int = 1000):
+        """
+        Percorre TODOS os agendamentos já com os dados do paciente e do médico,
+        numa única consulta com JOIN (sem N+1). Os registros são lidos do cursor
+        em lotes com fetchmany, então a memória usada é constante.
+        Produz tuplas na ordem de COLUNAS_AGENDAMENTO_COMPLETO.
+        """
+        cursor = self._get_conexao().cursor()
+        try:
+            cursor.execute(SQL["iterar_agendamentos_completos"])
+            while True:
+                lote = cursor.fetchmany(tamanho_lote)
+                if not lote:
+                    break
+                yield from lote
+        finally:
+            cursor.close()
+
+    def _iterar_lotes(self, chave: str, parametros: tuple, tamanho_lote: int):
+        cursor = self._get_conexao().cursor()
+        try:
+            cursor.execute(SQL[chave], parametros)
+            while True:
+                lote = cursor.fetchmany(tamanho_lote)
+                if not lote:
+                    break
+                yield lote
+        finally:
+            cursor.close()
+
+    def iterar_agenda_paciente(self, id_paciente: int, incluir_cancelados: bool = False,
+                               data_inicio: date | None = None, data_fim: date | None = None,
+                               tamanho_lote: int = 1000):
+        """
+        Mesma agenda de buscar_agendamentos_por_paciente, mas como LOTES de
+        tuplas (ordem de COLUNAS_AGENDA), sem montar objetos. Para serializar
+        direto (serializacao.py).
+        """
+        de = data_inicio.isoformat() if data_inicio else "0000-01-01"
+        ate = (data_fim + timedelta(days=1)).isoformat() if data_fim else "9999-12-31"
+        horizonte = self.horizonte_arquivo()
+        chave = "linhas_agenda_paciente_com_arquivo" if horizonte is not None and de < horizonte \
+            else "linhas_agenda_paciente"
+        return self._iterar_lotes(chave, (incluir_cancelados, id_paciente, de, ate), tamanho_lote)
+
+    def iterar_agenda_medico(self, id_medico: int, dia: date, incluir_cancelados: bool = False,
+                             tamanho_lote: int = 1000):
+        """Agenda do médico no dia (como buscar_agendamentos_por_medico_e_data) em LOTES de tuplas."""
+        return self._iterar_lotes("linhas_agenda_medico", (incluir_cancelados, id_medico, dia.isoformat(),
+                                                           (dia + timedelta(days=1)).isoformat()), tamanho_lote)
+
+    # --- Diário de eventos (change feed) ---
+
+    def buscar_eventos(self, apos_seq: int = 0, limite: int = 1000) -> list[dict]:
+        """
+        Retorna até 'limite' eventos com seq > apos_seq, em ordem. Cada evento
+        é um dict com seq, tipo ('criado', 'atualizado', 'removido'),
+        id_agendamento, dados (estado do agendamento) e criado_em.
+        """
+        import json
+
+        with self._get_conexao() as conn:
+            linhas = conn.execute(SQL["buscar_eventos"], (apos_seq, limite)).fetchall()
+        return [{"seq": seq, "tipo": tipo, "id_agendamento": id_ag, "dados": json.loads(dados), "criado_em": criado_em}
+                for seq, tipo, id_ag, dados, criado_em in linhas]
+
+    def iterar_eventos(self, apos_seq: int = 0, tamanho_lote: int = 1000):
+        """
+        Produz os eventos posteriores a apos_seq em LOTES (listas de até
+        tamanho_lote eventos), até alcançar o fim do diário. Cada lote é uma
+        consulta curta pelo índice de seq, então o consumidor pode gravar o
+        lote no sistema de destino e depois chamar confirmar_eventos().
+        """
+        while True:
+            lote = self.buscar_eventos(apos_seq, tamanho_lote)
+            if not lote:
+                return
+            yield lote
+            apos_seq = lote[-1]["seq"]
+
+    def posicao_consumidor(self, consumidor: str) -> int:
+        """Último seq confirmado pelo consumidor (0 se ele nunca confirmou)."""
+        with self._get_conexao() as conn:
+            linha = conn.execute(SQL["buscar_posicao_consumidor"], (consumidor,)).fetchone()
+        return linha[0] if linha else 0
+
+    def confirmar_eventos(self, consumidor: str, ate_seq: int) -> None:
+        """Registra que o consumidor já processou os eventos até ate_seq (nunca retrocede)."""
+        with self._get_conexao() as conn:
+            conn.execute(SQL["confirmar_eventos"], (consumidor, ate_seq))
+            conn.commit()
+
+    def podar_eventos(self, ate_seq: int) -> int:
+        """
+        Apaga os eventos até ate_seq que TODOS os consumidores registrados já
+        confirmaram. Retorna quantos eventos foram apagados.
+        """
+        with self._get_conexao() as conn:
+            cursor = conn.execute(SQL["podar_eventos"], (ate_seq, ate_seq))
+            conn.commit()
+            return cursor.rowcount
+
+    # --- Arquivamento (tabela quente x arquivo) ---
+
+    def horizonte_arquivo(self, conn: sqlite3.Connection | None = None) -> str | None:
+        """Corte (ISO) do último arquivamento, ou None se não há nada arquivado."""
+        conn = conn or self._get_conexao()
+        if not self._anexar_arquivo(conn):
+            return None
+        linha = conn.execute(SQL["buscar_horizonte_arquivo"]).fetchone()
+        return linha[0] if linha else None
+
+    def arquivar_agendamentos(self, antes_de: datetime, tamanho_lote: int = 1000) -> int:
+        """
+        Move para o banco de arquivo as consultas Realizadas/Canceladas que
+        começam antes de 'antes_de'. Trabalha em lotes, cada um numa transação
+        curta (cópia + remoção atômicas, nas duas bases), para não segurar a
+        trava de escrita e deixar as marcações seguirem entre um lote e outro.
+        Consultas ligadas a um pedido da lista de espera ficam na tabela quente.
+        Retorna quantas consultas foram arquivadas.
+        """
+        import json
+
+        conn = self._get_conexao()
+        self._anexar_arquivo(conn, criar=True)
+        corte = antes_de.isoformat()
+        total, ultimo_id = 0, 0
+        while True:
+            conn.execute("BEGIN IMMEDIATE;")
+            try:
+                # O horizonte avança ANTES de mover qualquer linha: se o job parar
+                # no meio, as buscas já sabem que precisam olhar o arquivo.
+                conn.execute(SQL["avancar_horizonte_arquivo"], (corte,))
+                ids = [linha[0] for linha in conn.execute(SQL["selecionar_para_arquivo"],
+                                                           (ultimo_id, corte, tamanho_lote))]
+                if ids:
+                    lista = json.dumps(ids)
+                    conn.execute(SQL["copiar_para_arquivo"], (datetime.now().isoformat(timespec="seconds"), lista))
+                    conn.execute(SQL["iniciar_arquivamento"])
+                    conn.execute(SQL["remover_agendamentos_por_ids"], (lista,))
+                    conn.execute(SQL["encerrar_arquivamento"])
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            total += len(ids)
+            if len(ids) < tamanho_lote:
+                return total
+            ultimo_id = ids[-1]
+
+    def purgar_excluidos(self, excluidos_ate: datetime | None = None, arquivar: bool = True,
+                         tamanho_lote: int = 500) -> dict:
+        """
+        Remove de vez os pacientes e médicos excluídos logicamente até
+        'excluidos_ate' (padrão: todos), junto com o que depende deles.
+
+        As consultas dependentes vão para o banco de arquivo (arquivar=True)
+        ou são apagadas; depois saem os pedidos da lista de espera e, por
+        fim, os cadastros. Tudo em lotes de tamanho_lote, cada um numa
+        transação curta, então a trava de escrita nunca fica presa por muito
+        tempo. Retorna as contagens de cada etapa.
+        """
+        import json
+
+        conn = self._get_conexao()
+        if arquivar:
+            self._anexar_arquivo(conn, criar=True)
+        limite = (excluidos_ate or datetime.now()).isoformat(timespec="seconds")
+        resumo = {"agendamentos_arquivados": 0, "agendamentos_removidos": 0, "pedidos_removidos": 0,
+                  "pacientes_removidos": 0, "medicos_removidos": 0}
+
+        def em_lotes(passo) -> None:
+            while True:
+                conn.execute("BEGIN IMMEDIATE;")
+                try:
+                    quantidade = passo()
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+                if quantidade < tamanho_lote:
+                    return
+
+        def agendamentos() -> int:
+            ids = [linha[0] for linha in conn.execute(SQL["selecionar_agendamentos_para_purga"],
+                                                       (limite, limite, tamanho_lote))]
+            if ids:
+                lista = json.dumps(ids)
+                conn.execute(SQL["desvincular_pedidos_espera"], (lista,))
+                if arquivar:
+                    conn.execute(SQL["copiar_para_arquivo"], (datetime.now().isoformat(timespec="seconds"), lista))
+                    conn.execute(SQL["iniciar_arquivamento"])
+                conn.execute(SQL["remover_agendamentos_por_ids"], (lista,))
+                if arquivar:
+                    conn.execute(SQL["encerrar_arquivamento"])
+                resumo["agendamentos_arquivados" if arquivar else "agendamentos_removidos"] += len(ids)
+            return len(ids)
+
+        def etapa(chave: str, contador: str):
+            def passo() -> int:
+                quantidade = conn.execute(SQL[chave], (limite, tamanho_lote)).rowcount
+                resumo[contador] += quantidade
+                return quantidade
+            return passo
+
+        em_lotes(agendamentos)
+        em_lotes(etapa("purgar_pedidos_espera", "pedidos_removidos"))
+        em_lotes(etapa("purgar_pacientes", "pacientes_removidos"))
+        em_lotes(etapa("purgar_medicos", "medicos_removidos"))
+        return resumo
+
+    def criar_snapshot(self, caminho: str, compactar: bool = False) -> str:
+        """
+        Grava uma cópia consistente do banco em 'caminho' para relatórios.
+        Se houver banco de arquivo, ele é copiado junto, ao lado do snapshot
+        ("snap.db" -> "snap.arquivo.db"), e abrir_snapshot() o anexa.
+
+        Usa a API de backup do SQLite (copia as páginas como estão, sem
+        bloquear a escrita por muito tempo). As duas cópias saem da mesma
+        transação de leitura: o arquivamento move consultas de um banco para
+        o outro, e cópias de instantes diferentes perderiam ou duplicariam
+        consultas. Com compactar=True as cópias passam por VACUUM, o que gera
+        arquivos menores e desfragmentados, mas é mais lento (VACUUM INTO
+        não roda dentro de uma transação).
+        Retorna o caminho do snapshot (abra com abrir_snapshot()).
+        """
+        conn = self._get_conexao()
+        copias = [("main", caminho)]
+        if self._anexar_arquivo(conn):
+            copias.append(("arquivo", os.path.splitext(caminho)[0] + ".arquivo.db"))
+        for _, destino in copias:
+            if os.path.exists(destino):
+                raise FileExistsError(f"O arquivo {destino} já existe.")
+        conn.execute("BEGIN;")
+        try:
+            for nome, _ in copias:  # Trava de leitura nos dois bancos antes da 1ª cópia
+                conn.execute(f"SELECT COUNT(*) FROM {nome}.sqlite_master;").fetchone()
+            for nome, destino in copias:
+                copia = sqlite3.connect(destino)
+                try:
+                    conn.backup(copia, name=nome)
+                    # O snapshot será aberto com immutable=1, então não pode depender de WAL.
+                    copia.execute("PRAGMA journal_mode = DELETE;")
+                    if compactar:
+                        copia.execute("VACUUM;")
+                finally:
+                    copia.close()
+        finally:
+            conn.rollback()
+        return caminho
+
+    @classmethod
+    def abrir_snapshot(cls, caminho: str) -> "AgendaRepository":
+        """Abre um snapshot (ver criar_snapshot) em modo somente leitura."""
+        return cls(caminho, somente_leitura=True)
+
+    # --- Manutenção ---
+
+    def estatisticas_paginas(self) -> dict:
+        """
+        Páginas do arquivo principal: total, livres (fragmentação), tamanho,
+        bytes e o modo de auto_vacuum (só 'incremental' permite compactar aos poucos).
+        """
+        conn = self._get_conexao()
+        paginas = conn.execute("PRAGMA page_count;").fetchone()[0]
+        livres = conn.execute("PRAGMA freelist_count;").fetchone()[0]
+        tamanho = conn.execute("PRAGMA page_size;").fetchone()[0]
+        modo = conn.execute("PRAGMA auto_vacuum;").fetchone()[0]
+        return {"paginas": paginas, "paginas_livres": livres, "tamanho_pagina": tamanho,
+                "bytes": paginas * tamanho, "auto_vacuum": ("nenhum", "completo", "incremental")[modo]}
+
+    def verificar_integridade(self, max_erros: int = 100) -> dict:
+        """
+        Roda PRAGMA integrity_check (até max_erros mensagens) e
+        foreign_key_check. Listas vazias = banco íntegro.
+        """
+        conn = self._get_conexao()
+        mensagens = [m for m, in conn.execute(f"PRAGMA integrity_check({int(max_erros)});")]
+        violacoes = conn.execute("PRAGMA foreign_key_check;").fetchmany(max_erros)
+        return {"integridade": [] if mensagens == ["ok"] else mensagens,
+                "chaves_estrangeiras": [{"tabela": tabela, "rowid": rowid, "referencia": pai}
+                                        for tabela, rowid, pai, _ in violacoes]}
+
+    def buscar_agendamentos_orfaos(self, amostra: int = 20) -> dict:
+        """
+        Consultas órfãs (paciente/médico inexistente ou excluído): total, total
+        por motivo e os IDs das primeiras 'amostra'. As de cadastros excluídos
+        saem com o 'purgar'; as de cadastros inexistentes são furos de
+        chave estrangeira.
+        """
+        conn = self._get_conexao()
+        por_motivo = dict(conn.execute(SQL["contar_agendamentos_orfaos"]))
+        return {"total": sum(por_motivo.values()), "por_motivo": por_motivo,
+                "amostra": [{"id_agendamento": i, "motivo": motivo}
+                            for i, motivo in conn.execute(SQL["amostra_agendamentos_orfaos"], (amostra,))]}
+
+    def buscar_consulta_recente(self) -> tuple[int, datetime, int] | None:
+        """(id_medico, inicio, id_paciente) da última consulta marcada com cadastros ativos, ou None."""
+        linha = self._get_conexao().execute(SQL["buscar_consulta_recente"]).fetchone()
+        if linha is None:
+            return None
+        return linha[0], datetime.fromisoformat(linha[1]), linha[2]
+
+    def analisar(self) -> None:
+        """ANALYZE: atualiza as estatísticas que o planejador usa para escolher os índices."""
+        conn = self._get_conexao()
+        conn.execute("ANALYZE;")
+        conn.commit()
+
+    def compactar(self, paginas: int | None = None, converter: bool = False) -> int:
+        """
+        Devolve ao sistema as páginas livres (até 'paginas'; padrão: todas) com
+        PRAGMA incremental_vacuum, que só funciona com auto_vacuum=INCREMENTAL
+        (bancos criados a partir desta versão). Num banco antigo, converter=True
+        liga o modo e roda um VACUUM completo (reescreve o arquivo e trava o
+        banco até terminar); sem isso nada é feito. Retorna as páginas liberadas.
+        """
+        conn = self._get_conexao()
+        antes = conn.execute("PRAGMA page_count;").fetchone()[0]
+        if conn.execute("PRAGMA auto_vacuum;").fetchone()[0] != 2:  # 2 = INCREMENTAL
+            if not converter:
+                return 0
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+            conn.execute("VACUUM;")
+        else:
+            # executescript roda o PRAGMA até o fim (execute() libera uma página
+            # por passo e para no primeiro). paginas é sempre um int nosso.
+            conn.executescript(f"PRAGMA incremental_vacuum({int(paginas or 0)});")
+        return antes - conn.execute("PRAGMA page_count;").fetchone()[0]
+
+    def otimizar(self) -> None:
+        """PRAGMA optimize: reanalisa o que o SQLite julgar desatualizado."""
+        self._get_conexao().execute("PRAGMA optimize;")
+
     @staticmethod
     def initdb(db_path: str):
         """Inicializa o banco de dados criando as tabelas necessárias."""
@@ -437,22 +2001,18 @@ class AgendaRepository:
         else:
             print("Banco de dados já existe.")
 
-    def buscar_agendamento(self, id_agendamento: int) -> Optional[Agendamento]:
+    def buscar_agendamento(self, id_agendamento: int) -> Agendamento | None:
             """Busca um Agendamento pelo ID. Retorna None se não encontrado."""
             with self._get_conexao() as conn:
                 cursor = conn.cursor()
                 try:
                     cursor.execute(
-                        """
-                        SELECT id, id_paciente, id_medico, data_hora_inicio, duracao_minutos, status
-                        FROM agendamentos
-                        WHERE id = ?;
-                        """,
+                        SQL["buscar_agendamento"],
                         (id_agendamento,)
                     )
                     row = cursor.fetchone()
                     if row:
-                        aid, id_paciente, id_medico, data_hora_inicio, duracao, status = row
+                        aid, id_paciente, id_medico, data_hora_inicio, duracao, status, versao = row
                         
                         paciente = self.buscar_paciente(id_paciente)
                         medico = self.buscar_medico(id_medico)
@@ -467,29 +2027,108 @@ class AgendaRepository:
                             duracao_minutos=duracao
                         )
                         ag.id = aid
-                        ag.status = status # Seta o status vindo do banco
+                        ag.status = STATUS_NOMES[status] # Seta o status vindo do banco
+                        ag.versao = versao
                         return ag
                     return None
                 except sqlite3.Error as e:
                     raise
                     
     def atualizar_agendamento(self, ag: Agendamento) -> None:
-        """Atualiza um agendamento existente no banco (ex: status)."""
+        """
+        Atualiza um agendamento existente no banco (ex: status).
+        Se ag.versao estiver setada (lida do banco), só grava se a linha ainda
+        estiver nessa versão; senão lança ConflitoVersao. Após gravar, ag.versao
+        passa a ser a nova versão.
+        """
         with self._get_conexao() as conn:
             cursor = conn.cursor()
             try:
-                cursor.execute(
-                    """
-                    UPDATE agendamentos
-                    SET status = ?
-                    WHERE id = ?;
-                    """,
-                    (ag.status, ag.id)
-                )
+                if ag.versao is None:
+                    cursor.execute(
+                        SQL["atualizar_agendamento"],
+                        (codigo_status(ag.status), ag.id)
+                    )
+                else:
+                    cursor.execute(
+                        SQL["atualizar_agendamento_versionado"],
+                        (codigo_status(ag.status), ag.id, ag.versao)
+                    )
+                    if cursor.rowcount == 0:
+                        raise ConflitoVersao(f"O agendamento {ag.id} foi alterado por outra operação "
+                                             f"(versão {ag.versao} desatualizada).")
+                    ag.versao += 1
                 conn.commit()
             except sqlite3.Error as e:
                 raise
 
+    def mudar_status_agendamento(self, id_agendamento: int, novo_status: str,
+                                 versao: int | None = None) -> tuple[int, datetime, int, int, int] | None:
+        """
+        Muda o status de UM agendamento com um único UPDATE, sem carregar
+        paciente e médico. Com 'versao', a mudança só acontece se a linha ainda
+        estiver nessa versão (concorrência otimista).
+
+        Retorna (id_medico, inicio, duracao_minutos, nova_versao, id_paciente)
+        se a linha mudou, ou None se ela já estava no status pedido. Lança ValueError se
+        o agendamento não existe e ConflitoVersao se a versão não confere.
+        """
+        codigo = codigo_status(novo_status)
+        with self._get_conexao() as conn:
+            linha = conn.execute(SQL["mudar_status_agendamento"], (codigo, id_agendamento, codigo, versao, versao)).fetchone()
+            if linha is None:
+                # Nada mudou: descobre por quê (caminho raro, uma leitura pela chave).
+                atual = conn.execute(SQL["buscar_status_agendamento"], (id_agendamento,)).fetchone()
+            conn.commit()
+        if linha is not None:
+            id_medico, inicio, duracao, nova_versao, id_paciente = linha
+            return id_medico, datetime.fromisoformat(inicio), duracao, nova_versao, id_paciente
+        if atual is None:
+            raise ValueError(f"Agendamento com ID {id_agendamento} não encontrado.")
+        if versao is not None and atual[1] != versao:
+            raise ConflitoVersao(f"O agendamento {id_agendamento} foi alterado por outra operação "
+                                 f"(versão {versao}, atual {atual[1]}).")
+        return None
+
+    def mudar_status_no_periodo(self, novo_status: str, status_atual: str, data_inicio: date, data_fim: date,
+                                id_medico: int | None = None) -> int:
+        """
+        Muda, num único UPDATE, o status de todos os agendamentos em
+        'status_atual' entre data_inicio e data_fim (inclusive), opcionalmente
+        de um só médico. Ex: todas as consultas de hoje de Agendado para
+        Realizado. Cada linha alterada ganha versao + 1. Retorna quantas mudaram.
+        """
+        parametros = (codigo_status(novo_status), data_inicio.isoformat(),
+                      (data_fim + timedelta(days=1)).isoformat(), codigo_status(status_atual))
+        with self._get_conexao() as conn:
+            if id_medico is None:
+                cursor = conn.execute(SQL["mudar_status_no_periodo"], parametros)
+            else:
+                cursor = conn.execute(SQL["mudar_status_no_periodo_medico"], parametros + (id_medico,))
+            conn.commit()
+            return cursor.rowcount
+
+    def fechar_periodo(self, data_inicio: date, data_fim: date, ate: datetime,
+                       id_medico: int | None = None) -> dict[int, int]:
+        """
+        Marca como Realizadas, num único UPDATE (uma transação), as consultas
+        Agendadas entre data_inicio e data_fim (inclusive) que terminaram até
+        'ate'. Retorna {id_medico: quantidade}.
+        """
+        inicio, fim = data_inicio.isoformat(), (data_fim + timedelta(days=1)).isoformat()
+        corte = ate.isoformat(timespec="seconds")
+        contagem: dict[int, int] = {}
+        with self._get_conexao() as conn:
+            if id_medico is None:
+                cursor = conn.execute(SQL["fechar_periodo"], (STATUS_REALIZADO, inicio, fim, STATUS_AGENDADO, corte))
+            else:
+                cursor = conn.execute(SQL["fechar_periodo_medico"],
+                                      (STATUS_REALIZADO, inicio, fim, STATUS_AGENDADO, id_medico, corte))
+            for (medico,) in cursor:
+                contagem[medico] = contagem.get(medico, 0) + 1
+            conn.commit()
+        return contagem
+
     # --- NOVO ---
     def atualizar_paciente(self, id_paciente: int, telefone: str, plano_saude: str) -> None:
         """Atualiza o telefone e o plano de saúde de um paciente existente."""
@@ -497,11 +2136,7 @@ class AgendaRepository:
             cursor = conn.cursor()
             try:
                 cursor.execute(
-                    """
-                    UPDATE pacientes
-                    SET telefone = ?, plano_saude = ?
-                    WHERE id = ?;
-                    """,
+                    SQL["atualizar_paciente"],
                     (telefone, plano_saude, id_paciente)
                 )
                 conn.commit()
@@ -510,4 +2145,262 @@ class AgendaRepository:
                     raise ValueError(f"Paciente com ID {id_paciente} não encontrado para atualização.")
             except sqlite3.Error as e:
                 print(f"Erro ao atualizar paciente: {e}")
-                raise
\ No newline at end of file
+                raise
+
+    # --- NOVO: BLOQUEIOS (exceções à disponibilidade) ---
+    def salvar_bloqueio(self, bloqueio: Bloqueio) -> int:
+        """Salva um bloqueio (de um médico ou, sem id_medico, da clínica) e retorna seu ID."""
+        with self._get_conexao() as conn:
+            cursor = conn.execute(
+                SQL["salvar_bloqueio"],
+                (bloqueio.id_medico, bloqueio.inicio.isoformat(timespec="seconds"),
+                 bloqueio.fim.isoformat(timespec="seconds"), bloqueio.motivo)
+            )
+            bloqueio.id = cursor.lastrowid
+            return bloqueio.id
+
+    def remover_bloqueio(self, id_bloqueio: int) -> Bloqueio | None:
+        """Remove um bloqueio. Retorna o bloqueio removido, ou None se ele não existia."""
+        with self._get_conexao() as conn:
+            linha = conn.execute(SQL["remover_bloqueio"], (id_bloqueio,)).fetchone()
+        if linha is None:
+            return None
+        return self._linha_para_bloqueio((id_bloqueio,) + tuple(linha))
+
+    def remover_copias_bloqueio_clinica(self, bloqueio: Bloqueio) -> int:
+        """Remove os bloqueios da clínica iguais a 'bloqueio' (usado pelos shards)."""
+        with self._get_conexao() as conn:
+            return conn.execute(
+                SQL["remover_copias_bloqueio_clinica"],
+                (bloqueio.inicio.isoformat(timespec="seconds"), bloqueio.fim.isoformat(timespec="seconds"),
+                 bloqueio.motivo)
+            ).rowcount
+
+    def buscar_bloqueios(self, id_medico: int | None = None, data_inicio: date | None = None,
+                         data_fim: date | None = None) -> list[Bloqueio]:
+        """
+        Bloqueios que tocam o período [data_inicio, data_fim] (inclusive; sem
+        datas, todos), em ordem de início. Com id_medico: os do médico e os da
+        clínica; sem id_medico: todos.
+        """
+        medicos = (id_medico, id_medico) if id_medico is not None else (0, _MEDICO_MAX)
+        de = minuto_epoca(datetime.combine(data_inicio, datetime.min.time())) if data_inicio else -_MEDICO_MAX
+        ate = minuto_epoca(datetime.combine(data_fim + timedelta(days=1), datetime.min.time())) \
+            if data_fim else _MEDICO_MAX
+        cursor = self._get_conexao().execute(SQL["buscar_bloqueios"], medicos + (de, ate))
+        return [self._linha_para_bloqueio(linha) for linha in cursor]
+
+    def existe_bloqueio(self, id_medico: int, inicio: datetime, fim: datetime) -> bool:
+        """True se algum bloqueio do médico ou da clínica se sobrepõe a [inicio, fim). O(log n)."""
+        return self._existe_bloqueio(self._get_conexao(), id_medico, inicio, fim)
+
+    @staticmethod
+    def _existe_bloqueio(conn: sqlite3.Connection, id_medico: int, inicio: datetime, fim: datetime) -> bool:
+        return conn.execute(
+            SQL["existe_bloqueio"],
+            (id_medico, minuto_epoca(inicio), minuto_epoca(fim, para_cima=True), inicio.isoformat(),
+             fim.isoformat())
+        ).fetchone() is not None
+
+    @staticmethod
+    def _linha_para_bloqueio(linha) -> Bloqueio:
+        id_bloqueio, id_medico, inicio, fim, motivo = linha
+        bloqueio = Bloqueio(datetime.fromisoformat(inicio), datetime.fromisoformat(fim), id_medico, motivo)
+        bloqueio.id = id_bloqueio
+        return bloqueio
+
+    # --- NOVO: CAPACIDADE (consultas simultâneas) ---
+    def capacidade_medico(self, id_medico: int) -> int:
+        """Consultas simultâneas permitidas ao médico: a dele, a da especialidade ou 1."""
+        return self._capacidade_medico(self._get_conexao(), id_medico)
+
+    @staticmethod
+    def _capacidade_medico(conn: sqlite3.Connection, id_medico: int) -> int:
+        from models.capacidade import CAPACIDADE_PADRAO
+
+        linha = conn.execute(SQL["capacidade_medico"], (id_medico,)).fetchone()
+        return linha[0] if linha and linha[0] else CAPACIDADE_PADRAO
+
+    @staticmethod
+    def _excede_capacidade(conn: sqlite3.Connection, id_medico: int, inicio: datetime, fim: datetime,
+                           capacidade: int) -> bool:
+        """True se mais uma consulta do médico em [inicio, fim) passa da capacidade."""
+        parametros = (id_medico, inicio.date().isoformat(), fim.isoformat(), inicio.isoformat())
+        if capacidade <= 1:
+            return conn.execute(SQL["existe_conflito_medico"], parametros).fetchone() is not None
+        from models.capacidade import pico_simultaneo
+
+        intervalos = [(datetime.fromisoformat(comeco), duracao)
+                      for comeco, duracao in conn.execute(SQL["intervalos_sobrepostos_medico"], parametros)]
+        return len(intervalos) >= capacidade and pico_simultaneo(intervalos, inicio, fim) >= capacidade
+
+    def definir_capacidade_medico(self, id_medico: int, capacidade: int | None) -> None:
+        """Define a capacidade do médico (None: volta a valer a da especialidade)."""
+        with self._get_conexao() as conn:
+            if not conn.execute(SQL["definir_capacidade_medico"], (capacidade, id_medico)).rowcount:
+                raise ValueError(f"Médico com ID {id_medico} não encontrado.")
+
+    def definir_capacidade_especialidade(self, especialidade: str, capacidade: int | None) -> None:
+        """Define a capacidade padrão dos médicos da especialidade (None: remove a regra)."""
+        with self._get_conexao() as conn:
+            if capacidade is None:
+                conn.execute(SQL["remover_capacidade_especialidade"], (especialidade,))
+            else:
+                conn.execute(SQL["definir_capacidade_especialidade"], (especialidade, capacidade))
+
+    def buscar_capacidades_especialidades(self) -> dict[str, int]:
+        """Regras de capacidade por especialidade."""
+        return dict(self._get_conexao().execute(SQL["buscar_capacidades_especialidades"]))
+
+    # --- NOVO: LISTA DE ESPERA ---
+    def salvar_pedido_espera(self, pedido: PedidoEspera) -> int:
+        """Salva um novo pedido da lista de espera e retorna seu ID."""
+        with self._get_conexao() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                SQL["salvar_pedido_espera"],
+                (
+                    pedido.id_paciente,
+                    pedido.especialidade,
+                    pedido.data_inicio.isoformat(),
+                    pedido.data_fim.isoformat(),
+                    pedido.duracao_minutos,
+                    pedido.criado_em.isoformat(),
+                    pedido.status
+                )
+            )
+            pedido.id = cursor.lastrowid
+            return pedido.id
+
+    def buscar_pedidos_espera_pendentes(self) -> list[PedidoEspera]:
+        """Retorna os pedidos pendentes da lista de espera, em ordem de chegada."""
+        pedidos = []
+        for pid, id_paciente, especialidade, inicio, fim, duracao, criado_em in self._get_conexao().execute(
+                SQL["buscar_pedidos_espera_pendentes"]):
+            p = PedidoEspera(id_paciente, especialidade, date.fromisoformat(inicio), date.fromisoformat(fim), duracao)
+            p.id = pid
+            p.criado_em = datetime.fromisoformat(criado_em)
+            pedidos.append(p)
+        return pedidos
+
+    def atender_pedidos_espera(self, pares: Iterable[tuple[int, int | None]]) -> None:
+        """
+        Marca pedidos pendentes como atendidos, numa transação. pares:
+        (id_pedido, id_agendamento), com id_agendamento None quando a consulta
+        está em outro arquivo (shards). salvar_agendamentos_em_lote já faz isso
+        para as consultas gravadas nele.
+        """
+        with self._get_conexao() as conn:
+            conn.executemany(SQL["atender_pedido_espera"], ((id_ag, id_pedido) for id_pedido, id_ag in pares))
+
+    def buscar_intervalos_ocupados(self, data_inicio: date, data_fim: date) -> list[tuple[int, int, datetime, int]]:
+        """
+        Retorna (id_medico, id_paciente, inicio, duracao_minutos) de todas as consultas não
+        canceladas entre data_inicio e data_fim (inclusive), sem montar objetos.
+        """
+        cursor = self._get_conexao().execute(
+            SQL["buscar_intervalos_ocupados"],
+            (data_inicio.isoformat(), (data_fim + timedelta(days=1)).isoformat())
+        )
+        return [(id_medico, id_paciente, datetime.fromisoformat(inicio), duracao)
+                for id_medico, id_paciente, inicio, duracao in cursor]
+
+    def buscar_intervalos_ocupados_medico(self, id_medico: int, data_inicio: date,
+                                          data_fim: date) -> list[tuple[datetime, int]]:
+        """Retorna (inicio, duracao_minutos) das consultas não canceladas do médico no período."""
+        cursor = self._get_conexao().execute(
+            SQL["buscar_intervalos_ocupados_medico"],
+            (id_medico, data_inicio.isoformat(), (data_fim + timedelta(days=1)).isoformat())
+        )
+        return [(datetime.fromisoformat(inicio), duracao) for inicio, duracao in cursor]
+
+    def salvar_agendamentos_em_lote(self, itens) -> list[int | None]:
+        """
+        Grava vários agendamentos numa única transação.
+
+        itens: sequência de (id_pedido_espera, id_paciente, id_medico, inicio, duracao_minutos, status);
+        id_pedido_espera pode ser None. Cada item é conferido contra as consultas já
+        gravadas (e os bloqueios) DENTRO da transação (BEGIN IMMEDIATE), então um
+        horário ocupado por outra recepção entre o cálculo e a gravação não é marcado em dobro.
+        Retorna o ID de cada agendamento criado, ou None para os itens em conflito.
+        """
+        conn = self._get_conexao()
+        ids = []
+        capacidades = {}
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            for id_pedido, id_paciente, id_medico, inicio, duracao, status in itens:
+                fim = inicio + timedelta(minutes=duracao)
+                if id_medico not in capacidades:
+                    capacidades[id_medico] = self._capacidade_medico(conn, id_medico)
+                if self._excede_capacidade(conn, id_medico, inicio, fim, capacidades[id_medico]) \
+                        or self._existe_bloqueio(conn, id_medico, inicio, fim):
+                    ids.append(None)
+                    continue
+                cursor = conn.execute(
+                    SQL["salvar_agendamento"],
+                    (id_paciente, id_medico, inicio.isoformat(), duracao, codigo_status(status))
+                )
+                ids.append(cursor.lastrowid)
+                if id_pedido is not None:
+                    conn.execute(SQL["atender_pedido_espera"], (cursor.lastrowid, id_pedido))
+            conn.commit()
+        except BaseException:
+            # Qualquer erro (inclusive KeyboardInterrupt ou um erro de quem
+            # gera 'itens') desfaz o lote: a conexão não pode ficar com a
+            # transação aberta segurando a trava de escrita.
+            conn.rollback()
+            raise
+        return ids
+
+    def carregar_em_massa(self, pacientes: Sequence[Paciente], medicos: Sequence[Medico],
+                          agendamentos: Iterable[Agendamento], bloqueios: Iterable[Bloqueio] = (),
+                          tamanho_lote: int = 10_000) -> dict[str, int]:
+        """
+        Carga inicial (ex: dados sintéticos) numa ÚNICA transação, SEM as
+        validações da Clinica: quem chama garante que não há conflitos.
+
+        Pacientes e médicos recebem o ID do banco; só então 'agendamentos' e,
+        depois deles, 'bloqueios' são percorridos (podem ser geradores que
+        usam esses IDs). Os agendamentos vão com executemany em lotes de
+        tamanho_lote. Retorna quantas linhas de cada tipo foram gravadas.
+        """
+        import json
+
+        conn = self._get_conexao()
+        contagem = {"pacientes": 0, "medicos": 0, "bloqueios": 0, "agendamentos": 0}
+        cache_anterior = conn.execute("PRAGMA cache_size;").fetchone()[0]
+        conn.execute(f"PRAGMA cache_size = {CACHE_CARGA_EM_MASSA};")
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            for p in pacientes:
+                p.id = conn.execute(SQL["salvar_paciente"], (p.nome, p.cpf, p.telefone, p.plano_saude)).lastrowid
+            modelos = {}
+            for m in medicos:
+                regras_json = json.dumps(m.regras_disponibilidade) if m.regras_disponibilidade else "{}"
+                if regras_json not in modelos:
+                    modelos[regras_json] = _id_modelo_disponibilidade(conn, m.regras_disponibilidade)
+                m.id = conn.execute(SQL["salvar_medico"], (m.nome, m.cpf, m.telefone, m.especialidade, m.crm,
+                                                           regras_json, modelos[regras_json])).lastrowid
+            contagem["pacientes"], contagem["medicos"] = len(pacientes), len(medicos)
+            linhas = ((ag.paciente.id, ag.medico.id, ag.data_hora_inicio.isoformat(), ag.duracao_minutos,
+                       STATUS_CODIGOS.get(ag.status) or codigo_status(ag.status)) for ag in agendamentos)
+            while True:
+                lote = list(itertools.islice(linhas, tamanho_lote))
+                if not lote:
+                    break
+                conn.executemany(SQL["salvar_agendamento"], lote)
+                contagem["agendamentos"] += len(lote)
+            for b in bloqueios:
+                b.id = conn.execute(SQL["salvar_bloqueio"], (b.id_medico, b.inicio.isoformat(timespec="seconds"),
+                                                             b.fim.isoformat(timespec="seconds"), b.motivo)).lastrowid
+                contagem["bloqueios"] += 1
+            conn.commit()
+        except BaseException:
+            # 'agendamentos' e 'bloqueios' podem ser geradores de quem chama:
+            # um erro neles (ou um KeyboardInterrupt) também desfaz a carga.
+            conn.rollback()
+            raise
+        finally:
+            conn.execute(f"PRAGMA cache_size = {cache_anterior};")
+        return contagem
@@ -0,0 +1,694 @@
+"""
+Camada de PERSISTÊNCIA distribuída em vários arquivos SQLite (shards).
+
+ShardedAgendaRepository tem a mesma interface do AgendaRepository, então a
+Clinica funciona com ele sem mudanças. Cada médico (e as consultas dele)
+fica em UM shard, escolhido pela função rotear_medico. Por padrão é um hash
+do CRM. Para separar por unidade, passe uma função que devolva o shard da
+unidade do médico.
+
+IDs globais: id_global = id_local * MAX_SHARDS + indice_do_shard. Assim o
+shard de qualquer paciente, médico ou agendamento sai direto do ID.
+
+Pacientes: cada paciente tem um shard "de origem" (hash do CPF). Quando ele
+marca consulta com um médico de outro shard, uma cópia do cadastro é criada
+nesse shard, pois a chave estrangeira de agendamentos é local ao arquivo.
+
+Índice global: um arquivo SQLite separado guarda CPF -> (tipo, id_global) e
+CRM -> id_global. Ele também fica em memória (dict), então as verificações
+de CPF/CRM duplicado feitas pela Clinica são O(1) e não consultam os shards.
+
+Leituras que cruzam shards (agenda completa do paciente, listagens) rodam
+em paralelo num ThreadPoolExecutor. Os resultados vêm ordenados e são
+juntados com heapq.merge.
+"""
+import heapq
+import itertools
+import sqlite3
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from models.agendamento import Agendamento
+from models.bloqueio import Bloqueio
+from models.medico import Medico
+from models.paciente import Paciente
+from models.pedido_espera import PedidoEspera
+from persistencia import AgendaRepository, CACHED_STATEMENTS, LIMITE_BUSCA, LIMITE_LISTAGEM
+
+# Limite de shards suportado pela codificação dos IDs (a rede tem 40 unidades).
+MAX_SHARDS = 64
+
+SQL_INDICE = {
+    "criar_indice_cpf":
+        "CREATE TABLE IF NOT EXISTS indice_cpf ("
+        "cpf TEXT PRIMARY KEY, tipo TEXT NOT NULL, id_global INTEGER NOT NULL) WITHOUT ROWID;",
+    "criar_indice_crm":
+        "CREATE TABLE IF NOT EXISTS indice_crm ("
+        "crm TEXT PRIMARY KEY, id_global INTEGER NOT NULL) WITHOUT ROWID;",
+    "carregar_cpf": "SELECT cpf, tipo, id_global FROM indice_cpf;",
+    "carregar_crm": "SELECT crm, id_global FROM indice_crm;",
+    "buscar_cpf": "SELECT tipo, id_global FROM indice_cpf WHERE cpf = ?;",
+    "buscar_crm": "SELECT id_global FROM indice_crm WHERE crm = ?;",
+    "inserir_cpf": "INSERT INTO indice_cpf (cpf, tipo, id_global) VALUES (?, ?, ?);",
+    "inserir_crm": "INSERT INTO indice_crm (crm, id_global) VALUES (?, ?);",
+    "atualizar_cpf": "UPDATE indice_cpf SET id_global = ? WHERE cpf = ?;",
+    "atualizar_crm": "UPDATE indice_crm SET id_global = ? WHERE crm = ?;",
+    "remover_cpf": "DELETE FROM indice_cpf WHERE cpf = ?;",
+    "remover_crm": "DELETE FROM indice_crm WHERE crm = ?;",
+}
+
+
+def _hash_estavel(texto: str) -> int:
+    """Hash que não muda entre execuções (hash() de str é aleatório por processo)."""
+    return zlib.crc32(texto.encode("utf-8"))
+
+
+class IndiceGlobal:
+    """
+    Índice CPF/CRM -> ID global, persistido em SQLite e mantido em memória.
+    O UNIQUE do SQLite garante a unicidade mesmo com vários processos; o
+    dict evita ir ao disco nas consultas.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._trava = threading.Lock()
+        self._conn = sqlite3.connect(db_path, cached_statements=CACHED_STATEMENTS, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(SQL_INDICE["criar_indice_cpf"])
+            self._conn.execute(SQL_INDICE["criar_indice_crm"])
+        self._cpf: Dict[str, Tuple[str, int]] = {
+            cpf: (tipo, id_global) for cpf, tipo, id_global in self._conn.execute(SQL_INDICE["carregar_cpf"])
+        }
+        self._crm: Dict[str, int] = dict(self._conn.execute(SQL_INDICE["carregar_crm"]))
+
+    def buscar_cpf(self, cpf: str) -> Optional[Tuple[str, int]]:
+        """Retorna (tipo, id_global) do CPF, ou None. tipo = 'paciente' | 'medico'."""
+        item = self._cpf.get(cpf)
+        if item is None:
+            # Outro processo pode ter cadastrado depois que carregamos o índice.
+            with self._trava:
+                row = self._conn.execute(SQL_INDICE["buscar_cpf"], (cpf,)).fetchone()
+            if row:
+                item = self._cpf[cpf] = (row[0], row[1])
+        return item
+
+    def buscar_crm(self, crm: str) -> Optional[int]:
+        id_global = self._crm.get(crm)
+        if id_global is None:
+            with self._trava:
+                row = self._conn.execute(SQL_INDICE["buscar_crm"], (crm,)).fetchone()
+            if row:
+                id_global = self._crm[crm] = row[0]
+        return id_global
+
+    def reservar(self, cpf: str, tipo: str, crm: Optional[str] = None) -> None:
+        """
+        Reserva o CPF (e o CRM) antes de gravar no shard. Lança ValueError se
+        já estiverem em uso. O ID é preenchido depois por confirmar().
+        """
+        with self._trava:
+            try:
+                with self._conn:
+                    self._conn.execute(SQL_INDICE["inserir_cpf"], (cpf, tipo, -1))
+                    if crm is not None:
+                        self._conn.execute(SQL_INDICE["inserir_crm"], (crm, -1))
+            except sqlite3.IntegrityError:
+                raise ValueError(f"CPF {cpf} ou CRM {crm} já cadastrado.")
+
+    def confirmar(self, cpf: str, tipo: str, id_global: int, crm: Optional[str] = None) -> None:
+        with self._trava:
+            with self._conn:
+                self._conn.execute(SQL_INDICE["atualizar_cpf"], (id_global, cpf))
+                if crm is not None:
+                    self._conn.execute(SQL_INDICE["atualizar_crm"], (id_global, crm))
+            self._cpf[cpf] = (tipo, id_global)
+            if crm is not None:
+                self._crm[crm] = id_global
+
+    def remover(self, cpf: str, crm: Optional[str] = None) -> None:
+        with self._trava:
+            with self._conn:
+                self._conn.execute(SQL_INDICE["remover_cpf"], (cpf,))
+                if crm is not None:
+                    self._conn.execute(SQL_INDICE["remover_crm"], (crm,))
+            self._cpf.pop(cpf, None)
+            if crm is not None:
+                self._crm.pop(crm, None)
+
+    def fechar(self) -> None:
+        self._conn.close()
+
+
+class ShardedAgendaRepository:
+    """
+    Repositório que distribui os dados entre vários AgendaRepository.
+    Mesma interface pública do AgendaRepository (pode ser passado à Clinica).
+    """
+
+    def __init__(self, caminhos_shards: Sequence[str], caminho_indice: str,
+                 rotear_medico: Optional[Callable[[Medico], int]] = None, max_workers: Optional[int] = None):
+        if not 0 < len(caminhos_shards) <= MAX_SHARDS:
+            raise ValueError(f"Use entre 1 e {MAX_SHARDS} shards.")
+        self.shards = [AgendaRepository(caminho) for caminho in caminhos_shards]
+        self.indice = IndiceGlobal(caminho_indice)
+        self._rotear_medico = rotear_medico or (lambda m: _hash_estavel(m.crm) % len(self.shards))
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or min(32, len(self.shards)),
+                                        thread_name_prefix="shard")
+        # (cpf, shard) -> id local da cópia do paciente naquele shard
+        self._copias_paciente: Dict[Tuple[str, int], int] = {}
+
+    # --- IDs globais ---
+
+    @staticmethod
+    def _global(id_local: int, shard: int) -> int:
+        return id_local * MAX_SHARDS + shard
+
+    def _local(self, id_global: int) -> Tuple[int, int]:
+        """Retorna (shard, id_local). Lança ValueError para IDs de shards inexistentes."""
+        shard = id_global % MAX_SHARDS
+        if shard >= len(self.shards):
+            raise ValueError(f"ID {id_global} não pertence a nenhum shard.")
+        return shard, id_global // MAX_SHARDS
+
+    def _shard_origem_paciente(self, cpf: str) -> int:
+        return _hash_estavel(cpf) % len(self.shards)
+
+    def _em_todos(self, funcao: Callable[[int, AgendaRepository], object]) -> List[object]:
+        """Executa funcao(indice, shard) em todos os shards, em paralelo."""
+        futuros = [self._pool.submit(funcao, i, shard) for i, shard in enumerate(self.shards)]
+        return [f.result() for f in futuros]
+
+    def _globalizar_paciente(self, paciente: Optional[Paciente]) -> Optional[Paciente]:
+        """Troca o ID local (de origem ou de cópia) pelo ID global do paciente."""
+        if paciente is not None:
+            item = self.indice.buscar_cpf(paciente.cpf)
+            if item:
+                paciente.id = item[1]
+        return paciente
+
+    def _globalizar_medico(self, medico: Optional[Medico], shard: int) -> Optional[Medico]:
+        if medico is not None:
+            medico.id = self._global(medico.id, shard)
+        return medico
+
+    def _globalizar_agendamento(self, ag: Agendamento, shard: int) -> Agendamento:
+        ag.id = self._global(ag.id, shard)
+        self._globalizar_paciente(ag.paciente)
+        self._globalizar_medico(ag.medico, shard)
+        return ag
+
+    # --- Pacientes ---
+
+    def salvar_paciente(self, paciente: Paciente) -> int:
+        self.indice.reservar(paciente.cpf, "paciente")
+        shard = self._shard_origem_paciente(paciente.cpf)
+        try:
+            id_local = self.shards[shard].salvar_paciente(paciente)
+        except Exception:
+            self.indice.remover(paciente.cpf)
+            raise
+        paciente.id = self._global(id_local, shard)
+        self.indice.confirmar(paciente.cpf, "paciente", paciente.id)
+        self._copias_paciente[(paciente.cpf, shard)] = id_local
+        return paciente.id
+
+    def buscar_paciente(self, id_paciente: int) -> Optional[Paciente]:
+        shard, id_local = self._local(id_paciente)
+        paciente = self.shards[shard].buscar_paciente(id_local)
+        if paciente is not None:
+            paciente.id = id_paciente
+        return paciente
+
+    def buscar_paciente_por_cpf(self, cpf: str) -> Optional[Paciente]:
+        item = self.indice.buscar_cpf(cpf)
+        if item is None or item[0] != "paciente":
+            return None
+        return self.buscar_paciente(item[1])
+
+    def buscar_todos_pacientes(self) -> List[Paciente]:
+        def no_shard(i, shard):
+            # Só os pacientes de origem deste shard (as cópias são ignoradas).
+            return [p for p in shard.buscar_todos_pacientes() if self._shard_origem_paciente(p.cpf) == i]
+
+        pacientes = [self._globalizar_paciente(p) for lista in self._em_todos(no_shard) for p in lista]
+        return sorted(pacientes, key=lambda p: p.id)
+
+    def _apos_local(self, apos_id: int, shard: int) -> int:
+        """Maior ID local do shard cujo ID global é <= apos_id (paginação por keyset)."""
+        return (apos_id - shard) // MAX_SHARDS if apos_id else 0
+
+    def buscar_pacientes_por_nome(self, texto: str, limite: int = 20, apos_id: int = 0) -> List[Paciente]:
+        """Busca em todos os shards (só pacientes de origem) e junta em ordem de ID global."""
+        limite = min(limite, LIMITE_BUSCA)
+
+        def no_shard(i, shard):
+            encontrados, apos_local = [], self._apos_local(apos_id, i)
+            # As cópias são descartadas, então pode ser preciso ler mais de uma página.
+            while len(encontrados) < limite:
+                pagina = shard.buscar_pacientes_por_nome(texto, limite, apos_local)
+                encontrados += [p for p in pagina if self._shard_origem_paciente(p.cpf) == i]
+                if len(pagina) < limite:
+                    break
+                apos_local = pagina[-1].id
+            return [self._globalizar_paciente(p) for p in encontrados[:limite]]
+
+        return list(itertools.islice(heapq.merge(*self._em_todos(no_shard), key=lambda p: p.id), limite))
+
+    def listar_pacientes_resumo(self, limite: int = LIMITE_LISTAGEM,
+                                apos_id: int = 0) -> List[Tuple[int, str, str, str]]:
+        """Junta as páginas dos shards (só pacientes de origem) em ordem de ID global."""
+        limite = min(limite, LIMITE_LISTAGEM)
+
+        def no_shard(i, shard):
+            # O ID global de origem é calculável pelo ID local: sem consultar o índice.
+            encontrados, apos_local = [], self._apos_local(apos_id, i)
+            while len(encontrados) < limite:
+                pagina = shard.listar_pacientes_resumo(limite, apos_local)
+                encontrados += [(self._global(pid, i), nome, cpf, plano) for pid, nome, cpf, plano in pagina
+                                if self._shard_origem_paciente(cpf) == i]
+                if len(pagina) < limite:
+                    break
+                apos_local = pagina[-1][0]
+            return encontrados[:limite]
+
+        return list(itertools.islice(heapq.merge(*self._em_todos(no_shard)), limite))
+
+    def atualizar_paciente(self, id_paciente: int, telefone: str, plano_saude: str) -> None:
+        paciente = self.buscar_paciente(id_paciente)
+        if paciente is None:
+            raise ValueError(f"Paciente com ID {id_paciente} não encontrado para atualização.")
+
+        def no_shard(i, shard):
+            copia = shard.buscar_paciente_por_cpf(paciente.cpf)
+            if copia is not None:
+                shard.atualizar_paciente(copia.id, telefone, plano_saude)
+
+        self._em_todos(no_shard)
+
+    def deletar_paciente(self, id_paciente: int) -> None:
+        paciente = self.buscar_paciente(id_paciente)
+        if paciente is None:
+            return
+
+        def no_shard(i, shard):
+            copia = shard.buscar_paciente_por_cpf(paciente.cpf)
+            if copia is not None:
+                shard.deletar_paciente(copia.id)
+
+        self._em_todos(no_shard)
+        self.indice.remover(paciente.cpf)
+        for chave in [c for c in self._copias_paciente if c[0] == paciente.cpf]:
+            del self._copias_paciente[chave]
+
+    def _id_paciente_no_shard(self, paciente: Paciente, shard: int) -> int:
+        """
+        Retorna o ID local do paciente no shard indicado, criando uma cópia do
+        cadastro se ele ainda não existir lá.
+        """
+        chave = (paciente.cpf, shard)
+        id_local = self._copias_paciente.get(chave)
+        if id_local is not None:
+            return id_local
+        destino = self.shards[shard]
+        copia = destino.buscar_paciente_por_cpf(paciente.cpf)
+        if copia is None:
+            try:
+                id_local = destino.salvar_paciente(
+                    Paciente(paciente.nome, paciente.cpf, paciente.telefone, paciente.plano_saude))
+            except sqlite3.IntegrityError:
+                # Outra thread criou a cópia ao mesmo tempo.
+                id_local = destino.buscar_paciente_por_cpf(paciente.cpf).id
+        else:
+            id_local = copia.id
+        self._copias_paciente[chave] = id_local
+        return id_local
+
+    # --- Médicos ---
+
+    def salvar_medico(self, medico: Medico) -> int:
+        shard = self._rotear_medico(medico)
+        if not 0 <= shard < len(self.shards):
+            raise ValueError(f"Shard {shard} inválido para o médico CRM {medico.crm}.")
+        self.indice.reservar(medico.cpf, "medico", medico.crm)
+        try:
+            id_local = self.shards[shard].salvar_medico(medico)
+        except Exception:
+            self.indice.remover(medico.cpf, medico.crm)
+            raise
+        medico.id = self._global(id_local, shard)
+        self.indice.confirmar(medico.cpf, "medico", medico.id, medico.crm)
+        return medico.id
+
+    def buscar_medico(self, id_medico: int) -> Optional[Medico]:
+        shard, id_local = self._local(id_medico)
+        return self._globalizar_medico(self.shards[shard].buscar_medico(id_local), shard)
+
+    def buscar_medico_por_crm(self, crm: str) -> Optional[Medico]:
+        id_global = self.indice.buscar_crm(crm)
+        return self.buscar_medico(id_global) if id_global is not None else None
+
+    def buscar_medico_por_cpf(self, cpf: str) -> Optional[Medico]:
+        item = self.indice.buscar_cpf(cpf)
+        if item is None or item[0] != "medico":
+            return None
+        return self.buscar_medico(item[1])
+
+    def buscar_todos_medicos(self) -> List[Medico]:
+        listas = self._em_todos(lambda i, shard: [self._globalizar_medico(m, i) for m in shard.buscar_todos_medicos()])
+        return sorted((m for lista in listas for m in lista), key=lambda m: m.id)
+
+    def buscar_medicos(self, texto: Optional[str] = None, especialidade: Optional[str] = None,
+                       limite: int = 20, apos_id: int = 0) -> List[Medico]:
+        listas = self._em_todos(lambda i, shard: [
+            self._globalizar_medico(m, i)
+            for m in shard.buscar_medicos(texto, especialidade, limite, self._apos_local(apos_id, i))])
+        return list(itertools.islice(heapq.merge(*listas, key=lambda m: m.id), min(limite, LIMITE_BUSCA)))
+
+    def listar_medicos_resumo(self, limite: int = LIMITE_LISTAGEM,
+                              apos_id: int = 0) -> List[Tuple[int, str, str, str]]:
+        listas = self._em_todos(lambda i, shard: [
+            (self._global(mid, i), nome, crm, especialidade)
+            for mid, nome, crm, especialidade in shard.listar_medicos_resumo(limite, self._apos_local(apos_id, i))])
+        return list(itertools.islice(heapq.merge(*listas), min(limite, LIMITE_LISTAGEM)))
+
+    def buscar_medicos_disponiveis(self, inicio, duracao_min: int, especialidade: Optional[str] = None,
+                                   sem_consulta: bool = True) -> List[Medico]:
+        listas = self._em_todos(lambda i, shard: [
+            self._globalizar_medico(m, i)
+            for m in shard.buscar_medicos_disponiveis(inicio, duracao_min, especialidade, sem_consulta)])
+        return sorted((m for lista in listas for m in lista), key=lambda m: m.id)
+
+    def deletar_medico(self, id_medico: int) -> None:
+        medico = self.buscar_medico(id_medico)
+        if medico is None:
+            return
+        shard, id_local = self._local(id_medico)
+        self.shards[shard].deletar_medico(id_local)
+        self.indice.remover(medico.cpf, medico.crm)
+
+    # --- Agendamentos ---
+
+    def salvar_agendamento(self, ag: Agendamento, conferir_conflito: bool = False) -> int:
+        if not ag.paciente.id:
+            raise ValueError("Paciente sem ID não pode agendar.")
+        if not ag.medico.id:
+            raise ValueError("Médico sem ID não pode agendar.")
+        shard, id_medico_local = self._local(ag.medico.id)
+        p, m = ag.paciente, ag.medico
+        paciente_local = Paciente(p.nome, p.cpf, p.telefone, p.plano_saude)
+        paciente_local.id = self._id_paciente_no_shard(p, shard)
+        medico_local = Medico(m.nome, m.cpf, m.telefone, m.crm, m.especialidade, m.regras_disponibilidade)
+        medico_local.id = id_medico_local
+        local = Agendamento(paciente_local, medico_local, ag.data_hora_inicio, ag.duracao_minutos)
+        local.status = ag.status
+        return self._global(self.shards[shard].salvar_agendamento(local, conferir_conflito), shard)
+
+    def buscar_agendamento(self, id_agendamento: int) -> Optional[Agendamento]:
+        shard, id_local = self._local(id_agendamento)
+        ag = self.shards[shard].buscar_agendamento(id_local)
+        return self._globalizar_agendamento(ag, shard) if ag is not None else None
+
+    def atualizar_agendamento(self, ag: Agendamento) -> None:
+        shard, id_local = self._local(ag.id)
+        local = Agendamento(ag.paciente, ag.medico, ag.data_hora_inicio, ag.duracao_minutos)
+        local.id = id_local
+        local.status = ag.status
+        local.versao = ag.versao
+        self.shards[shard].atualizar_agendamento(local)
+        ag.versao = local.versao
+
+    def mudar_status_agendamento(self, id_agendamento: int, novo_status: str, versao: Optional[int] = None):
+        shard, id_local = self._local(id_agendamento)
+        resultado = self.shards[shard].mudar_status_agendamento(id_local, novo_status, versao)
+        if resultado is None:
+            return None
+        id_medico, inicio, duracao, nova_versao, id_paciente = resultado
+        # O paciente pode ser uma cópia local: o ID global sai do índice de CPFs.
+        paciente = self._globalizar_paciente(self.shards[shard].buscar_paciente(id_paciente))
+        return (self._global(id_medico, shard), inicio, duracao, nova_versao,
+                paciente.id if paciente is not None else None)
+
+    def mudar_status_no_periodo(self, novo_status: str, status_atual: str, data_inicio, data_fim,
+                                id_medico: Optional[int] = None) -> int:
+        if id_medico is not None:
+            shard, id_local = self._local(id_medico)
+            return self.shards[shard].mudar_status_no_periodo(novo_status, status_atual, data_inicio, data_fim,
+                                                              id_local)
+        return sum(self._em_todos(lambda i, shard: shard.mudar_status_no_periodo(
+            novo_status, status_atual, data_inicio, data_fim)))
+
+    def fechar_periodo(self, data_inicio, data_fim, ate, id_medico: Optional[int] = None) -> Dict[int, int]:
+        if id_medico is not None:
+            shard, id_local = self._local(id_medico)
+            return {self._global(m, shard): n
+                    for m, n in self.shards[shard].fechar_periodo(data_inicio, data_fim, ate, id_local).items()}
+        contagem = {}
+        for i, parcial in enumerate(self._em_todos(lambda i, shard: shard.fechar_periodo(data_inicio, data_fim, ate))):
+            contagem.update((self._global(m, i), n) for m, n in parcial.items())
+        return contagem
+
+    def deletar_agendamento(self, id_agendamento: int) -> None:
+        shard, id_local = self._local(id_agendamento)
+        self.shards[shard].deletar_agendamento(id_local)
+
+    def buscar_agendamentos_por_paciente(self, id_paciente: int, incluir_cancelados: bool = False,
+                                         data_inicio=None, data_fim=None) -> List[Agendamento]:
+        """Agenda completa do paciente: consulta todos os shards em paralelo e junta por data."""
+        paciente = self.buscar_paciente(id_paciente)
+        if paciente is None:
+            return []
+
+        def no_shard(i, shard):
+            copia = shard.buscar_paciente_por_cpf(paciente.cpf)
+            if copia is None:
+                return []
+            # Cada shard já devolve em ordem de data.
+            return [self._globalizar_agendamento(ag, i)
+                    for ag in shard.buscar_agendamentos_por_paciente(copia.id, incluir_cancelados,
+                                                                     data_inicio, data_fim)]
+
+        return list(heapq.merge(*self._em_todos(no_shard), key=lambda ag: ag.data_hora_inicio))
+
+    def buscar_agendamentos_por_medico_e_data(self, id_medico: int, data_iso: str,
+                                              incluir_cancelados: bool = False) -> List[Agendamento]:
+        shard, id_local = self._local(id_medico)
+        return [self._globalizar_agendamento(ag, shard)
+                for ag in self.shards[shard].buscar_agendamentos_por_medico_e_data(id_local, data_iso,
+                                                                                  incluir_cancelados)]
+
+    def iterar_agenda_paciente(self, id_paciente: int, incluir_cancelados: bool = False,
+                               data_inicio=None, data_fim=None, tamanho_lote: int = 1000):
+        """Linhas da agenda do paciente em todos os shards, juntas por data, em lotes."""
+        paciente = self.buscar_paciente(id_paciente)
+        if paciente is None:
+            return
+
+        def no_shard(i, shard):
+            copia = shard.buscar_paciente_por_cpf(paciente.cpf)
+            if copia is None:
+                return []
+            return [(self._global(linha[0], i),) + linha[1:]
+                    for lote in shard.iterar_agenda_paciente(copia.id, incluir_cancelados, data_inicio, data_fim,
+                                                             tamanho_lote)
+                    for linha in lote]
+
+        linhas = heapq.merge(*self._em_todos(no_shard), key=lambda linha: linha[3])
+        while True:
+            lote = list(itertools.islice(linhas, tamanho_lote))
+            if not lote:
+                return
+            yield lote
+
+    def iterar_agenda_medico(self, id_medico: int, dia, incluir_cancelados: bool = False,
+                             tamanho_lote: int = 1000):
+        shard, id_local = self._local(id_medico)
+        for lote in self.shards[shard].iterar_agenda_medico(id_local, dia, incluir_cancelados, tamanho_lote):
+            yield [(self._global(linha[0], shard),) + linha[1:] for linha in lote]
+
+    def buscar_intervalos_ocupados_medico(self, id_medico: int, data_inicio, data_fim):
+        shard, id_local = self._local(id_medico)
+        return self.shards[shard].buscar_intervalos_ocupados_medico(id_local, data_inicio, data_fim)
+
+    def buscar_intervalos_ocupados(self, data_inicio, data_fim) -> List[Tuple[int, Optional[int], object, int]]:
+        """
+        Intervalos de todos os shards, com IDs globais. O paciente de uma
+        consulta pode ser uma cópia local: o ID global sai do índice de CPFs
+        (None se o paciente já foi excluído).
+        """
+        def no_shard(i, shard):
+            intervalos = shard.buscar_intervalos_ocupados(data_inicio, data_fim)
+            cpfs = shard.buscar_cpfs_pacientes({id_paciente for _, id_paciente, _, _ in intervalos})
+            ids = {}
+            for id_local, cpf in cpfs.items():
+                item = self.indice.buscar_cpf(cpf)
+                ids[id_local] = item[1] if item and item[0] == "paciente" else None
+            return [(self._global(id_medico, i), ids.get(id_paciente), inicio, duracao)
+                    for id_medico, id_paciente, inicio, duracao in intervalos]
+
+        return [intervalo for lista in self._em_todos(no_shard) for intervalo in lista]
+
+    # --- Lista de espera ---
+    # O pedido fica no shard de origem do paciente (ainda não há médico). Se a
+    # consulta que o atende cair em outro shard, o pedido é marcado como
+    # atendido depois da gravação e sem o vínculo id_agendamento, pois a chave
+    # estrangeira é local a cada arquivo.
+
+    @staticmethod
+    def _copiar_pedido(pedido: PedidoEspera, id_paciente: int) -> PedidoEspera:
+        """Cópia do pedido com outro ID de paciente (id_paciente não tem setter)."""
+        copia = PedidoEspera(id_paciente, pedido.especialidade, pedido.data_inicio, pedido.data_fim,
+                             pedido.duracao_minutos)
+        copia.criado_em = pedido.criado_em
+        copia.status = pedido.status
+        return copia
+
+    def salvar_pedido_espera(self, pedido: PedidoEspera) -> int:
+        # O ID global do paciente é sempre o do shard de origem.
+        shard, id_paciente_local = self._local(pedido.id_paciente)
+        id_local = self.shards[shard].salvar_pedido_espera(self._copiar_pedido(pedido, id_paciente_local))
+        pedido.id = self._global(id_local, shard)
+        return pedido.id
+
+    def buscar_pedidos_espera_pendentes(self) -> List[PedidoEspera]:
+        """Pedidos pendentes de todos os shards, juntos em ordem de chegada."""
+        def no_shard(i, shard):
+            pedidos = []
+            for local in shard.buscar_pedidos_espera_pendentes():
+                pedido = self._copiar_pedido(local, self._global(local.id_paciente, i))
+                pedido.id = self._global(local.id, i)
+                pedidos.append(pedido)
+            return pedidos
+
+        return list(heapq.merge(*self._em_todos(no_shard), key=lambda p: p.criado_em))
+
+    def salvar_agendamentos_em_lote(self, itens) -> List[Optional[int]]:
+        """
+        Separa os itens pelo shard do médico e grava cada grupo numa transação
+        do shard (os shards em paralelo), com a mesma conferência de conflitos
+        do AgendaRepository. Retorna os IDs globais, ou None nos conflitos.
+        """
+        itens = list(itens)
+        pacientes: Dict[int, Paciente] = {}
+        grupos: Dict[int, Tuple[List[int], list]] = {}
+        pedidos_de_fora: Dict[int, Tuple[int, int]] = {}  # posição -> (shard do pedido, id local)
+        for posicao, (id_pedido, id_paciente, id_medico, inicio, duracao, status) in enumerate(itens):
+            shard, id_medico_local = self._local(id_medico)
+            paciente = pacientes.get(id_paciente)
+            if paciente is None:
+                paciente = pacientes[id_paciente] = self.buscar_paciente(id_paciente)
+                if paciente is None:
+                    raise ValueError(f"Paciente com ID {id_paciente} não encontrado.")
+            id_pedido_local = None
+            if id_pedido is not None:
+                shard_pedido, id_pedido_local = self._local(id_pedido)
+                if shard_pedido != shard:
+                    pedidos_de_fora[posicao] = (shard_pedido, id_pedido_local)
+                    id_pedido_local = None
+            posicoes, locais = grupos.setdefault(shard, ([], []))
+            posicoes.append(posicao)
+            locais.append((id_pedido_local, self._id_paciente_no_shard(paciente, shard), id_medico_local,
+                           inicio, duracao, status))
+
+        futuros = {shard: self._pool.submit(self.shards[shard].salvar_agendamentos_em_lote, locais)
+                   for shard, (_, locais) in grupos.items()}
+        ids: List[Optional[int]] = [None] * len(itens)
+        for shard, (posicoes, _) in grupos.items():
+            for posicao, id_local in zip(posicoes, futuros[shard].result()):
+                if id_local is not None:
+                    ids[posicao] = self._global(id_local, shard)
+
+        atendidos: Dict[int, List[Tuple[int, None]]] = {}
+        for posicao, (shard_pedido, id_pedido_local) in pedidos_de_fora.items():
+            if ids[posicao] is not None:
+                atendidos.setdefault(shard_pedido, []).append((id_pedido_local, None))
+        for shard_pedido, pares in atendidos.items():
+            self.shards[shard_pedido].atender_pedidos_espera(pares)
+        return ids
+
+    # --- Capacidade ---
+    # A capacidade de um médico fica no shard dele; as regras por especialidade
+    # são copiadas em todos os shards (a conferência na gravação é local).
+
+    def capacidade_medico(self, id_medico: int) -> int:
+        shard, id_local = self._local(id_medico)
+        return self.shards[shard].capacidade_medico(id_local)
+
+    def definir_capacidade_medico(self, id_medico: int, capacidade: Optional[int]) -> None:
+        shard, id_local = self._local(id_medico)
+        self.shards[shard].definir_capacidade_medico(id_local, capacidade)
+
+    def definir_capacidade_especialidade(self, especialidade: str, capacidade: Optional[int]) -> None:
+        self._em_todos(lambda i, shard: shard.definir_capacidade_especialidade(especialidade, capacidade))
+
+    def buscar_capacidades_especialidades(self) -> Dict[str, int]:
+        return self.shards[0].buscar_capacidades_especialidades()
+
+    # --- Bloqueios ---
+    # O bloqueio de um médico fica no shard dele. Um bloqueio da clínica é
+    # copiado em todos os shards (as buscas e a conferência na gravação são
+    # locais a cada arquivo); o ID global é o da cópia do shard 0.
+
+    def _globalizar_bloqueio(self, bloqueio: Bloqueio, shard: int) -> Bloqueio:
+        bloqueio.id = self._global(bloqueio.id, shard)
+        if bloqueio.id_medico is not None:
+            bloqueio.id_medico = self._global(bloqueio.id_medico, shard)
+        return bloqueio
+
+    def salvar_bloqueio(self, bloqueio: Bloqueio) -> int:
+        if bloqueio.da_clinica:
+            ids = self._em_todos(lambda i, shard: shard.salvar_bloqueio(
+                Bloqueio(bloqueio.inicio, bloqueio.fim, None, bloqueio.motivo)))
+            bloqueio.id = self._global(ids[0], 0)
+            return bloqueio.id
+        shard, id_local = self._local(bloqueio.id_medico)
+        local = Bloqueio(bloqueio.inicio, bloqueio.fim, id_local, bloqueio.motivo)
+        bloqueio.id = self._global(self.shards[shard].salvar_bloqueio(local), shard)
+        return bloqueio.id
+
+    def remover_bloqueio(self, id_bloqueio: int) -> Optional[Bloqueio]:
+        shard, id_local = self._local(id_bloqueio)
+        bloqueio = self.shards[shard].remover_bloqueio(id_local)
+        if bloqueio is None:
+            return None
+        if bloqueio.da_clinica:
+            self._em_todos(lambda i, outro: outro.remover_copias_bloqueio_clinica(bloqueio))
+        return self._globalizar_bloqueio(bloqueio, shard)
+
+    def buscar_bloqueios(self, id_medico: Optional[int] = None, data_inicio=None, data_fim=None) -> List[Bloqueio]:
+        if id_medico is not None:
+            shard, id_local = self._local(id_medico)
+            return [self._globalizar_bloqueio(b, shard)
+                    for b in self.shards[shard].buscar_bloqueios(id_local, data_inicio, data_fim)]
+        # Os bloqueios da clínica vêm só do shard 0 (os outros têm cópias).
+        listas = self._em_todos(lambda i, shard: [
+            self._globalizar_bloqueio(b, i) for b in shard.buscar_bloqueios(None, data_inicio, data_fim)
+            if i == 0 or not b.da_clinica])
+        return list(heapq.merge(*listas, key=lambda b: b.inicio))
+
+    def existe_bloqueio(self, id_medico: int, inicio, fim) -> bool:
+        shard, id_local = self._local(id_medico)
+        return self.shards[shard].existe_bloqueio(id_local, inicio, fim)
+
+    def iterar_agendamentos_completos(self, tamanho_lote: int = 1000):
+        """Percorre os agendamentos shard por shard, já com IDs globais."""
+        for i, shard in enumerate(self.shards):
+            for (id_ag, inicio, duracao, status, _, nome_p, cpf_p, plano,
+                 id_m, nome_m, crm, especialidade) in shard.iterar_agendamentos_completos(tamanho_lote):
+                item = self.indice.buscar_cpf(cpf_p)
+                yield (self._global(id_ag, i), inicio, duracao, status, item[1] if item else None, nome_p, cpf_p,
+                       plano, self._global(id_m, i), nome_m, crm, especialidade)
+
+    def versao_dados(self) -> Optional[Tuple]:
+        """As versões (AgendaRepository.versao_dados) de todos os shards, nesta thread."""
+        versoes = tuple(shard.versao_dados() for shard in self.shards)
+        return None if None in versoes else versoes
+
+    def fechar(self) -> None:
+        """Encerra o pool de threads e fecha as conexões (de todas as threads) com os shards e o índice."""
+        self._pool.shutdown(wait=True)
+        for shard in self.shards:
+            shard.fechar()
+        self.indice.fechar()
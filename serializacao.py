@@ -0,0 +1,82 @@
+"""
+Serialização RÁPIDA de agendas para JSON, direto das linhas do banco.
+
+O caminho "por objetos" (buscar_agendamentos_* -> Agendamento com Paciente e
+Medico -> dict -> json.dumps) monta três objetos e um dict por consulta. Aqui
+as linhas vêm prontas do repositório (iterar_agenda_paciente /
+iterar_agenda_medico, na ordem de COLUNAS_AGENDA) e cada uma vira texto com
+UM modelo "%": as conversões são feitas coluna a coluna (map, em C) e as
+chaves do JSON já estão escritas no modelo.
+
+A saída é JSON compacto (separadores "," e ":", sem ensure_ascii), igual a
+json.dumps(..., separators=(",", ":"), ensure_ascii=False) dos mesmos dicts.
+
+    serializador = SerializadorLinhas(CAMPOS_AGENDA)
+    for parte in serializador.partes_array(repo.iterar_agenda_medico(id_medico, dia)):
+        saida.write(parte)          # b"[", b"{...},{...}", ..., b"]"
+"""
+from json.encoder import encode_basestring
+from typing import Iterable, Iterator, List, Sequence, Tuple
+
+from persistencia import COLUNAS_AGENDA, STATUS_NOMES
+
+# Tipos de campo aceitos pelo SerializadorLinhas.
+INTEIRO = "inteiro"
+TEXTO = "texto"          # Escapado (nomes, CPF, CRM...)
+DATA_HORA = "data_hora"  # ISO 8601 gravado pelo repositório: nunca precisa de escape
+STATUS = "status"        # Código do banco -> nome (STATUS_NOMES)
+
+CAMPOS_AGENDA = tuple(zip(COLUNAS_AGENDA, (INTEIRO, TEXTO, TEXTO, DATA_HORA, INTEIRO, STATUS)))
+
+_STATUS_JSON = {codigo: encode_basestring(nome) for codigo, nome in STATUS_NOMES.items()}
+_FORMATOS = {INTEIRO: "%d", TEXTO: "%s", DATA_HORA: '"%s"', STATUS: "%s"}
+_CONVERSORES = {INTEIRO: None, TEXTO: encode_basestring, DATA_HORA: None, STATUS: _STATUS_JSON.__getitem__}
+
+
+class SerializadorLinhas:
+    """
+    Converte tuplas (na ordem de 'campos') em objetos JSON. campos é uma
+    sequência de (nome, tipo), com tipo INTEIRO, TEXTO, DATA_HORA ou STATUS.
+    Os valores não podem ser NULL (as colunas das agendas são NOT NULL).
+    """
+
+    def __init__(self, campos: Sequence[Tuple[str, str]]):
+        self.campos = tuple(campos)
+        self._modelo = "{" + ",".join(f"{encode_basestring(nome)}:{_FORMATOS[tipo]}"
+                                      for nome, tipo in self.campos) + "}"
+        self._conversores = [_CONVERSORES[tipo] for _, tipo in self.campos]
+
+    def objetos(self, linhas: Sequence[tuple]) -> List[str]:
+        """Um texto JSON por linha."""
+        if not linhas:
+            return []
+        colunas = [coluna if conversor is None else list(map(conversor, coluna))
+                   for coluna, conversor in zip(zip(*linhas), self._conversores)]
+        modelo = self._modelo
+        return [modelo % valores for valores in zip(*colunas)]
+
+    def array(self, linhas: Sequence[tuple]) -> bytes:
+        """Todas as linhas como um único array JSON."""
+        return ("[" + ",".join(self.objetos(linhas)) + "]").encode("utf-8")
+
+    def partes_array(self, lotes: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+        """
+        Array JSON em partes (uma por lote), para respostas em fluxo: a memória
+        usada é a de um lote, não a da agenda inteira.
+        """
+        yield b"["
+        separador = ""
+        for lote in lotes:
+            if lote:
+                yield (separador + ",".join(self.objetos(lote))).encode("utf-8")
+                separador = ","
+        yield b"]"
+
+    def partes_jsonl(self, lotes: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+        """Um objeto JSON por linha (JSONL), uma parte por lote."""
+        for lote in lotes:
+            if lote:
+                yield ("\n".join(self.objetos(lote)) + "\n").encode("utf-8")
+
+
+SERIALIZADOR_AGENDA = SerializadorLinhas(CAMPOS_AGENDA)
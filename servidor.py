@@ -0,0 +1,266 @@
+"""
+Modo SERVIÇO: as operações da Clinica expostas como HTTP/JSON, só com a
+biblioteca padrão (http.server), para várias recepções usarem a mesma clínica.
+
+    python main.py servir [--host 127.0.0.1] [--porta 8080] [--workers 8]
+
+Rotas (os "dados" são os mesmos das operações do CLI, veja main.OPERACOES):
+  POST /<operacao>        corpo JSON com os dados. Ex: POST /marcar
+  GET  /<operacao>?a=b    só para as consultas (listar, buscar, agenda-medico, disponiveis,
+                          bloqueios);
+                          "true"/"false" viram booleanos. Ex:
+                          GET /agenda-medico?crm_medico=123&data=2025-03-10
+  GET  /saude             verificação simples (balanceador, scripts), com a taxa de
+                          acerto do cache de agendas de pacientes
+
+Respostas: {"op": ..., "ok": true, ...} ou {"op": ..., "ok": false, "erro": ...}
+com 400 (erro de negócio/dados), 404 (operação desconhecida), 409 (versão
+desatualizada, veja ConflitoVersao) ou 503 (banco ocupado; tente de novo).
+
+- As conexões são HTTP/1.1 com keep-alive. Uma conexão parada por mais de
+  timeout_ociosa segundos é fechada, liberando o worker.
+- Os pedidos são atendidos por um pool FIXO de workers. O repositório guarda
+  uma conexão SQLite por thread, então cada worker usa sempre a mesma
+  conexão (e o mesmo cache de statements). Use workers >= número de
+  recepções conectadas ao mesmo tempo: cada conexão keep-alive ocupa um worker.
+  Com todos os workers ocupados, até 'fila' conexões esperam; as seguintes
+  recebem 503 na hora e são fechadas, em vez de acumular sem limite.
+  As conexões SQLite dos workers são fechadas pelo repo.fechar() de quem
+  chamou servir() (main.py faz isso ao sair).
+- Um cliente que desconecta no meio da resposta só encerra a conexão dele.
+- Listagens (respostas com uma lista) saem em "Transfer-Encoding: chunked",
+  em partes de LOTE_STREAMING itens, sem montar o corpo inteiro na memória.
+  As agendas (main.LISTAGENS) nem passam por objetos: as linhas do banco
+  vão direto para JSON pelo serializacao.SERIALIZADOR_AGENDA. A agenda do
+  paciente ("listar" consultas) sai do cache de agendas da Clinica.
+"""
+import itertools
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from persistencia import ConflitoVersao
+from serializacao import SERIALIZADOR_AGENDA
+
+OPERACOES_LEITURA = ("listar", "buscar", "agenda-medico", "disponiveis", "bloqueios")
+LOTE_STREAMING = 200
+TAMANHO_MAXIMO_CORPO = 1 << 20
+
+_CORPO_OCUPADO = b'{"op": null, "ok": false, "erro": "Servidor ocupado; tente de novo."}'
+RESPOSTA_OCUPADO = (b"HTTP/1.1 503 Service Unavailable\r\n"
+                    b"Content-Type: application/json; charset=utf-8\r\n"
+                    b"Content-Length: %d\r\nRetry-After: 1\r\nConnection: close\r\n\r\n%s"
+                    % (len(_CORPO_OCUPADO), _CORPO_OCUPADO))
+
+
+def _json(valor) -> str:
+    return json.dumps(valor, ensure_ascii=False)
+
+
+def partes_json(registro: dict, tamanho_lote: int = LOTE_STREAMING):
+    """
+    Gera o JSON de 'registro' em pedaços (bytes). Se houver um campo lista, ele
+    sai em lotes de tamanho_lote itens; o resultado concatenado é igual a
+    json.dumps(registro).
+    """
+    chave = next((k for k, v in registro.items() if isinstance(v, list)), None)
+    if chave is None:
+        yield _json(registro).encode("utf-8")
+        return
+    itens = registro[chave]
+    resto = {k: v for k, v in registro.items() if k != chave}
+    cabeca = _json(resto)[:-1]  # sem o "}" final
+    yield f"{cabeca}{', ' if resto else ''}{_json(chave)}: [".encode("utf-8")
+    for i in range(0, len(itens), tamanho_lote):
+        yield ((", " if i else "") + ", ".join(_json(item) for item in itens[i:i + tamanho_lote])).encode("utf-8")
+    yield b"]}"
+
+
+def _valor_da_query(valor: str):
+    return {"true": True, "false": False}.get(valor.lower(), valor)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    # Cabeçalho e corpo saem em escritas separadas; com o algoritmo de Nagle
+    # ligado cada resposta esperaria o ACK atrasado do cliente (~40 ms).
+    disable_nagle_algorithm = True
+    server_version = "ClinicaHTTP/1.0"
+
+    def setup(self):
+        self.timeout = self.server.timeout_ociosa
+        super().setup()
+
+    def log_message(self, formato, *args):
+        if self.server.verboso:
+            super().log_message(formato, *args)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        nome = url.path.strip("/")
+        if nome == "saude":
+            self._responder(200, {"ok": True, "cache_agendas": self.server.clinica.agendas.estatisticas()})
+        elif nome in OPERACOES_LEITURA:
+            self._executar(nome, {k: _valor_da_query(v) for k, v in parse_qsl(url.query)})
+        else:
+            self._responder(404, {"op": nome, "ok": False, "erro": f"Rota desconhecida: {url.path!r}."})
+
+    def do_POST(self):
+        nome = urlsplit(self.path).path.strip("/")
+        try:
+            tamanho = int(self.headers.get("Content-Length") or 0)
+            if tamanho > TAMANHO_MAXIMO_CORPO:
+                raise ValueError(f"Corpo maior que {TAMANHO_MAXIMO_CORPO} bytes.")
+            corpo = self.rfile.read(tamanho) if tamanho else b"{}"
+            dados = json.loads(corpo)
+            if not isinstance(dados, dict):
+                raise ValueError("O corpo deve ser um objeto JSON.")
+        except ValueError as e:  # json.JSONDecodeError também é ValueError
+            self.close_connection = True  # O corpo pode não ter sido lido inteiro
+            self._responder(400, {"op": nome, "ok": False, "erro": str(e)})
+            return
+        self._executar(nome, dados)
+
+    def end_headers(self):
+        super().end_headers()
+        self._cabecalho_enviado = True
+
+    def _executar(self, nome: str, dados: dict):
+        self._cabecalho_enviado = False
+        funcao = self.server.operacoes.get(nome)
+        if funcao is None:
+            self._responder(404, {"op": nome, "ok": False, "erro": f"Operação desconhecida: {nome!r}."})
+            return
+        try:
+            listagem = self.server.listagens.get(nome)
+            rapida = listagem(self.server.clinica, dados) if listagem else None
+            if rapida is not None:
+                campos, chave, lotes = rapida
+                # O primeiro lote é lido antes do cabeçalho HTTP: um erro do
+                # banco ainda pode virar uma resposta de erro.
+                lotes = iter(lotes)
+                primeiro = next(lotes, [])
+                self._responder_agenda({"op": nome, "ok": True, **campos}, chave,
+                                       itertools.chain((primeiro,), lotes))
+                return
+            resultado = funcao(self.server.clinica, dados)
+        except ConflitoVersao as e:
+            self._responder_erro(409, {"op": nome, "ok": False, "erro": str(e)})
+        except (ValueError, KeyError, TypeError) as e:
+            self._responder_erro(400, {"op": nome, "ok": False, "erro": str(e)})
+        except sqlite3.OperationalError as e:  # "database is locked" depois do timeout do sqlite3
+            self._responder_erro(503, {"op": nome, "ok": False, "erro": str(e)})
+        except sqlite3.Error as e:
+            self._responder_erro(500, {"op": nome, "ok": False, "erro": str(e)})
+        else:
+            self._responder(200, {"op": nome, "ok": True, **resultado})
+
+    def _responder(self, codigo: int, registro: dict):
+        try:
+            self.send_response(codigo)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            if not any(isinstance(v, list) for v in registro.values()):
+                corpo = _json(registro).encode("utf-8")
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+                return
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for parte in partes_json(registro):
+                self.wfile.write(b"%X\r\n%s\r\n" % (len(parte), parte))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # O cliente desconectou; nada mais a enviar
+
+    def _responder_erro(self, codigo: int, registro: dict):
+        """
+        Resposta de erro. Se o cabeçalho já saiu (erro no meio de uma listagem
+        em fluxo), o status não pode mais mudar: a conexão é fechada sem o
+        chunk final, e o cliente vê a resposta incompleta como falha.
+        """
+        if self._cabecalho_enviado:
+            self.log_error("%s: erro depois do início da resposta: %s", registro["op"], registro["erro"])
+            self.close_connection = True
+            return
+        self._responder(codigo, registro)
+
+    def _responder_agenda(self, cabeca: dict, chave: str, lotes):
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            inicio = f"{_json(cabeca)[:-1]}, {_json(chave)}: ".encode("utf-8")
+            for parte in itertools.chain((inicio,), SERIALIZADOR_AGENDA.partes_array(lotes), (b"}",)):
+                self.wfile.write(b"%X\r\n%s\r\n" % (len(parte), parte))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+class ServidorClinica(ThreadingHTTPServer):
+    """
+    ThreadingHTTPServer com um pool fixo de workers (em vez de uma thread nova
+    por conexão), para que cada worker reaproveite a sua conexão com o banco.
+    No máximo workers + fila conexões são aceitas ao mesmo tempo (padrão da
+    fila: o número de workers); além disso a resposta é 503.
+    """
+    daemon_threads = True
+    request_queue_size = 64
+
+    def __init__(self, endereco, clinica, operacoes: dict, workers: int = 8, timeout_ociosa: float = 5.0,
+                 verboso: bool = False, listagens: dict = None, fila: int | None = None):
+        self.clinica = clinica
+        self.operacoes = operacoes
+        self.listagens = listagens or {}
+        self.timeout_ociosa = timeout_ociosa
+        self.verboso = verboso
+        self._workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="recepcao")
+        self._vagas = threading.BoundedSemaphore(workers + (workers if fila is None else fila))
+        self.recusadas = 0
+        super().__init__(endereco, _Handler)
+
+    def process_request(self, request, client_address):
+        if not self._vagas.acquire(blocking=False):
+            self._recusar(request)
+            return
+        self._workers.submit(self._atender, request, client_address)
+
+    def _atender(self, request, client_address):
+        try:
+            self.process_request_thread(request, client_address)
+        finally:
+            self._vagas.release()
+
+    def _recusar(self, request):
+        """Responde 503 sem ler o pedido e fecha a conexão (roda na thread que aceita conexões)."""
+        self.recusadas += 1
+        try:
+            request.sendall(RESPOSTA_OCUPADO)
+            # Descarta o pedido que já chegou: fechar com dados não lidos manda
+            # RST, e o cliente poderia perder o 503.
+            request.setblocking(False)
+            request.recv(TAMANHO_MAXIMO_CORPO)
+        except OSError:
+            pass  # O cliente já desistiu, ou o pedido ainda não chegou
+        self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._workers.shutdown(wait=True)
+
+
+def servir(clinica, operacoes: dict, host: str = "127.0.0.1", porta: int = 8080, workers: int = 8,
+           verboso: bool = False, listagens: dict = None, fila: int | None = None) -> None:
+    """Atende até Ctrl+C. listagens: {operacao: funcao} com caminho rápido (veja main.LISTAGENS)."""
+    with ServidorClinica((host, porta), clinica, operacoes, workers, verboso=verboso,
+                         listagens=listagens, fila=fila) as servidor:
+        print(f"Clínica em http://{host}:{servidor.server_address[1]} ({workers} workers). Ctrl+C para sair.")
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
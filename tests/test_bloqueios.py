@@ -0,0 +1,154 @@
+"""Bloqueios de agenda (férias, feriados): do médico ou da clínica inteira."""
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+
+from models.bloqueio import Bloqueio
+from models.clinica import Clinica
+from models.medico import Medico
+from models.paciente import Paciente
+from persistencia import AgendaRepository
+from persistencia_shards import ShardedAgendaRepository
+
+SEGUNDA = date(2030, 1, 7)
+REGRAS = {dia: ["08:00-18:00"] for dia in ("segunda", "terca", "quarta")}
+
+
+def _as(hora: int, minuto: int = 0, dia: int = 7, segundo: int = 0) -> datetime:
+    return datetime(2030, 1, dia, hora, minuto, segundo)
+
+
+class RecorteEmDias(unittest.TestCase):
+    def test_fim_antes_do_inicio(self):
+        with self.assertRaises(ValueError):
+            Bloqueio(_as(10), _as(10))
+
+    def test_por_dia(self):
+        ferias = Bloqueio(_as(14), _as(9, dia=9))
+        self.assertEqual(ferias.por_dia(date(2030, 1, 1), date(2030, 1, 31)),
+                         [(SEGUNDA, 840, 1440), (date(2030, 1, 8), 0, 1440), (date(2030, 1, 9), 0, 540)])
+        self.assertEqual(ferias.por_dia(date(2030, 1, 8), date(2030, 1, 8)), [(date(2030, 1, 8), 0, 1440)])
+        # Até a meia-noite: o dia seguinte não entra; segundos arredondam para fora.
+        self.assertEqual(Bloqueio(_as(23), _as(0, dia=8)).por_dia(SEGUNDA, date(2030, 1, 8)), [(SEGUNDA, 1380, 1440)])
+        self.assertEqual(Bloqueio(_as(9, 59, segundo=30), _as(10, 0, segundo=30)).por_dia(SEGUNDA, SEGUNDA),
+                         [(SEGUNDA, 599, 601)])
+
+
+class _ComClinica(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = pasta.name
+        self.repo = self.criar_repo()
+        self.addCleanup(self.repo.fechar)
+        self.clinica = Clinica(self.repo)
+        self.id_paciente = self.clinica.cadastrar_paciente(Paciente("Ana", "11111111111", "0", "SUS"))
+        self.medicos = [self.clinica.cadastrar_medico(Medico(f"M{i}", f"9000000000{i}", "0", f"CRM{i}", "Geral",
+                                                             REGRAS)) for i in (1, 2)]
+
+    def criar_repo(self):
+        return AgendaRepository(os.path.join(self.pasta, "clinica.db"))
+
+
+class SobreposicaoDeBloqueios(_ComClinica):
+    def setUp(self):
+        super().setUp()
+        m1, m2 = self.medicos
+        self.bloqueios = [
+            self.clinica.bloquear_agenda(_as(10), _as(11), m1, "reunião"),
+            self.clinica.bloquear_agenda(_as(14, 7, segundo=30), _as(14, 52), m2),  # Fora da grade
+            self.clinica.bloquear_agenda(_as(17), _as(9, dia=8), None, "feriado"),  # Clínica, vira o dia
+        ]
+
+    def sobrepoe_por_forca_bruta(self, id_medico: int, inicio: datetime, fim: datetime) -> bool:
+        return any(b.inicio < fim and inicio < b.fim for b in self.bloqueios
+                   if b.id_medico in (None, id_medico))
+
+    def test_existe_bloqueio(self):
+        candidatos = [(_as(8) + timedelta(minutes=m), d) for m in range(0, 26 * 60, 7) for d in (1, 15, 60)]
+        candidatos += [(_as(11), 5), (_as(9, 55), 5), (_as(14, 7), 1), (_as(14, 52), 1), (_as(16, 30), 30)]
+        for id_medico in self.medicos:
+            for inicio, duracao in candidatos:
+                fim = inicio + timedelta(minutes=duracao)
+                with self.subTest(id_medico=id_medico, inicio=inicio, duracao=duracao):
+                    self.assertEqual(self.repo.existe_bloqueio(id_medico, inicio, fim),
+                                     self.sobrepoe_por_forca_bruta(id_medico, inicio, fim))
+
+    def test_marcar_consulta(self):
+        m1, m2 = self.medicos
+        with self.assertRaises(ValueError):
+            self.clinica.marcar_consulta(self.id_paciente, m1, _as(10, 30), 30)
+        self.clinica.marcar_consulta(self.id_paciente, m2, _as(10, 30), 30)  # Bloqueio é só do M1
+        self.clinica.marcar_consulta(self.id_paciente, m1, _as(11), 30)  # Encosta no fim
+        for id_medico in self.medicos:
+            with self.assertRaises(ValueError):
+                self.clinica.marcar_consulta(self.id_paciente, id_medico, _as(8, dia=8), 30)  # Feriado
+
+    def test_horarios_livres(self):
+        livres = self.clinica.buscar_horarios_livres(self.medicos[1], SEGUNDA, date(2030, 1, 8), 30)
+        self.assertFalse([h for h in livres if self.sobrepoe_por_forca_bruta(self.medicos[1], h,
+                                                                              h + timedelta(minutes=30))])
+        self.assertIn(_as(13, 30), livres)
+        self.assertIn(_as(14, 55), livres)
+        self.assertIn(_as(9, dia=8), livres)
+
+    def test_gravacao_em_lote(self):
+        ids = self.repo.salvar_agendamentos_em_lote([
+            (None, self.id_paciente, self.medicos[0], _as(10, 30), 30, "Agendado"),
+            (None, self.id_paciente, self.medicos[0], _as(12), 30, "Agendado"),
+            (None, self.id_paciente, self.medicos[1], _as(17, 30), 30, "Agendado")])
+        self.assertIsNone(ids[0])
+        self.assertIsNotNone(ids[1])
+        self.assertIsNone(ids[2])
+
+    def test_desbloquear(self):
+        m1 = self.medicos[0]
+        self.assertEqual(self.clinica.desbloquear_agenda(self.bloqueios[0].id).motivo, "reunião")
+        self.clinica.marcar_consulta(self.id_paciente, m1, _as(10, 30), 30)
+        with self.assertRaises(ValueError):
+            self.clinica.desbloquear_agenda(self.bloqueios[0].id)
+
+    def test_consulta_ja_marcada_continua(self):
+        consulta = self.clinica.marcar_consulta(self.id_paciente, self.medicos[0], _as(12), 30)
+        self.clinica.bloquear_agenda(_as(12), _as(13), self.medicos[0])
+        self.assertEqual([ag.id for ag in self.clinica.consultar_agenda_medico(self.medicos[0], SEGUNDA)],
+                         [consulta.id])
+
+    def test_listar(self):
+        m1, m2 = self.medicos
+        ids = [b.id for b in self.bloqueios]
+        self.assertEqual([b.id for b in self.clinica.listar_bloqueios(m1)], [ids[0], ids[2]])
+        self.assertEqual([b.id for b in self.clinica.listar_bloqueios(m2)], [ids[1], ids[2]])
+        self.assertEqual([b.id for b in self.clinica.listar_bloqueios()], ids)
+        self.assertEqual([b.id for b in self.clinica.listar_bloqueios(None, date(2030, 1, 8), date(2030, 1, 8))],
+                         [ids[2]])
+        self.assertEqual(self.clinica.listar_bloqueios(m1, date(2030, 1, 9), date(2030, 1, 9)), [])
+        with self.assertRaises(ValueError):
+            self.clinica.bloquear_agenda(_as(8), _as(9), 999)
+
+
+class BloqueiosEmShards(_ComClinica):
+    def criar_repo(self):
+        return ShardedAgendaRepository([os.path.join(self.pasta, f"shard{i}.db") for i in range(3)],
+                                       os.path.join(self.pasta, "indice.db"),
+                                       rotear_medico=lambda m: int(m.crm[-1]))
+
+    def test_bloqueio_da_clinica_vale_em_todos_os_shards(self):
+        feriado = self.clinica.bloquear_agenda(_as(8), _as(18), None, "feriado")
+        proprio = self.clinica.bloquear_agenda(_as(8), _as(9, dia=8), self.medicos[1])
+        for id_medico in self.medicos:
+            with self.assertRaises(ValueError):
+                self.clinica.marcar_consulta(self.id_paciente, id_medico, _as(9), 30)
+        self.assertEqual([b.id for b in self.clinica.listar_bloqueios()], [feriado.id, proprio.id])
+        self.assertEqual([b.id_medico for b in self.clinica.listar_bloqueios(self.medicos[1])],
+                         [None, self.medicos[1]])
+
+        self.clinica.desbloquear_agenda(feriado.id)
+        self.clinica.marcar_consulta(self.id_paciente, self.medicos[0], _as(9), 30)
+        self.assertEqual([b.id for b in self.clinica.listar_bloqueios()], [proprio.id])
+        self.assertFalse(self.repo.existe_bloqueio(self.medicos[1], _as(10, dia=8), _as(11, dia=8)))
+
+
+if __name__ == "__main__":
+    unittest.main()
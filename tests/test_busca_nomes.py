@@ -0,0 +1,144 @@
+"""Busca por nome sem diferenciar acentos, paginada por ID."""
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from main import op_buscar
+from models.clinica import Clinica
+from models.medico import Medico
+from models.paciente import Paciente
+from persistencia import AgendaRepository
+from persistencia_shards import ShardedAgendaRepository
+
+REGRAS = {"segunda": ["08:00-12:00"]}
+NOMES = ["João da Silva", "Joana Souza", "Maria Conceição", "JOSÉ SILVÉRIO", "Ana Jô", "Pedro Silva"]
+
+
+def _ids(pessoas) -> list:
+    return [p.id for p in pessoas]
+
+
+class _ComClinica(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = pasta.name
+        self.clinica = Clinica(self.criar_repo())
+        self.addCleanup(self.clinica.repo.fechar)
+        self.pacientes = {nome: self.clinica.cadastrar_paciente(Paciente(nome, f"1000000000{i}", "0", "SUS"))
+                          for i, nome in enumerate(NOMES)}
+
+    def criar_repo(self):
+        return AgendaRepository(os.path.join(self.pasta, "clinica.db"))
+
+    def buscar(self, texto: str) -> list:
+        return [p.nome for p in self.clinica.buscar_pacientes(texto)]
+
+    def todas_as_paginas(self, texto: str, limite: int) -> list:
+        encontrados, apos_id = [], 0
+        while True:
+            pagina = self.clinica.buscar_pacientes(texto, limite, apos_id)
+            self.assertLessEqual(len(pagina), limite)
+            if not pagina:
+                return encontrados
+            encontrados += pagina
+            apos_id = pagina[-1].id
+
+
+class BuscaPacientes(_ComClinica):
+    def test_sem_diferenciar_acentos_nem_maiusculas(self):
+        self.assertEqual(self.buscar("joao"), ["João da Silva"])
+        self.assertEqual(self.buscar("CONCEICAO"), ["Maria Conceição"])
+        self.assertEqual(self.buscar("silverio"), ["JOSÉ SILVÉRIO"])
+        self.assertEqual(self.buscar("jô"), ["João da Silva", "Joana Souza", "JOSÉ SILVÉRIO", "Ana Jô"])
+
+    def test_cada_palavra_e_um_prefixo(self):
+        self.assertEqual(self.buscar("sil"), ["João da Silva", "JOSÉ SILVÉRIO", "Pedro Silva"])
+        self.assertEqual(self.buscar("jo sil"), ["João da Silva", "JOSÉ SILVÉRIO"])
+        self.assertEqual(self.buscar("ilva"), [])  # Só o começo das palavras
+
+    def test_caracteres_especiais_nao_quebram_a_consulta(self):
+        self.assertEqual(self.buscar('jo" OR *'), [])
+        self.assertEqual(self.buscar("  (jo)-  "), ["João da Silva", "Joana Souza", "JOSÉ SILVÉRIO", "Ana Jô"])
+        self.assertEqual(self.buscar(""), [])
+        self.assertEqual(self.buscar("?!"), [])
+
+    def test_paginacao(self):
+        esperado = self.clinica.buscar_pacientes("jo")
+        self.assertEqual(_ids(esperado), sorted(_ids(esperado)))
+        for limite in (1, 2, 3, 10):
+            with self.subTest(limite=limite):
+                self.assertEqual(_ids(self.todas_as_paginas("jo", limite)), _ids(esperado))
+
+    def test_indice_acompanha_alteracoes(self):
+        conn = self.clinica.repo._get_conexao()
+        with conn:
+            conn.execute("UPDATE pacientes SET nome = 'Joaquim Prado' WHERE id = ?;", (self.pacientes["Pedro Silva"],))
+        self.assertEqual(self.buscar("pedro"), [])
+        self.assertEqual(self.buscar("joaq"), ["Joaquim Prado"])
+        self.clinica.repo.deletar_paciente(self.pacientes["João da Silva"])
+        self.assertEqual(self.buscar("joao"), [])  # Excluído logicamente
+        no_indice = "SELECT rowid FROM pacientes_busca WHERE pacientes_busca MATCH 'joao';"
+        self.assertEqual(conn.execute(no_indice).fetchall(), [(self.pacientes["João da Silva"],)])
+        self.clinica.repo.purgar_excluidos(datetime(2100, 1, 1))
+        self.assertEqual(conn.execute(no_indice).fetchall(), [])
+
+    def test_operacao_buscar(self):
+        resposta = op_buscar(self.clinica, {"texto": "jo", "limite": 3})
+        self.assertEqual([p["nome"] for p in resposta["pacientes"]], ["João da Silva", "Joana Souza", "JOSÉ SILVÉRIO"])
+        resposta = op_buscar(self.clinica, {"texto": "jo", "limite": 3, "apos_id": resposta["proximo_apos_id"]})
+        self.assertEqual([p["nome"] for p in resposta["pacientes"]], ["Ana Jô"])
+        resposta = op_buscar(self.clinica, {"texto": "jo", "limite": 3, "apos_id": resposta["proximo_apos_id"]})
+        self.assertEqual(resposta, {"pacientes": [], "proximo_apos_id": None})
+
+
+class BuscaMedicos(_ComClinica):
+    def setUp(self):
+        super().setUp()
+        for i, (nome, especialidade) in enumerate([("Luís Gonçalves", "Cardiologia"),
+                                                   ("Luisa Prado", "Clínica Médica"),
+                                                   ("Lucas Prado", "Cardiologia")]):
+            self.clinica.cadastrar_medico(Medico(nome, f"9000000000{i}", "0", f"CRM{i}", especialidade, REGRAS))
+
+    def nomes(self, texto=None, especialidade=None) -> list:
+        return [m.nome for m in self.clinica.buscar_medicos(texto, especialidade)]
+
+    def test_por_nome_e_especialidade(self):
+        self.assertEqual(self.nomes("luis"), ["Luís Gonçalves", "Luisa Prado"])
+        self.assertEqual(self.nomes(especialidade="clinica medica"), ["Luisa Prado"])
+        self.assertEqual(self.nomes("pra", "cardiologia"), ["Lucas Prado"])
+        self.assertEqual(self.nomes(especialidade="medica clinica"), [])  # Especialidade é frase
+        self.assertEqual(self.nomes(), [])
+
+    def test_paginacao(self):
+        primeira = self.clinica.buscar_medicos(especialidade="cardiologia", limite=1)
+        segunda = self.clinica.buscar_medicos(especialidade="cardiologia", limite=1, apos_id=primeira[0].id)
+        self.assertEqual([m.nome for m in primeira + segunda], ["Luís Gonçalves", "Lucas Prado"])
+        self.assertEqual(self.clinica.buscar_medicos(especialidade="cardiologia", apos_id=segunda[0].id), [])
+
+
+class BuscaEmShards(_ComClinica):
+    def criar_repo(self):
+        return ShardedAgendaRepository([os.path.join(self.pasta, f"shard{i}.db") for i in range(3)],
+                                       os.path.join(self.pasta, "indice.db"),
+                                       rotear_medico=lambda m: int(m.crm[-1]))
+
+    def test_paginas_sem_copias_repetidas(self):
+        # Consultas com médicos de outros shards criam cópias dos pacientes lá.
+        for i in range(3):
+            id_medico = self.clinica.cadastrar_medico(
+                Medico(f"M{i}", f"9000000000{i}", "0", f"CRM{i}", "Geral", REGRAS))
+            for hora, id_paciente in enumerate(self.pacientes.values(), start=8):
+                if hora < 12:
+                    self.clinica.marcar_consulta(id_paciente, id_medico, datetime(2030, 1, 7, hora, 0), 30)
+        esperado = sorted(id_paciente for nome, id_paciente in self.pacientes.items()
+                          if nome in ("João da Silva", "Joana Souza", "JOSÉ SILVÉRIO", "Ana Jô"))
+        self.assertEqual(_ids(self.clinica.buscar_pacientes("jo")), esperado)
+        for limite in (1, 2, 3):
+            with self.subTest(limite=limite):
+                self.assertEqual(_ids(self.todas_as_paginas("jo", limite)), esperado)
+
+
+if __name__ == "__main__":
+    unittest.main()
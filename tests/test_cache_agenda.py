@@ -0,0 +1,76 @@
+"""Cache de agendas de pacientes: caminho rápido do modo serviço e versões limitadas."""
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from main import listagem_consultas
+from models.cache_agenda import CacheAgendaPaciente
+from models.clinica import Clinica
+from models.medico import Medico
+from models.paciente import Paciente
+from persistencia import AgendaRepository
+
+REGRAS = {"segunda": ["08:00-12:00"]}
+
+
+class ListagemPeloCache(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        repo = AgendaRepository(os.path.join(pasta.name, "clinica.db"))
+        self.addCleanup(repo.fechar)
+        self.clinica = Clinica(repo)
+        self.id_paciente = self.clinica.cadastrar_paciente(Paciente("Ana", "11111111111", "0", "SUS"))
+        self.id_medico = self.clinica.cadastrar_medico(
+            Medico("Bia", "22222222222", "0", "CRM1", "Geral", REGRAS))
+        self.clinica.marcar_consulta(self.id_paciente, self.id_medico, datetime(2030, 1, 7, 8, 0), 30)
+
+    def listar(self) -> list:
+        campos, chave, lotes = listagem_consultas(self.clinica, {"alvo": "consultas", "cpf_paciente": "11111111111"})
+        return [linha for lote in lotes for linha in lote]
+
+    def test_repeticao_sai_do_cache(self):
+        primeira = self.listar()
+        self.assertEqual(self.listar(), primeira)
+        estatisticas = self.clinica.agendas.estatisticas()
+        self.assertEqual((estatisticas["acertos"], estatisticas["faltas"]), (1, 1))
+
+    def test_escrita_invalida_a_listagem(self):
+        self.listar()
+        self.clinica.marcar_consulta(self.id_paciente, self.id_medico, datetime(2030, 1, 7, 9, 0), 30)
+        self.assertEqual(len(self.listar()), 2)
+        self.assertEqual(self.clinica.agendas.estatisticas()["acertos"], 0)
+
+    def test_outros_alvos_nao_tem_caminho_rapido(self):
+        self.assertIsNone(listagem_consultas(self.clinica, {"alvo": "pacientes"}))
+
+
+class VersoesLimitadas(unittest.TestCase):
+    def test_versoes_nao_crescem_sem_limite(self):
+        cache = CacheAgendaPaciente(max_versoes=3)
+        for id_paciente in range(100):
+            cache.invalidar(id_paciente)
+        self.assertLessEqual(len(cache._versoes), 3)
+
+    def test_leitura_em_andamento_continua_descartada(self):
+        cache = CacheAgendaPaciente(max_versoes=3)
+        versao = cache.versao(1)
+        cache.invalidar(1)  # Escrita no meio da leitura do paciente 1...
+        for id_paciente in range(2, 10):
+            cache.invalidar(id_paciente)  # ...e versões demais: o cache recomeça
+        cache.guardar((1, False, None, None), versao, ["antiga"])
+        self.assertIsNone(cache.obter((1, False, None, None)))
+
+    def test_agendas_guardadas_saem_ao_recomecar(self):
+        cache = CacheAgendaPaciente(max_versoes=3)
+        chave = (1, False, None, None)
+        cache.guardar(chave, cache.versao(1), ["consulta"])
+        for id_paciente in range(2, 10):
+            cache.invalidar(id_paciente)
+        self.assertIsNone(cache.obter(chave))
+        self.assertEqual(cache.estatisticas()["descartes"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
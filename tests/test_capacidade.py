@@ -0,0 +1,161 @@
+"""Capacidade (consultas simultâneas) por médico e por especialidade, conferida por varredura."""
+import os
+import random
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+
+from main import op_capacidade
+from models.agendamento import Agendamento
+from models.capacidade import cabe, pico_simultaneo
+from models.clinica import Clinica
+from models.medico import Medico
+from models.paciente import Paciente
+from persistencia import AgendaRepository
+
+SEGUNDA = date(2030, 1, 7)
+REGRAS = {"segunda": ["08:00-12:00"]}
+
+
+def _as(hora: int, minuto: int = 0) -> datetime:
+    return datetime(2030, 1, 7, hora, minuto)
+
+
+def _pico_por_forca_bruta(intervalos, inicio: datetime, fim: datetime) -> int:
+    """Maior contagem em cada minuto de [inicio, fim) (os testes só usam minutos inteiros)."""
+    pico, minuto = 0, inicio
+    while minuto < fim:
+        pico = max(pico, sum(1 for comeco, duracao in intervalos
+                             if comeco <= minuto < comeco + timedelta(minutes=duracao)))
+        minuto += timedelta(minutes=1)
+    return pico
+
+
+class Varredura(unittest.TestCase):
+    def test_encostadas_nao_se_somam(self):
+        intervalos = [(_as(8), 30), (_as(8, 30), 30), (_as(8, 15), 30)]
+        self.assertEqual(pico_simultaneo(intervalos, _as(8), _as(9)), 2)
+        self.assertEqual(pico_simultaneo(intervalos, _as(8, 45), _as(9)), 1)
+        self.assertEqual(pico_simultaneo(intervalos, _as(9), _as(10)), 0)
+        self.assertTrue(cabe(intervalos, _as(8), _as(9), 3))
+        self.assertFalse(cabe(intervalos, _as(8), _as(9), 2))
+
+    def test_igual_a_forca_bruta(self):
+        sorteio = random.Random(48)
+        for rodada in range(200):
+            intervalos = [(_as(8) + timedelta(minutes=sorteio.randrange(0, 240)), sorteio.randrange(1, 60))
+                          for _ in range(sorteio.randrange(0, 12))]
+            inicio = _as(8) + timedelta(minutes=sorteio.randrange(0, 240))
+            fim = inicio + timedelta(minutes=sorteio.randrange(1, 90))
+            with self.subTest(rodada=rodada):
+                self.assertEqual(pico_simultaneo(intervalos, inicio, fim),
+                                 _pico_por_forca_bruta(intervalos, inicio, fim))
+
+
+class _ComClinica(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.caminho = os.path.join(pasta.name, "clinica.db")
+        self.repo = AgendaRepository(self.caminho)
+        self.addCleanup(self.repo.fechar)
+        self.clinica = Clinica(self.repo)
+        self.id_paciente = self.clinica.cadastrar_paciente(Paciente("Ana", "11111111111", "0", "SUS"))
+        self.grupo = self.clinica.cadastrar_medico(Medico("Gil", "22222222222", "0", "CRM1", "Psicologia", REGRAS))
+        self.outro = self.clinica.cadastrar_medico(Medico("Hugo", "33333333333", "0", "CRM2", "Psicologia", REGRAS))
+
+    def marcar(self, id_medico: int, inicio: datetime, duracao: int = 30) -> bool:
+        try:
+            self.clinica.marcar_consulta(self.id_paciente, id_medico, inicio, duracao)
+        except ValueError:
+            return False
+        return True
+
+
+class RegrasDeCapacidade(_ComClinica):
+    def test_medico_especialidade_e_padrao(self):
+        self.assertEqual(self.clinica.capacidade_medico(self.grupo), 1)
+        self.clinica.definir_capacidade_especialidade("Psicologia", 3)
+        self.assertEqual((self.clinica.capacidade_medico(self.grupo), self.clinica.capacidade_medico(self.outro)),
+                         (3, 3))
+        self.assertEqual(self.clinica.definir_capacidade_medico(self.grupo, 2), 2)  # A do médico vale mais
+        self.assertEqual(self.clinica.capacidade_medico(self.outro), 3)
+        self.assertEqual(self.clinica.definir_capacidade_medico(self.grupo, None), 3)
+        self.clinica.definir_capacidade_especialidade("Psicologia", None)
+        self.assertEqual(self.clinica.capacidade_medico(self.outro), 1)
+        with self.assertRaises(ValueError):
+            self.clinica.definir_capacidade_medico(self.grupo, 0)
+        with self.assertRaises(ValueError):
+            self.clinica.definir_capacidade_especialidade(" ", 2)
+
+    def test_operacao_capacidade(self):
+        self.assertEqual(op_capacidade(self.clinica, {"especialidade": "Psicologia", "capacidade": 4}),
+                         {"especialidade": "Psicologia", "capacidade": 4})
+        self.assertEqual(op_capacidade(self.clinica, {"crm_medico": "CRM1", "capacidade": 2}),
+                         {"id_medico": self.grupo, "capacidade": 2})
+        self.assertEqual(op_capacidade(self.clinica, {"crm_medico": "CRM2"}), {"id_medico": self.outro, "capacidade": 4})
+        self.assertEqual(op_capacidade(self.clinica, {}),
+                         {"especialidades": [{"especialidade": "Psicologia", "capacidade": 4}]})
+
+
+class MarcacoesComCapacidade(_ComClinica):
+    CAPACIDADE = 3
+
+    def setUp(self):
+        super().setUp()
+        self.clinica.definir_capacidade_medico(self.grupo, self.CAPACIDADE)
+
+    def test_sorteio_igual_a_forca_bruta(self):
+        # Inícios na grade de 5 minutos e fora dela (caminho por SQL).
+        sorteio, aceitas = random.Random(7), []
+        for tentativa in range(150):
+            inicio = _as(8) + timedelta(minutes=sorteio.choice([5, 1, 7]) * sorteio.randrange(0, 30))
+            duracao = sorteio.choice([10, 15, 30, 45, 60])
+            fim = inicio + timedelta(minutes=duracao)
+            if fim > _as(12):
+                continue
+            esperado = _pico_por_forca_bruta(aceitas, inicio, fim) < self.CAPACIDADE
+            with self.subTest(tentativa=tentativa, inicio=inicio, duracao=duracao):
+                self.assertEqual(self.marcar(self.grupo, inicio, duracao), esperado)
+            if esperado:
+                aceitas.append((inicio, duracao))
+        self.assertGreater(len(aceitas), self.CAPACIDADE * 4)
+        livres = self.clinica.buscar_horarios_livres(self.grupo, SEGUNDA, SEGUNDA, 30)
+        self.assertEqual(livres, [_as(8) + timedelta(minutes=m) for m in range(0, 211, 5)
+                                  if _pico_por_forca_bruta(aceitas, _as(8) + timedelta(minutes=m),
+                                                           _as(8, 30) + timedelta(minutes=m)) < self.CAPACIDADE])
+
+    def test_lotado_e_cancelamento(self):
+        for _ in range(self.CAPACIDADE):
+            self.assertTrue(self.marcar(self.grupo, _as(9)))
+        with self.assertRaisesRegex(ValueError, "3 consultas simultâneas"):
+            self.clinica.marcar_consulta(self.id_paciente, self.grupo, _as(9, 10), 10)
+        self.assertTrue(self.marcar(self.grupo, _as(9, 30)))  # Encosta no fim das três
+        self.assertTrue(self.marcar(self.outro, _as(9)))
+        self.assertFalse(self.marcar(self.outro, _as(9)))  # Capacidade padrão: 1
+        self.assertNotIn(self.grupo, [m.id for m in self.clinica.medicos_disponiveis(_as(9), 30)])
+        primeira = self.clinica.consultar_agenda_medico(self.grupo, SEGUNDA)[0]
+        self.clinica.cancelar_consulta(primeira.id)
+        self.assertIn(self.grupo, [m.id for m in self.clinica.medicos_disponiveis(_as(9), 30)])
+        self.assertTrue(self.marcar(self.grupo, _as(9, 10), 10))
+
+    def test_gravacao_confere_dentro_da_transacao(self):
+        # Outra recepção enche o horário; a gravação direta no repositório (sem
+        # a conferência prévia da Clinica) tem de recusar a consulta a mais.
+        outra = Clinica(AgendaRepository(self.caminho))
+        self.addCleanup(outra.repo.fechar)
+        for _ in range(self.CAPACIDADE):
+            outra.marcar_consulta(self.id_paciente, self.grupo, _as(8), 30)
+        ag = Agendamento(self.repo.buscar_paciente(self.id_paciente), self.repo.buscar_medico(self.grupo), _as(8), 30)
+        ag.status = Agendamento.AGENDADO
+        with self.assertRaises(ValueError):
+            self.repo.salvar_agendamento(ag, conferir_conflito=True)
+        ids = self.repo.salvar_agendamentos_em_lote([
+            (None, self.id_paciente, self.grupo, _as(8, 15), 30, "Agendado"),
+            (None, self.id_paciente, self.grupo, _as(8, 30), 30, "Agendado")])
+        self.assertIsNone(ids[0])
+        self.assertIsNotNone(ids[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""CLI: leitura da entrada do --batch e opções sem subcomando."""
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import main
+from models.clinica import Clinica
+from persistencia import AgendaRepository
+
+
+class ModoBatch(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = pasta.name
+        repo = AgendaRepository(os.path.join(pasta.name, "clinica.db"))
+        self.addCleanup(repo.fechar)
+        self.clinica = Clinica(repo)
+
+    def executar(self, entrada: str):
+        caminho = os.path.join(self.pasta, "entrada.jsonl")
+        with open(caminho, "w", encoding="utf-8") as arquivo:
+            arquivo.write(entrada)
+        saida, relatorio = io.StringIO(), io.StringIO()
+        erros = main.executar_operacoes(self.clinica, main._operacoes_do_batch(caminho), saida, relatorio)
+        return erros, [json.loads(linha) for linha in saida.getvalue().splitlines()], relatorio.getvalue()
+
+    def test_linha_invalida_nao_interrompe_o_lote(self):
+        erros, resultados, relatorio = self.executar(
+            '{"op": "listar", "alvo": "medicos"}\n{bad\n{"op": "listar", "alvo": "pacientes"}\n')
+        self.assertEqual(erros, 1)
+        self.assertEqual([r["ok"] for r in resultados], [True, False, True])
+        self.assertIn("linha 2", resultados[1]["erro"])
+        self.assertIn("3 operações", relatorio)
+
+    def test_primeira_linha_invalida(self):
+        erros, resultados, _ = self.executar('{bad\n{"op": "listar", "alvo": "pacientes"}\n\n7\n')
+        self.assertEqual(erros, 2)
+        self.assertEqual([r["ok"] for r in resultados], [False, True, False])
+        self.assertIn("linha 4", resultados[2]["erro"])
+
+    def test_objeto_em_varias_linhas_e_array(self):
+        self.assertEqual(self.executar('{\n  "op": "listar",\n  "alvo": "medicos"\n}\n')[:2],
+                         (0, [{"op": "listar", "ok": True, "medicos": []}]))
+        erros, resultados, _ = self.executar('[{"op": "listar", "alvo": "medicos"}, 3]')
+        self.assertEqual((erros, [r["ok"] for r in resultados]), (1, [True, False]))
+
+    def test_erro_de_leitura_vira_resultado(self):
+        saida, relatorio = io.StringIO(), io.StringIO()
+        erros = main.executar_operacoes(self.clinica, main._operacoes_do_batch(os.path.join(self.pasta, "nao.jsonl")),
+                                        saida, relatorio)
+        self.assertEqual(erros, 1)
+        self.assertFalse(json.loads(saida.getvalue())["ok"])
+        self.assertIn("1 operações", relatorio.getvalue())
+
+
+class SemSubcomando(unittest.TestCase):
+    def test_db_sem_subcomando_abre_o_menu(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, "menu.db")
+            saida = io.StringIO()
+            with mock.patch("builtins.input", return_value="9"), contextlib.redirect_stdout(saida):
+                self.assertEqual(main.main_cli(["--db", caminho]), 0)
+            self.assertIn("Encerrando o sistema", saida.getvalue())
+            self.assertTrue(os.path.exists(caminho))
+
+
+if __name__ == "__main__":
+    unittest.main()
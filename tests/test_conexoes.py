@@ -0,0 +1,62 @@
+"""Conexões por thread: fechar() fecha as de todas as threads."""
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from persistencia import AgendaRepository
+
+
+class FecharTodasAsConexoes(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.repo = AgendaRepository(os.path.join(pasta.name, "clinica.db"))
+        self.addCleanup(self.repo.fechar)
+
+    def conexoes_em_threads(self, quantidade: int, manter_vivas: threading.Event) -> list:
+        conexoes, prontas = [], threading.Barrier(quantidade + 1)
+
+        def trabalho():
+            conexoes.append(self.repo._get_conexao())
+            prontas.wait()
+            manter_vivas.wait()
+
+        threads = [threading.Thread(target=trabalho) for _ in range(quantidade)]
+        for thread in threads:
+            thread.start()
+        prontas.wait()
+        self.addCleanup(lambda: [thread.join() for thread in threads])
+        self.addCleanup(manter_vivas.set)
+        return conexoes
+
+    def assert_fechada(self, conn):
+        with self.assertRaisesRegex(sqlite3.ProgrammingError, "closed"):
+            conn.execute("SELECT 1;")
+
+    def test_fecha_as_conexoes_das_outras_threads(self):
+        conexoes = self.conexoes_em_threads(3, threading.Event())
+        conexoes.append(self.repo._get_conexao())
+        self.repo.fechar()
+        for conn in conexoes:
+            self.assert_fechada(conn)
+        # Depois de fechar, o repositório abre uma conexão nova.
+        self.assertEqual(self.repo._get_conexao().execute("SELECT 1;").fetchone(), (1,))
+
+    def test_conexao_de_thread_encerrada_e_fechada(self):
+        fim = threading.Event()
+        conn, = self.conexoes_em_threads(1, fim)
+        fim.set()
+        encerrada, = [t for t in self.repo._conexoes if t is not threading.current_thread()]
+        encerrada.join()
+        # A próxima conexão registrada (de outra thread) fecha as de threads encerradas.
+        nova = threading.Thread(target=self.repo._get_conexao)
+        nova.start()
+        nova.join()
+        self.assert_fechada(conn)
+        self.assertNotIn(encerrada, self.repo._conexoes)
+
+
+if __name__ == "__main__":
+    unittest.main()
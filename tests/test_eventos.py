@@ -0,0 +1,141 @@
+"""Diário de eventos dos agendamentos (outbox) e o change feed que o consome."""
+import io
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from main import emitir_eventos
+from models.clinica import Clinica
+from models.medico import Medico
+from models.paciente import Paciente
+from persistencia import AgendaRepository
+
+REGRAS = {"segunda": ["08:00-12:00"]}
+
+
+def _as(hora: int, minuto: int = 0) -> datetime:
+    return datetime(2030, 1, 7, hora, minuto)
+
+
+class Interrompido(Exception):
+    """Falha do sistema de destino no meio da entrega."""
+
+
+class _ComClinica(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.repo = AgendaRepository(os.path.join(pasta.name, "clinica.db"))
+        self.addCleanup(self.repo.fechar)
+        self.clinica = Clinica(self.repo)
+        self.id_paciente = self.clinica.cadastrar_paciente(Paciente("Ana", "11111111111", "0", "SUS"))
+        self.id_medico = self.clinica.cadastrar_medico(Medico("Bia", "22222222222", "0", "CRM1", "Geral", REGRAS))
+
+    def marcar(self, hora: int) -> int:
+        return self.clinica.marcar_consulta(self.id_paciente, self.id_medico, _as(hora), 30).id
+
+    def resumo(self, eventos) -> list:
+        return [(e["tipo"], e["id_agendamento"], e["dados"]["status"]) for e in eventos]
+
+
+class OrdemDosEventos(_ComClinica):
+    def test_eventos_em_ordem_de_gravacao(self):
+        primeira = self.marcar(8)
+        segunda = self.marcar(9)
+        self.clinica.cancelar_consulta(primeira)
+        em_lote = self.repo.salvar_agendamentos_em_lote([
+            (None, self.id_paciente, self.id_medico, _as(10), 30, "Agendado"),
+            (None, self.id_paciente, self.id_medico, _as(11), 30, "Agendado")])
+        self.repo.deletar_agendamento(segunda)
+
+        eventos = self.repo.buscar_eventos()
+        self.assertEqual(self.resumo(eventos), [
+            ("criado", primeira, "Agendado"), ("criado", segunda, "Agendado"),
+            ("atualizado", primeira, "Cancelado"),
+            ("criado", em_lote[0], "Agendado"), ("criado", em_lote[1], "Agendado"),
+            ("removido", segunda, "Agendado")])
+        seqs = [e["seq"] for e in eventos]
+        self.assertEqual(seqs, sorted(set(seqs)))
+        self.assertEqual(eventos[2]["dados"]["status_anterior"], "Agendado")
+        self.assertEqual(eventos[0]["dados"]["data_hora_inicio"], _as(8).isoformat())
+
+    def test_gravacao_desfeita_nao_deixa_evento(self):
+        self.marcar(8)
+
+        def itens():
+            yield None, self.id_paciente, self.id_medico, _as(10), 30, "Agendado"
+            raise Interrompido()
+
+        with self.assertRaises(Interrompido):
+            self.repo.salvar_agendamentos_em_lote(itens())
+        self.assertEqual([e["tipo"] for e in self.repo.buscar_eventos()], ["criado"])
+
+    def test_seq_nao_e_reaproveitado_depois_da_poda(self):
+        self.marcar(8)
+        ultimo = self.repo.buscar_eventos()[-1]["seq"]
+        self.assertEqual(self.repo.podar_eventos(ultimo), 1)
+        self.marcar(9)
+        self.assertGreater(self.repo.buscar_eventos()[0]["seq"], ultimo)
+
+    def test_lotes(self):
+        for hora in range(8, 12):
+            self.marcar(hora)
+        todos = self.repo.buscar_eventos()
+        for tamanho_lote in (1, 3, 4, 10):
+            with self.subTest(tamanho_lote=tamanho_lote):
+                lotes = list(self.repo.iterar_eventos(tamanho_lote=tamanho_lote))
+                self.assertTrue(all(0 < len(lote) <= tamanho_lote for lote in lotes))
+                self.assertEqual([e for lote in lotes for e in lote], todos)
+        self.assertEqual(list(self.repo.iterar_eventos(apos_seq=todos[1]["seq"], tamanho_lote=10)), [todos[2:]])
+        self.assertEqual(self.repo.buscar_eventos(apos_seq=todos[-1]["seq"]), [])
+
+
+class Consumidores(_ComClinica):
+    def test_confirmacao_nao_retrocede(self):
+        self.assertEqual(self.repo.posicao_consumidor("sms"), 0)
+        self.repo.confirmar_eventos("sms", 5)
+        self.repo.confirmar_eventos("sms", 3)
+        self.assertEqual(self.repo.posicao_consumidor("sms"), 5)
+
+    def test_poda_respeita_o_consumidor_mais_atrasado(self):
+        for hora in range(8, 12):
+            self.marcar(hora)
+        seqs = [e["seq"] for e in self.repo.buscar_eventos()]
+        self.repo.confirmar_eventos("sms", seqs[3])
+        self.repo.confirmar_eventos("email", seqs[1])
+        self.assertEqual(self.repo.podar_eventos(seqs[3]), 2)
+        self.assertEqual([e["seq"] for e in self.repo.buscar_eventos()], seqs[2:])
+
+    def test_emitir_continua_de_onde_parou(self):
+        self.marcar(8)
+        self.marcar(9)
+        saida = io.StringIO()
+        self.assertEqual(emitir_eventos(self.clinica, saida, consumidor="sms", tamanho_lote=1), 2)
+        self.marcar(10)
+        self.assertEqual(emitir_eventos(self.clinica, saida, consumidor="sms"), 1)
+        self.assertEqual(emitir_eventos(self.clinica, saida, consumidor="sms"), 0)
+        emitidos = [json.loads(linha) for linha in saida.getvalue().splitlines()]
+        self.assertEqual(emitidos, self.repo.buscar_eventos())
+
+    def test_lote_que_falhou_e_reentregue(self):
+        for hora in range(8, 11):
+            self.marcar(hora)
+
+        class SaidaInstavel(io.StringIO):
+            def flush(self):
+                if self.getvalue().count("\n") > 2:
+                    raise Interrompido()
+
+        with self.assertRaises(Interrompido):
+            emitir_eventos(self.clinica, SaidaInstavel(), consumidor="sms", tamanho_lote=2)
+        eventos = self.repo.buscar_eventos()
+        self.assertEqual(self.repo.posicao_consumidor("sms"), eventos[1]["seq"])  # Só o 1º lote confirmado
+        saida = io.StringIO()
+        self.assertEqual(emitir_eventos(self.clinica, saida, consumidor="sms"), 1)
+        self.assertEqual(json.loads(saida.getvalue()), eventos[2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""Exclusão lógica: recadastro de CPF/CRM de cadastros excluídos (migração 14)."""
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from models.clinica import Clinica
+from models.medico import Medico
+from models.paciente import Paciente
+from persistencia import AgendaRepository, MIGRACOES
+
+REGRAS = {"segunda": ["08:00-12:00"]}
+
+
+class RecadastroAposExclusao(unittest.TestCase):
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.caminho = os.path.join(self.pasta.name, "clinica.db")
+
+    def tearDown(self):
+        self.pasta.cleanup()
+
+    def abrir(self) -> Clinica:
+        repo = AgendaRepository(self.caminho)
+        self.addCleanup(repo.fechar)
+        return Clinica(repo)
+
+    def test_cpf_de_paciente_excluido_pode_ser_recadastrado(self):
+        clinica = self.abrir()
+        antigo = clinica.cadastrar_paciente(Paciente("Ana", "11111111111", "0", "SUS"))
+        clinica.excluir_paciente(antigo)
+        novo = clinica.cadastrar_paciente(Paciente("Ana", "11111111111", "0", "Amil"))
+        self.assertNotEqual(novo, antigo)
+        self.assertEqual(clinica.repo.buscar_paciente_por_cpf("11111111111").id, novo)
+
+    def test_cpf_de_paciente_ativo_continua_unico(self):
+        clinica = self.abrir()
+        clinica.cadastrar_paciente(Paciente("Ana", "11111111111", "0", "SUS"))
+        with self.assertRaises(ValueError):
+            clinica.cadastrar_paciente(Paciente("Outra", "11111111111", "0", "SUS"))
+        with self.assertRaises(sqlite3.IntegrityError):
+            clinica.repo.salvar_paciente(Paciente("Outra", "11111111111", "0", "SUS"))
+
+    def test_crm_de_medico_excluido_pode_ser_recadastrado(self):
+        clinica = self.abrir()
+        antigo = clinica.cadastrar_medico(Medico("Bia", "22222222222", "0", "CRM1", "Geral", REGRAS))
+        clinica.excluir_medico(antigo)
+        novo = clinica.cadastrar_medico(Medico("Bia", "22222222222", "0", "CRM1", "Geral", REGRAS))
+        self.assertEqual(clinica.repo.buscar_medico_por_crm("CRM1").id, novo)
+
+    def test_crm_de_medico_ativo_continua_unico(self):
+        clinica = self.abrir()
+        clinica.cadastrar_medico(Medico("Bia", "22222222222", "0", "CRM1", "Geral", REGRAS))
+        with self.assertRaises(sqlite3.IntegrityError):
+            clinica.repo.salvar_medico(Medico("Caio", "33333333333", "0", "CRM1", "Geral", REGRAS))
+
+    def test_migracao_de_banco_antigo(self):
+        # Banco na versão 13 (CPF com UNIQUE na coluna) com um paciente excluído.
+        conn = sqlite3.connect(self.caminho)
+        for numero, migracao in enumerate(MIGRACOES[:13], start=1):
+            for ddl in migracao:
+                ddl(conn) if callable(ddl) else conn.execute(ddl)
+            conn.execute(f"PRAGMA user_version = {numero};")
+        conn.execute("INSERT INTO pacientes (nome, cpf, telefone, plano_saude, deleted_at) "
+                     "VALUES ('Ana', '11111111111', '0', 'SUS', '2024-01-01T00:00:00');")
+        conn.commit()
+        conn.close()
+
+        clinica = self.abrir()
+        novo = clinica.cadastrar_paciente(Paciente("Ana", "11111111111", "0", "SUS"))
+        self.assertEqual(novo, 2)  # O AUTOINCREMENT foi preservado
+        self.assertEqual([p.id for p in clinica.buscar_pacientes("ana")], [novo])
+        conn = clinica.repo._get_conexao()
+        self.assertEqual(conn.execute("PRAGMA foreign_key_check;").fetchall(), [])
+        self.assertIsNotNone(conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'disponibilidade';").fetchone())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""Exportação: CSV e JSONL em lotes; colunar com ida e volta pelo arquivo e fechamento com colunas em uso."""
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import exportacao
+from exportacao import carregar_colunar, exportar_colunar, exportar_csv, exportar_jsonl
+from models.clinica import Clinica
+from models.medico import Medico
+from models.paciente import Paciente
+from persistencia import COLUNAS_AGENDAMENTO_COMPLETO, AgendaRepository
+
+REGRAS = {"segunda": ["08:00-12:00"]}
+SEGUNDA = datetime(2030, 1, 7, 8, 0)
+
+
+class _ComAgendas(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.arquivo = os.path.join(pasta.name, "agendas.agcol")
+        self.repo = AgendaRepository(os.path.join(pasta.name, "clinica.db"))
+        self.addCleanup(self.repo.fechar)
+
+    def popular(self):
+        clinica = Clinica(self.repo)
+        id_medico = clinica.cadastrar_medico(Medico("Bia", "22222222222", "0", "CRM1", "Clínica Geral", REGRAS))
+        for i, nome in enumerate(("Ana", "João", "Zé Ção")):
+            id_paciente = clinica.cadastrar_paciente(Paciente(nome, f"{i:011d}", "0", "SUS"))
+            clinica.marcar_consulta(id_paciente, id_medico, SEGUNDA + timedelta(minutes=30 * i), 30)
+        clinica.cancelar_consulta(2)
+
+
+class ExportacaoTexto(_ComAgendas):
+    def test_csv_em_lotes(self):
+        self.popular()
+        esperado = [[str(v) for v in linha] for linha in self.repo.iterar_agendamentos_completos()]
+        saida = io.StringIO()
+        with mock.patch.object(exportacao, "TAMANHO_LOTE", 2):  # Um lote cheio e um parcial
+            self.assertEqual(exportar_csv(self.repo, saida), 3)
+        linhas = list(csv.reader(io.StringIO(saida.getvalue())))
+        self.assertEqual(linhas[0], list(COLUNAS_AGENDAMENTO_COMPLETO))
+        self.assertEqual(linhas[1:], esperado)
+
+    def test_jsonl(self):
+        self.popular()
+        saida = io.StringIO()
+        self.assertEqual(exportar_jsonl(self.repo, saida), 3)
+        registros = [json.loads(linha) for linha in saida.getvalue().splitlines()]
+        self.assertEqual([r["nome_paciente"] for r in registros], ["Ana", "João", "Zé Ção"])
+        self.assertEqual([r["status"] for r in registros], ["Agendado", "Cancelado", "Agendado"])
+        self.assertIn("Zé Ção", saida.getvalue())  # ensure_ascii=False
+
+    def test_banco_vazio(self):
+        saida = io.StringIO()
+        self.assertEqual(exportar_csv(self.repo, saida), 0)
+        self.assertEqual(saida.getvalue().splitlines(), [",".join(COLUNAS_AGENDAMENTO_COMPLETO)])
+        saida = io.StringIO()
+        self.assertEqual(exportar_jsonl(self.repo, saida), 0)
+        self.assertEqual(saida.getvalue(), "")
+
+
+class ExportacaoColunar(_ComAgendas):
+
+    def test_ida_e_volta(self):
+        self.popular()
+        esperado = list(self.repo.iterar_agendamentos_completos())
+        self.assertEqual(exportar_colunar(self.repo, self.arquivo), len(esperado))
+
+        with carregar_colunar(self.arquivo) as tabela:
+            self.assertEqual(tabela.linhas, 3)
+            self.assertEqual(tabela.nomes, list(COLUNAS_AGENDAMENTO_COMPLETO))
+            status = tabela.coluna("status")
+            lidos = [tuple(tabela.dicionario("status")[status[i]] if nome == "status" else tabela.coluna(nome)[i]
+                           for nome in tabela.nomes) for i in range(tabela.linhas)]
+        inicio = COLUNAS_AGENDAMENTO_COMPLETO.index("data_hora_inicio")
+        for linha, lida in zip(esperado, lidos):
+            linha = list(linha)
+            linha[inicio] = int((datetime.fromisoformat(linha[inicio]) - datetime(1970, 1, 1)).total_seconds())
+            self.assertEqual(tuple(linha), lida)
+
+    def test_fechar_com_colunas_em_uso(self):
+        self.popular()
+        exportar_colunar(self.repo, self.arquivo)
+        with carregar_colunar(self.arquivo) as tabela:
+            ids = tabela.coluna("id_agendamento")
+            nomes = tabela.coluna("nome_paciente")
+            self.assertEqual(nomes[2], "Zé Ção")
+        # O 'with' fechou o mmap; as colunas que sobraram não valem mais.
+        with self.assertRaises(ValueError):
+            ids[0]
+        with self.assertRaises(ValueError):
+            nomes[0]
+
+    def test_banco_vazio(self):
+        self.assertEqual(exportar_colunar(self.repo, self.arquivo), 0)
+        with carregar_colunar(self.arquivo) as tabela:
+            self.assertEqual(len(tabela.coluna("id_agendamento")), 0)
+            self.assertEqual(len(tabela.coluna("nome_medico")), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
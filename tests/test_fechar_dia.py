@@ -0,0 +1,128 @@
+"""Fechamento do dia: consultas que já terminaram passam a Realizadas num único UPDATE."""
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import date, datetime
+
+from main import main_cli
+from models.agendamento import Agendamento
+from models.clinica import Clinica
+from models.medico import Medico
+from models.paciente import Paciente
+from persistencia import AgendaRepository, ConflitoVersao
+from persistencia_shards import ShardedAgendaRepository
+
+SEGUNDA = date(2030, 1, 7)
+REGRAS = {"segunda": ["08:00-12:00"], "terca": ["08:00-12:00"]}
+
+
+def _as(hora: int, minuto: int = 0, dia: int = 7) -> datetime:
+    return datetime(2030, 1, dia, hora, minuto)
+
+
+class _ComClinica(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = pasta.name
+        self.repo = self.criar_repo()
+        self.addCleanup(self.repo.fechar)
+        self.clinica = Clinica(self.repo)
+        self.id_paciente = self.clinica.cadastrar_paciente(Paciente("Ana", "11111111111", "0", "SUS"))
+        self.medicos = [self.clinica.cadastrar_medico(Medico(f"M{i}", f"9000000000{i}", "0", f"CRM{i}", "Geral",
+                                                             REGRAS)) for i in (1, 2)]
+
+    def criar_repo(self):
+        return AgendaRepository(os.path.join(self.pasta, "clinica.db"))
+
+    def marcar(self, id_medico: int, inicio: datetime, duracao: int = 30) -> int:
+        return self.clinica.marcar_consulta(self.id_paciente, id_medico, inicio, duracao).id
+
+    def status(self) -> dict:
+        return {ag.id: ag.status for ag in self.clinica.consultar_agenda_paciente(self.id_paciente, True)}
+
+
+class FecharDia(_ComClinica):
+    def setUp(self):
+        super().setUp()
+        m1, m2 = self.medicos
+        self.cedo = self.marcar(m1, _as(8))
+        self.no_limite = self.marcar(m2, _as(9), 60)  # Termina exatamente às 10:00
+        self.em_andamento = self.marcar(m1, _as(9, 45))
+        self.cancelada = self.marcar(m2, _as(8))
+        self.clinica.cancelar_consulta(self.cancelada)
+        self.outro_dia = self.marcar(m1, _as(8, dia=8))
+
+    def test_so_consultas_ja_terminadas(self):
+        self.status()  # Agenda no cache: o fechamento tem de invalidá-la
+        self.assertEqual(self.clinica.fechar_dia(SEGUNDA, agora=_as(10)), {self.medicos[0]: 1, self.medicos[1]: 1})
+        self.assertEqual(self.status(), {self.cedo: "Realizado", self.no_limite: "Realizado",
+                                         self.em_andamento: "Agendado", self.cancelada: "Cancelado",
+                                         self.outro_dia: "Agendado"})
+
+    def test_repetir_nao_muda_nada(self):
+        self.clinica.fechar_dia(SEGUNDA, agora=_as(10))
+        self.assertEqual(self.clinica.fechar_dia(SEGUNDA, agora=_as(10)), {})
+        self.assertEqual(self.clinica.fechar_dia(SEGUNDA, agora=_as(12)), {self.medicos[0]: 1})
+
+    def test_periodo(self):
+        por_medico = self.clinica.fechar_dia(SEGUNDA, date(2030, 1, 8), agora=_as(23, dia=8))
+        self.assertEqual(por_medico, {self.medicos[0]: 3, self.medicos[1]: 1})
+        self.assertEqual(list(self.status().values()).count("Realizado"), 4)
+
+    def test_versao_e_diario(self):
+        versao = self.repo.buscar_agendamento(self.cedo).versao
+        ultimo = self.repo.buscar_eventos()[-1]["seq"]
+        self.clinica.fechar_dia(SEGUNDA, agora=_as(10))
+        with self.assertRaises(ConflitoVersao):
+            self.clinica.cancelar_consulta(self.cedo, versao)  # Lida antes do fechamento
+        eventos = self.repo.buscar_eventos(ultimo)
+        self.assertEqual(sorted((e["id_agendamento"], e["dados"]["status_anterior"], e["dados"]["status"])
+                                for e in eventos),
+                         [(self.cedo, "Agendado", "Realizado"), (self.no_limite, "Agendado", "Realizado")])
+
+    def test_confirmar_realizacoes_de_um_medico(self):
+        self.assertEqual(self.clinica.confirmar_realizacoes(SEGUNDA, id_medico=self.medicos[0]), 2)
+        self.assertEqual(self.status()[self.em_andamento], "Realizado")
+        self.assertEqual(self.status()[self.no_limite], "Agendado")
+
+
+class FecharDiaEmShards(_ComClinica):
+    def criar_repo(self):
+        return ShardedAgendaRepository([os.path.join(self.pasta, f"shard{i}.db") for i in range(3)],
+                                       os.path.join(self.pasta, "indice.db"),
+                                       rotear_medico=lambda m: int(m.crm[-1]))
+
+    def test_ids_globais(self):
+        for id_medico in self.medicos:
+            self.marcar(id_medico, _as(8))
+            self.marcar(id_medico, _as(11))
+        self.assertEqual(self.clinica.fechar_dia(SEGUNDA, agora=_as(9)), {self.medicos[0]: 1, self.medicos[1]: 1})
+        self.assertEqual(self.repo.fechar_periodo(SEGUNDA, SEGUNDA, _as(12), self.medicos[1]), {self.medicos[1]: 1})
+
+
+class FecharDiaPelaLinhaDeComando(unittest.TestCase):
+    def test_saida(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        caminho = os.path.join(pasta.name, "clinica.db")
+        repo = AgendaRepository(caminho)
+        self.addCleanup(repo.fechar)
+        paciente = repo.buscar_paciente(repo.salvar_paciente(Paciente("Ana", "11111111111", "0", "SUS")))
+        medico = repo.buscar_medico(repo.salvar_medico(Medico("Bia", "22222222222", "0", "CRM1", "Geral", REGRAS)))
+        for dia in (6, 7):  # Dias já passados: tudo terminou
+            ag = Agendamento(paciente, medico, datetime(2020, 1, dia, 8, 0), 30)
+            ag.status = Agendamento.AGENDADO
+            repo.salvar_agendamento(ag)
+
+        saida = io.StringIO()
+        with redirect_stdout(saida), redirect_stderr(io.StringIO()):
+            self.assertEqual(main_cli(["--db", caminho, "fechar-dia", "--data", "2020-01-06", "--ate", "2020-01-07"]), 0)
+        self.assertEqual(json.loads(saida.getvalue()), {"consultas": 2, "por_medico": {str(medico.id): 2}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+"""Orçamento de inicialização do main.py (-X importtime) e anotações resolvíveis."""
+import os
+import sys
+import tempfile
+import typing
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from verificar_inicializacao import medir  # noqa: E402
+
+ORCAMENTO_MS = 50.0
+REPETICOES = 5
+
+
+class OrcamentoInicializacao(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.db = os.path.join(pasta.name, "inicializacao.db")
+
+    def assert_dentro_do_orcamento(self, *argumentos):
+        importacoes, _ = medir(list(argumentos), REPETICOES)
+        self.assertLessEqual(importacoes, ORCAMENTO_MS,
+                             f"{' '.join(argumentos)}: importações levaram {importacoes:.1f} ms")
+
+    def test_ajuda(self):
+        self.assert_dentro_do_orcamento("--help")
+
+    def test_listar_medicos(self):
+        self.assert_dentro_do_orcamento("--db", self.db, "listar", "medicos")
+
+    def test_agenda_medico(self):
+        self.assert_dentro_do_orcamento("--db", self.db, "agenda-medico", "--crm", "X", "--data", "2030-01-07")
+
+
+class AnotacoesResolviveis(unittest.TestCase):
+    """As anotações adiadas (from __future__ import annotations) precisam resolver em tempo de execução."""
+
+    def test_get_type_hints(self):
+        import persistencia
+        from models import bloqueio, cache_agenda, capacidade, clinica, mapa_disponibilidade
+
+        for modulo in (persistencia, bloqueio, cache_agenda, capacidade, clinica, mapa_disponibilidade):
+            for nome, objeto in vars(modulo).items():
+                if getattr(objeto, "__module__", None) != modulo.__name__:
+                    continue
+                if isinstance(objeto, type):
+                    funcoes = [f for f in vars(objeto).values() if callable(f)]
+                else:
+                    funcoes = [objeto] if callable(objeto) else []
+                for funcao in funcoes:
+                    with self.subTest(modulo=modulo.__name__, funcao=getattr(funcao, "__qualname__", nome)):
+                        typing.get_type_hints(funcao)
+
+
+if __name__ == "__main__":
+    unittest.main()
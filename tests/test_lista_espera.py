@@ -0,0 +1,53 @@
+"""Lista de espera: paciente esperando em mais de uma especialidade."""
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+
+from lista_espera import OtimizadorListaEspera
+from models.clinica import Clinica
+from models.medico import Medico
+from models.paciente import Paciente
+from persistencia import AgendaRepository
+
+SEGUNDA = date(2030, 1, 7)
+REGRAS = {"segunda": ["08:00-09:00"]}
+
+
+class PacienteEmDuasEspecialidades(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        repo = AgendaRepository(os.path.join(pasta.name, "clinica.db"))
+        self.addCleanup(repo.fechar)
+        self.clinica = Clinica(repo)
+        for i, especialidade in enumerate(("Cardiologia", "Dermatologia", "Pediatria")):
+            self.clinica.cadastrar_medico(Medico(f"M{i}", f"9000000000{i}", "0", f"CRM{i}", especialidade, REGRAS))
+        self.pacientes = [self.clinica.cadastrar_paciente(Paciente(f"P{i}", f"1000000000{i}", "0", "SUS"))
+                          for i in range(2)]
+
+    def horarios(self, id_paciente) -> list:
+        return sorted((ag.data_hora_inicio.time().isoformat(), ag.medico.especialidade)
+                      for ag in self.clinica.consultar_agenda_paciente(id_paciente))
+
+    def test_horarios_nao_se_sobrepoem(self):
+        ana, bruno = self.pacientes
+        for especialidade in ("cardiologia", "dermatologia"):
+            self.clinica.adicionar_lista_espera(ana, especialidade, SEGUNDA, SEGUNDA, 30)
+        self.clinica.adicionar_lista_espera(bruno, "pediatria", SEGUNDA, SEGUNDA, 30)
+
+        otimizador = OtimizadorListaEspera(self.clinica, usar_processos=False)
+        tarefas = otimizador._montar_tarefas(self.clinica.repo.buscar_pedidos_espera_pendentes(),
+                                             self.clinica.repo.buscar_todos_medicos(), datetime(2030, 1, 1))
+        # Cardiologia e dermatologia (ligadas por Ana) numa tarefa; pediatria em outra.
+        self.assertEqual(sorted(sorted(t["medicos_por_especialidade"]) for t in tarefas),
+                         [["cardiologia", "dermatologia"], ["pediatria"]])
+
+        resumo = otimizador.executar(datetime(2030, 1, 1))
+        self.assertEqual((resumo["agendados"], resumo["conflitos"]), (3, 0))
+        self.assertEqual(self.horarios(ana), [("08:00:00", "Cardiologia"), ("08:30:00", "Dermatologia")])
+        self.assertEqual(self.horarios(bruno), [("08:00:00", "Pediatria")])
+
+
+if __name__ == "__main__":
+    unittest.main()
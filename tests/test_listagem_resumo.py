@@ -0,0 +1,138 @@
+"""Listagens resumidas de pacientes e médicos: tuplas do índice de cobertura, paginadas por ID."""
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import persistencia
+import persistencia_shards
+from main import op_listar
+from models.clinica import Clinica
+from models.medico import Medico
+from models.paciente import Paciente
+from persistencia import COLUNAS_RESUMO_MEDICO, COLUNAS_RESUMO_PACIENTE, AgendaRepository
+from persistencia_shards import ShardedAgendaRepository
+
+REGRAS = {"segunda": ["08:00-18:00"]}
+
+
+class _ComClinica(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = pasta.name
+        self.repo = self.criar_repo()
+        self.addCleanup(self.repo.fechar)
+        self.clinica = Clinica(self.repo)
+        self.pacientes = [self.clinica.cadastrar_paciente(Paciente(f"Paciente {i}", f"{i:011d}", "0",
+                                                                   "SUS" if i % 2 else "Unimed"))
+                          for i in range(1, 12)]
+        self.medicos = [self.clinica.cadastrar_medico(Medico(f"Médico {i}", f"9000000000{i}", "0", f"CRM{i}",
+                                                             "Geral" if i % 2 else "Pediatria", REGRAS))
+                        for i in range(6)]
+
+    def criar_repo(self):
+        return AgendaRepository(os.path.join(self.pasta, "clinica.db"))
+
+    def esperado_pacientes(self) -> list:
+        return sorted((p.id, p.nome, p.cpf, p.plano_saude) for p in self.clinica.listar_todos_pacientes())
+
+    def esperado_medicos(self) -> list:
+        return sorted((m.id, m.nome, m.crm, m.especialidade) for m in self.clinica.listar_todos_medicos())
+
+    def todas_as_paginas(self, listar, limite: int) -> list:
+        linhas, apos_id = [], 0
+        while True:
+            pagina = listar(limite, apos_id)
+            self.assertLessEqual(len(pagina), limite)
+            linhas += pagina
+            if len(pagina) < limite:
+                return linhas
+            apos_id = pagina[-1][0]
+
+
+class ListagemResumida(_ComClinica):
+    def test_igual_a_listagem_completa(self):
+        self.assertEqual(self.clinica.listar_pacientes_resumo(), self.esperado_pacientes())
+        self.assertEqual(self.clinica.listar_medicos_resumo(), self.esperado_medicos())
+        self.assertEqual(len(self.esperado_pacientes()), 11)
+
+    def test_paginas(self):
+        for limite in (1, 2, 5, 11, 50):
+            with self.subTest(limite=limite):
+                self.assertEqual(self.todas_as_paginas(self.clinica.listar_pacientes_resumo, limite),
+                                 self.esperado_pacientes())
+                self.assertEqual(self.todas_as_paginas(self.clinica.listar_medicos_resumo, limite),
+                                 self.esperado_medicos())
+        ultimo = self.esperado_pacientes()[-1][0]
+        self.assertEqual(self.clinica.listar_pacientes_resumo(10, ultimo), [])
+
+    def test_excluidos_ficam_de_fora(self):
+        self.repo.deletar_paciente(self.pacientes[3])
+        self.repo.deletar_medico(self.medicos[0])
+        self.assertNotIn(self.pacientes[3], [linha[0] for linha in self.clinica.listar_pacientes_resumo()])
+        self.assertNotIn(self.medicos[0], [linha[0] for linha in self.clinica.listar_medicos_resumo()])
+        self.assertEqual(self.clinica.listar_pacientes_resumo(), self.esperado_pacientes())
+        self.assertEqual(self.todas_as_paginas(self.clinica.listar_medicos_resumo, 2), self.esperado_medicos())
+
+    def test_limite_maximo(self):
+        with mock.patch.object(persistencia, "LIMITE_LISTAGEM", 4):
+            self.assertEqual(self.clinica.listar_pacientes_resumo(100), self.esperado_pacientes()[:4])
+            self.assertEqual(self.clinica.listar_medicos_resumo(100, self.medicos[0]), self.esperado_medicos()[1:5])
+
+    def test_so_le_o_indice(self):
+        conn = self.repo._get_conexao()
+        for chave, indice in (("listar_pacientes_resumo", "idx_pacientes_listagem"),
+                              ("listar_medicos_resumo", "idx_medicos_listagem")):
+            with self.subTest(chave=chave):
+                plano = " ".join(linha[-1] for linha in conn.execute(
+                    "EXPLAIN QUERY PLAN " + persistencia.SQL[chave], (0, 10)).fetchall())
+                self.assertIn(f"USING COVERING INDEX {indice}", plano)
+
+    def test_operacao_listar(self):
+        resposta = op_listar(self.clinica, {"alvo": "pacientes", "resumo": True, "limite": 4})
+        self.assertEqual(resposta["pacientes"][0], dict(zip(COLUNAS_RESUMO_PACIENTE, self.esperado_pacientes()[0])))
+        linhas, dados = [], {"alvo": "medicos", "resumo": True, "limite": 4}
+        while True:
+            resposta = op_listar(self.clinica, dados)
+            linhas += resposta["medicos"]
+            if resposta["proximo_apos_id"] is None:
+                break
+            dados["apos_id"] = resposta["proximo_apos_id"]
+        self.assertEqual(linhas, [dict(zip(COLUNAS_RESUMO_MEDICO, m)) for m in self.esperado_medicos()])
+
+
+class ListagemResumidaEmShards(_ComClinica):
+    def criar_repo(self):
+        return ShardedAgendaRepository([os.path.join(self.pasta, f"shard{i}.db") for i in range(3)],
+                                       os.path.join(self.pasta, "indice.db"),
+                                       rotear_medico=lambda m: int(m.crm[-1]) % 3)
+
+    def setUp(self):
+        super().setUp()
+        # Consultas com médicos de outros shards criam cópias dos pacientes lá.
+        for hora, id_paciente in enumerate(self.pacientes[:8], start=8):
+            for id_medico in self.medicos[:3]:
+                self.clinica.marcar_consulta(id_paciente, id_medico, datetime(2030, 1, 7, hora, 0), 30)
+
+    def test_sem_copias_e_em_ordem_de_id_global(self):
+        esperado = self.esperado_pacientes()
+        self.assertEqual([linha[0] for linha in esperado], sorted(self.pacientes))
+        self.assertEqual(self.clinica.listar_pacientes_resumo(), esperado)
+        self.assertEqual(self.clinica.listar_medicos_resumo(), self.esperado_medicos())
+        for limite in (1, 2, 3, 7):
+            with self.subTest(limite=limite):
+                self.assertEqual(self.todas_as_paginas(self.clinica.listar_pacientes_resumo, limite), esperado)
+                self.assertEqual(self.todas_as_paginas(self.clinica.listar_medicos_resumo, limite),
+                                 self.esperado_medicos())
+
+    def test_limite_maximo(self):
+        with mock.patch.object(persistencia, "LIMITE_LISTAGEM", 3), \
+                mock.patch.object(persistencia_shards, "LIMITE_LISTAGEM", 3):
+            self.assertEqual(self.clinica.listar_pacientes_resumo(100), self.esperado_pacientes()[:3])
+            self.assertEqual(self.clinica.listar_medicos_resumo(100), self.esperado_medicos()[:3])
+
+
+if __name__ == "__main__":
+    unittest.main()
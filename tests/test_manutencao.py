@@ -0,0 +1,181 @@
+"""Manutenção do banco: integridade, consultas órfãs, compactação e a saída do subcomando."""
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import datetime
+
+import manutencao
+from main import main_cli
+from models.agendamento import Agendamento
+from models.medico import Medico
+from models.paciente import Paciente
+from persistencia import AgendaRepository
+
+REGRAS = {"segunda": ["08:00-12:00"]}
+
+
+class _ComBanco(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.caminho = os.path.join(pasta.name, "clinica.db")
+        self.repo = AgendaRepository(self.caminho)
+        self.addCleanup(self.repo.fechar)
+        self.pacientes = [self.repo.salvar_paciente(Paciente(nome, cpf, "0", "SUS"))
+                          for nome, cpf in (("Ana", "11111111111"), ("Caio", "33333333333"))]
+        self.medicos = [self.repo.salvar_medico(Medico(nome, cpf, "0", crm, "Geral", REGRAS))
+                        for nome, cpf, crm in (("Bia", "22222222222", "CRM1"), ("Davi", "44444444444", "CRM2"))]
+        # Consultas: (paciente, médico) = (0, 0), (0, 1), (1, 0), (1, 1).
+        self.consultas = []
+        for hora, (i, j) in enumerate([(0, 0), (0, 1), (1, 0), (1, 1)], start=8):
+            ag = Agendamento(self.repo.buscar_paciente(self.pacientes[i]), self.repo.buscar_medico(self.medicos[j]),
+                             datetime(2030, 1, 7, hora, 0), 30)
+            ag.status = Agendamento.AGENDADO
+            self.consultas.append(self.repo.salvar_agendamento(ag))
+
+    def inserir_sem_chave_estrangeira(self, id_paciente: int, id_medico: int) -> int:
+        """Consulta gravada com as chaves estrangeiras desligadas (como num banco danificado)."""
+        conn = sqlite3.connect(self.caminho)
+        try:
+            with conn:
+                return conn.execute(
+                    "INSERT INTO agendamentos (id_paciente, id_medico, data_hora_inicio, duracao_minutos, status) "
+                    "VALUES (?, ?, '2030-01-07T14:00:00', 30, 1);", (id_paciente, id_medico)).lastrowid
+        finally:
+            conn.close()
+
+
+class Integridade(_ComBanco):
+    def test_banco_integro(self):
+        self.assertEqual(self.repo.verificar_integridade(), {"integridade": [], "chaves_estrangeiras": []})
+        self.assertEqual(self.repo.buscar_agendamentos_orfaos(), {"total": 0, "por_motivo": {}, "amostra": []})
+
+    def test_furo_de_chave_estrangeira(self):
+        orfa = self.inserir_sem_chave_estrangeira(999, self.medicos[0])
+        self.assertEqual(self.repo.verificar_integridade()["chaves_estrangeiras"],
+                         [{"tabela": "agendamentos", "rowid": orfa, "referencia": "pacientes"}])
+
+
+class ConsultasOrfas(_ComBanco):
+    def test_motivos(self):
+        sem_paciente = self.inserir_sem_chave_estrangeira(999, self.medicos[0])
+        sem_nenhum = self.inserir_sem_chave_estrangeira(998, 997)  # O paciente inexistente vem primeiro
+        sem_medico = self.inserir_sem_chave_estrangeira(self.pacientes[0], 997)
+        self.repo.deletar_paciente(self.pacientes[1])
+        self.repo.deletar_medico(self.medicos[1])
+        orfaos = self.repo.buscar_agendamentos_orfaos()
+        # (1, 1) tem os dois excluídos: conta como paciente excluído.
+        self.assertEqual(orfaos["por_motivo"], {"médico excluído": 1, "médico inexistente": 1,
+                                                "paciente excluído": 2, "paciente inexistente": 2})
+        self.assertEqual(orfaos["total"], 6)
+        self.assertEqual(orfaos["amostra"], [
+            {"id_agendamento": self.consultas[1], "motivo": "médico excluído"},
+            {"id_agendamento": self.consultas[2], "motivo": "paciente excluído"},
+            {"id_agendamento": self.consultas[3], "motivo": "paciente excluído"},
+            {"id_agendamento": sem_paciente, "motivo": "paciente inexistente"},
+            {"id_agendamento": sem_nenhum, "motivo": "paciente inexistente"},
+            {"id_agendamento": sem_medico, "motivo": "médico inexistente"}])
+        self.assertEqual([o["id_agendamento"] for o in self.repo.buscar_agendamentos_orfaos(2)["amostra"]],
+                         self.consultas[1:3])
+
+    def test_com_problemas(self):
+        relatorio = {"integridade": [], "chaves_estrangeiras": [], "orfaos": self.repo.buscar_agendamentos_orfaos()}
+        self.assertFalse(manutencao.com_problemas(relatorio))
+        self.repo.deletar_medico(self.medicos[1])  # Só cadastros excluídos: o 'purgar' resolve
+        relatorio["orfaos"] = self.repo.buscar_agendamentos_orfaos()
+        self.assertFalse(manutencao.com_problemas(relatorio))
+        self.inserir_sem_chave_estrangeira(self.pacientes[0], 997)
+        relatorio["orfaos"] = self.repo.buscar_agendamentos_orfaos()
+        self.assertTrue(manutencao.com_problemas(relatorio))
+        self.assertTrue(manutencao.com_problemas({"integridade": ["*** corrompido"], "chaves_estrangeiras": [],
+                                                  "orfaos": {"por_motivo": {}}}))
+
+    def test_consulta_recente_ignora_cadastros_excluidos(self):
+        self.assertEqual(self.repo.buscar_consulta_recente(),
+                         (self.medicos[1], datetime(2030, 1, 7, 11, 0), self.pacientes[1]))
+        self.repo.deletar_paciente(self.pacientes[1])
+        self.assertEqual(self.repo.buscar_consulta_recente(),
+                         (self.medicos[1], datetime(2030, 1, 7, 9, 0), self.pacientes[0]))
+
+
+class Compactacao(_ComBanco):
+    def liberar_paginas(self) -> int:
+        conn = self.repo._get_conexao()
+        conn.execute("CREATE TABLE lixo (x BLOB);")
+        conn.executemany("INSERT INTO lixo VALUES (randomblob(3000));", [()] * 100)
+        conn.execute("DROP TABLE lixo;")
+        conn.commit()
+        return self.repo.estatisticas_paginas()["paginas_livres"]
+
+    def test_banco_novo_e_incremental(self):
+        self.assertEqual(self.repo.estatisticas_paginas()["auto_vacuum"], "incremental")
+        livres = self.liberar_paginas()
+        self.assertGreater(livres, 20)
+        antes = self.repo.estatisticas_paginas()
+        self.assertEqual(self.repo.compactar(10), 10)
+        self.assertEqual(self.repo.estatisticas_paginas()["paginas_livres"], livres - 10)
+        self.assertEqual(self.repo.compactar(), livres - 10)
+        depois = self.repo.estatisticas_paginas()
+        self.assertEqual((depois["paginas_livres"], depois["paginas"]), (0, antes["paginas"] - livres))
+        self.assertEqual(depois["bytes"], depois["paginas"] * depois["tamanho_pagina"])
+
+    def test_banco_antigo_so_com_converter(self):
+        conn = self.repo._get_conexao()
+        conn.execute("PRAGMA auto_vacuum = NONE;")
+        conn.execute("VACUUM;")  # Como um banco criado antes do auto_vacuum incremental
+        self.assertEqual(self.repo.estatisticas_paginas()["auto_vacuum"], "nenhum")
+        livres = self.liberar_paginas()
+        self.assertEqual(self.repo.compactar(), 0)
+        antes = self.repo.estatisticas_paginas()
+        self.assertEqual(antes["paginas_livres"], livres)
+        liberadas = self.repo.compactar(converter=True)
+        self.assertGreater(liberadas, livres // 2)  # O modo incremental ocupa páginas de mapa
+        depois = self.repo.estatisticas_paginas()
+        self.assertEqual((depois["auto_vacuum"], depois["paginas_livres"]), ("incremental", 0))
+        self.assertEqual(depois["paginas"], antes["paginas"] - liberadas)
+        self.assertEqual(len(self.repo.buscar_agendamentos_por_paciente(self.pacientes[0])), 2)
+
+
+class ManutencaoPelaLinhaDeComando(_ComBanco):
+    def rodar(self, *opcoes) -> tuple:
+        self.repo.fechar()
+        saida = io.StringIO()
+        with redirect_stdout(saida), redirect_stderr(io.StringIO()):
+            codigo = main_cli(["--db", self.caminho, "manutencao", "--repeticoes", "2", *opcoes])
+        return codigo, json.loads(saida.getvalue())
+
+    def test_relatorio(self):
+        codigo, relatorio = self.rodar()
+        self.assertEqual(codigo, 0)
+        self.assertEqual(list(relatorio), ["antes", "integridade", "chaves_estrangeiras", "orfaos",
+                                           "paginas_liberadas", "depois", "etapas_s"])
+        self.assertEqual(list(relatorio["etapas_s"]), ["integridade", "orfaos", "analyze", "vacuum", "optimize"])
+        for momento in ("antes", "depois"):
+            with self.subTest(momento=momento):
+                self.assertEqual(set(relatorio[momento]["consultas_ms"]),
+                                 {"listar_pacientes", "listar_medicos", "agenda_medico", "agenda_paciente",
+                                  "intervalos_semana", "medicos_disponiveis"})
+                self.assertEqual(relatorio[momento]["paginas"]["auto_vacuum"], "incremental")
+        self.assertEqual(relatorio["orfaos"]["total"], 0)
+        conn = sqlite3.connect(self.caminho)
+        self.addCleanup(conn.close)
+        self.assertTrue(conn.execute("SELECT COUNT(*) FROM sqlite_stat1;").fetchone()[0])  # Rodou o ANALYZE
+
+    def test_codigo_de_saida(self):
+        self.repo.deletar_medico(self.medicos[0])
+        codigo, relatorio = self.rodar()
+        self.assertEqual((codigo, relatorio["orfaos"]["por_motivo"]), (0, {"médico excluído": 2}))
+        orfa = self.inserir_sem_chave_estrangeira(999, self.medicos[1])
+        codigo, relatorio = self.rodar()
+        self.assertEqual(codigo, 1)
+        self.assertEqual(relatorio["chaves_estrangeiras"],
+                         [{"tabela": "agendamentos", "rowid": orfa, "referencia": "pacientes"}])
+        self.assertEqual(relatorio["orfaos"]["total"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+"""Cache de disponibilidade em bitsets (MapaDisponibilidade)."""
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, time, timedelta
+
+from models.agendamento import Agendamento
+from models.clinica import Clinica
+from models.mapa_disponibilidade import inicios_com_janela, mascara, mascara_contida, posicoes_dos_bits
+from models.medico import Medico
+from models.paciente import Paciente
+from persistencia import AgendaRepository
+
+SEGUNDA = date(2030, 1, 7)
+
+
+def _as(hora: str) -> datetime:
+    return datetime.combine(SEGUNDA, time.fromisoformat(hora))
+
+
+class _ComClinica(unittest.TestCase):
+    REGRAS = {"segunda": ["08:00-12:00"]}
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.caminho = os.path.join(pasta.name, "clinica.db")
+        repo = AgendaRepository(self.caminho)
+        self.addCleanup(repo.fechar)
+        self.clinica = Clinica(repo)
+        self.id_paciente = self.clinica.cadastrar_paciente(Paciente("Ana", "11111111111", "0", "SUS"))
+        self.id_medico = self.clinica.cadastrar_medico(
+            Medico("Bia", "22222222222", "0", "CRM1", "Geral", self.REGRAS))
+        self.medico = self.clinica.repo.buscar_medico(self.id_medico)
+
+
+class FuncoesDeBits(unittest.TestCase):
+    def test_mascara(self):
+        self.assertEqual(mascara(0, 15), 0b111)
+        self.assertEqual(mascara(7, 12), 0b110)  # Fora da grade: arredonda para fora
+        self.assertEqual(mascara_contida(7, 12), 0)  # ...ou para dentro
+        self.assertEqual(mascara_contida(3, 22), 0b1110)
+        self.assertEqual(mascara(10, 10), 0)
+
+    def test_janelas_e_posicoes(self):
+        livres = 0b1110111  # slots 0-2 e 4-6
+        self.assertEqual(posicoes_dos_bits(inicios_com_janela(livres, 1)), [0, 1, 2, 4, 5, 6])
+        self.assertEqual(posicoes_dos_bits(inicios_com_janela(livres, 3)), [0, 4])
+        self.assertEqual(posicoes_dos_bits(inicios_com_janela(livres, 4)), [])
+
+
+class ConflitosEHorariosLivres(_ComClinica):
+    """O bitset tem de concordar com a conferência direta dos intervalos."""
+
+    def setUp(self):
+        super().setUp()
+        self.outro_paciente = self.clinica.cadastrar_paciente(Paciente("Caio", "33333333333", "0", "SUS"))
+        self.clinica.marcar_consulta(self.id_paciente, self.id_medico, _as("08:30"), 30)
+        self.clinica.marcar_consulta(self.outro_paciente, self.id_medico, _as("10:00"), 45)
+        self.clinica.bloquear_agenda(_as("11:00"), _as("11:20"), self.id_medico, "reunião")
+
+    def ocupados(self) -> list:
+        return [(inicio, inicio + timedelta(minutes=duracao)) for inicio, duracao in
+                self.clinica.repo.buscar_intervalos_ocupados_medico(self.id_medico, SEGUNDA, SEGUNDA)] \
+            + [(_as("11:00"), _as("11:20"))]
+
+    def livres_por_forca_bruta(self, duracao: int) -> list:
+        ocupados, livres = self.ocupados(), []
+        inicio = _as("08:00")
+        while inicio + timedelta(minutes=duracao) <= _as("12:00"):
+            fim = inicio + timedelta(minutes=duracao)
+            if all(fim <= o_ini or inicio >= o_fim for o_ini, o_fim in ocupados):
+                livres.append(inicio)
+            inicio += timedelta(minutes=5)
+        return livres
+
+    def test_tem_conflito(self):
+        mapa = self.clinica.mapa
+        self.assertTrue(mapa.tem_conflito(self.id_medico, _as("08:30"), 30))
+        self.assertTrue(mapa.tem_conflito(self.id_medico, _as("08:15"), 20))  # Sobrepõe o começo
+        self.assertTrue(mapa.tem_conflito(self.id_medico, _as("10:40"), 5))  # Sobrepõe o fim
+        self.assertFalse(mapa.tem_conflito(self.id_medico, _as("09:00"), 60))  # Encosta nas duas
+        self.assertIsNone(mapa.tem_conflito(self.id_medico, _as("09:02"), 30))  # Fora da grade
+        self.assertTrue(mapa.bloqueado(self.id_medico, _as("11:15"), 15))
+        self.assertFalse(mapa.bloqueado(self.id_medico, _as("11:20"), 15))
+        with self.assertRaises(ValueError):
+            self.clinica.marcar_consulta(self.outro_paciente, self.id_medico, _as("08:45"), 30)
+
+    def test_horarios_livres(self):
+        for duracao in (5, 30, 45, 60):
+            with self.subTest(duracao=duracao):
+                self.assertEqual(self.clinica.buscar_horarios_livres(self.id_medico, SEGUNDA, SEGUNDA, duracao),
+                                 self.livres_por_forca_bruta(duracao))
+
+    def test_cancelamento_libera_o_horario(self):
+        agenda = self.clinica.consultar_agenda_medico(self.id_medico, SEGUNDA)
+        self.clinica.cancelar_consulta(agenda[0].id)
+        self.assertFalse(self.clinica.mapa.tem_conflito(self.id_medico, _as("08:30"), 30))
+        self.assertIn(_as("08:30"), self.clinica.buscar_horarios_livres(self.id_medico, SEGUNDA, SEGUNDA, 30))
+
+    def test_consulta_fora_da_grade(self):
+        # 09:07-09:22 não cai na grade: o bitset deixa a decisão para a conferência direta.
+        self.clinica.marcar_consulta(self.id_paciente, self.id_medico, _as("09:07"), 15)
+        self.assertIsNone(self.clinica.mapa.tem_conflito(self.id_medico, _as("09:20"), 10))
+        with self.assertRaises(ValueError):
+            self.clinica.marcar_consulta(self.outro_paciente, self.id_medico, _as("09:20"), 10)
+        self.clinica.marcar_consulta(self.outro_paciente, self.id_medico, _as("09:25"), 10)
+        for duracao in (5, 15):
+            with self.subTest(duracao=duracao):
+                livres = self.clinica.buscar_horarios_livres(self.id_medico, SEGUNDA, SEGUNDA, duracao)
+                # Os slots tocados por 09:07-09:22 ficam ocupados por inteiro.
+                self.assertEqual(livres, [h for h in self.livres_por_forca_bruta(duracao)
+                                          if not (_as("09:05") < h + timedelta(minutes=duracao)
+                                                  and h < _as("09:25"))])
+
+    def test_varios_dias(self):
+        livres = self.clinica.buscar_horarios_livres(self.id_medico, SEGUNDA, date(2030, 1, 14), 60)
+        self.assertEqual({h.date() for h in livres}, {SEGUNDA, date(2030, 1, 14)})  # Só atende às segundas
+        self.assertEqual([h for h in livres if h.date() == SEGUNDA], self.livres_por_forca_bruta(60))
+
+
+class GravacaoDeOutraConexao(_ComClinica):
+    def test_consulta_marcada_por_outro_processo(self):
+        self.assertFalse(self.clinica.mapa.tem_conflito(self.id_medico, _as("09:00"), 30))
+        outro = AgendaRepository(self.caminho)  # Outra recepção, outro processo
+        self.addCleanup(outro.fechar)
+        ag = Agendamento(outro.buscar_paciente(self.id_paciente), outro.buscar_medico(self.id_medico),
+                         _as("09:00"), 30)
+        ag.status = "Agendado"
+        outro.salvar_agendamento(ag)
+
+        self.assertTrue(self.clinica.mapa.tem_conflito(self.id_medico, _as("09:00"), 30))
+        self.assertNotIn(_as("09:00"), self.clinica.mapa.horarios_livres(self.medico, SEGUNDA, SEGUNDA, 30))
+
+    def test_gravacao_pela_clinica_nao_descarta_o_cache(self):
+        self.clinica.mapa.tem_conflito(self.id_medico, _as("09:00"), 30)
+        self.clinica.marcar_consulta(self.id_paciente, self.id_medico, _as("10:00"), 30)
+        self.assertIn((self.id_medico, SEGUNDA), self.clinica.mapa._dias)
+        self.assertTrue(self.clinica.mapa.tem_conflito(self.id_medico, _as("10:00"), 30))
+
+
+class ExpedienteForaDaGrade(_ComClinica):
+    REGRAS = {"segunda": ["08:03-08:57"]}
+
+    def test_horarios_livres_arredondam_para_dentro(self):
+        horarios = self.clinica.mapa.horarios_livres(self.medico, SEGUNDA, SEGUNDA, 5)
+        self.assertEqual((horarios[0], horarios[-1]), (_as("08:05"), _as("08:50")))
+        self.assertEqual(len(horarios), 10)
+
+    def test_nenhum_horario_oferecido_fica_fora_do_expediente(self):
+        for duracao in (5, 15, 30):
+            for inicio in self.clinica.mapa.horarios_livres(self.medico, SEGUNDA, SEGUNDA, duracao):
+                with self.subTest(duracao=duracao, inicio=inicio):
+                    self.assertGreaterEqual(inicio, _as("08:03"))
+                    self.assertLessEqual(inicio + timedelta(minutes=duracao), _as("08:57"))
+
+
+if __name__ == "__main__":
+    unittest.main()
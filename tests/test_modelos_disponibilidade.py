@@ -0,0 +1,134 @@
+"""Horários de trabalho normalizados: modelos compartilhados e a busca de médicos disponíveis."""
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import persistencia
+from models.clinica import Clinica
+from models.medico import Medico
+from models.paciente import Paciente
+from persistencia import AgendaRepository, faixas_disponibilidade
+
+MANHAS = {"segunda": ["08:00-12:00"], "sabado": ["08:00-12:00"]}
+# O mesmo expediente escrito de outro jeito (ordem, espaços, repetição).
+MANHAS_DE_NOVO = {"sabado": [" 08:00 - 12:00"], "segunda": ["08:00-12:00", "08:00-12:00"]}
+TARDES = {"segunda": ["13:00-18:00"]}
+
+
+def _as(hora: int, minuto: int = 0, dia: int = 7) -> datetime:
+    return datetime(2030, 1, dia, hora, minuto)  # 7 = segunda, 12 = sábado
+
+
+class Faixas(unittest.TestCase):
+    def test_conversao(self):
+        self.assertEqual(faixas_disponibilidade(MANHAS), [(0, 480, 720), (5, 480, 720)])
+        self.assertEqual(faixas_disponibilidade(MANHAS_DE_NOVO), faixas_disponibilidade(MANHAS))
+        self.assertEqual(faixas_disponibilidade({"domingo": ["12:00-08:00", "8h-9h", None], "feriado": ["08:00-09:00"],
+                                                 "terca": ["07:30-09:15"]}), [(1, 450, 555)])
+        self.assertEqual(faixas_disponibilidade(None), [])
+
+
+class _ComRepo(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.caminho = os.path.join(pasta.name, "clinica.db")
+
+    def abrir(self) -> AgendaRepository:
+        repo = AgendaRepository(self.caminho)
+        self.addCleanup(repo.fechar)
+        return repo
+
+    def modelos(self, repo) -> tuple:
+        """{id_medico: id_modelo} e quantos modelos existem."""
+        conn = repo._get_conexao()
+        return (dict(conn.execute("SELECT id, id_modelo_disponibilidade FROM medicos ORDER BY id;").fetchall()),
+                conn.execute("SELECT COUNT(*) FROM modelos_disponibilidade;").fetchone()[0])
+
+
+class ModelosCompartilhados(_ComRepo):
+    def test_mesmo_expediente_mesmo_modelo(self):
+        repo = self.abrir()
+        ids = [repo.salvar_medico(Medico(f"M{i}", f"9000000000{i}", "0", f"CRM{i}", "Geral", regras))
+               for i, regras in enumerate([MANHAS, TARDES, MANHAS_DE_NOVO, {}])]
+        por_medico, total = self.modelos(repo)
+        self.assertEqual(total, 3)
+        self.assertEqual(por_medico[ids[0]], por_medico[ids[2]])
+        self.assertEqual(len(set(por_medico.values())), 3)
+        self.assertEqual(repo._get_conexao().execute(
+            "SELECT dia_semana, inicio_min, fim_min FROM disponibilidade WHERE id_medico = ? ORDER BY 1;",
+            (ids[2],)).fetchall(), [(0, 480, 720), (5, 480, 720)])
+        self.assertEqual(repo.buscar_medico(ids[2]).regras_disponibilidade, MANHAS_DE_NOVO)  # O JSON fica como veio
+
+    def test_carga_em_massa(self):
+        repo = self.abrir()
+        repo.salvar_medico(Medico("M0", "90000000000", "0", "CRM0", "Geral", MANHAS))
+        medicos = [Medico(f"M{i}", f"9000000000{i}", "0", f"CRM{i}", "Geral", regras)
+                   for i, regras in enumerate([TARDES, MANHAS, TARDES], start=1)]
+        repo.carregar_em_massa([], medicos, [])
+        por_medico, total = self.modelos(repo)
+        self.assertEqual(total, 2)
+        self.assertEqual(len({por_medico[m.id] for m in medicos}), 2)
+
+    def test_migracao_de_banco_antigo(self):
+        with mock.patch.object(persistencia, "MIGRACOES", persistencia.MIGRACOES[:9]), \
+                mock.patch.object(persistencia, "ESQUEMA_VERSAO", 9):
+            AgendaRepository(self.caminho).fechar()
+        conn = sqlite3.connect(self.caminho)
+        with conn:
+            conn.executemany(
+                "INSERT INTO medicos (nome, cpf, telefone, crm, especialidade, regras_disponibilidade) "
+                "VALUES (?, ?, '0', ?, 'Geral', ?);",
+                [(f"M{i}", f"9000000000{i}", f"CRM{i}", regras) for i, regras in enumerate(
+                    [json.dumps(MANHAS), json.dumps(MANHAS_DE_NOVO), json.dumps({"segunda": ["xx"]}), None])])
+        conn.close()
+        repo = self.abrir()
+        por_medico, total = self.modelos(repo)
+        self.assertEqual(total, 2)  # Manhãs e o expediente vazio (JSON inválido ou ausente)
+        self.assertEqual((por_medico[1], por_medico[3]), (por_medico[2], por_medico[4]))
+        self.assertEqual([m.nome for m in repo.buscar_medicos_disponiveis(_as(9, dia=12), 60)], ["M0", "M1"])
+
+
+class MedicosDisponiveis(_ComRepo):
+    def setUp(self):
+        super().setUp()
+        self.clinica = Clinica(self.abrir())
+        self.id_paciente = self.clinica.cadastrar_paciente(Paciente("Ana", "11111111111", "0", "SUS"))
+        self.ids = {nome: self.clinica.cadastrar_medico(Medico(nome, f"9000000000{i}", "0", f"CRM{i}", esp, regras))
+                    for i, (nome, esp, regras) in enumerate([("Cris", "Cardiologia", MANHAS),
+                                                             ("Davi", "Cardiologia", TARDES),
+                                                             ("Eva", "Dermatologia", MANHAS_DE_NOVO)])}
+
+    def nomes(self, inicio: datetime, duracao: int, especialidade: str = None, sem_consulta: bool = True) -> list:
+        return [m.nome for m in self.clinica.repo.buscar_medicos_disponiveis(inicio, duracao, especialidade,
+                                                                              sem_consulta)]
+
+    def test_expediente(self):
+        self.assertEqual(self.nomes(_as(8), 240), ["Cris", "Eva"])
+        self.assertEqual(self.nomes(_as(11, 30), 60), [])  # Passa do fim da manhã
+        self.assertEqual(self.nomes(_as(12, 30), 30), [])  # Intervalo de almoço
+        self.assertEqual(self.nomes(_as(13), 30), ["Davi"])
+        self.assertEqual(self.nomes(_as(8, dia=12), 240), ["Cris", "Eva"])  # Sábado
+        self.assertEqual(self.nomes(_as(8, dia=8), 30), [])  # Terça: ninguém
+
+    def test_especialidade(self):
+        self.assertEqual(self.nomes(_as(9), 30, "cardiologia"), ["Cris"])
+        self.assertEqual([m.nome for m in self.clinica.medicos_disponiveis(_as(9), 30, "DERMATOLOGIA")], ["Eva"])
+
+    def test_consultas_marcadas(self):
+        self.clinica.marcar_consulta(self.id_paciente, self.ids["Cris"], _as(9), 30)
+        self.assertEqual(self.nomes(_as(9, 15), 30), ["Eva"])
+        self.assertEqual(self.nomes(_as(8, 30), 30), ["Cris", "Eva"])  # Encosta na consulta
+        self.assertEqual(self.nomes(_as(9, 15), 30, sem_consulta=False), ["Cris", "Eva"])
+
+    def test_medico_excluido(self):
+        self.clinica.repo.deletar_medico(self.ids["Eva"])
+        self.assertEqual(self.nomes(_as(9), 30), ["Cris"])
+
+
+if __name__ == "__main__":
+    unittest.main()
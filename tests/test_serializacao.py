@@ -0,0 +1,104 @@
+"""Serialização das agendas direto das linhas: o mesmo JSON que json.dumps dos dicts."""
+import json
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+
+from main import _agendamento_para_dict
+from models.agendamento import Agendamento
+from models.medico import Medico
+from models.paciente import Paciente
+from persistencia import COLUNAS_AGENDA, STATUS_AGENDADO, STATUS_CANCELADO, STATUS_REALIZADO, AgendaRepository
+from serializacao import DATA_HORA, INTEIRO, SERIALIZADOR_AGENDA, TEXTO, SerializadorLinhas
+
+REGRAS = {"segunda": ["08:00-12:00"]}
+# Textos que o json.dumps escapa de jeitos diferentes.
+TEXTOS = ["CRM-SP 1", 'aspas " e \\ barra', "Conceição ☃ 🩺", "tab\tnova\nlinha\x00\x1f", "  ", ""]
+
+
+def _dumps(objeto) -> str:
+    return json.dumps(objeto, separators=(",", ":"), ensure_ascii=False)
+
+
+class SerializadorIgualAoJsonDumps(unittest.TestCase):
+    def setUp(self):
+        self.linhas = [(i, texto, TEXTOS[-1 - i], f"2030-01-07T08:{i:02d}:00", 30 + i, status)
+                       for i, (texto, status) in enumerate(zip(TEXTOS, [STATUS_AGENDADO, STATUS_CANCELADO,
+                                                                       STATUS_REALIZADO] * 2))]
+        nomes = {STATUS_AGENDADO: "Agendado", STATUS_CANCELADO: "Cancelado", STATUS_REALIZADO: "Realizado"}
+        self.dicts = [dict(zip(COLUNAS_AGENDA, linha[:-1] + (nomes[linha[-1]],))) for linha in self.linhas]
+
+    def test_objetos(self):
+        self.assertEqual(SERIALIZADOR_AGENDA.objetos(self.linhas), [_dumps(d) for d in self.dicts])
+        self.assertEqual(SERIALIZADOR_AGENDA.objetos([]), [])
+
+    def test_array(self):
+        self.assertEqual(SERIALIZADOR_AGENDA.array(self.linhas), _dumps(self.dicts).encode("utf-8"))
+        self.assertEqual(SERIALIZADOR_AGENDA.array([]), b"[]")
+
+    def test_partes_array(self):
+        for tamanho in (1, 2, 4, 100):
+            lotes = [self.linhas[i:i + tamanho] for i in range(0, len(self.linhas), tamanho)]
+            with self.subTest(tamanho=tamanho):
+                self.assertEqual(b"".join(SERIALIZADOR_AGENDA.partes_array([[]] + lotes + [[]])),
+                                 _dumps(self.dicts).encode("utf-8"))
+        self.assertEqual(b"".join(SERIALIZADOR_AGENDA.partes_array([])), b"[]")
+        self.assertEqual(b"".join(SERIALIZADOR_AGENDA.partes_array([[], []])), b"[]")
+
+    def test_partes_jsonl(self):
+        lotes = [self.linhas[:2], [], self.linhas[2:]]
+        esperado = "".join(_dumps(d) + "\n" for d in self.dicts).encode("utf-8")
+        self.assertEqual(b"".join(SERIALIZADOR_AGENDA.partes_jsonl(lotes)), esperado)
+        self.assertEqual(list(SERIALIZADOR_AGENDA.partes_jsonl([])), [])
+
+    def test_campos_proprios(self):
+        serializador = SerializadorLinhas([("n", INTEIRO), ('chave "estranha"', TEXTO), ("quando", DATA_HORA)])
+        linhas = [(-1, "ç", "2030-01-07T08:00:00")]
+        self.assertEqual(serializador.objetos(linhas),
+                         [_dumps({"n": -1, 'chave "estranha"': "ç", "quando": "2030-01-07T08:00:00"})])
+
+
+class LinhasIguaisAosObjetos(unittest.TestCase):
+    """iterar_agenda_* + serializador == buscar_agendamentos_* + _agendamento_para_dict + json.dumps."""
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.repo = AgendaRepository(os.path.join(pasta.name, "clinica.db"))
+        self.addCleanup(self.repo.fechar)
+        self.id_paciente = self.repo.salvar_paciente(Paciente('Ana "Nina"', "111.111.111-11", "0", "SUS"))
+        self.id_medico = self.repo.salvar_medico(Medico("Bia", "22222222222", "0", 'CRM "SP" ç', "Geral", REGRAS))
+        paciente, medico = self.repo.buscar_paciente(self.id_paciente), self.repo.buscar_medico(self.id_medico)
+        for inicio, status in [(datetime(2020, 1, 6, 8, 0), "Realizado"), (datetime(2030, 1, 7, 8, 0), "Agendado"),
+                               (datetime(2030, 1, 7, 9, 0), "Cancelado"), (datetime(2030, 1, 7, 10, 0), "Agendado")]:
+            ag = Agendamento(paciente, medico, inicio, 30)
+            ag.status = status
+            self.repo.salvar_agendamento(ag)
+        self.repo.arquivar_agendamentos(datetime(2021, 1, 1))  # A de 2020 vai para o arquivo
+
+    def assert_mesmo_json(self, lotes, agendamentos):
+        texto = b"".join(SERIALIZADOR_AGENDA.partes_array(lotes)).decode("utf-8")
+        self.assertEqual(texto, _dumps([_agendamento_para_dict(a) for a in agendamentos]))
+
+    def test_agenda_do_paciente(self):
+        for incluir_cancelados, quantidade in ((False, 3), (True, 4)):  # Com a consulta arquivada
+            with self.subTest(incluir_cancelados=incluir_cancelados):
+                agendamentos = self.repo.buscar_agendamentos_por_paciente(self.id_paciente, incluir_cancelados)
+                self.assertEqual(len(agendamentos), quantidade)
+                self.assert_mesmo_json(
+                    self.repo.iterar_agenda_paciente(self.id_paciente, incluir_cancelados, tamanho_lote=1),
+                    agendamentos)
+
+    def test_agenda_do_medico(self):
+        dia = date(2030, 1, 7)
+        for incluir_cancelados in (False, True):
+            with self.subTest(incluir_cancelados=incluir_cancelados):
+                self.assert_mesmo_json(
+                    self.repo.iterar_agenda_medico(self.id_medico, dia, incluir_cancelados, tamanho_lote=2),
+                    self.repo.buscar_agendamentos_por_medico_e_data(self.id_medico, dia.isoformat(),
+                                                                    incluir_cancelados))
+
+
+if __name__ == "__main__":
+    unittest.main()
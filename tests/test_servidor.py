@@ -0,0 +1,117 @@
+"""Modo serviço: erro no meio de uma listagem em fluxo, servidor lotado, cliente que desconecta."""
+import http.client
+import os
+import socket
+import sqlite3
+import struct
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from models.clinica import Clinica
+from persistencia import AgendaRepository
+from servidor import ServidorClinica
+
+
+def _agenda_que_falha(clinica, dados):
+    def lotes():
+        yield []
+        raise sqlite3.OperationalError("database is locked")
+
+    return {}, "consultas", lotes()
+
+
+def _agenda_enorme(clinica, dados):
+    linha = (1, "11111111111", "CRM1", "2030-01-07T08:00:00", 30, "Agendado")
+    return {}, "consultas", ([linha] * 1000 for _ in range(1000))  # ~80 MB de JSON
+
+
+class _ComServidor(unittest.TestCase):
+    def iniciar(self, **opcoes):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        repo = AgendaRepository(os.path.join(pasta.name, "clinica.db"))
+        self.addCleanup(repo.fechar)
+        self.servidor = ServidorClinica(("127.0.0.1", 0), Clinica(repo), {"agenda-medico": lambda c, d: {}},
+                                        **opcoes)
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.addCleanup(self.servidor.server_close)
+        self.addCleanup(self.servidor.shutdown)
+
+    def saude(self) -> int:
+        conexao = http.client.HTTPConnection(*self.servidor.server_address, timeout=5)
+        self.addCleanup(conexao.close)
+        conexao.request("GET", "/saude")
+        resposta = conexao.getresponse()
+        resposta.read()
+        return resposta.status
+
+
+class ErroDepoisDoCabecalho(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        repo = AgendaRepository(os.path.join(pasta.name, "clinica.db"))
+        self.addCleanup(repo.fechar)
+        self.servidor = ServidorClinica(("127.0.0.1", 0), Clinica(repo), {"agenda-medico": lambda c, d: {}},
+                                        workers=2, listagens={"agenda-medico": _agenda_que_falha})
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.addCleanup(self.servidor.server_close)
+        self.addCleanup(self.servidor.shutdown)
+
+    def conexao(self):
+        conexao = http.client.HTTPConnection(*self.servidor.server_address, timeout=5)
+        self.addCleanup(conexao.close)
+        return conexao
+
+    def test_fecha_a_conexao_sem_segunda_resposta(self):
+        with socket.create_connection(self.servidor.server_address, timeout=2) as cliente:
+            cliente.sendall(b"GET /agenda-medico HTTP/1.1\r\nHost: teste\r\n\r\n")
+            recebido = b""
+            while parte := cliente.recv(65536):  # Até o servidor fechar a conexão
+                recebido += parte
+        self.assertTrue(recebido.startswith(b"HTTP/1.1 200 "))
+        self.assertEqual(recebido.count(b"HTTP/1.1 "), 1)
+        self.assertFalse(recebido.endswith(b"0\r\n\r\n"))  # Sem o chunk final: resposta incompleta
+
+        # O servidor continua atendendo normalmente.
+        conexao = self.conexao()
+        conexao.request("GET", "/saude")
+        self.assertEqual(conexao.getresponse().status, 200)
+
+
+class ServidorLotado(_ComServidor):
+    def test_conexao_alem_da_fila_recebe_503(self):
+        self.iniciar(workers=1, fila=0, timeout_ociosa=5.0)
+        ocupando = http.client.HTTPConnection(*self.servidor.server_address, timeout=5)
+        ocupando.request("GET", "/saude")
+        ocupando.getresponse().read()  # Keep-alive: o único worker fica com esta conexão
+
+        self.assertEqual(self.saude(), 503)
+        self.assertEqual(self.servidor.recusadas, 1)
+
+        ocupando.close()  # Libera o worker
+        for _ in range(50):
+            if self.saude() == 200:
+                break
+            threading.Event().wait(0.05)
+        else:
+            self.fail("O worker não foi liberado.")
+
+
+class ClienteDesconecta(_ComServidor):
+    def test_desconexao_no_meio_da_agenda(self):
+        self.iniciar(workers=1, listagens={"agenda-medico": _agenda_enorme})
+        with mock.patch.object(self.servidor, "handle_error") as handle_error:
+            with socket.create_connection(self.servidor.server_address, timeout=2) as cliente:
+                cliente.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))  # Fecha com RST
+                cliente.sendall(b"GET /agenda-medico HTTP/1.1\r\nHost: teste\r\n\r\n")
+                self.assertTrue(cliente.recv(65536).startswith(b"HTTP/1.1 200 "))
+            # Com um único worker, esta resposta só sai depois que o da agenda terminou.
+            self.assertEqual(self.saude(), 200)
+        handle_error.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""Lista de espera com a Clinica sobre o ShardedAgendaRepository."""
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+
+from lista_espera import OtimizadorListaEspera
+from models.clinica import Clinica
+from models.medico import Medico
+from models.paciente import Paciente
+from persistencia_shards import ShardedAgendaRepository
+
+SEGUNDA = date(2030, 1, 7)
+REGRAS = {"segunda": ["08:00-09:00"]}
+
+
+class ListaEsperaEmShards(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        # Médico "CRMn" vai para o shard n: os dois ficam em shards diferentes.
+        self.repo = ShardedAgendaRepository([os.path.join(pasta.name, f"shard{i}.db") for i in range(3)],
+                                            os.path.join(pasta.name, "indice.db"),
+                                            rotear_medico=lambda m: int(m.crm[-1]))
+        self.addCleanup(self.repo.fechar)
+        self.clinica = Clinica(self.repo)
+        self.medicos = [self.clinica.cadastrar_medico(Medico(f"M{i}", f"9000000000{i}", "0", f"CRM{i}",
+                                                             "Cardiologia", REGRAS)) for i in (1, 2)]
+        self.pacientes = [self.clinica.cadastrar_paciente(Paciente(f"P{i}", f"1000000000{i}", "0", "SUS"))
+                          for i in range(4)]
+
+    def test_pedidos_atendidos_em_varios_shards(self):
+        origens = {self.repo._local(p)[0] for p in self.pacientes}
+        self.assertGreater(len(origens), 1)
+        # P0 já tem consulta às 08:00: a lista de espera não pode sobrepor.
+        self.clinica.marcar_consulta(self.pacientes[0], self.medicos[0], datetime(2030, 1, 7, 8, 0), 30)
+        pedidos = [self.clinica.adicionar_lista_espera(p, "cardiologia", SEGUNDA, SEGUNDA, 30)
+                   for p in self.pacientes]
+
+        pendentes = self.repo.buscar_pedidos_espera_pendentes()
+        self.assertEqual([p.id for p in pendentes], [p.id for p in pedidos])
+        self.assertEqual([p.id_paciente for p in pendentes], self.pacientes)
+
+        resumo = OtimizadorListaEspera(self.clinica, usar_processos=False).executar(datetime(2030, 1, 1))
+        # Quatro horários (2 médicos x 08:00/08:30), um já ocupado por P0.
+        self.assertEqual((resumo["agendados"], resumo["conflitos"]), (3, 0))
+        self.assertEqual([p.id for p in self.repo.buscar_pedidos_espera_pendentes()], [pedidos[3].id])
+
+        agenda = self.clinica.consultar_agenda_paciente(self.pacientes[0])
+        self.assertEqual([ag.data_hora_inicio.time().isoformat() for ag in agenda], ["08:00:00", "08:30:00"])
+        ocupados = self.repo.buscar_intervalos_ocupados(SEGUNDA, SEGUNDA)
+        self.assertEqual(len(ocupados), 4)
+        self.assertEqual({id_paciente for _, id_paciente, _, _ in ocupados}, set(self.pacientes[:3]))
+        self.assertEqual(len({(id_medico, inicio) for id_medico, _, inicio, _ in ocupados}), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
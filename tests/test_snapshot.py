@@ -0,0 +1,103 @@
+"""Snapshots para relatórios: congelados, somente leitura, com o banco de arquivo junto."""
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from datetime import datetime
+
+from main import main_cli
+from models.agendamento import Agendamento
+from models.medico import Medico
+from models.paciente import Paciente
+from persistencia import AgendaRepository
+
+REGRAS = {"segunda": ["08:00-12:00"]}
+
+
+class _ComRepo(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = pasta.name
+        self.repo = AgendaRepository(os.path.join(pasta.name, "clinica.db"))
+        self.addCleanup(self.repo.fechar)
+        self.id_paciente = self.repo.salvar_paciente(Paciente("Ana", "11111111111", "0", "SUS"))
+        self.id_medico = self.repo.salvar_medico(Medico("Bia", "22222222222", "0", "CRM1", "Geral", REGRAS))
+
+    def salvar_agendamento(self, inicio: datetime, status: str) -> None:
+        ag = Agendamento(self.repo.buscar_paciente(self.id_paciente), self.repo.buscar_medico(self.id_medico),
+                         inicio, 30)
+        ag.status = status
+        self.repo.salvar_agendamento(ag)
+
+    def agenda_do_snapshot(self, caminho: str) -> list:
+        snapshot = AgendaRepository.abrir_snapshot(caminho)
+        self.addCleanup(snapshot.fechar)
+        return [ag.data_hora_inicio for ag in snapshot.buscar_agendamentos_por_paciente(self.id_paciente)]
+
+
+class SnapshotComArquivo(_ComRepo):
+    def test_consultas_arquivadas_entram_no_snapshot(self):
+        self.salvar_agendamento(datetime(2020, 1, 6, 8, 0), "Realizado")
+        self.salvar_agendamento(datetime(2030, 1, 7, 8, 0), "Agendado")
+        self.assertEqual(self.repo.arquivar_agendamentos(datetime(2021, 1, 1)), 1)
+        for compactar in (False, True):
+            with self.subTest(compactar=compactar):
+                caminho = os.path.join(self.pasta, f"snap{int(compactar)}.db")
+                self.repo.criar_snapshot(caminho, compactar=compactar)
+                self.assertTrue(os.path.exists(os.path.join(self.pasta, f"snap{int(compactar)}.arquivo.db")))
+                self.assertEqual(self.agenda_do_snapshot(caminho),
+                                 [datetime(2020, 1, 6, 8, 0), datetime(2030, 1, 7, 8, 0)])
+        self.assertFalse(self.repo._get_conexao().in_transaction)
+
+    def test_sem_arquivo(self):
+        self.salvar_agendamento(datetime(2030, 1, 7, 8, 0), "Agendado")
+        caminho = os.path.join(self.pasta, "snap.db")
+        self.repo.criar_snapshot(caminho)
+        self.assertFalse(os.path.exists(os.path.join(self.pasta, "snap.arquivo.db")))
+        self.assertEqual(self.agenda_do_snapshot(caminho), [datetime(2030, 1, 7, 8, 0)])
+
+    def test_arquivo_de_destino_existente(self):
+        self.salvar_agendamento(datetime(2020, 1, 6, 8, 0), "Realizado")
+        self.repo.arquivar_agendamentos(datetime(2021, 1, 1))
+        open(os.path.join(self.pasta, "snap.arquivo.db"), "w").close()
+        with self.assertRaises(FileExistsError):
+            self.repo.criar_snapshot(os.path.join(self.pasta, "snap.db"))
+        self.assertFalse(os.path.exists(os.path.join(self.pasta, "snap.db")))
+
+
+class SnapshotSomenteLeitura(_ComRepo):
+    def test_congelado_no_instante_da_copia(self):
+        self.salvar_agendamento(datetime(2030, 1, 7, 8, 0), "Agendado")
+        caminho = self.repo.criar_snapshot(os.path.join(self.pasta, "snap.db"))
+        self.salvar_agendamento(datetime(2030, 1, 7, 9, 0), "Agendado")
+        self.assertEqual(self.agenda_do_snapshot(caminho), [datetime(2030, 1, 7, 8, 0)])
+
+    def test_escrita_recusada(self):
+        caminho = self.repo.criar_snapshot(os.path.join(self.pasta, "snap.db"))
+        snapshot = AgendaRepository.abrir_snapshot(caminho)
+        self.addCleanup(snapshot.fechar)
+        with self.assertRaises(sqlite3.Error):
+            snapshot.salvar_paciente(Paciente("Caio", "33333333333", "0", "SUS"))
+        self.assertEqual([p.nome for p in snapshot.buscar_todos_pacientes()], ["Ana"])
+
+    def test_snapshot_inexistente(self):
+        with self.assertRaises(FileNotFoundError):
+            AgendaRepository.abrir_snapshot(os.path.join(self.pasta, "nao_existe.db"))
+
+    def test_cli(self):
+        caminho = os.path.join(self.pasta, "snap.db")
+        self.assertEqual(main_cli(["--db", self.repo.db_path, "snapshot", caminho]), 0)
+        self.assertEqual(main_cli(["--db", self.repo.db_path, "snapshot", caminho]), 1)  # Já existe
+        saida = io.StringIO()
+        with redirect_stdout(saida):
+            self.assertEqual(main_cli(["--db", caminho, "--somente-leitura", "listar", "pacientes"]), 0)
+        self.assertEqual([json.loads(linha)["ok"] for linha in saida.getvalue().splitlines()], [True])
+        self.assertIn("Ana", saida.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""Status dos agendamentos como código inteiro e o índice parcial de consultas ativas."""
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import date, datetime
+from unittest import mock
+
+import persistencia
+from models.clinica import Clinica
+from persistencia import STATUS_AGENDADO, STATUS_CANCELADO, STATUS_REALIZADO, AgendaRepository
+
+SEGUNDA = date(2030, 1, 7)
+REGRAS = {"segunda": ["08:00-12:00"]}
+# (id, início, status como as versões antigas gravavam)
+LEGADO = [(1, "2030-01-07T08:00:00", "agendado"), (2, "2030-01-07T08:30:00", "Cancelado"),
+          (3, "2030-01-07T09:00:00", "REALIZADO"), (5, "2030-01-07T09:30:00", "Agendado")]
+
+
+class MigracaoDeBancoAntigo(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.caminho = os.path.join(pasta.name, "clinica.db")
+        # Banco na versão 4 do esquema: status ainda é texto.
+        with mock.patch.object(persistencia, "MIGRACOES", persistencia.MIGRACOES[:4]), \
+                mock.patch.object(persistencia, "ESQUEMA_VERSAO", 4):
+            AgendaRepository(self.caminho).fechar()
+        conn = sqlite3.connect(self.caminho)
+        with conn:
+            conn.execute("INSERT INTO pacientes (id, nome, cpf, telefone, plano_saude) "
+                         "VALUES (1, 'Ana', '11111111111', '0', 'SUS');")
+            conn.execute("INSERT INTO medicos (id, nome, cpf, telefone, crm, especialidade, regras_disponibilidade) "
+                         "VALUES (1, 'Bia', '22222222222', '0', 'CRM1', 'Geral', ?);", (json.dumps(REGRAS),))
+            conn.executemany("INSERT INTO agendamentos (id, id_paciente, id_medico, data_hora_inicio, "
+                             "duracao_minutos, status) VALUES (?, 1, 1, ?, 30, ?);", LEGADO)
+            conn.execute("INSERT INTO agendamentos (id, id_paciente, id_medico, data_hora_inicio, duracao_minutos, "
+                         "status) VALUES (6, 1, 1, '2030-01-07T10:00:00', 30, 'agendado');")
+            conn.execute("DELETE FROM agendamentos WHERE id = 6;")
+        conn.close()
+        self.repo = AgendaRepository(self.caminho)
+        self.addCleanup(self.repo.fechar)
+        self.conn = self.repo._get_conexao()
+
+    def test_status_convertidos(self):
+        self.assertEqual(self.conn.execute("SELECT id, status FROM agendamentos ORDER BY id;").fetchall(),
+                         [(1, STATUS_AGENDADO), (2, STATUS_CANCELADO), (3, STATUS_REALIZADO), (5, STATUS_AGENDADO)])
+        self.assertEqual([(ag.id, ag.status) for ag in self.repo.buscar_agendamentos_por_paciente(1, True)],
+                         [(1, "Agendado"), (2, "Cancelado"), (3, "Realizado"), (5, "Agendado")])
+        self.assertEqual(self.conn.execute("PRAGMA foreign_key_check;").fetchall(), [])
+        tipo, = [col[2] for col in self.conn.execute("PRAGMA table_info(agendamentos);") if col[1] == "status"]
+        self.assertEqual(tipo, "INTEGER")
+
+    def test_ids_apagados_nao_voltam(self):
+        clinica = Clinica(self.repo)
+        self.assertEqual(clinica.marcar_consulta(1, 1, datetime(2030, 1, 7, 11, 0), 30).id, 7)
+
+    def test_codigo_invalido_recusado(self):
+        with self.assertRaises(sqlite3.IntegrityError):
+            with self.conn:
+                self.conn.execute("UPDATE agendamentos SET status = 9 WHERE id = 1;")
+
+    def test_diario_continua_com_nomes(self):
+        Clinica(self.repo).cancelar_consulta(1)
+        evento = self.repo.buscar_eventos()[-1]
+        self.assertEqual((evento["tipo"], evento["dados"]["status"], evento["dados"]["status_anterior"]),
+                         ("atualizado", "Cancelado", "Agendado"))
+
+    def test_cancelados_ficam_fora_por_padrao(self):
+        ativos = [ag.id for ag in self.repo.buscar_agendamentos_por_paciente(1)]
+        self.assertEqual(ativos, [1, 3, 5])
+        self.assertEqual([ag.id for ag in self.repo.buscar_agendamentos_por_medico_e_data(1, SEGUNDA.isoformat())],
+                         ativos)
+        self.assertEqual([ag.id for ag in self.repo.buscar_agendamentos_por_medico_e_data(
+            1, SEGUNDA.isoformat(), incluir_cancelados=True)], [1, 2, 3, 5])
+        self.assertEqual([linha[0] for lote in self.repo.iterar_agenda_medico(1, SEGUNDA) for linha in lote], ativos)
+
+    def test_horario_cancelado_pode_ser_remarcado(self):
+        clinica = Clinica(self.repo)
+        self.assertEqual(clinica.marcar_consulta(1, 1, datetime(2030, 1, 7, 8, 30), 30).status, "Agendado")
+        with self.assertRaises(ValueError):
+            clinica.marcar_consulta(1, 1, datetime(2030, 1, 7, 8, 0), 30)
+
+    def test_indice_parcial_usado(self):
+        plano = " ".join(linha[-1] for linha in self.conn.execute(
+            "EXPLAIN QUERY PLAN " + persistencia.SQL["buscar_agendamentos_por_medico_e_data"],
+            (1, "2030-01-07", "2030-01-08")))
+        self.assertIn("idx_agendamentos_ativos_medico", plano)
+
+
+class NomesDeStatus(unittest.TestCase):
+    def test_codigo_status(self):
+        self.assertEqual(persistencia.codigo_status("agendado"), STATUS_AGENDADO)
+        self.assertEqual(persistencia.codigo_status("CANCELADO"), STATUS_CANCELADO)
+        with self.assertRaises(ValueError):
+            persistencia.codigo_status("Remarcado")
+
+
+if __name__ == "__main__":
+    unittest.main()
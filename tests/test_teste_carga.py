@@ -0,0 +1,101 @@
+"""Teste de carga (benchmarks/teste_carga.py): uma rodada curta e a verificação de dupla marcação."""
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+from teste_carga import FAIXAS_MS, duplas_marcacoes, ler_catalogo, ler_perfil, resumir  # noqa: E402
+
+from dados_sinteticos import GeradorDados  # noqa: E402
+from persistencia import AgendaRepository  # noqa: E402
+
+
+class Perfil(unittest.TestCase):
+    def test_ler_perfil(self):
+        self.assertEqual(ler_perfil("buscar=20, marcar=5"), {"buscar": 20.0, "marcar": 5.0})
+        with self.assertRaises(ValueError):
+            ler_perfil("buscar=1,apagar=2")
+        with self.assertRaises(ValueError):
+            ler_perfil("buscar=0")
+
+    def test_resumir(self):
+        medidas = {"marcar": {"latencias": [0.0001, 0.003, 0.003, 0.2, 9.0], "exemplos": ["ocupado"],
+                              "ok": 3, "recusada": 1, "travada": 1, "erro": 0}}
+        resumo = resumir(medidas, 2.0)
+        marcar = resumo["por_operacao"]["marcar"]
+        self.assertEqual((resumo["total"], resumo["por_segundo"], resumo["travadas"]), (5, 2.5, 1))
+        self.assertEqual((marcar["p50_ms"], marcar["max_ms"]), (3.0, 9000.0))
+        self.assertEqual(sum(n for _, n in marcar["histograma_ms"]), 5)
+        self.assertEqual(marcar["histograma_ms"][-1], [None, 1])  # Acima de FAIXAS_MS[-1]
+        self.assertEqual(len(marcar["histograma_ms"]), len(FAIXAS_MS) + 1)
+
+
+class _ComBanco(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = pasta.name
+        self.db = os.path.join(pasta.name, "carga.db")
+        hoje = date.today()
+        repo = AgendaRepository(self.db)
+        try:
+            GeradorDados(7, pacientes=40, medicos=4, consultas=600, data_inicio=hoje - timedelta(days=14),
+                         hoje=hoje).popular(repo)
+        finally:
+            repo.fechar()
+        self.catalogo = ler_catalogo(self.db)
+
+
+class DuplaMarcacao(_ComBanco):
+    def duplicar(self, id_agendamento: int, status: int = 1) -> int:
+        conn = sqlite3.connect(self.db)
+        try:
+            with conn:
+                return conn.execute(
+                    "INSERT INTO agendamentos (id_paciente, id_medico, data_hora_inicio, duracao_minutos, status) "
+                    "SELECT id_paciente, id_medico, data_hora_inicio, duracao_minutos, ? FROM agendamentos "
+                    "WHERE id = ?;", (status, id_agendamento)).lastrowid
+        finally:
+            conn.close()
+
+    def test_banco_gerado_nao_tem_duplas(self):
+        self.assertEqual(duplas_marcacoes(self.db, 0), (0, []))
+
+    def test_encontra_so_as_criadas_no_teste(self):
+        alvo = self.catalogo["futuras"][0]
+        self.duplicar(alvo, status=2)  # Cancelada: não conta
+        dupla = self.duplicar(alvo)
+        total, exemplos = duplas_marcacoes(self.db, self.catalogo["id_maximo"])
+        self.assertEqual(total, 1)
+        self.assertEqual((exemplos[0]["id"], exemplos[0]["sobreposta_a"]), (dupla, alvo))
+        self.assertEqual(duplas_marcacoes(self.db, dupla), (0, []))
+
+
+class RodadaCurta(_ComBanco):
+    def test_linha_de_comando(self):
+        prefixo = os.path.join(self.pasta, "relatorio")
+        processo = subprocess.run(
+            [sys.executable, os.path.join(RAIZ, "benchmarks", "teste_carga.py"), "--db", self.db,
+             "--clientes", "3", "--segundos", "1", "--relatorio", prefixo],
+            capture_output=True, text=True, timeout=120)
+        self.assertEqual(processo.returncode, 0, processo.stdout + processo.stderr)
+        with open(prefixo + ".json", encoding="utf-8") as f:
+            relatorio = json.load(f)
+        self.assertGreater(relatorio["total"], 0)
+        self.assertEqual((relatorio["erros"], relatorio["duplas_marcacoes"]), (0, 0))
+        self.assertEqual(relatorio["total"], sum(o["n"] for o in relatorio["por_operacao"].values()))
+        for op, o in relatorio["por_operacao"].items():
+            with self.subTest(op=op):
+                self.assertEqual(o["n"], o["ok"] + o["recusada"] + o["travada"] + o["erro"])
+        with open(prefixo + ".html", encoding="utf-8") as f:
+            self.assertIn("Teste de carga da clínica", f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
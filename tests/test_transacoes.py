@@ -0,0 +1,104 @@
+"""Transações de escrita (BEGIN IMMEDIATE) são desfeitas em qualquer erro."""
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from models.agendamento import Agendamento
+from models.medico import Medico
+from models.paciente import Paciente
+import persistencia
+from persistencia import AgendaRepository
+
+REGRAS = {"segunda": ["08:00-12:00"]}
+SEGUNDA = datetime(2030, 1, 7, 8, 0)
+
+
+class Interrompido(Exception):
+    """Erro que não é sqlite3.Error, como um KeyboardInterrupt no meio do lote."""
+
+
+class RollbackEmQualquerErro(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = pasta.name
+        self.repo = AgendaRepository(os.path.join(pasta.name, "clinica.db"))
+        self.addCleanup(self.repo.fechar)
+        self.id_paciente = self.repo.salvar_paciente(Paciente("Ana", "11111111111", "0", "SUS"))
+        self.id_medico = self.repo.salvar_medico(Medico("Bia", "22222222222", "0", "CRM1", "Geral", REGRAS))
+
+    def contar(self, tabela: str) -> int:
+        return self.repo._get_conexao().execute(f"SELECT COUNT(*) FROM {tabela};").fetchone()[0]
+
+    def assert_sem_transacao_aberta(self):
+        self.assertFalse(self.repo._get_conexao().in_transaction)
+
+    def test_salvar_agendamentos_em_lote(self):
+        def itens():
+            yield None, self.id_paciente, self.id_medico, SEGUNDA, 30, "Agendado"
+            raise Interrompido
+
+        with self.assertRaises(Interrompido):
+            self.repo.salvar_agendamentos_em_lote(itens())
+        self.assert_sem_transacao_aberta()
+        self.assertEqual(self.contar("agendamentos"), 0)
+
+    def test_migracao(self):
+        def migracao_interrompida(conn):
+            conn.execute("CREATE TABLE nova (id INTEGER PRIMARY KEY);")
+            raise Interrompido
+
+        versao = persistencia.ESQUEMA_VERSAO
+        with mock.patch.object(persistencia, "MIGRACOES", persistencia.MIGRACOES + ((migracao_interrompida,),)), \
+                mock.patch.object(persistencia, "ESQUEMA_VERSAO", versao + 1):
+            with self.assertRaises(Interrompido):
+                self.repo._criar_tabelas()
+        self.assert_sem_transacao_aberta()
+        conn = self.repo._get_conexao()
+        self.assertEqual(conn.execute("PRAGMA user_version;").fetchone()[0], versao)
+        self.assertIsNone(conn.execute("SELECT name FROM sqlite_master WHERE name = 'nova';").fetchone())
+
+    def salvar_agendamento(self, status: str) -> None:
+        ag = Agendamento(self.repo.buscar_paciente(self.id_paciente), self.repo.buscar_medico(self.id_medico),
+                         SEGUNDA, 30)
+        ag.status = status
+        self.repo.salvar_agendamento(ag)
+
+    def test_arquivar_agendamentos(self):
+        self.salvar_agendamento("Realizado")
+        with mock.patch("json.dumps", side_effect=Interrompido):
+            with self.assertRaises(Interrompido):
+                self.repo.arquivar_agendamentos(datetime(2031, 1, 1))
+        self.assert_sem_transacao_aberta()
+        self.assertEqual(self.contar("agendamentos"), 1)
+        self.assertIsNone(self.repo.horizonte_arquivo(self.repo._get_conexao()))
+
+    def test_purgar_excluidos(self):
+        self.salvar_agendamento("Agendado")
+        self.repo.deletar_paciente(self.id_paciente)
+        with mock.patch("json.dumps", side_effect=Interrompido):
+            with self.assertRaises(Interrompido):
+                self.repo.purgar_excluidos()
+        self.assert_sem_transacao_aberta()
+        self.assertEqual((self.contar("agendamentos"), self.contar("pacientes")), (1, 1))
+
+    def test_carregar_em_massa(self):
+        paciente = Paciente("Caio", "33333333333", "0", "SUS")
+        medico = Medico("Duda", "44444444444", "0", "CRM2", "Geral", REGRAS)
+
+        def agendamentos():
+            ag = Agendamento(paciente, medico, SEGUNDA, 30)
+            ag.status = "Agendado"
+            yield ag
+            raise Interrompido
+
+        with self.assertRaises(Interrompido):
+            self.repo.carregar_em_massa([paciente], [medico], agendamentos(), tamanho_lote=1)
+        self.assert_sem_transacao_aberta()
+        self.assertEqual((self.contar("pacientes"), self.contar("medicos"), self.contar("agendamentos")), (1, 1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+"""Concorrência otimista: os cancelamentos em cascata também mudam a versão."""
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from models.clinica import Clinica
+from models.medico import Medico
+from models.paciente import Paciente
+from persistencia import SQL, STATUS_CANCELADO, AgendaRepository, ConflitoVersao
+
+REGRAS = {"segunda": ["08:00-12:00"]}
+SEGUNDA = datetime(2030, 1, 7, 9, 0)
+
+
+class VersaoAposCascata(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        repo = AgendaRepository(os.path.join(pasta.name, "clinica.db"))
+        self.addCleanup(repo.fechar)
+        self.clinica = Clinica(repo)
+        self.id_paciente = self.clinica.cadastrar_paciente(Paciente("Ana", "11111111111", "0", "SUS"))
+        self.id_medico = self.clinica.cadastrar_medico(
+            Medico("Bia", "22222222222", "0", "CRM1", "Geral", REGRAS))
+        self.id_agendamento = self.clinica.marcar_consulta(self.id_paciente, self.id_medico, SEGUNDA, 30).id
+        self.lida = self.clinica.repo.buscar_agendamento(self.id_agendamento)
+
+    def linha(self):
+        """(status, versao) direto da tabela: buscar_agendamento ignora cadastros excluídos."""
+        conn = self.clinica.repo._get_conexao()
+        return conn.execute(SQL["buscar_status_agendamento"], (self.id_agendamento,)).fetchone()
+
+    def assert_versao_desatualizada(self):
+        self.assertEqual(self.linha(), (STATUS_CANCELADO, self.lida.versao + 1))
+        with self.assertRaises(ConflitoVersao):
+            self.clinica.confirmar_realizacao(self.id_agendamento, self.lida.versao)
+        with self.assertRaises(ConflitoVersao):
+            self.clinica.cancelar_consulta(self.id_agendamento, self.lida.versao)
+        self.assertEqual(self.linha(), (STATUS_CANCELADO, self.lida.versao + 1))
+
+    def test_exclusao_do_paciente(self):
+        self.clinica.excluir_paciente(self.id_paciente)
+        self.assert_versao_desatualizada()
+
+    def test_exclusao_do_medico(self):
+        self.clinica.excluir_medico(self.id_medico)
+        self.assert_versao_desatualizada()
+
+
+if __name__ == "__main__":
+    unittest.main()